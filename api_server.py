@@ -3,19 +3,17 @@ API сервер для удалённого запуска парсера че
 Используется FastAPI для создания REST API endpoint
 """
 
-from fastapi import FastAPI, HTTPException, Header, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Header, Depends
 from pydantic import BaseModel
-import asyncio
-import subprocess
 import os
 from datetime import datetime
-from typing import Optional
-import hashlib
+from typing import List, Optional
 import hmac
 from loguru import logger
 from dotenv import load_dotenv
 
+from job_queue import QUEUED, RUNNING, JobQueue
+
 # Загрузка переменных окружения из .env
 load_dotenv()
 
@@ -36,20 +34,21 @@ app = FastAPI(
 # Секретный ключ для аутентификации (ДОЛЖЕН БЫТЬ В .env!)
 API_SECRET_KEY = os.getenv("API_SECRET_KEY", "CHANGE_THIS_SECRET_KEY_IN_PRODUCTION")
 
-# Статус текущего выполнения
-current_task_status = {
-    "is_running": False,
-    "started_at": None,
-    "last_run": None,
-    "last_status": None,
-    "last_error": None
-}
+# Очередь заданий (общая с Telegram-ботом)
+job_queue = JobQueue()
 
 
 class TriggerRequest(BaseModel):
     """Запрос на запуск парсера"""
     source: str = "manual"  # manual, cron, app_script
-    force: bool = False  # Принудительный запуск даже если уже выполняется
+    force: bool = False  # Новое задание даже если такое же уже ждёт в очереди
+
+
+class JobRequest(BaseModel):
+    """Запрос на постановку задания в очередь"""
+    kind: str  # parse, parse_range, wb_sync, sheets_sync, rematch
+    args: List[str] = []
+    source: str = "api"
 
 
 def verify_api_key(api_key: Optional[str]) -> bool:
@@ -73,43 +72,26 @@ def verify_api_key(api_key: Optional[str]) -> bool:
         return False
 
 
-async def run_parser_task():
-    """Фоновая задача для запуска парсера"""
-    global current_task_status
-    
-    try:
-        current_task_status["is_running"] = True
-        current_task_status["started_at"] = datetime.now().isoformat()
-        current_task_status["last_error"] = None
-        
-        logger.info("Запуск парсера через API...")
-        
-        # Запуск main.py как subprocess
-        process = await asyncio.create_subprocess_exec(
-            "python", "main.py",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=os.path.dirname(os.path.abspath(__file__))
-        )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            current_task_status["last_status"] = "success"
-            logger.info(f"Парсер завершён успешно: {stdout.decode('utf-8', errors='ignore')}")
-        else:
-            current_task_status["last_status"] = "error"
-            current_task_status["last_error"] = stderr.decode('utf-8', errors='ignore')
-            logger.error(f"Парсер завершён с ошибкой: {stderr.decode('utf-8', errors='ignore')}")
-        
-    except Exception as e:
-        current_task_status["last_status"] = "error"
-        current_task_status["last_error"] = str(e)
-        logger.error(f"Ошибка при запуске парсера: {e}")
-    
-    finally:
-        current_task_status["is_running"] = False
-        current_task_status["last_run"] = datetime.now().isoformat()
+def require_api_key(authorization: Optional[str]) -> None:
+    """401, если ключ не подходит."""
+    if not verify_api_key(authorization):
+        raise HTTPException(status_code=401, detail="Unauthorized: Invalid or missing API key")
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    """
+    Запуск воркеров очереди заданий вместе с сервером.
+
+    Слушателей здесь нет: о запуске и завершении заданий, которые выполнил
+    сервер, сообщает бот - он следит за статусами в файле очереди.
+    """
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
 
 
 @app.get("/")
@@ -122,7 +104,8 @@ async def root():
         "endpoints": {
             "/health": "Проверка работоспособности",
             "/status": "Текущий статус парсера",
-            "/trigger": "Запуск парсера (POST, требует авторизацию)"
+            "/trigger": "Запуск парсера (POST, требует авторизацию)",
+            "/jobs": "Очередь заданий (GET - список, POST - новое задание)"
         }
     }
 
@@ -133,7 +116,7 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "parser_running": current_task_status["is_running"]
+        "parser_running": bool(job_queue.jobs((RUNNING,)))
     }
 
 
@@ -144,20 +127,27 @@ async def get_status(authorization: Optional[str] = Header(None)):
     if not verify_api_key(authorization):
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid or missing API key")
     
+    jobs = job_queue.jobs()
     return {
         "status": "ok",
-        "data": current_task_status
+        "data": {
+            "is_running": any(job.status == RUNNING for job in jobs),
+            "running": [job.to_dict() for job in jobs if job.status == RUNNING],
+            "queued": [job.to_dict() for job in jobs if job.status != RUNNING]
+        }
     }
 
 
 @app.post("/trigger")
 async def trigger_parser(
     request: TriggerRequest,
-    background_tasks: BackgroundTasks,
     authorization: Optional[str] = Header(None)
 ):
     """
-    Запуск парсера
+    Запуск парсера (постановка задания в очередь)
+    
+    Если парсер уже работает, задание ждёт своей очереди; повторный запрос
+    возвращает уже ожидающее задание (force - поставить ещё одно).
     
     Требуется заголовок: Authorization: Bearer <API_SECRET_KEY>
     """
@@ -166,27 +156,62 @@ async def trigger_parser(
         logger.warning("Попытка запуска без авторизации")
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid or missing API key")
     
-    # Проверка, не выполняется ли уже парсер
-    if current_task_status["is_running"] and not request.force:
-        logger.warning("Попытка запуска парсера, который уже выполняется")
-        raise HTTPException(
-            status_code=409,
-            detail="Parser is already running. Use 'force: true' to override."
-        )
+    job = job_queue.submit('parse', source=request.source, dedupe=not request.force)
     
-    # Добавление фоновой задачи
-    background_tasks.add_task(run_parser_task)
-    
-    logger.info(f"Парсер запущен через API (source: {request.source})")
+    logger.info(f"Парсер поставлен в очередь через API (source: {request.source}, задание #{job.id})")
     
     return {
         "status": "accepted",
-        "message": "Parser task started",
+        "message": "Parser task queued",
         "source": request.source,
-        "started_at": datetime.now().isoformat()
+        "job_id": job.id,
+        "position": job_queue.position(job.id),
+        "queued_at": datetime.fromtimestamp(job.created_at).isoformat()
     }
 
 
+@app.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = 50,
+    authorization: Optional[str] = Header(None)
+):
+    """Задания очереди: по умолчанию ожидающие и работающие, status=done,failed - завершённые"""
+    require_api_key(authorization)
+    statuses = tuple(status.split(',')) if status else (QUEUED, RUNNING)
+    return {"status": "ok", "jobs": [job.to_dict() for job in job_queue.jobs(statuses, limit=limit)]}
+
+
+@app.post("/jobs")
+async def submit_job(request: JobRequest, authorization: Optional[str] = Header(None)):
+    """Поставить задание в очередь"""
+    require_api_key(authorization)
+    try:
+        job = job_queue.submit(request.kind, request.args, source=request.source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "accepted", "job": job.to_dict(), "position": job_queue.position(job.id)}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int, authorization: Optional[str] = Header(None)):
+    """Статус задания"""
+    require_api_key(authorization)
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "ok", "job": job.to_dict(), "position": job_queue.position(job_id)}
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int, authorization: Optional[str] = Header(None)):
+    """Отменить задание: ожидающее - сразу, работающее - остановкой процесса"""
+    require_api_key(authorization)
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job not found or already finished")
+    return {"status": "ok", "job_id": job_id}
+
+
 @app.get("/logs")
 async def get_logs(
     lines: int = 100,
@@ -319,9 +344,15 @@ async def upload_mappings_endpoint(x_api_key: str = Header(None)):
         logger.info("📤 API: Загрузка данных из Sheets в JSON на сервере...")
         
         from mappings_sync import download_mappings_from_sheets
+        from mappings_store import get_store
+        
+        # Сворачиваем журнал, чтобы новый снимок из Sheets не перекрывался старыми записями
+        store = get_store('product_mappings.json')
+        store.compact()
         
         # download_mappings_from_sheets читает ИЗ Sheets и пишет В JSON
         success = download_mappings_from_sheets('product_mappings.json')
+        store.reload()
         
         if success:
             logger.info("✅ API: Данные из Sheets сохранены в JSON")
@@ -355,6 +386,10 @@ async def download_mappings_endpoint(x_api_key: str = Header(None)):
         logger.info("📥 API: Загрузка данных из JSON в Sheets...")
         
         from mappings_sync import upload_mappings_to_sheets
+        from mappings_store import get_store
+        
+        # В Sheets уходит снимок: сначала сворачиваем в него журнал
+        get_store('product_mappings.json').compact()
         
         # upload_mappings_to_sheets читает ИЗ JSON и пишет В Sheets
         success = upload_mappings_to_sheets('product_mappings.json')
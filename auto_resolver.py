@@ -0,0 +1,197 @@
+"""
+Автоматическое сопоставление по истории решений (product_mappings.json).
+
+Большая часть вопросов в Telegram касается товаров, почти совпадающих с
+уже сопоставленными (тот же товар, другое количество в упаковке или
+формулировка продавца). AutoResolver ищет ближайшие исходные названия
+из истории по словам с весами IDF и, если соседи уверенно сходятся на
+одном решении, возвращает его без вопроса пользователю.
+
+Защита от ложных срабатываний:
+- числа в названии (модели, объёмы) должны совпадать точно;
+- количество в упаковке ("2 шт", "x4") может отличаться, но не для
+  решений с разбивкой (split_units зависит от количества);
+- решения SKIP и автоматически принятые решения не используются для обучения.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from product_index import normalize_name, WORD_PATTERN
+
+# Минимальная уверенность для автоматического решения по умолчанию
+DEFAULT_THRESHOLD = 0.85
+# Сколько ближайших соседей голосует за решение
+NEIGHBORS = 10
+# Соседи с меньшей схожестью не учитываются
+MIN_SIMILARITY = 0.5
+
+# Решение "оставить собственное название товара" (mapped_name == original_name)
+SELF_NAME = '__self__'
+
+_QUANTITY_PATTERN = re.compile(
+    r'(?<!\w)(?:(\d+)\s*(?:шт|штук|pcs|pc|уп|[xх])|[xх]\s*(\d+))(?!\w)'
+)
+
+Decision = Tuple[str, str, int]
+
+
+def _split_quantity(name: str) -> Tuple[str, Optional[int]]:
+    """Убрать из нормализованного названия количество в упаковке."""
+    quantity = None
+    match = _QUANTITY_PATTERN.search(name)
+    if match:
+        quantity = int(match.group(1) or match.group(2))
+        name = _QUANTITY_PATTERN.sub(' ', name)
+    return name, quantity
+
+
+def _features(name: str) -> Tuple[FrozenSet[str], FrozenSet[str], Optional[int]]:
+    """Слова, числа (без количества) и количество в упаковке."""
+    text, quantity = _split_quantity(normalize_name(name))
+    tokens = frozenset(WORD_PATTERN.findall(text))
+    numbers = frozenset(token for token in tokens if any(ch.isdigit() for ch in token))
+    return tokens, numbers, quantity
+
+
+class AutoResolver:
+    """Предсказание сопоставления по ближайшим решениям из истории."""
+
+    def __init__(
+        self,
+        mappings: Dict[str, Dict],
+        catalog: Optional[List[Dict[str, str]]] = None,
+        threshold: float = DEFAULT_THRESHOLD
+    ):
+        """
+        Args:
+            mappings: Сопоставления {ключ: {original_name, mapped_name, mapped_type, ...}}
+            catalog: Каталог товаров; решения с товарами вне каталога не применяются
+            threshold: Минимальная уверенность (0-1) для автоматического решения
+        """
+        self.threshold = threshold
+        self.catalog_names = (
+            {normalize_name(product.get('name', '')) for product in catalog} if catalog else None
+        )
+        self.entries: List[Tuple[FrozenSet[str], FrozenSet[str], Optional[int], Decision]] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.document_frequency: Counter = Counter()
+        self._seen: Dict[str, int] = {}
+
+        for mapping in mappings.values():
+            if mapping.get('auto_resolved') is not None:
+                continue
+            self.learn(
+                str(mapping.get('original_name', '')),
+                str(mapping.get('mapped_name', '')),
+                str(mapping.get('mapped_type', '')),
+                mapping.get('split_units')
+            )
+
+    def learn(self, original_name: str, mapped_name: str, mapped_type: str, split_units=None) -> None:
+        """Добавить (или обновить) решение пользователя."""
+        if not original_name or not mapped_name or not mapped_type or mapped_name == 'SKIP':
+            return
+        try:
+            units = int(split_units) if split_units else 0
+        except (ValueError, TypeError):
+            units = 0
+
+        original_normalized = normalize_name(original_name)
+        if normalize_name(mapped_name) == original_normalized:
+            mapped_name = SELF_NAME
+        decision: Decision = (mapped_name, mapped_type, units if units > 1 else 0)
+
+        # Повторное решение по тому же названию заменяет прежнее
+        if original_normalized in self._seen:
+            idx = self._seen[original_normalized]
+            tokens, numbers, quantity, _ = self.entries[idx]
+            self.entries[idx] = (tokens, numbers, quantity, decision)
+            return
+
+        tokens, numbers, quantity = _features(original_name)
+        if not tokens:
+            return
+        idx = len(self.entries)
+        self.entries.append((tokens, numbers, quantity, decision))
+        self._seen[original_normalized] = idx
+        self.document_frequency.update(tokens)
+        for token in tokens:
+            self.postings[token].append(idx)
+
+    def _weight(self, token: str) -> float:
+        total = len(self.entries)
+        return math.log((1 + total) / (1 + self.document_frequency.get(token, 0))) + 1
+
+    def _neighbors(self, name: str) -> List[Tuple[float, Decision]]:
+        tokens, numbers, quantity = _features(name)
+        if not tokens:
+            return []
+        weights = {token: self._weight(token) for token in tokens}
+        query_weight = sum(weights.values())
+
+        overlap: Dict[int, float] = defaultdict(float)
+        for token in tokens:
+            for idx in self.postings.get(token, ()):
+                overlap[idx] += weights[token]
+
+        neighbors = []
+        for idx, shared in overlap.items():
+            entry_tokens, entry_numbers, entry_quantity, decision = self.entries[idx]
+            if entry_numbers != numbers:
+                continue
+            if decision[2] and entry_quantity != quantity:
+                continue
+            entry_weight = sum(self._weight(token) for token in entry_tokens)
+            # Взвешенный коэффициент Жаккара
+            similarity = shared / (query_weight + entry_weight - shared)
+            if similarity >= MIN_SIMILARITY:
+                neighbors.append((similarity, decision))
+
+        neighbors.sort(key=lambda item: -item[0])
+        return neighbors[:NEIGHBORS]
+
+    def predict(self, name: str) -> Optional[Dict]:
+        """
+        Наиболее вероятное решение для названия.
+
+        Уверенность = схожесть лучшего соседа с этим решением, умноженная на
+        долю голосов соседей (с весом схожести), отданных за это решение.
+
+        Returns:
+            {mapped_name, mapped_type, split_units, confidence} или None
+        """
+        neighbors = self._neighbors(name)
+        if not neighbors:
+            return None
+
+        votes: Dict[Decision, float] = defaultdict(float)
+        best_similarity: Dict[Decision, float] = {}
+        for similarity, decision in neighbors:
+            votes[decision] += similarity
+            best_similarity.setdefault(decision, similarity)
+
+        decision = max(votes, key=lambda d: (votes[d], best_similarity[d]))
+        confidence = best_similarity[decision] * votes[decision] / sum(votes.values())
+
+        mapped_name, mapped_type, split_units = decision
+        if mapped_name == SELF_NAME:
+            mapped_name = name
+        elif self.catalog_names is not None and normalize_name(mapped_name) not in self.catalog_names:
+            return None
+
+        return {
+            'mapped_name': mapped_name,
+            'mapped_type': mapped_type,
+            'split_units': split_units,
+            'confidence': round(confidence, 3)
+        }
+
+    def resolve(self, name: str) -> Optional[Dict]:
+        """Решение, если уверенность не ниже порога, иначе None."""
+        prediction = self.predict(name)
+        if prediction and prediction['confidence'] >= self.threshold:
+            return prediction
+        return None
@@ -0,0 +1,143 @@
+"""
+Локальный снимок каталога товаров (лист "Настройки") в SQLite.
+
+Каталог сохраняется вместе с версией листа каталога - значением
+контрольной ячейки (Config.CATALOG_CHECKSUM_CELL) с формулой
+CATALOG_CHECKSUM_FORMULA. При следующем запуске SheetsManager читает
+одну эту ячейку и, если версия та же, берёт товары из снимка вместо
+полного чтения A:AU.
+
+Контрольная ячейка настраивается один раз вручную: вставьте
+CATALOG_CHECKSUM_FORMULA в свободную ячейку листа "Настройки" правее A:AU
+(например, AV1) и укажите её в CATALOG_CHECKSUM_CELL. Загрузчик ячейку
+только читает; без настройки (или если ячейка пуста) каталог читается
+из таблицы целиком при каждом запуске.
+
+Время изменения всей таблицы (Drive modifiedTime) для этого не годится:
+каталог лежит в той же таблице, что и лист синхронизации заказов, и
+каждая синхронизация сбрасывала бы снимок. Формула - не криптографический
+хеш, поэтому снимок к тому же живёт не дольше
+Config.CATALOG_SNAPSHOT_MAX_AGE_HOURS.
+"""
+
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+CATALOG_SNAPSHOT_FILE = 'catalog_snapshot.sqlite3'
+
+# Версия каталога A:AU: число непустых ячеек, длины и коды символов с весами
+# по позиции ячейки - меняется при правке, вставке, удалении и перестановке
+CATALOG_CHECKSUM_FORMULA = (
+    '=COUNTA(A:AU)'
+    '&"-"&SUMPRODUCT(LEN(A:AU)*(ROW(A:AU)*64+COLUMN(A:AU)))'
+    '&"-"&SUMPRODUCT(IFERROR(UNICODE(A:AU),0)*ROW(A:AU))'
+    '&"-"&SUMPRODUCT(IFERROR(UNICODE(MID(A:AU,INT(LEN(A:AU)/2)+1,1)),0)*COLUMN(A:AU))'
+    '&"-"&SUMPRODUCT(IFERROR(UNICODE(RIGHT(A:AU)),0)*(ROW(A:AU)+COLUMN(A:AU)))'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    source TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    product_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_products (
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    price TEXT NOT NULL,
+    PRIMARY KEY (source, position)
+);
+"""
+
+
+class CatalogSnapshot:
+    """Снимок каталога, привязанный к версии листа каталога."""
+
+    def __init__(self, db_path: str = CATALOG_SNAPSHOT_FILE):
+        """
+        Args:
+            db_path: Путь к файлу SQLite
+        """
+        self.db_path = Path(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def load(self, source: str, version: str, max_age: Optional[float] = None) -> Optional[List[Dict[str, str]]]:
+        """
+        Товары из снимка, если он сделан для той же версии каталога.
+
+        Args:
+            source: Идентификатор источника (таблица, лист и диапазон)
+            version: Текущая версия каталога (значение контрольной ячейки)
+            max_age: Максимальный возраст снимка в секундах (None - без ограничения)
+
+        Returns:
+            Список товаров или None, если снимка нет, каталог изменился или снимок устарел
+        """
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT version, product_count, saved_at FROM catalog_meta WHERE source = ?",
+                    (source,)
+                ).fetchone()
+                if row is None or row[0] != version:
+                    return None
+                if max_age is not None and time.time() - row[2] > max_age:
+                    logger.info("🕰️ Снимок каталога устарел - будет перечитан из таблицы")
+                    return None
+
+                products = [
+                    {'name': name, 'type': product_type, 'price': price}
+                    for name, product_type, price in conn.execute(
+                        "SELECT name, type, price FROM catalog_products WHERE source = ? ORDER BY position",
+                        (source,)
+                    )
+                ]
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Не удалось прочитать снимок каталога: {e}")
+            return None
+
+        if len(products) != row[1]:
+            logger.warning("⚠️ Снимок каталога неполный - будет перечитан из таблицы")
+            return None
+        return products
+
+    def save(self, source: str, version: str, products: List[Dict[str, str]]) -> bool:
+        """
+        Заменить снимок источника (одной транзакцией).
+
+        Returns:
+            True если снимок сохранён
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM catalog_products WHERE source = ?", (source,))
+                conn.executemany(
+                    "INSERT INTO catalog_products (source, position, name, type, price) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (source, position, p.get('name', ''), p.get('type', ''), p.get('price', ''))
+                        for position, p in enumerate(products)
+                    )
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog_meta (source, version, saved_at, product_count) "
+                    "VALUES (?, ?, ?, ?)",
+                    (source, version, time.time(), len(products))
+                )
+            logger.debug(f"💾 Снимок каталога сохранён: {len(products)} товаров ({version})")
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Не удалось сохранить снимок каталога: {e}")
+            return False
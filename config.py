@@ -40,6 +40,35 @@ class Config:
     # Google Sheets - GID листов
     GOOGLE_SHEETS_CATALOG_GID = '1473954199'  # Лист "Настройки" с каталогом товаров
     GOOGLE_SHEETS_SYNC_GID = '2122054287'     # Лист для синхронизации заказов (A:I)
+    # Контрольная ячейка листа "Настройки" с формулой версии каталога (см. catalog_snapshot;
+    # пусто - снимок каталога не используется) и срок жизни снимка
+    CATALOG_CHECKSUM_CELL = os.getenv('CATALOG_CHECKSUM_CELL', '')
+    CATALOG_SNAPSHOT_MAX_AGE_HOURS = float(os.getenv('CATALOG_SNAPSHOT_MAX_AGE_HOURS', '24'))
+
+    # Google Sheets - квоты API (запросов в минуту на пользователя) и повторы при 429/5xx
+    SHEETS_READ_REQUESTS_PER_MINUTE = int(os.getenv('SHEETS_READ_REQUESTS_PER_MINUTE', '60'))
+    SHEETS_WRITE_REQUESTS_PER_MINUTE = int(os.getenv('SHEETS_WRITE_REQUESTS_PER_MINUTE', '60'))
+    SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '6'))
+    # Время жизни кеша метаданных таблиц (листы, gid, число строк), секунд
+    SHEETS_METADATA_TTL = int(os.getenv('SHEETS_METADATA_TTL', '300'))
+    # Сумма заказа в столбце E: 'sumif' - SUMIF по номеру заказа в первой строке заказа,
+    # 'arrayformula' - одна формула в E1 на весь столбец
+    ORDER_TOTAL_MODE = os.getenv('ORDER_TOTAL_MODE', 'sumif').lower()
+    # Архив: завершённые заказы старше N дней переносятся в листы по годам ('year') или кварталам ('quarter')
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+    ARCHIVE_PERIOD = os.getenv('ARCHIVE_PERIOD', 'year').lower()
+
+    # Очередь заданий (job_queue): одновременно работающих заданий и свободная память
+    # (МБ), без которой задания с браузером ждут в очереди
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+    JOB_BROWSER_MIN_FREE_MB = int(os.getenv('JOB_BROWSER_MIN_FREE_MB', '600'))
+    # Встроенный планировщик (scheduler): автопарсинг каждые N минут в окне часов (МСК),
+    # случайная задержка запуска и максимальное опоздание для пропущенного запуска
+    SCHEDULE_PARSE_EVERY_MINUTES = int(os.getenv('SCHEDULE_PARSE_EVERY_MINUTES', '15'))
+    SCHEDULE_PARSE_HOURS = os.getenv('SCHEDULE_PARSE_HOURS', '9-21')
+    SCHEDULE_TIMEZONE = os.getenv('SCHEDULE_TIMEZONE', 'Europe/Moscow')
+    SCHEDULE_JITTER_SECONDS = int(os.getenv('SCHEDULE_JITTER_SECONDS', '60'))
+    SCHEDULE_CATCHUP_MINUTES = int(os.getenv('SCHEDULE_CATCHUP_MINUTES', '30'))
     
     # Telegram - Разрешённые пользователи (user_id)
     # Добавьте сюда ID пользователей, которым разрешён доступ к боту
@@ -54,6 +83,14 @@ class Config:
     # Уведомлять всех админов о действиях (True/False)
     NOTIFY_ALL_ADMINS = True
     
+    # Рассылать все вопросы сопоставления сразу и принимать ответы в любом порядке
+    BATCH_PROMPTS = os.getenv('BATCH_PROMPTS', 'True').lower() == 'true'
+    
+    # Автоматически применять решения, уверенно предсказанные по истории сопоставлений
+    AUTO_RESOLVE = os.getenv('AUTO_RESOLVE', 'True').lower() == 'true'
+    # Минимальная уверенность автоматического решения (0-1)
+    AUTO_RESOLVE_THRESHOLD = float(os.getenv('AUTO_RESOLVE_THRESHOLD', '0.85'))
+    
     @classmethod
     def validate(cls):
         """Проверка наличия обязательных настроек."""
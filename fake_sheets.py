@@ -0,0 +1,410 @@
+"""
+Локальная подмена Google Sheets для тестов и замеров синхронизации.
+
+Реализует используемое подмножество gspread (Client.open_by_url,
+Spreadsheet.batch_update / values_batch_update / worksheets, методы
+Worksheet для чтения и записи значений) поверх таблицы в памяти и
+считает вызовы API и прочитанные/записанные ячейки. Так sheets_sync.py,
+wb_sheets_sync.py и sheets_manager.py можно прогонять на листах в
+100k строк без квоты и без риска для рабочей таблицы:
+
+    client = FakeClient()
+    spreadsheet = client.create('Заказы')
+    worksheet = spreadsheet.sheet1
+    sync = SheetsSynchronizer(...)
+    sync.client = client
+    sync.open_sync_worksheet(spreadsheet.url, str(worksheet.id))
+
+Формулы не вычисляются: значения хранятся так, как они записаны
+(USER_ENTERED и RAW не различаются), при чтении всё отдаётся строками,
+как FORMATTED_VALUE в API. Ссылки на строки в формулах сдвигаются при
+вставке и удалении строк, как в Google Sheets.
+"""
+
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from gspread.utils import a1_range_to_grid_range, absolute_range_name
+
+from sheet_plan import shift_formula_rows
+
+DEFAULT_ROWS = 1000
+DEFAULT_COLS = 26
+
+_ids = itertools.count(1)
+
+
+class FakeAPIError(Exception):
+    """Ошибка, которую вернул бы Sheets API (например, выход за границы листа)."""
+
+
+class FakeStats:
+    """Счётчики обращений к API."""
+
+    def __init__(self):
+        # HTTP-запросы по методам API
+        self.calls: Counter = Counter()
+        # Запросы внутри spreadsheets.batchUpdate по типам
+        self.requests: Counter = Counter()
+        self.cells_read = 0
+        self.cells_written = 0
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.requests.clear()
+        self.cells_read = 0
+        self.cells_written = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"FakeStats(calls={self.total_calls} {dict(self.calls)}, requests={dict(self.requests)}, "
+            f"read={self.cells_read}, written={self.cells_written})"
+        )
+
+
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    return str(value)
+
+
+def _trim(rows: List[List[str]]) -> List[List[str]]:
+    """Убрать пустые хвосты строк и пустые строки в конце (как делает API)."""
+    trimmed = []
+    for row in rows:
+        end = len(row)
+        while end and row[end - 1] == '':
+            end -= 1
+        trimmed.append(row[:end])
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class FakeWorksheet:
+    """Лист: сетка строк в памяти."""
+
+    def __init__(self, spreadsheet: 'FakeSpreadsheet', title: str, rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLS):
+        self.spreadsheet = spreadsheet
+        self.id = next(_ids)
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        # Хранятся только строки до последней записанной; остальные - пустые
+        self.grid: List[List[Any]] = []
+        # Запросы оформления (updateBorders и т.п.) в порядке применения
+        self.formatting: List[Dict[str, Any]] = []
+
+    @property
+    def stats(self) -> FakeStats:
+        return self.spreadsheet.stats
+
+    # ------------------------------------------------------------------
+    # Внутренняя работа с сеткой
+
+    def _bounds(self, range_name: Optional[str]) -> Dict[str, int]:
+        if not range_name:
+            return {'startRowIndex': 0, 'endRowIndex': self.row_count,
+                    'startColumnIndex': 0, 'endColumnIndex': self.col_count}
+        if '!' in range_name:
+            range_name = range_name.split('!', 1)[1]
+        grid = a1_range_to_grid_range(range_name)
+        grid.setdefault('startRowIndex', 0)
+        grid.setdefault('startColumnIndex', 0)
+        grid.setdefault('endRowIndex', self.row_count)
+        grid.setdefault('endColumnIndex', self.col_count)
+        # Одна ячейка "A5" - диапазон A5:A5
+        if ':' not in range_name:
+            grid['endRowIndex'] = grid['startRowIndex'] + 1
+            grid['endColumnIndex'] = grid['startColumnIndex'] + 1
+        return grid
+
+    def _read(self, grid: Dict[str, int]) -> List[List[str]]:
+        rows = []
+        for r in range(grid['startRowIndex'], min(grid['endRowIndex'], len(self.grid))):
+            row = self.grid[r]
+            rows.append([
+                _cell_text(row[c]) if c < len(row) else ''
+                for c in range(grid['startColumnIndex'], grid['endColumnIndex'])
+            ])
+        rows = _trim(rows)
+        self.stats.cells_read += sum(len(row) for row in rows)
+        return rows
+
+    def _write(self, start_row: int, start_col: int, values: List[List[Any]], sent: bool = True) -> None:
+        last_row = start_row + len(values)
+        last_col = start_col + max((len(row) for row in values), default=0)
+        if last_row > self.row_count or last_col > self.col_count:
+            raise FakeAPIError(
+                f"Range exceeds grid limits: rows {self.row_count}, columns {self.col_count}"
+            )
+        while len(self.grid) < last_row:
+            self.grid.append([])
+        for r, row_values in enumerate(values, start=start_row):
+            row = self.grid[r]
+            for c, value in enumerate(row_values, start=start_col):
+                while len(row) <= c:
+                    row.append('')
+                row[c] = '' if value is None else value
+        if sent:  # cells_written - ячейки, переданные в запросах (без копирования на сервере)
+            self.stats.cells_written += sum(len(row) for row in values)
+        self.spreadsheet.touch()
+
+    def _shift_formulas(self, position: int, delta: int) -> None:
+        for row in self.grid:
+            for c, value in enumerate(row):
+                if isinstance(value, str) and value.startswith('='):
+                    row[c] = shift_formula_rows(value, position, delta)
+
+    def _copy(self, source: Dict[str, int], destination: Dict[str, int]) -> None:
+        """copyPaste: источник повторяется по всему диапазону назначения."""
+        height = source['endRowIndex'] - source['startRowIndex']
+        width = source['endColumnIndex'] - source['startColumnIndex']
+        pattern = [
+            [
+                self.grid[r][c] if r < len(self.grid) and c < len(self.grid[r]) else ''
+                for c in range(source['startColumnIndex'], source['endColumnIndex'])
+            ]
+            for r in range(source['startRowIndex'], source['endRowIndex'])
+        ]
+        rows = destination['endRowIndex'] - destination['startRowIndex']
+        cols = destination['endColumnIndex'] - destination['startColumnIndex']
+        values = [[pattern[r % height][c % width] for c in range(cols)] for r in range(rows)]
+        self._write(destination['startRowIndex'], destination['startColumnIndex'], values, sent=False)
+
+    def _fill(self, grid: Dict[str, int], value: Any) -> None:
+        """repeatCell: одно значение во всём диапазоне (пустое - очистка), строки за данными не создаются."""
+        if isinstance(value, dict):
+            value = next(iter(value.values()), '')
+        start = grid.get('startRowIndex', 0)
+        end = min(grid.get('endRowIndex', self.row_count), max(len(self.grid), start))
+        cols = grid.get('endColumnIndex', self.col_count) - grid.get('startColumnIndex', 0)
+        values = [[value or ''] * cols for _ in range(start, end)]
+        if values:
+            self._write(start, grid.get('startColumnIndex', 0), values, sent=False)
+
+    def _insert(self, start: int, count: int) -> None:
+        if start < len(self.grid):
+            self.grid[start:start] = [[] for _ in range(count)]
+        self.row_count += count
+        self._shift_formulas(start + 1, count)
+
+    def _delete(self, start: int, end: int) -> None:
+        if end > self.row_count:
+            raise FakeAPIError("deleteDimension: диапазон за пределами листа")
+        del self.grid[start:end]
+        self.row_count -= end - start
+        self._shift_formulas(start + 1, start - end)
+
+    # ------------------------------------------------------------------
+    # API gspread.Worksheet
+
+    def get(self, range_name: Optional[str] = None, pad_values: bool = False, **kwargs) -> List[List[str]]:
+        self.stats.calls['values.get'] += 1
+        grid = self._bounds(range_name)
+        rows = self._read(grid)
+        if pad_values:
+            width = max((len(row) for row in rows), default=0)
+            rows = [row + [''] * (width - len(row)) for row in rows]
+        return rows
+
+    def get_values(self, range_name: Optional[str] = None, **kwargs) -> List[List[str]]:
+        kwargs.setdefault('pad_values', True)
+        return self.get(range_name, **kwargs)
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        self.stats.calls['values.batchGet'] += 1
+        return [self._read(self._bounds(range_name)) for range_name in ranges]
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        return self.get_values(**kwargs)
+
+    def col_values(self, col: int, **kwargs) -> List[str]:
+        self.stats.calls['values.get'] += 1
+        column = [[row[col - 1] if col - 1 < len(row) else ''] for row in self.grid]
+        column = _trim([[_cell_text(cell[0])] for cell in column])
+        self.stats.cells_read += len(column)
+        return [row[0] if row else '' for row in column]
+
+    def update(self, range_name: Any = None, values: Any = None, value_input_option: Optional[str] = None, **kwargs):
+        # gspread 6: update(values, range_name); старые вызовы - update(range_name, values)
+        if isinstance(range_name, list):
+            range_name, values = values, range_name
+        self.stats.calls['values.update'] += 1
+        grid = self._bounds(range_name or 'A1')
+        self._write(grid['startRowIndex'], grid['startColumnIndex'], values or [])
+        return {'updatedRange': absolute_range_name(self.title, range_name or 'A1')}
+
+    def insert_rows(self, values: List[List[Any]], row: int = 1, value_input_option: Optional[str] = None,
+                    inherit_from_before: bool = False):
+        # Как в gspread: insertDimension + values.append
+        self.stats.calls['batchUpdate'] += 1
+        self._insert(row - 1, len(values))
+        self.stats.calls['values.append'] += 1
+        if any(values):
+            self._write(row - 1, 0, values)
+        else:
+            self.spreadsheet.touch()
+
+    def insert_row(self, values: List[Any], index: int = 1, value_input_option: Optional[str] = None,
+                   inherit_from_before: bool = False):
+        return self.insert_rows([values], row=index, value_input_option=value_input_option)
+
+    def add_rows(self, rows: int) -> None:
+        self.stats.calls['batchUpdate'] += 1
+        self.row_count += rows
+        self.spreadsheet.touch()
+
+    def cell_value(self, row: int, col: int) -> Any:
+        """Значение ячейки как оно записано (для проверок в тестах, без учёта вызовов)."""
+        if row - 1 < len(self.grid) and col - 1 < len(self.grid[row - 1]):
+            return self.grid[row - 1][col - 1]
+        return ''
+
+
+class FakeSpreadsheet:
+    """Таблица: набор листов и пакетные запросы."""
+
+    def __init__(self, client: 'FakeClient', title: str):
+        self.client = client
+        self.id = f"fake-{next(_ids)}"
+        self.title = title
+        self.stats = FakeStats()
+        self._worksheets: List[FakeWorksheet] = []
+        self._version = 0
+        self._modified = datetime.now(timezone.utc)
+
+    @property
+    def url(self) -> str:
+        return f"https://docs.google.com/spreadsheets/d/{self.id}"
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        return self._worksheets[0]
+
+    def touch(self) -> None:
+        self._version += 1
+        self._modified = datetime.now(timezone.utc)
+
+    def get_lastUpdateTime(self) -> str:
+        self.stats.calls['drive.files.get'] += 1
+        # Версия в миллисекундах гарантирует новое значение после каждого изменения
+        return f"{self._modified:%Y-%m-%dT%H:%M:%S}.{self._version:03d}Z"
+
+    def add_worksheet(self, title: str, rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLS, index: Optional[int] = None) -> FakeWorksheet:
+        self.stats.calls['batchUpdate'] += 1
+        worksheet = FakeWorksheet(self, title, rows, cols)
+        if index is None:
+            self._worksheets.append(worksheet)
+        else:
+            self._worksheets.insert(index, worksheet)
+        self.touch()
+        return worksheet
+
+    def worksheets(self, exclude_hidden: bool = False) -> List[FakeWorksheet]:
+        self.stats.calls['spreadsheets.get'] += 1
+        return list(self._worksheets)
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.stats.calls['spreadsheets.get'] += 1
+        for worksheet in self._worksheets:
+            if worksheet.title == title:
+                return worksheet
+        raise FakeAPIError(f"Лист {title!r} не найден")
+
+    def get_worksheet_by_id(self, sheet_id: int) -> FakeWorksheet:
+        self.stats.calls['spreadsheets.get'] += 1
+        for worksheet in self._worksheets:
+            if worksheet.id == int(sheet_id):
+                return worksheet
+        raise FakeAPIError(f"Лист с id={sheet_id} не найден")
+
+    def _by_id(self, sheet_id: int) -> FakeWorksheet:
+        for worksheet in self._worksheets:
+            if worksheet.id == sheet_id:
+                return worksheet
+        raise FakeAPIError(f"Лист с id={sheet_id} не найден")
+
+    def batch_update(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """spreadsheets.batchUpdate: insertDimension, deleteDimension, copyPaste, оформление."""
+        self.stats.calls['batchUpdate'] += 1
+        replies = []
+        for request in body.get('requests', []):
+            kind, params = next(iter(request.items()))
+            if kind in ('insertDimension', 'deleteDimension'):
+                grid = params['range']
+                if grid.get('dimension') != 'ROWS':
+                    raise FakeAPIError(f"{kind}: поддерживаются только строки")
+                worksheet = self._by_id(grid['sheetId'])
+                if kind == 'insertDimension':
+                    worksheet._insert(grid['startIndex'], grid['endIndex'] - grid['startIndex'])
+                else:
+                    worksheet._delete(grid['startIndex'], grid['endIndex'])
+            elif kind == 'copyPaste':
+                self._by_id(params['source']['sheetId'])._copy(params['source'], params['destination'])
+            elif 'range' in params and 'sheetId' in params['range']:
+                worksheet = self._by_id(params['range']['sheetId'])
+                worksheet.formatting.append(request)
+                if kind == 'repeatCell' and 'userEnteredValue' in params.get('fields', ''):
+                    worksheet._fill(params['range'], params.get('cell', {}).get('userEnteredValue'))
+            else:
+                raise FakeAPIError(f"Запрос {kind} не поддерживается")
+            self.stats.requests[kind] += 1
+            replies.append({})
+        self.touch()
+        return {'spreadsheetId': self.id, 'replies': replies}
+
+    def values_append(self, range_name: str, params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+        """spreadsheets.values.append: строки после последней заполненной строки листа."""
+        self.stats.calls['values.append'] += 1
+        title = range_name.rsplit('!', 1)[0].strip("'").replace("''", "'")
+        worksheet = next(ws for ws in self._worksheets if ws.title == title)
+        values = body.get('values', [])
+        start = len(_trim([[_cell_text(v) for v in row] for row in worksheet.grid]))
+        if start + len(values) > worksheet.row_count:
+            worksheet.row_count = start + len(values)
+        worksheet._write(start, 0, values)
+        return {'spreadsheetId': self.id, 'updates': {'updatedRows': len(values)}}
+
+    def values_batch_update(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """spreadsheets.values.batchUpdate."""
+        self.stats.calls['values.batchUpdate'] += 1
+        for value_range in body.get('data', []):
+            title, a1 = value_range['range'].rsplit('!', 1)
+            title = title.strip("'").replace("''", "'")
+            worksheet = next(ws for ws in self._worksheets if ws.title == title)
+            grid = worksheet._bounds(a1)
+            worksheet._write(grid['startRowIndex'], grid['startColumnIndex'], value_range['values'])
+        return {'spreadsheetId': self.id, 'totalUpdatedRanges': len(body.get('data', []))}
+
+
+class FakeClient:
+    """Клиент: реестр таблиц по id."""
+
+    def __init__(self):
+        self.spreadsheets: Dict[str, FakeSpreadsheet] = {}
+
+    def create(self, title: str, rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLS) -> FakeSpreadsheet:
+        spreadsheet = FakeSpreadsheet(self, title)
+        spreadsheet._worksheets.append(FakeWorksheet(spreadsheet, 'Лист1', rows, cols))
+        self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        spreadsheet = self.spreadsheets.get(key)
+        if spreadsheet is None:
+            raise FakeAPIError(f"Таблица {key} не найдена")
+        spreadsheet.stats.calls['spreadsheets.get'] += 1
+        return spreadsheet
+
+    def open_by_url(self, url: str) -> FakeSpreadsheet:
+        key = url.rstrip('/').split('/d/', 1)[-1].split('/', 1)[0]
+        return self.open_by_key(key)
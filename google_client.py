@@ -0,0 +1,138 @@
+"""
+Общий на процесс клиент Google Sheets и кеш метаданных таблиц.
+
+SheetsSynchronizer (и WBSheetsSynchronizer) берут клиент из get_client():
+сервисный аккаунт читается и авторизуется один раз на процесс, все
+запросы идут через одну HTTP-сессию (AuthorizedSession gspread) и общий
+QuotaAwareHTTPClient. SheetsManager только читает каталог и берёт
+отдельный клиент с правами только на чтение (readonly=True). Токен доступа обновляется самой
+сессией до истечения срока (google-auth считает токен просроченным
+заранее, с запасом), поэтому отдельного обновления не требуется.
+
+Метаданные таблиц - объект таблицы и её листы (gid → sheetId, название,
+rowCount) - кешируются на Config.SHEETS_METADATA_TTL секунд:
+open_by_url и список листов запрашиваются один раз, повторное открытие
+той же таблицы и поиск листа по gid или названию запросов не делают.
+Кто добавляет или удаляет листы, сбрасывает кеш (invalidate). Таблица,
+открытая одним клиентом, другому клиенту из кеша не отдаётся.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import gspread
+from google.oauth2.service_account import Credentials
+from loguru import logger
+
+from config import Config
+from quota_client import authorize
+
+# Права на запись включают чтение - один клиент на все модули, которые пишут
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+# Загрузчик каталога таблицу не меняет
+READONLY_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets.readonly',
+    'https://www.googleapis.com/auth/drive.readonly'
+]
+
+_clients: Dict[Tuple[str, bool], gspread.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(credentials_file: str, readonly: bool = False) -> gspread.Client:
+    """Авторизованный клиент для файла сервисного аккаунта (один на процесс и набор прав)."""
+    with _clients_lock:
+        client = _clients.get((credentials_file, readonly))
+        if client is None:
+            creds = Credentials.from_service_account_file(
+                credentials_file, scopes=READONLY_SCOPES if readonly else SCOPES
+            )
+            client = authorize(creds)
+            _clients[(credentials_file, readonly)] = client
+            logger.debug(f"🔑 Авторизация Google{' (только чтение)' if readonly else ''}: {credentials_file}")
+        return client
+
+
+def spreadsheet_key(url: str) -> str:
+    """ID таблицы из URL (или сам ID)."""
+    return url.rstrip('/').split('/d/', 1)[-1].split('/', 1)[0]
+
+
+class MetadataCache:
+    """Таблицы и их листы с временем жизни ttl секунд."""
+
+    def __init__(self, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            ttl: Время жизни метаданных, секунд (по умолчанию из Config)
+            clock: Источник времени (для тестов)
+        """
+        self.ttl = Config.SHEETS_METADATA_TTL if ttl is None else ttl
+        self._clock = clock
+        # ID таблицы → (время загрузки, клиент, таблица, листы или None - ещё не запрашивались)
+        self._entries: Dict[
+            str, Tuple[float, Optional[gspread.Client], gspread.Spreadsheet, Optional[List[gspread.Worksheet]]]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or self._clock() - entry[0] >= self.ttl:
+            return None
+        return entry
+
+    def open(self, client: gspread.Client, url: str) -> gspread.Spreadsheet:
+        """Таблица по URL: из кеша или open_by_url."""
+        key = spreadsheet_key(url)
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None and entry[1] is client:
+                return entry[2]
+        spreadsheet = client.open_by_url(url)
+        with self._lock:
+            self._entries[spreadsheet.id] = (self._clock(), client, spreadsheet, None)
+        return spreadsheet
+
+    def worksheets(self, spreadsheet: gspread.Spreadsheet) -> List[gspread.Worksheet]:
+        """Листы таблицы: из кеша или одним запросом метаданных."""
+        with self._lock:
+            entry = self._fresh(spreadsheet.id)
+            if entry is not None and entry[2] is spreadsheet and entry[3] is not None:
+                return list(entry[3])
+        worksheets = spreadsheet.worksheets()
+        with self._lock:
+            entry = self._entries.get(spreadsheet.id)
+            client = entry[1] if entry is not None and entry[2] is spreadsheet else None
+            self._entries[spreadsheet.id] = (self._clock(), client, spreadsheet, worksheets)
+        logger.debug(f"📑 Метаданные таблицы {spreadsheet.title}: {len(worksheets)} листов")
+        return list(worksheets)
+
+    def worksheet_by_gid(self, spreadsheet: gspread.Spreadsheet, gid: str) -> Optional[gspread.Worksheet]:
+        return next((ws for ws in self.worksheets(spreadsheet) if str(ws.id) == str(gid)), None)
+
+    def worksheet_by_title(self, spreadsheet: gspread.Spreadsheet, title: str) -> Optional[gspread.Worksheet]:
+        return next((ws for ws in self.worksheets(spreadsheet) if ws.title == title), None)
+
+    def invalidate(self, spreadsheet_id: Optional[str] = None) -> None:
+        """Сбросить метаданные таблицы (None - всех таблиц)."""
+        with self._lock:
+            if spreadsheet_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(spreadsheet_id, None)
+
+
+_metadata: Optional[MetadataCache] = None
+
+
+def get_metadata() -> MetadataCache:
+    """Общий на процесс кеш метаданных таблиц."""
+    global _metadata
+    with _clients_lock:
+        if _metadata is None:
+            _metadata = MetadataCache()
+        return _metadata
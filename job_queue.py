@@ -0,0 +1,548 @@
+"""
+Очередь заданий парсера и синхронизации, общая для бота и API-сервера.
+
+Задания типизированы (JOB_KINDS): полный парсинг Ozon, парсинг
+диапазона, синхронизация WB, синхронизация листа из JSON,
+пересопоставление. Каждое задание - отдельный процесс под
+ParserSupervisor (вывод в logs/jobs/job_<id>.log, события прогресса
+сохраняются в задании).
+
+Очередь хранится в SQLite (JOBS_FILE): telegram_bot и api_server
+добавляют задания в один файл, и любой из процессов может их выполнять.
+Задание забирается атомарно одной транзакцией (BEGIN IMMEDIATE), поэтому
+число работающих заданий (Config.JOB_WORKERS) и занятые ресурсы общие
+для всех процессов.
+
+Слушатели (listeners) узнают и о заданиях, которые выполняет другой
+процесс: очередь со слушателями следит за их статусом в файле очереди
+и сообщает о запуске и завершении (бот уведомляет о заданиях, которые
+забрал api_server).
+
+Допуск к запуску с учётом ресурсов:
+- задания с общим ресурсом не работают одновременно ('browser' - сессия
+  Ozon, 'sheets' - лист синхронизации, 'catalog' - сопоставления товаров:
+  product_mappings, match_cache.json и вопросы пользователю; парсинг
+  сопоставляет товары так же, как пересопоставление);
+- ресурсы ожидающего задания резервируются - более поздние задания не
+  обгоняют его на тех же ресурсах;
+- задания с браузером ждут, пока свободной памяти не станет
+  не меньше Config.JOB_BROWSER_MIN_FREE_MB.
+
+Повторный запрос того же задания, пока оно ждёт в очереди, возвращает
+уже поставленное задание. Задания процесса, завершившегося посреди
+работы, возвращаются в очередь - но только после завершения их дочернего
+процесса (child_pid): осиротевший main.py может ещё держать браузер и лист.
+"""
+
+import asyncio
+import json
+import os
+import re
+import socket
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from config import Config
+from parser_supervisor import ParserSupervisor
+
+JOBS_FILE = 'jobs.sqlite3'
+JOB_LOG_DIR = os.path.join(Config.LOGS_DIR, 'jobs')
+# Как часто очередь проверяет задания, добавленные другими процессами, секунд
+POLL_INTERVAL = 2.0
+# За сколько последних секунд искать завершённые другими процессами задания
+WATCH_WINDOW = 60.0
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# Тип задания: название, занимаемые ресурсы, скрипт
+JOB_KINDS: Dict[str, Dict[str, Any]] = {
+    'parse': {'title': '🚀 Парсинг Ozon', 'resources': ('browser', 'sheets', 'catalog'), 'script': 'main.py'},
+    'parse_range': {'title': '📊 Парсинг диапазона', 'resources': ('browser', 'sheets', 'catalog'), 'script': 'main.py'},
+    'wb_sync': {'title': '🟣 Синхронизация WB', 'resources': ('sheets', 'catalog'), 'script': 'wb_sheets_sync.py'},
+    'sheets_sync': {'title': '📤 Синхронизация листа', 'resources': ('sheets',), 'script': 'sheets_sync.py'},
+    'rematch': {'title': '🔄 Пересопоставление', 'resources': ('catalog',), 'script': 'rematch_orders.py'},
+}
+
+_ORDER_NUMBER = re.compile(r'^\d+-\d+$')
+_JSON_FILE = re.compile(r'^[\w.-]+\.json$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    chat_id INTEGER,
+    owner TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    returncode INTEGER,
+    error TEXT,
+    progress TEXT,
+    child_pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+def job_command(kind: str, args: Sequence[str]) -> List[str]:
+    """
+    Команда запуска задания.
+
+    Raises:
+        ValueError: Неизвестный тип или недопустимые аргументы
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Неизвестный тип задания: {kind}")
+    args = [str(arg) for arg in args]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), JOB_KINDS[kind]['script'])
+    command = [sys.executable, script]
+    if kind == 'parse_range':
+        if len(args) != 2 or not all(_ORDER_NUMBER.match(arg) for arg in args):
+            raise ValueError("parse_range: нужны номера первого и последнего заказа")
+        return command + ['--range'] + args
+    if kind == 'parse':
+        if any(arg != '--plan-only' for arg in args):
+            raise ValueError("parse: допустим только флаг --plan-only")
+        return command + args
+    if kind == 'sheets_sync':
+        if any(arg != '--plan-only' and not _JSON_FILE.match(arg) for arg in args):
+            raise ValueError("sheets_sync: допустимы имя JSON-файла и флаг --plan-only")
+        return command + args
+    if args:
+        raise ValueError(f"{kind}: задание без аргументов")
+    return command
+
+
+def available_memory_mb() -> Optional[int]:
+    """Свободная память (MemAvailable) в МБ или None, если неизвестно."""
+    try:
+        with open('/proc/meminfo', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """Задание очереди."""
+
+    def __init__(self, row: sqlite3.Row):
+        self.id: int = row['id']
+        self.kind: str = row['kind']
+        self.args: List[str] = json.loads(row['args'])
+        self.status: str = row['status']
+        self.source: str = row['source']
+        self.chat_id: Optional[int] = row['chat_id']
+        self.owner: Optional[str] = row['owner']
+        self.cancel_requested = bool(row['cancel_requested'])
+        self.created_at: float = row['created_at']
+        self.started_at: Optional[float] = row['started_at']
+        self.finished_at: Optional[float] = row['finished_at']
+        self.returncode: Optional[int] = row['returncode']
+        self.error: Optional[str] = row['error']
+        self.progress: Optional[Dict[str, Any]] = json.loads(row['progress']) if row['progress'] else None
+        self.child_pid: Optional[int] = row['child_pid']
+
+    @property
+    def title(self) -> str:
+        title = JOB_KINDS.get(self.kind, {}).get('title', self.kind)
+        return f"{title} {' '.join(self.args)}".strip()
+
+    @property
+    def resources(self) -> Sequence[str]:
+        return JOB_KINDS.get(self.kind, {}).get('resources', ())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'args': self.args,
+            'status': self.status,
+            'source': self.source,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'returncode': self.returncode,
+            'error': self.error,
+            'progress': self.progress,
+        }
+
+
+JobListener = Callable[[Job], Awaitable[None]]
+
+
+class JobQueue:
+    """Постоянная очередь заданий с пулом исполнителей."""
+
+    def __init__(
+        self,
+        db_path: str = JOBS_FILE,
+        workers: Optional[int] = None,
+        command: Callable[[str, Sequence[str]], List[str]] = job_command,
+        min_free_mb: Optional[int] = None,
+        log_dir: Optional[str] = JOB_LOG_DIR
+    ):
+        """
+        Args:
+            db_path: Путь к файлу SQLite очереди
+            workers: Сколько заданий выполняется одновременно (по умолчанию из Config)
+            command: Команда запуска задания по типу и аргументам
+            min_free_mb: Свободная память для заданий с браузером (по умолчанию из Config)
+            log_dir: Каталог логов заданий (None - без логов)
+        """
+        self.db_path = Path(db_path)
+        self.workers = max(1, Config.JOB_WORKERS if workers is None else workers)
+        self.command = command
+        self.min_free_mb = Config.JOB_BROWSER_MIN_FREE_MB if min_free_mb is None else min_free_mb
+        self.log_dir = log_dir
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.listeners: List[JobListener] = []
+        self._supervisors: Dict[int, ParserSupervisor] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Статусы заданий других процессов, о которых слушатели уже знают
+        self._watched: Dict[int, str] = {}
+        self._watch_since = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Хранилище
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(_SCHEMA)
+        # Файлы очереди до появления child_pid
+        if 'child_pid' not in {column['name'] for column in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN child_pid INTEGER")
+        return conn
+
+    def submit(
+        self,
+        kind: str,
+        args: Sequence[str] = (),
+        source: str = 'bot',
+        chat_id: Optional[int] = None,
+        dedupe: bool = True
+    ) -> Job:
+        """
+        Поставить задание в очередь.
+
+        Args:
+            kind: Тип задания (JOB_KINDS)
+            args: Аргументы задания
+            source: Кто поставил (bot, api, schedule, ...)
+            chat_id: Чат Telegram для уведомлений о задании
+            dedupe: Вернуть уже ожидающее такое же задание вместо нового
+
+        Raises:
+            ValueError: Неизвестный тип или недопустимые аргументы
+        """
+        args = [str(arg) for arg in args]
+        job_command(kind, args)  # проверка типа и аргументов
+        args_json = json.dumps(args, ensure_ascii=False)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = None
+                if dedupe:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE status = ? AND kind = ? AND args = ? ORDER BY id LIMIT 1",
+                        (QUEUED, kind, args_json)
+                    ).fetchone()
+                if row is None:
+                    cursor = conn.execute(
+                        "INSERT INTO jobs (kind, args, status, source, chat_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (kind, args_json, QUEUED, source, chat_id, time.time())
+                    )
+                    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
+                    logger.info(f"📥 Задание #{row['id']} в очереди: {kind} {' '.join(args)} ({source})")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return Job(row)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(row) if row else None
+
+    def jobs(self, statuses: Sequence[str] = (QUEUED, RUNNING), limit: int = 50) -> List[Job]:
+        """Задания с указанными статусами, по порядку постановки."""
+        marks = ','.join('?' for _ in statuses)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY id DESC LIMIT ?",
+                (*statuses, limit)
+            ).fetchall()
+        return [Job(row) for row in reversed(rows)]
+
+    def position(self, job_id: int) -> int:
+        """Место задания в очереди (1 - следующее), 0 - не ожидает."""
+        queued = [job.id for job in self.jobs((QUEUED,), limit=1000)]
+        return queued.index(job_id) + 1 if job_id in queued else 0
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Отменить задание: ожидающее - сразу, работающее - остановкой процесса.
+
+        Returns:
+            True если задание отменено или остановка запрошена
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            if cursor.rowcount:
+                logger.info(f"🚫 Задание #{job_id} отменено в очереди")
+                return True
+            cursor = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING)
+            )
+            if not cursor.rowcount:
+                return False
+        logger.info(f"🚫 Запрошена остановка задания #{job_id}")
+        # Задание другого процесса он остановит сам при следующей проверке очереди
+        supervisor = self._supervisors.get(job_id)
+        if supervisor is not None:
+            asyncio.ensure_future(supervisor.stop())
+        return True
+
+    # ------------------------------------------------------------------
+    # Исполнение
+
+    def _admit_memory(self, job: Job) -> bool:
+        if 'browser' not in job.resources or not self.min_free_mb:
+            return True
+        free = available_memory_mb()
+        return free is None or free >= self.min_free_mb
+
+    def _claim(self) -> List[Job]:
+        """Забрать задания, которые можно запустить сейчас (одной транзакцией)."""
+        claimed: List[Job] = []
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = [Job(row) for row in conn.execute("SELECT * FROM jobs WHERE status = ?", (RUNNING,))]
+                slots = self.workers - len(running)
+                held = {resource for job in running for resource in job.resources}
+                queued = [Job(row) for row in conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (QUEUED,))]
+                for job in queued:
+                    if slots <= 0:
+                        break
+                    if held.intersection(job.resources) or not self._admit_memory(job):
+                        # Ресурсы ожидающего задания резервируются за ним
+                        held.update(job.resources)
+                        continue
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, started_at = ? WHERE id = ?",
+                        (RUNNING, self.owner, now, job.id)
+                    )
+                    job.status, job.owner, job.started_at = RUNNING, self.owner, now
+                    held.update(job.resources)
+                    slots -= 1
+                    claimed.append(job)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def recover(self) -> int:
+        """
+        Вернуть в очередь задания этого хоста, процесс-исполнитель которых завершился.
+
+        Пока жив дочерний процесс задания (child_pid), оно остаётся RUNNING и
+        держит свои ресурсы - в очередь оно вернётся при следующей проверке
+        после завершения процесса.
+        """
+        host = socket.gethostname()
+        recovered = 0
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT id, owner, child_pid FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            for row in rows:
+                owner_host, _, pid = (row['owner'] or '').rpartition(':')
+                if owner_host != host:
+                    continue  # Процессы другого хоста отсюда не проверить
+                if pid.isdigit() and int(pid) != os.getpid() and _pid_alive(int(pid)):
+                    continue
+                if row['id'] in self._tasks:
+                    continue  # Задание этого процесса
+                if row['child_pid'] and _pid_alive(row['child_pid']):
+                    logger.debug(f"⏳ Задание #{row['id']}: исполнитель завершился, но процесс {row['child_pid']} ещё работает")
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, progress = NULL, child_pid = NULL "
+                    "WHERE id = ? AND status = ?",
+                    (QUEUED, row['id'], RUNNING)
+                )
+                recovered += 1
+        if recovered:
+            logger.warning(f"♻️ Возвращено в очередь прерванных заданий: {recovered}")
+        return recovered
+
+    async def _notify(self, job: Job) -> None:
+        for listener in self.listeners:
+            try:
+                await listener(job)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка обработчика задания #{job.id}: {e}")
+
+    def _others_jobs(self) -> List[Job]:
+        """Работающие и недавно завершённые задания других процессов."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE owner IS NOT NULL AND owner != ? "
+                "AND (status = ? OR finished_at > ?) ORDER BY id",
+                (self.owner, RUNNING, self._watch_since)
+            ).fetchall()
+        return [Job(row) for row in rows]
+
+    async def _watch_others(self) -> None:
+        """Сообщить слушателям о запуске и завершении заданий других процессов."""
+        jobs = self._others_jobs()
+        for job in jobs:
+            if self._watched.get(job.id) != job.status:
+                await self._notify(job)
+        self._watched = {job.id: job.status for job in jobs}
+        # Завершённые раньше окна уже объявлены и больше не запрашиваются
+        self._watch_since = max(self._watch_since, time.time() - WATCH_WINDOW)
+
+    async def _run(self, job: Job) -> None:
+        log_file = os.path.join(self.log_dir, f"job_{job.id}.log") if self.log_dir else None
+
+        async def on_progress(event: Dict[str, Any]) -> None:
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "UPDATE jobs SET progress = ? WHERE id = ?",
+                    (json.dumps(event, ensure_ascii=False), job.id)
+                )
+
+        supervisor = ParserSupervisor(self.command(job.kind, job.args), log_file=log_file, on_progress=on_progress)
+        self._supervisors[job.id] = supervisor
+        error = None
+        returncode = None
+        try:
+            logger.info(f"▶️ Задание #{job.id}: {job.title}")
+            await supervisor.start()
+            with closing(self._connect()) as conn:
+                conn.execute("UPDATE jobs SET child_pid = ? WHERE id = ?", (supervisor.pid, job.id))
+            job.child_pid = supervisor.pid
+            await self._notify(job)
+            returncode = await supervisor.wait()
+            if returncode != 0:
+                error = "\n".join(supervisor.tail(15))
+        except Exception as e:
+            error = str(e)
+            logger.error(f"❌ Ошибка задания #{job.id}: {e}")
+        finally:
+            self._supervisors.pop(job.id, None)
+            with closing(self._connect()) as conn:
+                cancel_requested = conn.execute(
+                    "SELECT cancel_requested FROM jobs WHERE id = ?", (job.id,)
+                ).fetchone()[0]
+                status = CANCELLED if cancel_requested else DONE if returncode == 0 else FAILED
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, returncode = ?, error = ? WHERE id = ?",
+                    (status, time.time(), returncode, error, job.id)
+                )
+            finished = self.get(job.id)
+            logger.info(f"⏹️ Задание #{job.id} завершено: {status} (код {returncode})")
+            self._tasks.pop(job.id, None)
+            if self._wakeup is not None:
+                self._wakeup.set()
+            if finished is not None:
+                await self._notify(finished)
+
+    def _stop_cancelled(self) -> None:
+        """Остановить свои задания, отмену которых запросил другой процесс."""
+        if not self._supervisors:
+            return
+        with closing(self._connect()) as conn:
+            marks = ','.join('?' for _ in self._supervisors)
+            rows = conn.execute(
+                f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({marks})",
+                tuple(self._supervisors)
+            ).fetchall()
+        for row in rows:
+            supervisor = self._supervisors.get(row['id'])
+            if supervisor is not None and supervisor.running:
+                asyncio.ensure_future(supervisor.stop())
+
+    async def _dispatch(self) -> None:
+        while True:
+            try:
+                self._stop_cancelled()
+                self.recover()  # Задания, ждавшие завершения осиротевшего процесса
+                if self.listeners:
+                    await self._watch_others()
+                for job in self._claim():
+                    self._tasks[job.id] = asyncio.create_task(self._run(job))
+            except Exception as e:
+                logger.error(f"❌ Ошибка очереди заданий: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def start(self) -> None:
+        """Запустить исполнение заданий в текущем цикле событий."""
+        if self._loop_task is not None:
+            return
+        self.recover()
+        # Задания других процессов, начатые до запуска, не объявляем
+        self._watch_since = time.time()
+        self._watched = {job.id: job.status for job in self._others_jobs()}
+        self._wakeup = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._dispatch())
+        logger.info(f"🧵 Очередь заданий запущена (исполнителей: {self.workers})")
+
+    async def stop(self) -> None:
+        """Остановить очередь: новые задания не запускаются, работающие останавливаются."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        for supervisor in list(self._supervisors.values()):
+            await supervisor.stop()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def wait_idle(self) -> None:
+        """Дождаться завершения работающих в этом процессе заданий."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
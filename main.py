@@ -36,6 +36,7 @@ from config import Config
 from auth import OzonAuth
 from parser import OzonParser
 from notifier import sync_send_message
+from parser_supervisor import emit_progress
 from session_manager import SessionManager
 
 
@@ -65,6 +66,8 @@ def main():
     parser_args = argparse.ArgumentParser(description='Ozon Parser')
     parser_args.add_argument('--range', nargs=2, metavar=('FIRST', 'LAST'),
                             help='Parse range of orders (e.g., --range 46206571-0680 46206571-0710)')
+    parser_args.add_argument('--plan-only', action='store_true',
+                            help='Only plan the Google Sheets sync: changes, API requests and time, no writes')
     args = parser_args.parse_args()
     
     # Путь к файлу-флагу блокировки
@@ -349,6 +352,7 @@ def main():
                 
                 logger.info(f"Парсинг номеров завершен. Получено заказов: {len(orders)}")
                 sync_send_message(f"✅ <b>Найдено заказов: {len(orders)}</b>\n\nНачинаем парсинг деталей...")
+                emit_progress('orders', total=len(orders))
                 
                 # Парсим детали каждого заказа
                 if orders:
@@ -359,6 +363,7 @@ def main():
                     for i, order_number in enumerate(orders, 1):
                         logger.info(f"📦 [{i}/{len(orders)}] Парсим детали заказа: {order_number}")
                         sync_send_message(f"📦 Парсим заказ {order_number}")
+                        emit_progress('order', index=i, total=len(orders), order_number=order_number)
                         
                         try:
                             order_details = parser.parse_order_details(order_number)
@@ -467,6 +472,7 @@ def main():
                         try:
                             logger.info("🔄 Запуск сопоставления товаров с каталогом...")
                             sync_send_message("🔄 <b>Сопоставление с каталогом...</b>")
+                            emit_progress('matching')
                             
                             from sheets_manager import SheetsManager
                             from product_matcher import ProductMatcher, enrich_orders_with_mapping
@@ -504,7 +510,9 @@ def main():
                                     )
                                     
                                     logger.info("✅ Сопоставление завершено")
-                                    sync_send_message("✅ <b>Сопоставление завершено!</b>")
+                                    sync_send_message(
+                                        f"✅ <b>Сопоставление завершено!</b>\n\n{matcher.match_cache.stats_message()}"
+                                    )
                                 else:
                                     logger.warning("⚠️ Каталог товаров пуст")
                             else:
@@ -548,10 +556,11 @@ def main():
                             # Синхронизация с Google Sheets
                             try:
                                 logger.info("🔄 Запуск синхронизации с Google Sheets...")
+                                emit_progress('sync')
                                 from sheets_sync import sync_to_sheets
                                 
                                 logger.info("DEBUG: Вызов sync_to_sheets()...")
-                                result = sync_to_sheets(json_file)
+                                result = sync_to_sheets(json_file, plan_only=args.plan_only)
                                 logger.info(f"DEBUG: sync_to_sheets() вернул: {result}")
                                 
                                 if result:
@@ -590,6 +599,7 @@ def main():
             
             # Сообщаем о завершении
             sync_send_message("✅ <b>Работа завершена</b>")
+            emit_progress('done')
             
             # КРИТИЧНО: Удаляем lock файл ПЕРЕД os._exit()
             cleanup_lock_file(lock_file, lock_file_path)
@@ -0,0 +1,334 @@
+"""
+Хранилище сопоставлений товаров (product_mappings.json) с журналом изменений.
+
+Снимок остаётся в прежнем формате product_mappings.json, а каждое новое
+решение дописывается одной строкой в журнал product_mappings.journal.jsonl
+(O(1) на запись). Журнал периодически сворачивается в снимок. Запись и
+сворачивание идут под файловой блокировкой, поэтому бот, парсер и API
+могут писать одновременно. Внутри процесса все потребители получают
+один и тот же загруженный экземпляр через get_store().
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, cast
+
+from loguru import logger
+
+from product_index import mapping_key, normalize_mapping_keys, normalize_name
+
+try:  # pragma: no cover - Windows fallback
+    import fcntl as _fcntl  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover
+    _fcntl = None  # type: ignore
+
+fcntl = cast(Any, _fcntl)
+
+DEFAULT_MAPPINGS_FILE = 'product_mappings.json'
+
+# Свернуть журнал в снимок после стольких записей
+COMPACT_EVERY = 500
+# Как часто (сек) проверять, не дописали ли журнал другие процессы
+REFRESH_INTERVAL = 1.0
+
+# Порядок подбора цвета, если сохранено сопоставление с другим цветом
+FALLBACK_COLORS = ('black', 'white', '')
+
+
+def _parse_split_units(raw: Any) -> int:
+    try:
+        return int(raw) if raw is not None else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+class MappingsStore:
+    """Снимок сопоставлений + журнал дописываемых изменений."""
+
+    def __init__(self, snapshot_path: str = DEFAULT_MAPPINGS_FILE):
+        """
+        Args:
+            snapshot_path: Путь к product_mappings.json
+        """
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_name(f"{self.snapshot_path.stem}.journal.jsonl")
+        self.lock_path = self.snapshot_path.with_name(f"{self.snapshot_path.name}.lock")
+
+        self._set_data({})
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._snapshot_signature: Optional[Tuple[int, int, int]] = None
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+
+        self.reload()
+
+    # ------------------------------------------------------------------
+    # Блокировки и чтение файлов
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a+', encoding='utf-8') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _stat_snapshot(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self.snapshot_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _read_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        if not self.snapshot_path.exists():
+            return {}
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                return normalize_mapping_keys(json.load(f))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить сопоставления из {self.snapshot_path}: {e}")
+            return {}
+
+    def _read_journal_tail(self) -> None:
+        """Применить строки журнала, дописанные после последнего чтения."""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+
+        # Недописанную последнюю строку (без \n) оставляем до следующего чтения
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ Повреждённая строка журнала сопоставлений пропущена: {line[:80]!r}")
+                continue
+            self._apply(entry)
+        self._journal_offset += len(complete)
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        key = entry.get('key')
+        if not key:
+            return
+        value = entry.get('value')
+        if value is None:
+            self._data.pop(key, None)
+        else:
+            self._data[key] = value
+        self._index_key(key, value)
+        self._journal_entries += 1
+
+    # ------------------------------------------------------------------
+    # Вторичные индексы
+
+    def _set_data(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """Заменить данные и перестроить индексы."""
+        self._data = data
+        self._variants: Dict[str, Dict[str, str]] = {}
+        self._default_variant: Dict[str, str] = {}
+        self._split_units: Dict[str, int] = {}
+        for key, value in data.items():
+            self._index_key(key, value)
+
+    def _index_key(self, key: str, value: Optional[Dict[str, Any]]) -> None:
+        """Обновить индексы цветовых вариантов и split_units для одного ключа."""
+        base, _, color = key.partition('|')
+        variants = self._variants.setdefault(base, {})
+        if value is None:
+            variants.pop(color, None)
+            self._split_units.pop(key, None)
+        else:
+            variants[color] = key
+            split_units = _parse_split_units(value.get('split_units'))
+            if split_units > 1:
+                self._split_units[key] = split_units
+            else:
+                self._split_units.pop(key, None)
+
+        # Вариант по умолчанию, если точного цвета нет: black → white → без цвета
+        for fallback_color in FALLBACK_COLORS:
+            if fallback_color in variants:
+                self._default_variant[base] = variants[fallback_color]
+                break
+        else:
+            self._default_variant.pop(base, None)
+        if not variants:
+            del self._variants[base]
+
+    # ------------------------------------------------------------------
+    # Публичное API
+
+    def reload(self) -> None:
+        """Полностью перечитать снимок и журнал."""
+        with self._lock, self._file_lock(exclusive=False):
+            self._set_data(self._read_snapshot())
+            self._snapshot_signature = self._stat_snapshot()
+            self._journal_offset = 0
+            self._journal_entries = 0
+            self._read_journal_tail()
+            self._last_refresh = time.monotonic()
+        logger.debug(f"📋 Сопоставления загружены: {len(self._data)} (журнал: {self._journal_entries} записей)")
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Подхватить изменения других процессов.
+
+        Дописанный журнал читается с сохранённого смещения; если снимок
+        заменили (сворачивание или внешняя перезапись) - полная перезагрузка.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < REFRESH_INTERVAL:
+                return
+            self._last_refresh = now
+
+            try:
+                journal_size = self.journal_path.stat().st_size
+            except FileNotFoundError:
+                journal_size = 0
+
+            if self._stat_snapshot() != self._snapshot_signature or journal_size < self._journal_offset:
+                self.reload()
+            elif journal_size > self._journal_offset:
+                with self._file_lock(exclusive=False):
+                    self._read_journal_tail()
+
+    @property
+    def mappings(self) -> Dict[str, Dict[str, Any]]:
+        """Все сопоставления (общий словарь процесса, не изменять напрямую)."""
+        self.refresh()
+        return self._data
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._data.get(key)
+
+    def lookup(self, name: str, color: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Сопоставление товара с учётом цвета.
+
+        Сначала точный ключ название|цвет, иначе заранее выбранный вариант
+        того же названия (black → white → без цвета).
+        """
+        self.refresh()
+        value = self._data.get(mapping_key(name, color))
+        if value is not None:
+            return value
+        default_key = self._default_variant.get(normalize_name(name))
+        return self._data.get(default_key) if default_key else None
+
+    def color_variants(self, name: str) -> Dict[str, str]:
+        """Цвета, сохранённые для названия: {цвет: ключ}."""
+        self.refresh()
+        return dict(self._variants.get(normalize_name(name), {}))
+
+    def split_units(self, mapped_name: str, color: str = "") -> int:
+        """
+        split_units сопоставления с ключом mapped_name|цвет (1, если разбивки нет).
+
+        Используется синхронизацией для товаров, у которых split_units
+        не проставлен при сопоставлении.
+        """
+        self.refresh()
+        return self._split_units.get(mapping_key(mapped_name, color), 1)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._data)
+
+    def put(self, key: str, value: Optional[Dict[str, Any]]) -> bool:
+        """
+        Записать (или удалить при value=None) сопоставление.
+
+        Returns:
+            True если запись попала в журнал
+        """
+        line = json.dumps({'key': key, 'value': value}, ensure_ascii=False) + '\n'
+        try:
+            with self._lock, self._file_lock(exclusive=True):
+                # Сначала догоняем чужие записи, чтобы смещение осталось верным
+                if self._stat_snapshot() != self._snapshot_signature:
+                    self._set_data(self._read_snapshot())
+                    self._snapshot_signature = self._stat_snapshot()
+                    self._journal_offset = 0
+                    self._journal_entries = 0
+                self._read_journal_tail()
+
+                with open(self.journal_path, 'ab') as f:
+                    f.write(line.encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_offset += len(line.encode('utf-8'))
+                self._apply({'key': key, 'value': value})
+                needs_compaction = self._journal_entries >= COMPACT_EVERY
+        except OSError as e:
+            logger.error(f"❌ Ошибка записи сопоставления в журнал: {e}")
+            return False
+
+        if needs_compaction:
+            self.compact()
+        return True
+
+    def delete(self, key: str) -> bool:
+        return self.put(key, None)
+
+    def compact(self) -> bool:
+        """Свернуть журнал в снимок product_mappings.json и очистить журнал."""
+        try:
+            with self._lock, self._file_lock(exclusive=True):
+                if self._stat_snapshot() != self._snapshot_signature:
+                    self._set_data(self._read_snapshot())
+                    self._journal_offset = 0
+                self._read_journal_tail()
+
+                tmp_path = self.snapshot_path.with_name(f"{self.snapshot_path.name}.tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                # Журнал очищаем только после того, как снимок на месте
+                with open(self.journal_path, 'wb'):
+                    pass
+
+                self._snapshot_signature = self._stat_snapshot()
+                self._journal_offset = 0
+                self._journal_entries = 0
+            logger.info(f"🗜️ Журнал сопоставлений свёрнут в {self.snapshot_path} (записей: {len(self._data)})")
+            return True
+        except OSError as e:
+            logger.error(f"❌ Ошибка сворачивания журнала сопоставлений: {e}")
+            return False
+
+
+_STORES: Dict[str, MappingsStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(snapshot_path: Optional[str] = None) -> MappingsStore:
+    """Общий для процесса экземпляр хранилища для данного файла."""
+    path = str(Path(snapshot_path or DEFAULT_MAPPINGS_FILE).resolve())
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = MappingsStore(path)
+            _STORES[path] = store
+        return store
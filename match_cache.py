@@ -0,0 +1,125 @@
+"""
+Кеш кандидатов сопоставления между запусками.
+
+Хранит списки похожих товаров каталога для (нормализованное название,
+цвет) в match_cache.json. Кеш привязан к хешу содержимого каталога:
+если лист "Настройки" изменился, все записи сбрасываются. Размер
+ограничен, вытесняются давно не использованные записи (LRU).
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from product_index import mapping_key
+
+MATCH_CACHE_FILE = 'match_cache.json'
+MAX_ENTRIES = 5000
+# Меняется при изменении алгоритма поиска - старые записи становятся недействительными
+CACHE_VERSION = 1
+
+
+def catalog_hash(products: List[Dict[str, str]]) -> str:
+    """Хеш содержимого каталога (порядок важен: он влияет на ранжирование)."""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}".encode('utf-8'))
+    for product in products:
+        line = "\t".join(str(product.get(field, '')) for field in ('name', 'type', 'price'))
+        digest.update(line.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class MatchCache:
+    """LRU-кеш кандидатов сопоставления, привязанный к версии каталога."""
+
+    def __init__(self, catalog_digest: str, cache_file: str = MATCH_CACHE_FILE, max_entries: int = MAX_ENTRIES):
+        """
+        Args:
+            catalog_digest: Хеш текущего каталога (catalog_hash)
+            cache_file: Путь к файлу кеша
+            max_entries: Максимальное количество записей
+        """
+        self.catalog_digest = catalog_digest
+        self.cache_file = Path(cache_file)
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить кеш сопоставлений: {e}")
+            return
+
+        if data.get('catalog_hash') != self.catalog_digest:
+            logger.info("🔄 Каталог изменился - кеш кандидатов сопоставления сброшен")
+            self._dirty = True
+            return
+        self.entries = OrderedDict((key, candidates) for key, candidates in data.get('entries', []))
+        logger.info(f"📦 Загружен кеш кандидатов сопоставления: {len(self.entries)} записей")
+
+    @staticmethod
+    def _key(method: str, name: str, color: str) -> str:
+        return f"{method}:{mapping_key(name, color)}"
+
+    def get(self, method: str, name: str, color: str = "") -> Optional[list]:
+        """Кандидаты из кеша или None (считается попаданием/промахом)."""
+        key = self._key(method, name, color)
+        candidates = self.entries.get(key)
+        if candidates is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return [dict(candidate) for candidate in candidates]
+
+    def put(self, method: str, name: str, color: str, candidates: list) -> None:
+        key = self._key(method, name, color)
+        self.entries[key] = candidates
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._dirty = True
+
+    def save(self) -> bool:
+        """Записать кеш на диск (если он менялся)."""
+        if not self._dirty:
+            return True
+        try:
+            tmp_path = self.cache_file.with_name(f"{self.cache_file.name}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'catalog_hash': self.catalog_digest, 'entries': list(self.entries.items())},
+                    f,
+                    ensure_ascii=False
+                )
+            os.replace(tmp_path, self.cache_file)
+            self._dirty = False
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить кеш сопоставлений: {e}")
+            return False
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats_message(self) -> str:
+        """Строка со статистикой для отчёта о запуске."""
+        return (
+            f"🗂️ Кеш кандидатов: {self.hits} попаданий, {self.misses} промахов "
+            f"({self.hit_rate:.0%})"
+        )
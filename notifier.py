@@ -1,18 +1,24 @@
 """Модуль уведомлений через Telegram."""
 import asyncio
 import threading
-from typing import Awaitable, Optional, TypeVar, List, Tuple
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Optional, TypeVar, List, Tuple
 
 from loguru import logger
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import TelegramError
 
 from config import Config
-from prompt_manager import PromptManager
+from prompt_manager import PromptChannel, PromptManager
 
 PROMPT_MANAGER = PromptManager()
 _T = TypeVar("_T")
 
+# Интервал опроса файла промптов: короткий без канала уведомлений,
+# длинный (страховочный) когда бот будит нас через сокет
+PROMPT_POLL_INTERVAL = 1.5
+PROMPT_FALLBACK_POLL_INTERVAL = 10.0
+
 
 def get_or_create_eventloop():
     """Получить или создать event loop."""
@@ -124,7 +130,59 @@ class TelegramNotifier:
             options: Список кнопок [(значение_ответа, текст_кнопки), ...]
                     Например: [("1", "1️⃣ Вариант 1"), ("2", "2️⃣ Вариант 2")]
         """
-        prompt_id = self.prompt_manager.create_prompt(prompt, timeout if timeout > 0 else None)
+        # Канал открываем ДО создания промпта, чтобы не пропустить быстрый ответ
+        channel = self.prompt_manager.open_channel()
+        try:
+            return await self._send_and_wait(prompt, timeout, options, channel)
+        finally:
+            if channel:
+                channel.close()
+    
+    async def _send_and_wait(
+        self,
+        prompt: str,
+        timeout: int,
+        options: Optional[List[Tuple[str, str]]],
+        channel: Optional[PromptChannel]
+    ) -> Optional[str]:
+        """Создать промпт, разослать его и дождаться ответа (через канал или опросом)."""
+        prompt_id = await self.send_prompt(
+            prompt,
+            timeout,
+            options,
+            notify_path=str(channel.path) if channel else None
+        )
+        if prompt_id is None:
+            return None
+        
+        logger.info(f"📤 Промпт {prompt_id} отправлен, ожидаем ответ пользователя")
+        answer = await self.wait_for_any_response([prompt_id], timeout, channel)
+        return answer[1] if answer else None
+    
+    async def send_prompt(
+        self,
+        prompt: str,
+        timeout: int = 0,
+        options: Optional[List[Tuple[str, str]]] = None,
+        notify_path: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Создать промпт и разослать его всем пользователям, НЕ дожидаясь ответа.
+        
+        Args:
+            prompt: Текст запроса
+            timeout: Таймаут ожидания в секундах (0 - без ограничения)
+            options: Список кнопок [(значение_ответа, текст_кнопки), ...]
+            notify_path: Сокет канала, который бот разбудит после ответа
+            
+        Returns:
+            ID промпта или None, если сообщение не ушло ни одному пользователю
+        """
+        prompt_id = self.prompt_manager.create_prompt(
+            prompt,
+            timeout if timeout > 0 else None,
+            notify_path=notify_path
+        )
         
         # Формируем сообщение
         message_parts = [
@@ -174,27 +232,59 @@ class TelegramNotifier:
         
         if not any(results):
             logger.error("Не удалось отправить промпт ни одному пользователю")
+            self.prompt_manager.mark_expired(prompt_id)
             return None
         
-        logger.info(f"📤 Промпт {prompt_id} отправлен, ожидаем ответ пользователя")
+        return prompt_id
+    
+    async def wait_for_any_response(
+        self,
+        prompt_ids: List[str],
+        timeout: int = 0,
+        channel: Optional[PromptChannel] = None
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Дождаться ответа на любой из промптов.
+        
+        Args:
+            prompt_ids: ID ожидающих промптов
+            timeout: Таймаут ожидания в секундах (0 - без ограничения)
+            channel: Канал, в который бот шлёт уведомления об ответах
+            
+        Returns:
+            (prompt_id, текст ответа) для первого найденного ответа или None по таймауту
+        """
+        if not prompt_ids:
+            return None
 
         loop = asyncio.get_event_loop()
         use_timeout = timeout > 0
         start_time = loop.time()
+        poll_interval = PROMPT_FALLBACK_POLL_INTERVAL if channel else PROMPT_POLL_INTERVAL
 
         while True:
-            response = self.prompt_manager.get_response_text(prompt_id)
-            if response is not None:
-                logger.info(f"✅ Получен ответ для промпта {prompt_id}: {response}")
-                return response
-
-            if use_timeout and (loop.time() - start_time) >= timeout:
-                logger.warning(f"Таймаут ожидания ответа по промпту {prompt_id}")
-                self.prompt_manager.mark_expired(prompt_id)
+            answers = self.prompt_manager.get_response_texts(prompt_ids)
+            # Порядок prompt_ids сохраняем: при нескольких готовых ответах первым идёт ранний вопрос
+            for prompt_id in prompt_ids:
+                if prompt_id in answers:
+                    response = answers[prompt_id]
+                    logger.info(f"✅ Получен ответ для промпта {prompt_id}: {response}")
+                    return prompt_id, response
+
+            elapsed = loop.time() - start_time
+            if use_timeout and elapsed >= timeout:
+                logger.warning(f"Таймаут ожидания ответа по промптам {', '.join(prompt_ids)}")
+                for prompt_id in prompt_ids:
+                    self.prompt_manager.mark_expired(prompt_id)
                 await self.send_message("❌ Время ожидания истекло")
                 return None
 
-            await asyncio.sleep(1.5)
+            wait_time = min(poll_interval, timeout - elapsed) if use_timeout else poll_interval
+            if channel:
+                # Бот будит нас сразу после записи ответа; опрос остаётся страховкой
+                await channel.wait(wait_time)
+            else:
+                await asyncio.sleep(wait_time)
 
 
 def _run_in_thread(coro: Awaitable[_T]) -> _T:
@@ -251,3 +341,105 @@ def sync_wait_for_input(
     """
     notifier = TelegramNotifier()
     return _run_async(notifier.wait_for_user_input(prompt, timeout, options))
+
+
+class PromptBatch:
+    """
+    Пакет одновременно открытых промптов.
+    
+    Все вопросы рассылаются сразу, ответы принимаются в любом порядке и от любого
+    администратора. Один канал уведомлений обслуживает весь пакет.
+    
+    Пример:
+        with PromptBatch() as batch:
+            for item in items:
+                batch.send(item_key, "Что это?", options)
+            while batch:
+                key, answer = batch.next_answer()
+    """
+    
+    def __init__(self, timeout: int = 0):
+        """
+        Args:
+            timeout: Таймаут ожидания следующего ответа в секундах (0 - без ограничения)
+        """
+        self.notifier = TelegramNotifier()
+        self.timeout = timeout
+        self.channel = PROMPT_MANAGER.open_channel()
+        # prompt_id -> ключ вызывающего кода
+        self.pending: Dict[str, Any] = {}
+    
+    def __enter__(self) -> "PromptBatch":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def __len__(self) -> int:
+        return len(self.pending)
+    
+    def send(
+        self,
+        key: Any,
+        prompt: str,
+        options: Optional[List[Tuple[str, str]]] = None
+    ) -> Optional[str]:
+        """Разослать вопрос, не дожидаясь ответа. Возвращает ID промпта или None."""
+        prompt_id = _run_async(self.notifier.send_prompt(
+            prompt,
+            self.timeout,
+            options,
+            notify_path=str(self.channel.path) if self.channel else None
+        ))
+        if prompt_id:
+            self.pending[prompt_id] = key
+        return prompt_id
+    
+    def next_answer(self) -> Optional[Tuple[Any, str]]:
+        """
+        Дождаться ответа на любой из оставшихся вопросов.
+        
+        Returns:
+            (ключ, текст ответа) или None, если ждать нечего или истёк таймаут
+        """
+        if not self.pending:
+            return None
+        answer = _run_async(self.notifier.wait_for_any_response(
+            list(self.pending), self.timeout, self.channel
+        ))
+        if answer is None:
+            self.pending.clear()
+            return None
+        prompt_id, response = answer
+        return self.pending.pop(prompt_id), response
+    
+    @contextmanager
+    def paused(self):
+        """
+        Пока открыт уточняющий вопрос, текст без кода промпта идёт только ему.
+        
+        Вопросы пакета на это время исключаются из маршрутизации текста без
+        кода; ответы на них кнопками или reply по-прежнему накапливаются.
+        """
+        prompt_ids = list(self.pending)
+        self.notifier.prompt_manager.set_paused(prompt_ids, True)
+        try:
+            yield self
+        finally:
+            self.notifier.prompt_manager.set_paused(prompt_ids, False)
+    
+    def cancel(self, key: Any) -> None:
+        """Снять вопрос с ожидания (например, заказ уже исключён другим ответом)."""
+        for prompt_id, pending_key in list(self.pending.items()):
+            if pending_key == key:
+                PROMPT_MANAGER.mark_expired(prompt_id)
+                del self.pending[prompt_id]
+    
+    def close(self) -> None:
+        """Пометить неотвеченные вопросы истёкшими и закрыть канал."""
+        for prompt_id in self.pending:
+            PROMPT_MANAGER.mark_expired(prompt_id)
+        self.pending.clear()
+        if self.channel:
+            self.channel.close()
+            self.channel = None
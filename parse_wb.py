@@ -90,9 +90,11 @@ def parse_product_name(name_elem):
     return full_text
 
 
-import json
 import os
 
+from mappings_store import get_store
+from product_index import normalize_name
+
 def load_mappings(file_path: str = 'product_mappings.json') -> dict:
     """
     Загружает маппинг товаров из JSON файла.
@@ -101,8 +103,8 @@ def load_mappings(file_path: str = 'product_mappings.json') -> dict:
         return {}
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Общий для процесса индекс: снимок + журнал изменений
+        return get_store(file_path).mappings
     except Exception as e:
         print(f"Ошибка при загрузке маппинга: {e}")
         return {}
@@ -117,7 +119,7 @@ def get_standardized_name(name: str, mappings: dict) -> str:
         return name
         
     # Нормализуем имя для поиска (как в ProductMatcher)
-    normalized_name = " ".join(name.lower().split())
+    normalized_name = normalize_name(name)
     
     # Пробуем найти с разными вариантами цвета (так как в HTML цвета может не быть)
     # Приоритет: Black -> White -> 0 -> без цвета
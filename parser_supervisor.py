@@ -0,0 +1,172 @@
+"""
+Запуск и сопровождение процесса парсера (main.py) из Telegram-бота.
+
+Процесс запускается через asyncio.create_subprocess_exec, stdout и stderr
+читаются построчно по мере появления:
+
+- последние строки держатся в кольцевом буфере (tail) - их бот
+  показывает при ошибке;
+- все строки дописываются в лог-файл запуска;
+- строки-события прогресса (PROGRESS_PREFIX + JSON), которые печатает
+  дочерний процесс через emit_progress, разбираются и передаются боту.
+
+Чтение труб не даёт парсеру встать на заполненном буфере, а завершение
+процесса видно сразу - ожидание идёт на самом процессе, без опроса.
+"""
+
+import asyncio
+import json
+import sys
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+
+# Префикс строки события прогресса в выводе дочернего процесса
+PROGRESS_PREFIX = '@@progress '
+# Сколько последних строк вывода хранится в памяти
+TAIL_LINES = 200
+# Предел длины строки вывода при чтении (по умолчанию asyncio - 64 КБ)
+LINE_LIMIT = 1024 * 1024
+STOP_TIMEOUT = 5.0  # секунд
+
+ProgressHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def emit_progress(stage: str, **data: Any) -> None:
+    """
+    Сообщить супервизору о прогрессе (вызывается в дочернем процессе).
+
+    Событие - одна строка stdout: PROGRESS_PREFIX и JSON {"stage": ..., ...}.
+    """
+    event = dict(data, stage=stage)
+    sys.stdout.write(PROGRESS_PREFIX + json.dumps(event, ensure_ascii=False) + '\n')
+    sys.stdout.flush()
+
+
+def parse_progress(line: str) -> Optional[Dict[str, Any]]:
+    """Событие прогресса из строки вывода или None для обычной строки."""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        event = json.loads(line[len(PROGRESS_PREFIX):])
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and 'stage' in event else None
+
+
+class ParserSupervisor:
+    """Дочерний процесс с построчным чтением вывода и событиями прогресса."""
+
+    def __init__(
+        self,
+        args: List[str],
+        log_file: Optional[str] = None,
+        on_progress: Optional[ProgressHandler] = None,
+        tail_lines: int = TAIL_LINES
+    ):
+        """
+        Args:
+            args: Команда запуска (исполняемый файл и аргументы)
+            log_file: Файл, в который дописывается вывод процесса (None - без файла)
+            on_progress: Корутина, вызываемая на каждое событие прогресса
+            tail_lines: Размер кольцевого буфера строк
+        """
+        self.args = args
+        self.log_file = Path(log_file) if log_file else None
+        self.on_progress = on_progress
+        self.lines: Deque[str] = deque(maxlen=tail_lines)
+        self.progress: Optional[Dict[str, Any]] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._readers: List[asyncio.Task] = []
+        self._log = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode if self.process else None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def tail(self, count: int = 20) -> List[str]:
+        """Последние count строк вывода."""
+        return list(self.lines)[-count:]
+
+    async def start(self) -> None:
+        """Запустить процесс и чтение его вывода."""
+        if self.log_file:
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(self.log_file, 'a', encoding='utf-8')
+            self._log.write(f"===== {datetime.now():%d.%m.%Y %H:%M:%S} {' '.join(self.args)}\n")
+        self.process = await asyncio.create_subprocess_exec(
+            *self.args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=LINE_LIMIT
+        )
+        self._readers = [
+            asyncio.create_task(self._read(self.process.stdout, 'stdout')),
+            asyncio.create_task(self._read(self.process.stderr, 'stderr'))
+        ]
+        logger.info(f"✅ Процесс запущен (PID: {self.process.pid}): {' '.join(self.args)}")
+
+    async def _read(self, stream: asyncio.StreamReader, name: str) -> None:
+        while True:
+            try:
+                raw = await stream.readline()
+            except ValueError:
+                # Строка длиннее LINE_LIMIT - остаток уже отброшен, читаем дальше
+                continue
+            if not raw:
+                break
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            event = parse_progress(line)
+            if event is not None:
+                self.progress = event
+                if self.on_progress:
+                    try:
+                        await self.on_progress(event)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Ошибка обработки события прогресса: {e}")
+                continue
+            self.lines.append(line)
+            if self._log:
+                self._log.write(f"[{name}] {line}\n")
+                self._log.flush()
+
+    async def wait(self) -> int:
+        """Дождаться завершения процесса и дочитать вывод."""
+        if self.process is None:
+            raise RuntimeError("Процесс не запущен")
+        returncode = await self.process.wait()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+        if self._log:
+            self._log.write(f"===== код завершения: {returncode}\n")
+            self._log.close()
+            self._log = None
+        return returncode
+
+    async def stop(self, timeout: float = STOP_TIMEOUT) -> bool:
+        """
+        Остановить процесс: terminate, через timeout секунд - kill.
+
+        Returns:
+            True если процесс завершился сам после terminate
+        """
+        if not self.running:
+            return True
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+            return False
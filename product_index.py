@@ -0,0 +1,455 @@
+"""
+Индекс каталога товаров для быстрого поиска похожих названий.
+
+Строится один раз при загрузке каталога: нормализованные названия,
+словарь точных совпадений, инвертированный индекс слово → товары и
+заранее посчитанные множества слов. Поиск затрагивает только товары,
+у которых есть общие слова с запросом, поэтому скорость не зависит
+от размера листа "Настройки".
+
+Опечатки: слова запроса, которых нет в каталоге, и названия целиком
+ищутся через фильтр по общим q-граммам с проверкой ограниченным
+расстоянием Левенштейна. Нормализация (ё→е, латинские/кириллические двойники)
+общая с ключами сохранённых сопоставлений (mapping_key).
+
+search_batch даёт те же оценки для многих названий сразу: доли общих слов
+для всего пакета считаются разреженными матричными произведениями
+(numpy/scipy; без них - обычный search для каждого названия).
+"""
+
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - необязательная зависимость
+    np = None
+    sparse = None
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Оценки совпадений (совместимы с прежним линейным поиском)
+EXACT_SCORE = 100
+CONTAINS_SCORE = 80
+WORDS_MAX_SCORE = 70
+MIN_SCORE = 30
+# Почти совпадающее название (опечатка): ниже 100, чтобы не сохранять без вопроса
+NEAR_DUPLICATE_SCORE = 90
+NEAR_DUPLICATE_STEP = 5
+
+# Минимальная длина слова для поиска опечаток и допустимое расстояние
+FUZZY_MIN_TOKEN_LENGTH = 4
+FUZZY_LONG_TOKEN_LENGTH = 8
+QGRAM = 3
+
+# Сколько названий пакетного поиска умножать за раз (ограничивает память)
+BATCH_CHUNK_SIZE = 256
+
+# Латинские буквы, похожие на кириллические (в нижнем регистре), и обратно
+_LATIN_TO_CYRILLIC = str.maketrans('aceopxykmtbh', 'асеорхукмтвн')
+_CYRILLIC_TO_LATIN = str.maketrans('асеорхукмтвн', 'aceopxykmtbh')
+_FOLDABLE_LATIN = set('aceopxykmtbh')
+_FOLDABLE_CYRILLIC = set('асеорхукмтвн')
+
+
+def _is_cyrillic(char: str) -> bool:
+    return 'Ѐ' <= char <= 'ӿ'
+
+
+def _fold_homoglyphs(match: re.Match) -> str:
+    """Привести слово со смесью латиницы и кириллицы к одному алфавиту."""
+    word = match.group(0)
+    cyrillic = [c for c in word if _is_cyrillic(c)]
+    latin = [c for c in word if 'a' <= c <= 'z']
+    if not cyrillic or not latin:
+        return word
+    # Переводим меньшинство в алфавит большинства, если все его буквы имеют двойников
+    if len(cyrillic) >= len(latin):
+        if set(latin) <= _FOLDABLE_LATIN:
+            return word.translate(_LATIN_TO_CYRILLIC)
+    elif set(cyrillic) <= _FOLDABLE_CYRILLIC:
+        return word.translate(_CYRILLIC_TO_LATIN)
+    return word
+
+
+def normalize_name(text: str) -> str:
+    """
+    Нормализовать название товара для сравнения.
+
+    Нижний регистр, схлопнутые пробелы, ё→е и замена латинских двойников
+    кириллических букв (и наоборот) внутри слов со смешанным алфавитом.
+    """
+    if not text:
+        return ""
+    normalized = " ".join(text.lower().split()).replace('ё', 'е')
+    return WORD_PATTERN.sub(_fold_homoglyphs, normalized)
+
+
+def mapping_key(name: str, color: str = "") -> str:
+    """Ключ сохранённого сопоставления: нормализованное название[|цвет]."""
+    normalized_name = normalize_name(name)
+    normalized_color = normalize_name(color) if color else ""
+    if normalized_color:
+        return f"{normalized_name}|{normalized_color}"
+    return normalized_name
+
+
+def normalize_mapping_keys(mappings: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Перевести ключи сопоставлений (в т.ч. сохранённых старым форматом) в mapping_key."""
+    normalized = {}
+    for key, value in mappings.items():
+        name, _, color = key.partition('|')
+        normalized[mapping_key(name, color)] = value
+    return normalized
+
+
+def tokenize(text: str) -> Set[str]:
+    """Множество слов нормализованной строки."""
+    return set(WORD_PATTERN.findall(normalize_name(text)))
+
+
+def levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    Расстояние Левенштейна с отсечением.
+
+    Returns:
+        Расстояние или max_distance + 1, если оно больше max_distance
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(a) + 1))
+    for j, char_b in enumerate(b, start=1):
+        current = [j]
+        row_min = j
+        for i, char_a in enumerate(a, start=1):
+            value = min(
+                previous[i] + 1,
+                current[i - 1] + 1,
+                previous[i - 1] + (char_a != char_b)
+            )
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+def allowed_typos(length: int) -> int:
+    """Допустимое число опечаток для слова данной длины."""
+    if length < FUZZY_MIN_TOKEN_LENGTH:
+        return 0
+    return 2 if length >= FUZZY_LONG_TOKEN_LENGTH else 1
+
+
+def qgrams(text: str, q: int = QGRAM) -> List[str]:
+    """q-граммы строки с пробелом по краям."""
+    padded = f" {text} "
+    return [padded[i:i + q] for i in range(len(padded) - q + 1)]
+
+
+class QGramIndex:
+    """
+    Поиск строк с опечатками: фильтр по общим q-граммам + проверка Левенштейном.
+
+    Каждая правка портит не больше q грамм, поэтому у строк на расстоянии k
+    общих грамм не меньше max(|A|, |B|) - k*q, и хотя бы одна из k*q + 1 самых
+    редких грамм запроса обязана встретиться в кандидате (префиксный фильтр).
+    """
+
+    def __init__(self, strings: List[str], q: int = QGRAM):
+        self.strings = strings
+        self.q = q
+        self.gram_sets: List[Set[str]] = [set(qgrams(s, q)) for s in strings]
+        self.postings: Dict[str, List[int]] = {}
+        for idx, grams in enumerate(self.gram_sets):
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(idx)
+
+    def similar(self, query: str, max_distance: int) -> Dict[int, int]:
+        """
+        Строки на расстоянии от 1 до max_distance от запроса.
+
+        Returns:
+            Словарь {индекс строки: расстояние}
+        """
+        query_grams = set(qgrams(query, self.q))
+        min_common = len(query_grams) - max_distance * self.q
+        # Слишком короткий запрос для такого числа правок: фильтр бесполезен
+        if max_distance <= 0 or min_common <= 0:
+            return {}
+
+        rare_first = sorted(query_grams, key=lambda g: len(self.postings.get(g, ())))
+        candidates: Set[int] = set()
+        for gram in rare_first[:max_distance * self.q + 1]:
+            candidates.update(self.postings.get(gram, ()))
+
+        found: Dict[int, int] = {}
+        for idx in candidates:
+            candidate = self.strings[idx]
+            if candidate == query or abs(len(candidate) - len(query)) > max_distance:
+                continue
+            grams = self.gram_sets[idx]
+            if len(query_grams & grams) < max(len(query_grams), len(grams)) - max_distance * self.q:
+                continue
+            distance = levenshtein(query, candidate, max_distance)
+            if distance <= max_distance:
+                found[idx] = distance
+        return found
+
+
+class ProductIndex:
+    """Поисковый индекс по названиям товаров каталога."""
+
+    def __init__(self, products: List[Dict[str, str]], fuzzy: bool = True):
+        """
+        Построить индекс.
+
+        Args:
+            products: Список товаров [{name, type, ...}, ...]
+            fuzzy: Искать также названия и слова с опечатками
+        """
+        self.products = products
+        self.fuzzy = fuzzy
+        self.names: List[str] = [normalize_name(p.get('name', '')) for p in products]
+        self.token_sets: List[Set[str]] = [set(WORD_PATTERN.findall(n)) for n in self.names]
+
+        # Точные совпадения: название → индексы товаров
+        self.exact: Dict[str, List[int]] = {}
+        # Инвертированный индекс: слово → индексы товаров
+        self.postings: Dict[str, List[int]] = {}
+
+        for idx, (name, tokens) in enumerate(zip(self.names, self.token_sets)):
+            self.exact.setdefault(name, []).append(idx)
+            for token in tokens:
+                self.postings.setdefault(token, []).append(idx)
+
+        # Склеенные названия для поиска подстроки запроса внутри названий
+        # ("\n" не встречается в названиях из ячеек таблицы)
+        self._joined = "\n".join(self.names)
+        self._offsets: List[int] = []
+        offset = 0
+        for name in self.names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+        self._name_lengths = sorted({len(n) for n in self.exact if n})
+
+        # Поиск опечаток: по словам каталога (биграммы) и по названиям целиком (триграммы)
+        self._vocabulary: List[str] = []
+        self._vocabulary_index: Optional[QGramIndex] = None
+        self._names_index: Optional[QGramIndex] = None
+        if fuzzy:
+            self._vocabulary = [t for t in self.postings if len(t) >= FUZZY_MIN_TOKEN_LENGTH]
+            self._vocabulary_index = QGramIndex(self._vocabulary, q=2)
+            self._names_index = QGramIndex(self.names, q=QGRAM)
+
+        # Матрица товар × слово для search_batch (строится при первом пакетном поиске)
+        self._token_matrix = None
+        self._token_columns: Dict[str, int] = {}
+        self._product_token_counts = None
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _containing(self, query: str) -> Set[int]:
+        """Товары, в названии которых встречается запрос целиком."""
+        found: Set[int] = set()
+        start = self._joined.find(query)
+        while start != -1:
+            idx = bisect_right(self._offsets, start) - 1
+            found.add(idx)
+            # Переходим к следующему названию: одно вхождение на товар достаточно
+            next_offset = self._offsets[idx + 1] if idx + 1 < len(self._offsets) else len(self._joined)
+            start = self._joined.find(query, next_offset)
+        return found
+
+    def _contained(self, query: str) -> Set[int]:
+        """Товары, название которых целиком входит в запрос."""
+        found: Set[int] = set()
+        query_len = len(query)
+        for length in self._name_lengths:
+            if length >= query_len:
+                break
+            for i in range(query_len - length + 1):
+                found.update(self.exact.get(query[i:i + length], ()))
+        return found
+
+    def _token_products(self, token: str) -> Set[int]:
+        """Товары со словом token или (если его нет в каталоге) с близким словом."""
+        products = self.postings.get(token)
+        if products is not None:
+            return set(products)
+        typos = allowed_typos(len(token))
+        if not typos or self._vocabulary_index is None:
+            return set()
+        found: Set[int] = set()
+        for vocabulary_idx in self._vocabulary_index.similar(token, typos):
+            found.update(self.postings[self._vocabulary[vocabulary_idx]])
+        return found
+
+    def near_duplicates(self, query: str, max_distance: Optional[int] = None) -> Dict[int, int]:
+        """
+        Названия каталога, отличающиеся от запроса на несколько правок.
+
+        Returns:
+            Словарь {индекс товара: расстояние}
+        """
+        if self._names_index is None or not query:
+            return {}
+        if max_distance is None:
+            max_distance = 1 if len(query) < 2 * FUZZY_LONG_TOKEN_LENGTH else 2
+        return self._names_index.similar(query, max_distance)
+
+    def _name_scores(self, query: str) -> Dict[int, int]:
+        """Оценки по названию целиком: точное совпадение, опечатки, вхождение."""
+        scores: Dict[int, int] = {}
+
+        for idx in self.exact.get(query, ()):
+            scores[idx] = EXACT_SCORE
+
+        for idx, distance in self.near_duplicates(query).items():
+            scores.setdefault(idx, NEAR_DUPLICATE_SCORE - NEAR_DUPLICATE_STEP * (distance - 1))
+
+        if query:
+            for idx in self._containing(query) | self._contained(query):
+                scores.setdefault(idx, CONTAINS_SCORE)
+        return scores
+
+    def search(self, name: str, limit: int = 5) -> List[Dict]:
+        """
+        Найти похожие товары.
+
+        Оценки: 100 - точное совпадение, 90/85 - название с 1-2 опечатками,
+        80 - одно название содержит другое, иначе доля общих слов * 70
+        (не ниже 30; слова с опечатками считаются общими).
+
+        Args:
+            name: Название товара для поиска
+            limit: Максимальное количество результатов
+
+        Returns:
+            Список товаров с добавленным полем match_score, по убыванию оценки
+        """
+        query = normalize_name(name)
+        scores = self._name_scores(query)
+
+        query_tokens = set(WORD_PATTERN.findall(query))
+        if query_tokens:
+            common_counts: Counter = Counter()
+            for token in query_tokens:
+                if self.fuzzy:
+                    common_counts.update(self._token_products(token))
+                else:
+                    common_counts.update(self.postings.get(token, ()))
+
+            for idx, common in common_counts.items():
+                if idx in scores:
+                    continue
+                score = int((common / max(len(query_tokens), len(self.token_sets[idx]))) * WORDS_MAX_SCORE)
+                if score >= MIN_SCORE:
+                    scores[idx] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{**self.products[idx], 'match_score': score} for idx, score in ranked]
+
+    def _token_columns_for(self, token: str, similar: Dict[str, List[int]]) -> List[int]:
+        """Столбцы матрицы слов для слова запроса: само слово или (с опечаткой) близкие слова."""
+        column = self._token_columns.get(token)
+        if column is not None:
+            return [column]
+        if not self.fuzzy or self._vocabulary_index is None:
+            return []
+        if token not in similar:
+            typos = allowed_typos(len(token))
+            similar[token] = [
+                self._token_columns[self._vocabulary[vocabulary_idx]]
+                for vocabulary_idx in (self._vocabulary_index.similar(token, typos) if typos else ())
+            ]
+        return similar[token]
+
+    def _build_token_matrix(self) -> None:
+        self._token_columns = {token: column for column, token in enumerate(self.postings)}
+        rows: List[int] = []
+        columns: List[int] = []
+        for token, products in self.postings.items():
+            rows.extend(products)
+            columns.extend([self._token_columns[token]] * len(products))
+        self._token_matrix = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)),
+            shape=(len(self.products), len(self._token_columns))
+        )
+        self._product_token_counts = np.array([len(tokens) for tokens in self.token_sets], dtype=np.float64)
+
+    def search_batch(self, names: List[str], limit: int = 5) -> List[List[Dict]]:
+        """
+        Найти похожие товары сразу для многих названий - с теми же оценками, что search.
+
+        Число общих слов для всех пар (название, товар) считается разреженными
+        произведениями: слова запросов × слова каталога × товары. Слово с
+        опечаткой, похожее на несколько слов товара, засчитывается один раз.
+
+        Args:
+            names: Названия товаров для поиска
+            limit: Максимальное количество результатов на название
+
+        Returns:
+            Для каждого названия - список как у search
+        """
+        if np is None or sparse is None or not self.products:
+            return [self.search(name, limit) for name in names]
+        if self._token_matrix is None:
+            self._build_token_matrix()
+        catalog_t = self._token_matrix.T.tocsc()
+        similar: Dict[str, List[int]] = {}
+        results: List[List[Dict]] = []
+
+        for start in range(0, len(names), BATCH_CHUNK_SIZE):
+            queries = [normalize_name(name) for name in names[start:start + BATCH_CHUNK_SIZE]]
+            # Строка матрицы - одно слово запроса; owners - номер запроса этого слова
+            rows: List[int] = []
+            columns: List[int] = []
+            owners: List[int] = []
+            query_token_counts: List[int] = []
+            for query_idx, query in enumerate(queries):
+                tokens = set(WORD_PATTERN.findall(query))
+                query_token_counts.append(len(tokens))
+                for token in tokens:
+                    token_columns = self._token_columns_for(token, similar)
+                    rows.extend([len(owners)] * len(token_columns))
+                    columns.extend(token_columns)
+                    owners.append(query_idx)
+
+            query_tokens = sparse.csr_matrix(
+                (np.ones(len(rows)), (rows, columns)),
+                shape=(len(owners), len(self._token_columns))
+            )
+            hits = (query_tokens @ catalog_t).tocsr()
+            hits.data[:] = 1.0
+            owner_matrix = sparse.csr_matrix(
+                (np.ones(len(owners)), (owners, range(len(owners)))),
+                shape=(len(queries), len(owners))
+            )
+            common = (owner_matrix @ hits).tocsr()
+
+            for row, query in enumerate(queries):
+                scores = self._name_scores(query)
+                products = common.indices[common.indptr[row]:common.indptr[row + 1]]
+                counts = common.data[common.indptr[row]:common.indptr[row + 1]]
+                if len(products):
+                    denominators = np.maximum(query_token_counts[row], self._product_token_counts[products])
+                    word_scores = np.floor(counts / denominators * WORDS_MAX_SCORE).astype(np.int64)
+                    keep = word_scores >= MIN_SCORE
+                    products, word_scores = products[keep], word_scores[keep]
+                    # Достаточно лучших limit + уже найденных по названию
+                    order = np.lexsort((products, -word_scores))[:limit + len(scores)]
+                    for idx, score in zip(products[order].tolist(), word_scores[order].tolist()):
+                        scores.setdefault(idx, score)
+                ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+                results.append([{**self.products[idx], 'match_score': score} for idx, score in ranked])
+
+        return results
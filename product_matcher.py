@@ -2,13 +2,17 @@
 Модуль для сопоставления товаров с каталогом и интерактивного подтверждения через Telegram.
 """
 
-import json
 from pathlib import Path
 from typing import Dict, Optional, Tuple, List
 from loguru import logger
-from notifier import sync_send_message
+from notifier import PromptBatch, sync_send_message, sync_wait_for_input
+from config import Config
+from auto_resolver import AutoResolver
+from mappings_store import get_store
+from match_cache import MATCH_CACHE_FILE, MatchCache, catalog_hash
+from product_index import ProductIndex, mapping_key
 from excluded_manager import ExcludedOrdersManager
-from bundle_manager import BundleManager, create_bundle_item
+from bundle_manager import BundleManager
 import time
 
 
@@ -27,8 +31,16 @@ class ProductMatcher:
             mappings_file: Путь к файлу с сохранёнными сопоставлениями
         """
         self.catalog = sheets_products
+        # Индекс строится лениво: при попаданиях в кеш кандидатов он не нужен
+        self._index: Optional[ProductIndex] = None
+        self._auto_resolver: Optional[AutoResolver] = None
         self.mappings_file = mappings_file or self.MAPPINGS_FILE
-        self.mappings = self._load_mappings()
+        self.store = get_store(self.mappings_file)
+        # Кеш кандидатов между запусками лежит рядом с файлом сопоставлений
+        self.match_cache = MatchCache(
+            catalog_hash(self.catalog),
+            cache_file=str(Path(self.mappings_file).with_name(MATCH_CACHE_FILE))
+        )
         self.type_map = self._create_type_map()
         
         logger.info(f"🔄 Загружено товаров из каталога: {len(self.catalog)}")
@@ -99,50 +111,26 @@ class ProductMatcher:
         
         return options
     
-    def _load_mappings(self) -> Dict[str, Dict[str, str | int]]:
-        """Загрузить сохранённые сопоставления из файла."""
-        try:
-            if Path(self.mappings_file).exists():
-                with open(self.mappings_file, 'r', encoding='utf-8') as f:
-                    mappings = json.load(f)
-                logger.info(f"✅ Загружены сопоставления из {self.mappings_file}")
-                return mappings
-        except Exception as e:
-            logger.warning(f"⚠️ Не удалось загрузить сопоставления: {e}")
-        
-        return {}
+    @property
+    def index(self) -> ProductIndex:
+        """Поисковый индекс каталога (строится при первом обращении)."""
+        if self._index is None:
+            self._index = ProductIndex(self.catalog)
+        return self._index
     
-    def _save_mappings(self) -> bool:
-        """
-        Сохранить сопоставления в файл с объединением существующих данных.
-        Перечитывает файл перед сохранением, чтобы не потерять маппинги,
-        добавленные другими процессами или на сервере.
-        """
-        try:
-            # Перечитываем файл для получения актуальных данных
-            existing_mappings = {}
-            if Path(self.mappings_file).exists():
-                try:
-                    with open(self.mappings_file, 'r', encoding='utf-8') as f:
-                        existing_mappings = json.load(f)
-                except Exception as e:
-                    logger.warning(f"⚠️ Не удалось загрузить существующие маппинги: {e}")
-            
-            # Объединяем: приоритет у НОВЫХ маппингов (self.mappings)
-            merged_mappings = {**existing_mappings, **self.mappings}
-            
-            # Сохраняем объединённый результат
-            with open(self.mappings_file, 'w', encoding='utf-8') as f:
-                json.dump(merged_mappings, f, ensure_ascii=False, indent=2)
-            
-            # Обновляем локальный кеш
-            self.mappings = merged_mappings
-            
-            logger.info(f"✅ Сопоставления сохранены в {self.mappings_file} (всего записей: {len(merged_mappings)})")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения сопоставлений: {e}")
-            return False
+    @property
+    def auto_resolver(self) -> AutoResolver:
+        """Предсказатель решений по истории сопоставлений (строится при первом обращении)."""
+        if self._auto_resolver is None:
+            self._auto_resolver = AutoResolver(
+                self.mappings, self.catalog, threshold=Config.AUTO_RESOLVE_THRESHOLD
+            )
+        return self._auto_resolver
+    
+    @property
+    def mappings(self) -> Dict[str, Dict[str, str | int]]:
+        """Сохранённые сопоставления (общий для процесса индекс MappingsStore)."""
+        return self.store.mappings
     
     def _create_mapping_key(self, name: str, color: str = "") -> str:
         """
@@ -155,13 +143,8 @@ class ProductMatcher:
         Returns:
             Уникальный ключ
         """
-        # Нормализуем название: убираем лишние пробелы, приводим к нижнему регистру
-        normalized_name = " ".join(name.lower().split())
-        normalized_color = color.lower().strip() if color else ""
-        
-        if normalized_color:
-            return f"{normalized_name}|{normalized_color}"
-        return normalized_name
+        # Нормализуем так же, как индекс каталога: регистр, пробелы, ё→е, двойники букв
+        return mapping_key(name, color)
     
     def get_mapping(self, name: str, color: str = "") -> Optional[Dict[str, str | int]]:
         """
@@ -174,26 +157,19 @@ class ProductMatcher:
         Returns:
             Словарь с mapped_name, mapped_type и опционально split_units или None
         """
-        # Сначала пробуем точное совпадение с переданным цветом
-        key = self._create_mapping_key(name, color)
-        if key in self.mappings:
-            return self.mappings[key]
-        
-        # Пробуем другие варианты цветов (товар мог быть сохранён с другим цветом)
-        fallback_colors = ['black', 'white', '']
-        # Исключаем текущий цвет из fallback, если он там есть
-        current_color_lower = color.lower().strip() if color else ''
-        fallback_colors = [c for c in fallback_colors if c != current_color_lower]
-        
-        for fallback_color in fallback_colors:
-            fallback_key = self._create_mapping_key(name, fallback_color)
-            if fallback_key in self.mappings:
-                logger.info(f"✅ Найден маппинг с fallback цветом '{fallback_color}' (искали '{color}'): {name}")
-                return self.mappings[fallback_key]
-        
-        return None
+        # Точный ключ название|цвет, иначе заранее выбранный цветовой вариант
+        # (black → white → без цвета) - одно обращение к индексу хранилища
+        return self.store.lookup(name, color)
     
-    def save_mapping(self, name: str, color: str, mapped_name: str, mapped_type: str, split_units: Optional[int] = None) -> bool:
+    def save_mapping(
+        self,
+        name: str,
+        color: str,
+        mapped_name: str,
+        mapped_type: str,
+        split_units: Optional[int] = None,
+        auto_confidence: Optional[float] = None
+    ) -> bool:
         """
         Сохранить новое сопоставление.
         
@@ -203,12 +179,13 @@ class ProductMatcher:
             mapped_name: Сопоставленное название
             mapped_type: Тип товара
             split_units: Количество единиц для разбивки (если товар разбивается)
+            auto_confidence: Уверенность, если решение принято AutoResolver без вопроса
             
         Returns:
             True если успешно сохранено
         """
         key = self._create_mapping_key(name, color)
-        mapping_data: Dict[str, str | int] = {
+        mapping_data: Dict[str, str | int | float] = {
             'mapped_name': mapped_name,
             'mapped_type': mapped_type,
             'original_name': name,
@@ -218,9 +195,18 @@ class ProductMatcher:
         # Добавляем информацию о разбивке, если она есть
         if split_units and split_units > 1:
             mapping_data['split_units'] = split_units
+        
+        # Автоматические решения помечаем, чтобы не обучаться на собственных предсказаниях
+        if auto_confidence is not None:
+            mapping_data['auto_resolved'] = auto_confidence
+        elif self._auto_resolver is not None:
+            self._auto_resolver.learn(name, mapped_name, mapped_type, split_units)
             
-        self.mappings[key] = mapping_data
-        return self._save_mappings()
+        # Одна строка в журнал вместо перезаписи всего product_mappings.json
+        saved = self.store.put(key, mapping_data)
+        if saved:
+            logger.info(f"✅ Сопоставление сохранено в {self.mappings_file} (всего записей: {len(self.store)})")
+        return saved
     
     def find_matches(self, name: str, color: str = "") -> list:
         """
@@ -233,43 +219,54 @@ class ProductMatcher:
         Returns:
             Список похожих товаров из каталога
         """
-        from sheets_manager import SheetsManager
-        
-        # Создаём временный объект для использования метода поиска
-        # (можно оптимизировать, передавая SheetsManager)
-        matches = []
+        cached = self.match_cache.get('index', name, color)
+        if cached is not None:
+            return cached
+        matches = self.index.search(name)
+        self.match_cache.put('index', name, color, matches)
+        return matches
+    
+    def find_matches_batch(self, items: List[Tuple[str, str]]) -> Dict[Tuple[str, str], list]:
+        """
+        Найти похожие товары сразу для многих товаров.
         
-        search_lower = name.lower()
+        Оценки те же, что у find_matches: ProductIndex.search_batch считает
+        доли общих слов всего пакета разреженными матричными произведениями
+        и даёт ровно те же 100/90/85/80/доля слов, поэтому пороги
+        автосохранения и вопросов одинаковы для одиночного и пакетного поиска.
+        Повторы ищутся один раз; кеш кандидатов общий с find_matches (тот же
+        ключ название+цвет) и сохраняется один раз на пакет.
         
-        for product in self.catalog:
-            product_name_lower = product['name'].lower()
-            
-            # Точное совпадение
-            if product_name_lower == search_lower:
-                matches.insert(0, {**product, 'match_score': 100})
-                continue
-            
-            # Содержит название
-            if search_lower in product_name_lower or product_name_lower in search_lower:
-                matches.append({**product, 'match_score': 80})
-                continue
-            
-            # Проверка по словам
-            import re
-            search_words = set(re.findall(r'\w+', search_lower))
-            product_words = set(re.findall(r'\w+', product_name_lower))
+        Args:
+            items: Пары (название, цвет) товаров из заказов
             
-            if search_words and product_words:
-                common_words = search_words & product_words
-                if common_words:
-                    score = int((len(common_words) / max(len(search_words), len(product_words))) * 70)
-                    if score >= 30:
-                        matches.append({**product, 'match_score': score})
+        Returns:
+            Словарь {(название, цвет): список похожих товаров (как find_matches)}
+        """
+        unique_items = list(dict.fromkeys(items))
+        if not unique_items:
+            return {}
         
-        # Сортируем по score
-        matches.sort(key=lambda x: x['match_score'], reverse=True)
-        return matches[:5]  # Топ-5
-
+        results: Dict[Tuple[str, str], list] = {}
+        missing = []
+        for name, color in unique_items:
+            cached = self.match_cache.get('index', name, color)
+            if cached is None:
+                missing.append((name, color))
+            else:
+                results[(name, color)] = cached
+        
+        if missing:
+            started = time.time()
+            found = self.index.search_batch([name for name, _ in missing])
+            for (name, color), matches in zip(missing, found):
+                self.match_cache.put('index', name, color, matches)
+                results[(name, color)] = matches
+            self.match_cache.save()
+            logger.info(f"🧮 Пакетное сопоставление: {len(missing)} товаров за {time.time() - started:.2f} с")
+        
+        logger.info(f"🗂️ Кандидаты из кеша: {len(unique_items) - len(missing)}/{len(unique_items)}")
+        return results
 
 def clarify_color_if_needed(color: str, item_name: str) -> str:
     """
@@ -401,13 +398,95 @@ def request_split_units(
     return num_units
 
 
+def _build_match_prompt(
+    item: Dict,
+    matcher: ProductMatcher,
+    matches: list,
+    order_number: Optional[str] = None,
+    excluded_manager: Optional[ExcludedOrdersManager] = None,
+    skip_split_option: bool = False
+) -> Tuple[str, str, List[Tuple[str, str]]]:
+    """
+    Сформировать вопрос о сопоставлении товара.
+    
+    Returns:
+        Tuple (описание товара, короткий вопрос, кнопки [(значение, текст), ...])
+    """
+    name = item.get('name', '')
+    color = item.get('color', '')
+    quantity = item.get('quantity', 1)
+    price = item.get('price', 0)
+    # Получаем дату из item, если она есть (для WB)
+    date = item.get('date', '')
+    
+    # Преобразуем цвет для отображения
+    display_color = color if color and color != '0' else 'не указан'
+    color_status = ""
+    if color == '0':
+        color_status = " ⚠️ (требует уточнения)"
+    elif color in ['Black', 'White']:
+        color_status = f" ✅ (преобразован в {color})"
+    
+    header = "🔍 <b>Найдены похожие товары</b>" if matches else "🔍 <b>Товар НЕ НАЙДЕН в каталоге</b>"
+    message = f"""
+{header}
+
+📦 <b>Товар из заказа:</b>
+• Название: {name}
+• Цвет: {display_color}{color_status}
+• Количество: {quantity}
+• Цена: {price} ₽"""
+
+    if date:
+        message += f"\n• Дата: {date}"
+    
+    if order_number:
+        order_url = f"https://www.ozon.ru/my/orderdetails/?order={order_number}"
+        message += f"\n• Заказ: <a href='{order_url}'>{order_number}</a>"
+    
+    if not matches:
+        message += f"""
+
+❓ Предлагаем тип по умолчанию: {matcher.DEFAULT_TYPE}"""
+        
+        # Собираем кнопки в зависимости от доступных опций
+        button_options = [
+            ("1", "1️⃣ Расходники"),
+            ("0", "0️⃣ Подарок"),
+            ("2", "2️⃣ Каталог")
+        ]
+        if not skip_split_option:
+            button_options.append(("3", "3️⃣ Разбить"))
+        if order_number and excluded_manager:
+            button_options.append(("4", "4️⃣ Исключить заказ"))
+        
+        button_options.append(("5", "5️⃣ Пропустить товар"))
+        return message, "Выберите действие:", button_options
+    
+    message += "\n\n✅ Предлагаемые варианты:"
+    for idx, match in enumerate(matches[:5], start=1):
+        message += f"\n{idx}. <b>{match['name']}</b> ({match['type']}) - {match['match_score']}%"
+    
+    # Собираем кнопки (1-5 для совпадений + дополнительные опции)
+    button_options = [(str(i+1), f"{i+1}️⃣") for i in range(min(5, len(matches)))]
+    button_options.append(("6", "6️⃣ Каталог"))
+    if not skip_split_option:
+        button_options.append(("7", "7️⃣ Разбить"))
+    if order_number and excluded_manager:
+        button_options.append(("8", "8️⃣ Исключить"))
+    button_options.append(("9", "9️⃣ Пропустить"))
+    return message, "Выберите вариант:", button_options
+
+
 def match_product_interactive(
     item: Dict,
     matcher: ProductMatcher,
     auto_mode: bool = False,
     order_number: Optional[str] = None,
     excluded_manager: Optional[ExcludedOrdersManager] = None,
-    skip_split_option: bool = False
+    skip_split_option: bool = False,
+    matches: Optional[list] = None,
+    first_response: Optional[str] = None
 ) -> Tuple[Optional[str], Optional[str]]:
     """
     Интерактивное сопоставление товара с подтверждением через Telegram.
@@ -419,14 +498,15 @@ def match_product_interactive(
         order_number: Номер заказа (для возможности исключения всего заказа)
         excluded_manager: Менеджер исключённых заказов
         skip_split_option: Если True, не показывать опцию разбивки (используется после разбивки)
+        matches: Заранее найденные совпадения (по умолчанию ищутся в каталоге)
+        first_response: Уже полученный ответ на первый вопрос (пакетный режим) -
+                        вопрос повторно не отправляется, сразу применяется ответ
         
     Returns:
         Tuple (mapped_name, mapped_type) или (None, None) если заказ исключён
     """
     name = item.get('name', '')
     color = item.get('color', '')
-    quantity = item.get('quantity', 1)
-    price = item.get('price', 0)
     
     # Проверяем сохранённые сопоставления
     saved_mapping = matcher.get_mapping(name, color)
@@ -450,7 +530,8 @@ def match_product_interactive(
         return mapped_name, mapped_type
     
     # Ищем похожие товары в каталоге
-    matches = matcher.find_matches(name, color)
+    if matches is None:
+        matches = matcher.find_matches(name, color)
     
     # Если 100% совпадение найдено
     if matches and matches[0]['match_score'] == 100:
@@ -487,60 +568,16 @@ def match_product_interactive(
     mapped_name = name
     mapped_type = matcher.DEFAULT_TYPE
     
-    # Получаем дату из item, если она есть (для WB)
-    date = item.get('date', '')
-    
     if not matches:
-        # Преобразуем цвет для отображения
-        display_color = color if color and color != '0' else 'не указан'
-        color_status = ""
-        if color == '0':
-            color_status = " ⚠️ (требует уточнения)"
-        elif color in ['Black', 'White']:
-            color_status = f" ✅ (преобразован в {color})"
-        
-        # Нет совпадений - предлагаем ручной ввод
-        message = f"""
-🔍 <b>Товар НЕ НАЙДЕН в каталоге</b>
-
-📦 <b>Товар из заказа:</b>
-• Название: {name}
-• Цвет: {display_color}{color_status}
-• Количество: {quantity}
-• Цена: {price} ₽"""
-
-        if date:
-            message += f"\n• Дата: {date}"
-        
-        if order_number:
-            order_url = f"https://www.ozon.ru/my/orderdetails/?order={order_number}"
-            message += f"\n• Заказ: <a href='{order_url}'>{order_number}</a>"
-        
-        message += f"""
-
-❓ Предлагаем тип по умолчанию: {matcher.DEFAULT_TYPE}"""
-        
-        sync_send_message(message)
-        
-        # Собираем кнопки в зависимости от доступных опций
-        button_options = [
-            ("1", "1️⃣ Расходники"),
-            ("0", "0️⃣ Подарок"),
-            ("2", "2️⃣ Каталог")
-        ]
-        if not skip_split_option:
-            button_options.append(("3", "3️⃣ Разбить"))
-        if order_number and excluded_manager:
-            button_options.append(("4", "4️⃣ Исключить заказ"))
-        
-        button_options.append(("5", "5️⃣ Пропустить товар"))
-        
-        from notifier import sync_wait_for_input
-        response = sync_wait_for_input(
-            "Выберите действие:",
-            timeout=0,
-            options=button_options
+        message, question, button_options = _build_match_prompt(
+            item, matcher, matches, order_number, excluded_manager, skip_split_option
         )
+        if first_response is None:
+            sync_send_message(message)
+            response = sync_wait_for_input(question, timeout=0, options=button_options)
+        else:
+            # Ответ на первый вопрос уже собран пакетом (см. enrich_orders_with_mapping)
+            response = first_response
         
         if not response:
             logger.warning(f"⏱️ Таймаут ожидания - используем тип по умолчанию для: {name}")
@@ -730,64 +767,14 @@ def match_product_interactive(
         return mapped_name, mapped_type
     
     # Есть совпадения, но не 100% - показываем варианты
-    # Преобразуем цвет для отображения
-    display_color = color if color and color != '0' else 'не указан'
-    color_status = ""
-    if color == '0':
-        color_status = " ⚠️ (требует уточнения)"
-    elif color in ['Black', 'White']:
-        color_status = f" ✅ (преобразован в {color})"
-    
-    # Получаем дату из item, если она есть (для WB)
-    date = item.get('date', '')
-    
-    message = f"""
-🔍 <b>Найдены похожие товары</b>
-
-📦 <b>Товар из заказа:</b>
-• Название: {name}
-• Цвет: {display_color}{color_status}
-• Количество: {quantity}
-• Цена: {price} ₽"""
-
-    if date:
-        message += f"\n• Дата: {date}"
-    
-    if order_number:
-        order_url = f"https://www.ozon.ru/my/orderdetails/?order={order_number}"
-        message += f"\n• Заказ: <a href='{order_url}'>{order_number}</a>"
-    
-    message += "\n\n✅ Предлагаемые варианты:"
-    
-    # Собираем уникальные названия и типы
-    unique_names = []
-    unique_types = []
-    
-    for idx, match in enumerate(matches[:5], start=1):
-        message += f"\n{idx}. <b>{match['name']}</b> ({match['type']}) - {match['match_score']}%"
-        
-        if match['name'] not in unique_names:
-            unique_names.append(match['name'])
-        if match['type'] not in unique_types:
-            unique_types.append(match['type'])
-    
-    sync_send_message(message)
-    
-    # Собираем кнопки (1-5 для совпадений + дополнительные опции)
-    button_options = [(str(i+1), f"{i+1}️⃣") for i in range(min(5, len(matches)))]
-    button_options.append(("6", "6️⃣ Каталог"))
-    if not skip_split_option:
-        button_options.append(("7", "7️⃣ Разбить"))
-    if order_number and excluded_manager:
-        button_options.append(("8", "8️⃣ Исключить"))
-    button_options.append(("9", "9️⃣ Пропустить"))
-    
-    from notifier import sync_wait_for_input
-    response = sync_wait_for_input(
-        "Выберите вариант:",
-        timeout=0,
-        options=button_options
+    message, question, button_options = _build_match_prompt(
+        item, matcher, matches, order_number, excluded_manager, skip_split_option
     )
+    if first_response is None:
+        sync_send_message(message)
+        response = sync_wait_for_input(question, timeout=0, options=button_options)
+    else:
+        response = first_response
     
     if not response:
         # Таймаут - используем лучшее совпадение
@@ -1000,12 +987,247 @@ def match_product_interactive(
     return mapped_name, mapped_type
 
 
+def _saved_split_entry(item: Dict, matcher: ProductMatcher) -> Optional[Dict]:
+    """Запись кеша для товара с сохранённой разбивкой (split_units > 1) или None."""
+    saved_mapping = matcher.get_mapping(item['name'], item.get('color', ''))
+    split_units_raw = saved_mapping.get('split_units', 0) if saved_mapping else 0
+    if not (saved_mapping and split_units_raw):
+        return None
+    try:
+        split_units = int(split_units_raw) if isinstance(split_units_raw, (int, str)) else 0
+    except (ValueError, TypeError):
+        split_units = 0
+    if split_units <= 1:
+        return None
+    
+    logger.info(f"🔄 Применяем split_units={split_units} (из сохранённого маппинга): {item['name'][:50]}...")
+    return {
+        'mapped_name': saved_mapping['mapped_name'],
+        'mapped_type': saved_mapping['mapped_type'],
+        'split_units': split_units
+    }
+
+
+def _matches_if_prompt_needed(
+    item: Dict,
+    matcher: ProductMatcher,
+    matches: Optional[list] = None
+) -> Optional[list]:
+    """
+    Проверить, придётся ли спрашивать пользователя о товаре.
+    
+    Returns:
+        Найденные совпадения (возможно пустые), если нужен вопрос, иначе None
+    """
+    if matcher.get_mapping(item['name'], item.get('color', '')):
+        return None
+    if matches is None:
+        matches = matcher.find_matches(item['name'], item.get('color', ''))
+    if matches and matches[0]['match_score'] == 100:
+        return None
+    return matches
+
+
+def _auto_resolve_item(item: Dict, matcher: ProductMatcher) -> Optional[Dict]:
+    """
+    Решение по истории сопоставлений без вопроса пользователю.
+    
+    Returns:
+        Запись кеша {mapped_name, mapped_type[, split_units], confidence} или None,
+        если уверенность ниже Config.AUTO_RESOLVE_THRESHOLD
+    """
+    prediction = matcher.auto_resolver.resolve(item['name'])
+    if prediction is None:
+        return None
+    
+    color = item.get('color', '')
+    # Как и при ручном выборе: расходники и подарки без цвета сохраняются как Black
+    if prediction['mapped_type'] in ["расходники", "подарок"] and (not color or color == '0'):
+        color = 'Black'
+    matcher.save_mapping(
+        item['name'], color, prediction['mapped_name'], prediction['mapped_type'],
+        split_units=prediction['split_units'] or None,
+        auto_confidence=prediction['confidence']
+    )
+    
+    cache_entry = {
+        'mapped_name': prediction['mapped_name'],
+        'mapped_type': prediction['mapped_type'],
+        'confidence': prediction['confidence']
+    }
+    if prediction['split_units'] > 1:
+        cache_entry['split_units'] = prediction['split_units']
+    logger.info(
+        f"🤖 Автосопоставление ({prediction['confidence']:.0%}): {item['name'][:50]} → "
+        f"{cache_entry['mapped_name']} ({cache_entry['mapped_type']})"
+    )
+    return cache_entry
+
+
+def _match_unique_item(
+    item: Dict,
+    matcher: ProductMatcher,
+    interactive: bool,
+    first_order: Optional[str],
+    excluded_manager: Optional[ExcludedOrdersManager],
+    matches: Optional[list] = None,
+    first_response: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Сопоставить один уникальный товар, включая сценарий разбивки.
+    
+    Returns:
+        Запись кеша {mapped_name, mapped_type[, split_units]} или None, если заказ исключён
+    """
+    mapped_name, mapped_type = match_product_interactive(
+        item, 
+        matcher, 
+        auto_mode=not interactive,
+        order_number=first_order,
+        excluded_manager=excluded_manager,
+        matches=matches,
+        first_response=first_response
+    )
+    
+    if mapped_name is None and mapped_type is None:
+        return None
+    
+    # Обработка разбивки товара на единицы
+    if mapped_name == "SPLIT" and mapped_type is None:
+        logger.info(f"🔧 Разбивка товара на единицы: {item['name'][:50]}...")
+        
+        # Проверяем, есть ли сохраненная информация о split_units
+        saved_mapping = matcher.get_mapping(item['name'], item.get('color', ''))
+        saved_split_units = None
+        if saved_mapping and 'split_units' in saved_mapping:
+            try:
+                saved_split_units = int(saved_mapping['split_units'])
+            except (ValueError, TypeError):
+                logger.warning(f"⚠️ Некорректное значение split_units: {saved_mapping['split_units']}")
+                saved_split_units = None
+        
+        # Запрашиваем split_units (или используем сохраненное значение)
+        num_units = request_split_units(item, matcher, predefined_units=saved_split_units)
+        
+        if not num_units:
+            logger.warning(f"⚠️ Разбивка отменена для: {item['name'][:50]}...")
+            # Fallback к обычному маппингу
+            return {
+                'mapped_name': item['name'],
+                'mapped_type': matcher.DEFAULT_TYPE
+            }
+        
+        logger.info(f"✅ split_units = {num_units} для: {item['name'][:50]}...")
+        
+        # После разбивки задаем вопрос заново, но БЕЗ опции разбивки
+        logger.info(f"🔄 Повторное сопоставление после разбивки: {item['name'][:50]}...")
+        mapped_name, mapped_type = match_product_interactive(
+            item, 
+            matcher, 
+            auto_mode=not interactive,
+            order_number=first_order,
+            excluded_manager=excluded_manager,
+            skip_split_option=True,  # Не показывать опцию разбивки
+            matches=matches
+        )
+        
+        # Сохраняем маппинг с split_units
+        if mapped_name and mapped_type:
+            matcher.save_mapping(item['name'], item.get('color', ''), mapped_name, mapped_type, split_units=num_units)
+            logger.info(f"✅ Маппинг с split_units={num_units}: {mapped_name} ({mapped_type})")
+            return {
+                'mapped_name': mapped_name,
+                'mapped_type': mapped_type,
+                'split_units': num_units
+            }
+        # Fallback к обычному маппингу
+        return {
+            'mapped_name': item['name'],
+            'mapped_type': matcher.DEFAULT_TYPE
+        }
+    
+    return {
+        'mapped_name': mapped_name,
+        'mapped_type': mapped_type
+    }
+
+
+def _resolve_deferred_batch(
+    deferred: List[Tuple[str, Dict, list]],
+    matcher: ProductMatcher,
+    item_to_orders: Dict[str, list],
+    excluded_manager: Optional[ExcludedOrdersManager],
+    mapping_cache: Dict[str, Dict],
+    orders_to_exclude: set
+) -> None:
+    """
+    Разослать вопросы по всем товарам сразу и применять ответы по мере поступления.
+    
+    Каждый вопрос получает свой ID промпта и кнопки, отвечать можно в любом порядке
+    и с любого аккаунта администратора. Уточняющие вопросы (каталог, разбивка, цвет)
+    задаются сразу после ответа, остальные ответы тем временем накапливаются.
+    """
+    pending: Dict[str, Tuple[Dict, list]] = {}
+    with PromptBatch() as batch:
+        for key, item, matches in deferred:
+            order_numbers = item_to_orders.get(key, [])
+            first_order = order_numbers[0] if order_numbers else None
+            message, question, button_options = _build_match_prompt(
+                item, matcher, matches, first_order, excluded_manager
+            )
+            if batch.send(key, f"{message}\n\n{question}", button_options):
+                pending[key] = (item, matches)
+            else:
+                logger.warning(f"⚠️ Не удалось отправить вопрос, используем тип по умолчанию: {item['name']}")
+                mapping_cache[key] = {'mapped_name': item['name'], 'mapped_type': matcher.DEFAULT_TYPE}
+        
+        if pending:
+            sync_send_message(f"📨 Отправлено вопросов по товарам: <b>{len(pending)}</b>\n\nОтвечайте в любом порядке.")
+        
+        while batch:
+            answer = batch.next_answer()
+            if answer is None:
+                break
+            key, response = answer
+            item, matches = pending.pop(key)
+            order_numbers = item_to_orders.get(key, [])
+            first_order = order_numbers[0] if order_numbers else None
+            
+            # Уточняющие вопросы ждут текст без кода - он не должен уйти в вопросы пакета
+            with batch.paused():
+                cache_entry = _match_unique_item(
+                    item, matcher, True, first_order, excluded_manager,
+                    matches=matches, first_response=response
+                )
+            if cache_entry is None:
+                logger.info(f"🚫 Товар из исключённого заказа: {item['name']}")
+                orders_to_exclude.update(order_numbers)
+                # Вопросы по товарам, все заказы которых уже исключены, больше не нужны
+                for other_key in list(pending):
+                    other_orders = set(item_to_orders.get(other_key, []))
+                    if other_orders and other_orders <= orders_to_exclude:
+                        batch.cancel(other_key)
+                        pending.pop(other_key)
+                continue
+            
+            mapping_cache[key] = cache_entry
+            logger.info(f"✅ [осталось {len(pending)}] {item['name']} → {cache_entry['mapped_name']} ({cache_entry['mapped_type']})")
+    
+    # Таймаут: неотвеченные товары получают лучшее совпадение или тип по умолчанию
+    for key, (item, matches) in pending.items():
+        if matches:
+            mapping_cache[key] = {'mapped_name': matches[0]['name'], 'mapped_type': matches[0]['type']}
+        else:
+            mapping_cache[key] = {'mapped_name': item['name'], 'mapped_type': matcher.DEFAULT_TYPE}
+
+
 def enrich_orders_with_mapping(
     orders_data: list, 
     matcher: ProductMatcher, 
     interactive: bool = True, 
     excluded_manager: Optional[ExcludedOrdersManager] = None,
-    bundle_manager: Optional[BundleManager] = None
+    bundle_manager: Optional[BundleManager] = None,
+    batch_prompts: Optional[bool] = None
 ) -> list:
     """
     Обогатить данные заказов сопоставлениями из каталога.
@@ -1016,6 +1238,8 @@ def enrich_orders_with_mapping(
         interactive: Если True, использовать интерактивный режим через Telegram
         excluded_manager: Менеджер исключённых заказов (для возможности исключения)
         bundle_manager: Менеджер связок товаров (для разбивки на компоненты)
+        batch_prompts: Разослать все вопросы сразу и применять ответы по мере поступления
+                       (по умолчанию Config.BATCH_PROMPTS)
         
     Returns:
         Обогащённый список заказов (без исключённых)
@@ -1044,10 +1268,24 @@ def enrich_orders_with_mapping(
     unique_items = list(unique_items_dict.values())
     logger.info(f"📦 Уникальных товаров для сопоставления: {len(unique_items)}")
     
+    # Кандидаты из каталога для всех несопоставленных товаров - одним пакетом,
+    # до первого вопроса пользователю
+    batch_matches = matcher.find_matches_batch([
+        (item['name'], item.get('color', '')) for item in unique_items
+        if not matcher.get_mapping(item['name'], item.get('color', ''))
+    ])
+    
     # Создаём кеш сопоставлений
     mapping_cache = {}
     orders_to_exclude = set()
     
+    if batch_prompts is None:
+        batch_prompts = Config.BATCH_PROMPTS
+    # Товары, по которым нужен вопрос пользователю: откладываем, чтобы разослать пакетом
+    deferred: List[Tuple[str, Dict, list]] = []
+    # Товары, сопоставленные по истории решений без вопроса: (название, запись кеша)
+    auto_resolved: List[Tuple[str, Dict]] = []
+    
     # Сопоставляем каждый уникальный товар
     for idx, item in enumerate(unique_items, 1):
         logger.info(f"[{idx}/{len(unique_items)}] Обрабатываем: {item['name']}")
@@ -1059,107 +1297,60 @@ def enrich_orders_with_mapping(
         first_order = order_numbers[0] if order_numbers else None
         
         # 🔧 АВТОМАТИЧЕСКАЯ РАЗБИВКА: проверяем сохранённый маппинг на split_units
-        saved_mapping = matcher.get_mapping(item['name'], item.get('color', ''))
-        split_units_raw = saved_mapping.get('split_units', 0) if saved_mapping else 0
-        if saved_mapping and split_units_raw:
-            try:
-                split_units = int(split_units_raw) if isinstance(split_units_raw, (int, str)) else 0
-            except (ValueError, TypeError):
-                split_units = 0
-            
-            if split_units > 1:
-                mapped_name = saved_mapping['mapped_name']
-                mapped_type = saved_mapping['mapped_type']
-                
-                logger.info(f"🔄 Применяем split_units={split_units} (из сохранённого маппинга): {item['name'][:50]}...")
-                
-                # Сохраняем в кеш с split_units
-                mapping_cache[key] = {
-                    'mapped_name': mapped_name,
-                    'mapped_type': mapped_type,
-                    'split_units': split_units
-                }
-                logger.info(f"✅ Маппинг с split_units={split_units}: {mapped_name} ({mapped_type})")
+        split_entry = _saved_split_entry(item, matcher)
+        if split_entry:
+            mapping_cache[key] = split_entry
+            logger.info(f"✅ Маппинг с split_units={split_entry['split_units']}: {split_entry['mapped_name']} ({split_entry['mapped_type']})")
+            continue
+        
+        matches = batch_matches.get((item['name'], item.get('color', '')))
+        prompt_matches = _matches_if_prompt_needed(item, matcher, matches)
+        if prompt_matches is not None:
+            # Похожий товар уже сопоставляли - применяем уверенное решение без вопроса
+            if Config.AUTO_RESOLVE:
+                auto_entry = _auto_resolve_item(item, matcher)
+                if auto_entry:
+                    mapping_cache[key] = auto_entry
+                    auto_resolved.append((item['name'], auto_entry))
+                    continue
+            if interactive and batch_prompts:
+                deferred.append((key, item, prompt_matches))
                 continue
+            matches = prompt_matches
         
         # Используем интерактивный или автоматический режим
-        mapped_name, mapped_type = match_product_interactive(
-            item, 
-            matcher, 
-            auto_mode=not interactive,
-            order_number=first_order,
-            excluded_manager=excluded_manager
+        cache_entry = _match_unique_item(
+            item, matcher, interactive, first_order, excluded_manager,
+            matches=matches
         )
         
         # Если товар исключён (заказ исключён)
-        if mapped_name is None and mapped_type is None:
+        if cache_entry is None:
             logger.info(f"🚫 Товар из исключённого заказа: {item['name']}")
             # Добавляем все заказы с этим товаром в список исключённых
             orders_to_exclude.update(order_numbers)
             continue
         
-        # Обработка разбивки товара на единицы
-        if mapped_name == "SPLIT" and mapped_type is None:
-            logger.info(f"🔧 Разбивка товара на единицы: {item['name'][:50]}...")
-            
-            # Проверяем, есть ли сохраненная информация о split_units
-            saved_mapping = matcher.get_mapping(item['name'], item.get('color', ''))
-            saved_split_units = None
-            if saved_mapping and 'split_units' in saved_mapping:
-                try:
-                    saved_split_units = int(saved_mapping['split_units'])
-                except (ValueError, TypeError):
-                    logger.warning(f"⚠️ Некорректное значение split_units: {saved_mapping['split_units']}")
-                    saved_split_units = None
-            
-            # Запрашиваем split_units (или используем сохраненное значение)
-            num_units = request_split_units(item, matcher, predefined_units=saved_split_units)
-            
-            if num_units:
-                logger.info(f"✅ split_units = {num_units} для: {item['name'][:50]}...")
-                
-                # После разбивки задаем вопрос заново, но БЕЗ опции разбивки
-                logger.info(f"🔄 Повторное сопоставление после разбивки: {item['name'][:50]}...")
-                mapped_name, mapped_type = match_product_interactive(
-                    item, 
-                    matcher, 
-                    auto_mode=not interactive,
-                    order_number=first_order,
-                    excluded_manager=excluded_manager,
-                    skip_split_option=True  # Не показывать опцию разбивки
-                )
-                
-                # Сохраняем маппинг с split_units
-                if mapped_name and mapped_type:
-                    matcher.save_mapping(item['name'], item.get('color', ''), mapped_name, mapped_type, split_units=num_units)
-                    mapping_cache[key] = {
-                        'mapped_name': mapped_name,
-                        'mapped_type': mapped_type,
-                        'split_units': num_units
-                    }
-                    logger.info(f"✅ Маппинг с split_units={num_units}: {mapped_name} ({mapped_type})")
-                else:
-                    # Fallback к обычному маппингу
-                    mapping_cache[key] = {
-                        'mapped_name': item['name'],
-                        'mapped_type': matcher.DEFAULT_TYPE
-                    }
-            else:
-                logger.warning(f"⚠️ Разбивка отменена для: {item['name'][:50]}...")
-                # Fallback к обычному маппингу
-                mapping_cache[key] = {
-                    'mapped_name': item['name'],
-                    'mapped_type': matcher.DEFAULT_TYPE
-                }
-            
-            continue
-        
-        mapping_cache[key] = {
-            'mapped_name': mapped_name,
-            'mapped_type': mapped_type
-        }
-        
-        logger.info(f"✅ [{idx}/{len(unique_items)}] {item['name']} → {mapped_name} ({mapped_type})")
+        mapping_cache[key] = cache_entry
+        logger.info(f"✅ [{idx}/{len(unique_items)}] {item['name']} → {cache_entry['mapped_name']} ({cache_entry['mapped_type']})")
+    
+    if auto_resolved:
+        logger.info(f"🤖 Сопоставлено автоматически по истории: {len(auto_resolved)}")
+        if interactive:
+            lines = [
+                f"• {name[:40]} → {entry['mapped_name'][:40]} ({entry['confidence']:.0%})"
+                for name, entry in auto_resolved[:10]
+            ]
+            if len(auto_resolved) > 10:
+                lines.append(f"... и ещё {len(auto_resolved) - 10}")
+            sync_send_message(
+                f"🤖 <b>Сопоставлено автоматически по истории: {len(auto_resolved)}</b>\n\n" + "\n".join(lines)
+            )
+    
+    if deferred:
+        _resolve_deferred_batch(
+            deferred, matcher, item_to_orders, excluded_manager, mapping_cache, orders_to_exclude
+        )
     
     # Применяем сопоставления ко всем товарам (исключая исключённые заказы)
     enriched_orders = []
@@ -1216,7 +1407,9 @@ def enrich_orders_with_mapping(
         enriched_order['items'] = enriched_items
         enriched_orders.append(enriched_order)
     
+    matcher.match_cache.save()
     logger.info(f"✅ Сопоставлено товаров: {matched_items}/{total_items}")
+    logger.info(matcher.match_cache.stats_message())
     if excluded_orders_count > 0:
         logger.info(f"🚫 Исключено заказов: {excluded_orders_count}")
     
@@ -1,13 +1,15 @@
 """Utility for coordinating interactive prompts between parser and Telegram bot."""
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import socket
 import time
 import uuid
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, cast
+from typing import Any, Dict, Iterable, List, Optional, cast
 
 try:  # pragma: no cover - Windows fallback
     import fcntl as _fcntl  # type: ignore[attr-defined]
@@ -16,6 +18,68 @@ except ImportError:  # pragma: no cover
 
 fcntl = cast(Any, _fcntl)
 
+# Unix socket paths are limited to ~108 bytes on Linux
+_MAX_SOCKET_PATH = 100
+
+
+class PromptChannel:
+    """Unix datagram socket that wakes a process waiting for prompt answers.
+
+    The waiting process binds the socket and records its path in the prompt.
+    Whoever stores an answer sends a one-byte datagram to that path, so the
+    waiter returns immediately instead of re-reading the state file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists():
+                self.path.unlink()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(str(self.path))
+            sock.setblocking(False)
+            self._sock = sock
+        except OSError:
+            self._sock = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._sock is not None
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a wake-up signal. Returns True if one arrived before timeout."""
+        if self._sock is None:
+            await asyncio.sleep(timeout)
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.sock_recv(self._sock, 64), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        except OSError:
+            await asyncio.sleep(timeout)
+            return False
+        # Drain signals that arrived together so the next wait really blocks
+        while True:
+            try:
+                self._sock.recv(64)
+            except (BlockingIOError, OSError):
+                break
+        return True
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
 
 class PromptManager:
     """File-based storage for pending prompts and user responses."""
@@ -25,6 +89,7 @@ class PromptManager:
         self.storage_path = storage_path or (base_dir / "prompt_state.json")
         self.max_prompts = max_prompts
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+        self.sockets_dir = self.storage_path.parent / "prompt_sockets"
 
     @contextmanager
     def _locked_state(self, write_back: bool = True) -> Any:
@@ -41,9 +106,7 @@ class PromptManager:
                 state = json.load(handle)
             yield state
             if write_back:
-                # Ensure only recent prompts are kept to avoid unbounded growth
-                prompts = state.get("prompts", [])
-                state["prompts"] = prompts[-self.max_prompts :]
+                state["prompts"] = self._trim(state.get("prompts", []))
                 handle.seek(0)
                 handle.truncate()
                 json.dump(state, handle, ensure_ascii=False, indent=2)
@@ -52,7 +115,52 @@ class PromptManager:
             if fcntl:
                 fcntl.flock(handle, fcntl.LOCK_UN)
 
-    def create_prompt(self, prompt_text: str, timeout: int | float | None) -> str:
+    def _trim(self, prompts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep only recent prompts to avoid unbounded growth.
+
+        Waiting prompts are never dropped, even past max_prompts: a large
+        PromptBatch would otherwise lose answers to its oldest questions.
+        """
+        excess = len(prompts) - self.max_prompts
+        if excess <= 0:
+            return prompts
+        kept: List[Dict[str, Any]] = []
+        for prompt in prompts:
+            if excess > 0 and prompt.get("status") != "waiting":
+                excess -= 1
+                continue
+            kept.append(prompt)
+        return kept
+
+    def open_channel(self) -> Optional[PromptChannel]:
+        """Create a wake-up channel for this process, or None if unsupported."""
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        path = self.sockets_dir / f"{os.getpid()}-{uuid.uuid4().hex[:6]}.sock"
+        if len(str(path)) > _MAX_SOCKET_PATH:
+            return None
+        channel = PromptChannel(path)
+        if not channel.is_open:
+            channel.close()
+            return None
+        return channel
+
+    def _notify(self, notify_path: Optional[str]) -> None:
+        """Wake the process waiting on the prompt; failures are ignored (it polls anyway)."""
+        if not notify_path or not hasattr(socket, "AF_UNIX"):
+            return
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(b"1", notify_path)
+        except OSError:
+            pass
+
+    def create_prompt(
+        self,
+        prompt_text: str,
+        timeout: int | float | None,
+        notify_path: Optional[str] = None,
+    ) -> str:
         prompt_id = uuid.uuid4().hex[:8].upper()
         created_at = time.time()
         with self._locked_state() as state:
@@ -64,6 +172,7 @@ class PromptManager:
                     "status": "waiting",
                     "timeout": timeout,
                     "response": None,
+                    "notify": notify_path,
                 }
             )
         return prompt_id
@@ -82,7 +191,7 @@ class PromptManager:
         with self._locked_state(write_back=False) as state:
             valid_prompts = []
             for prompt in state.get("prompts", []):
-                if prompt.get("status") == "waiting":
+                if prompt.get("status") == "waiting" and not prompt.get("paused"):
                     # Проверяем, не истек ли промпт по времени
                     timeout = prompt.get("timeout")
                     created_at = prompt.get("created_at", 0)
@@ -98,6 +207,8 @@ class PromptManager:
 
     def set_response(self, prompt_id: str, response_text: str, user: Optional[str] = None) -> bool:
         responded_at = time.time()
+        answered = False
+        notify_path: Optional[str] = None
         with self._locked_state() as state:
             for prompt in state.get("prompts", []):
                 if prompt.get("id") == prompt_id and prompt.get("status") == "waiting":
@@ -107,12 +218,32 @@ class PromptManager:
                         "user": user,
                         "responded_at": responded_at,
                     }
-                    return True
-        return False
+                    notify_path = prompt.get("notify")
+                    answered = True
+                    break
+        # Wake the waiter only after the answer is written and the lock released
+        if answered:
+            self._notify(notify_path)
+        return answered
+
+    def set_paused(self, prompt_ids: Iterable[str], paused: bool) -> None:
+        """Exclude waiting prompts from free-text routing (or include them again).
+
+        A paused prompt still accepts answers addressed to its id (buttons,
+        reply-to, typed code); only text without an id skips it.
+        """
+        wanted = set(prompt_ids)
+        if not wanted:
+            return
+        with self._locked_state() as state:
+            for prompt in state.get("prompts", []):
+                if prompt.get("id") in wanted:
+                    prompt["paused"] = paused
 
     def set_response_for_oldest(self, response_text: str, user: Optional[str] = None) -> Optional[str]:
         responded_at = time.time()
         captured_id: Optional[str] = None
+        notify_path: Optional[str] = None
         with self._locked_state() as state:
             for prompt in state.get("prompts", []):
                 if prompt.get("status") == "waiting":
@@ -123,7 +254,10 @@ class PromptManager:
                         "responded_at": responded_at,
                     }
                     captured_id = prompt.get("id")
+                    notify_path = prompt.get("notify")
                     break
+        if captured_id:
+            self._notify(notify_path)
         return captured_id
 
     def mark_expired(self, prompt_id: str) -> None:
@@ -153,6 +287,16 @@ class PromptManager:
         with self._locked_state(write_back=False) as state:
             return any(prompt.get("status") == "waiting" for prompt in state.get("prompts", []))
 
+    def get_response_texts(self, prompt_ids: Iterable[str]) -> Dict[str, str]:
+        """Return answers for several prompts with a single state read (answered prompts only)."""
+        wanted = set(prompt_ids)
+        answers: Dict[str, str] = {}
+        with self._locked_state(write_back=False) as state:
+            for prompt in state.get("prompts", []):
+                if prompt.get("id") in wanted and prompt.get("response"):
+                    answers[prompt["id"]] = prompt["response"].get("text")
+        return answers
+
     def get_response_text(self, prompt_id: str) -> Optional[str]:
         prompt = self.get_prompt(prompt_id)
         if not prompt:
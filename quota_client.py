@@ -0,0 +1,317 @@
+"""
+HTTP-слой gspread с учётом квот Google Sheets API.
+
+Все клиенты gspread проекта создаются через authorize() этого модуля, и
+каждый запрос проходит через QuotaAwareHTTPClient:
+
+1. Бюджет запросов в минуту - отдельно на чтение и запись (квоты Sheets
+   API считаются на пользователя за минуту). Если бюджет исчерпан, запрос
+   ждёт освобождения окна, а не получает 429.
+2. Повтор при 429/5xx (и 403 rateLimitExceeded от Drive API) с
+   экспоненциальной задержкой и случайным джиттером; заголовок
+   Retry-After учитывается. Неидемпотентные запросы (spreadsheets.batchUpdate
+   со вставкой/удалением строк, values.append) повторяются только после
+   429/403 по квоте и ошибки соединения до отправки: после 5xx или
+   таймаута сервер мог уже выполнить запрос, и повтор вставил бы строки
+   дважды.
+3. Объединение диапазонов: соседние по строкам диапазоны с одинаковыми
+   столбцами в values.batchGet читаются одним диапазоном, а в
+   values.batchUpdate - пишутся одним.
+
+Бюджеты общие на процесс: квота одна на сервисный аккаунт, сколько бы
+клиентов ни было создано.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import gspread
+import requests
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+from loguru import logger
+from urllib3.exceptions import NewConnectionError
+
+from config import Config
+
+# Коды ответа, после которых запрос повторяется
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Коды ответа, после которых повторяется и неидемпотентный запрос: сервер его отклонил, не выполнив
+QUOTA_STATUS_CODES = (429,)
+# Запросы POST, которые можно безопасно повторить (фиксированные диапазоны)
+IDEMPOTENT_POST_SUFFIXES = ('/values:batchUpdate', '/values:batchClear', '/values:batchGet', ':clear')
+# Причины 403, означающие превышение квоты (Drive API), а не запрет доступа
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+BACKOFF_BASE = 1.0  # секунд
+BACKOFF_MAX = 64.0  # секунд
+
+
+class QuotaBudget:
+    """Скользящее окно: не больше limit запросов за window секунд."""
+
+    def __init__(
+        self,
+        limit: int,
+        window: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.limit = max(1, limit)
+        self.window = window
+        self._clock = clock
+        self._sleep = sleep
+        self._sent: Deque[float] = deque()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        # Всего занятых мест за время жизни бюджета
+        self.acquired = 0
+
+    def available(self) -> int:
+        """Сколько запросов можно отправить сейчас без ожидания."""
+        with self._lock:
+            now = self._clock()
+            return self.limit - sum(1 for sent in self._sent if now - sent < self.window)
+
+    def acquire(self) -> float:
+        """
+        Занять место в окне, при необходимости подождав.
+
+        Returns:
+            Время ожидания в секундах
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                while self._sent and now - self._sent[0] >= self.window:
+                    self._sent.popleft()
+                if len(self._sent) < self.limit:
+                    self._sent.append(now)
+                    self.acquired += 1
+                    self.waited += waited
+                    return waited
+                delay = self.window - (now - self._sent[0])
+            self._sleep(delay)
+            waited += delay
+
+
+_budgets: Dict[str, QuotaBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_budget(kind: str) -> QuotaBudget:
+    """Общий на процесс бюджет 'read' или 'write'."""
+    with _budgets_lock:
+        if kind not in _budgets:
+            limit = (
+                Config.SHEETS_READ_REQUESTS_PER_MINUTE if kind == 'read'
+                else Config.SHEETS_WRITE_REQUESTS_PER_MINUTE
+            )
+            _budgets[kind] = QuotaBudget(limit)
+        return _budgets[kind]
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Задержка перед повтором attempt (с 0): экспонента, случайно уменьшенная до половины."""
+    cap = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(cap / 2, cap)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def is_idempotent(method: str, endpoint: str) -> bool:
+    """Повтор запроса не меняет результат (чтения, запись в фиксированные диапазоны)."""
+    method = method.lower()
+    if method in ('get', 'put', 'delete'):
+        return True
+    return method == 'post' and endpoint.split('?', 1)[0].endswith(IDEMPOTENT_POST_SUFFIXES)
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    """Ошибка установки соединения: запрос до сервера не дошёл."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    reason = getattr(error.args[0], 'reason', error.args[0])  # MaxRetryError -> причина
+    return isinstance(reason, NewConnectionError)
+
+
+def _is_retryable(error: APIError, idempotent: bool = True) -> bool:
+    status = error.response.status_code
+    if status in (RETRY_STATUS_CODES if idempotent else QUOTA_STATUS_CODES):
+        return True
+    if status == 403:
+        try:
+            errors = error.response.json()['error'].get('errors', [])
+        except (ValueError, KeyError, AttributeError):
+            return False
+        return any(item.get('reason') in RATE_LIMIT_REASONS for item in errors)
+    return False
+
+
+def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# ----------------------------------------------------------------------
+# Объединение диапазонов
+
+_RANGE_PATTERN = re.compile(r'^(?:(?P<sheet>.+)!)?(?P<start>[A-Z]+\d+):(?P<end>[A-Z]+\d+)$')
+
+# (лист, первая строка, последняя строка, первый столбец, последний столбец)
+Box = Tuple[str, int, int, int, int]
+
+
+def parse_box(range_name: str) -> Optional[Box]:
+    """Прямоугольник 'Лист'!A1:H3 или None, если диапазон не ограничен."""
+    match = _RANGE_PATTERN.match(range_name)
+    if not match:
+        return None
+    first_row, first_col = a1_to_rowcol(match.group('start'))
+    last_row, last_col = a1_to_rowcol(match.group('end'))
+    return match.group('sheet') or '', first_row, last_row, first_col, last_col
+
+
+def format_box(box: Box) -> str:
+    sheet, first_row, last_row, first_col, last_col = box
+    a1 = f"{rowcol_to_a1(first_row, first_col)}:{rowcol_to_a1(last_row, last_col)}"
+    return f"{sheet}!{a1}" if sheet else a1
+
+
+def _follows(previous: Box, box: Box) -> bool:
+    """box начинается сразу под previous и занимает те же столбцы."""
+    return (
+        previous[0] == box[0] and previous[3:] == box[3:]
+        and box[1] == previous[2] + 1
+    )
+
+
+def coalesce_reads(ranges: List[str]) -> List[Tuple[str, List[Tuple[int, int]]]]:
+    """
+    Объединить соседние диапазоны чтения.
+
+    Returns:
+        [(объединённый диапазон, [(индекс исходного диапазона, смещение строк)])]
+    """
+    merged: List[Tuple[Optional[Box], str, List[Tuple[int, int]]]] = []
+    for idx, range_name in enumerate(ranges):
+        box = parse_box(range_name)
+        if box and merged and merged[-1][0] and _follows(merged[-1][0], box):
+            previous, _, parts = merged[-1]
+            parts.append((idx, box[1] - previous[1]))
+            grown = previous[:2] + (box[2],) + previous[3:]
+            merged[-1] = (grown, format_box(grown), parts)
+        else:
+            merged.append((box, range_name, [(idx, 0)]))
+    return [(range_name, parts) for _, range_name, parts in merged]
+
+
+def coalesce_writes(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Объединить соседние по строкам диапазоны записи с теми же столбцами."""
+    result: List[Dict[str, Any]] = []
+    last_box: Optional[Box] = None
+    for item in data:
+        box = parse_box(item.get('range', ''))
+        values = item.get('values', [])
+        complete = box is not None and len(values) == box[2] - box[1] + 1 and set(item) <= {'range', 'values'}
+        if complete and last_box and _follows(last_box, box):
+            last_box = last_box[:2] + (box[2],) + last_box[3:]
+            result[-1] = {'range': format_box(last_box), 'values': result[-1]['values'] + values}
+            continue
+        result.append(dict(item))
+        last_box = box if complete else None
+    return result
+
+
+# ----------------------------------------------------------------------
+# HTTP-клиент
+
+class QuotaAwareHTTPClient(HTTPClient):
+    """HTTPClient gspread с бюджетами квот, повторами и объединением диапазонов."""
+
+    max_retries = Config.SHEETS_MAX_RETRIES
+
+    @staticmethod
+    def _kind(method: str) -> str:
+        # Чтения Sheets API (values.get, values.batchGet, spreadsheets.get) - это GET
+        return 'read' if method.lower() == 'get' else 'write'
+
+    def request(self, method: str, endpoint: str, *args: Any, **kwargs: Any) -> requests.Response:
+        budget = get_budget(self._kind(method))
+        idempotent = is_idempotent(method, endpoint)
+        attempt = 0
+        while True:
+            waited = budget.acquire()
+            if waited > 1:
+                logger.debug(f"⏳ Квота Sheets API: ожидание {waited:.1f} с")
+            try:
+                return super().request(method, endpoint, *args, **kwargs)
+            except APIError as e:
+                if not _is_retryable(e, idempotent) or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, _retry_after(e.response))
+                reason = f"HTTP {e.response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Неидемпотентный запрос мог дойти до сервера - повторяем только если соединения не было
+                if attempt >= self.max_retries or not (idempotent or _not_sent(e)):
+                    raise
+                delay = backoff_delay(attempt)
+                reason = type(e).__name__
+            attempt += 1
+            logger.warning(
+                f"⚠️ Sheets API: {reason}, повтор {attempt}/{self.max_retries} через {delay:.1f} с"
+            )
+            time.sleep(delay)
+
+    def values_batch_get(self, id: str, ranges: List[str], params: Optional[Dict[str, Any]] = None) -> Any:
+        """values.batchGet с объединением соседних диапазонов."""
+        if (params or {}).get('majorDimension', 'ROWS') != 'ROWS':
+            return super().values_batch_get(id, ranges, params)
+        groups = coalesce_reads(ranges)
+        if len(groups) == len(ranges):
+            return super().values_batch_get(id, ranges, params)
+
+        response = super().values_batch_get(id, [range_name for range_name, _ in groups], params)
+        value_ranges: List[Optional[Dict[str, Any]]] = [None] * len(ranges)
+        for (_, parts), merged in zip(groups, response.get('valueRanges', [])):
+            values = merged.get('values', [])
+            for part_no, (idx, offset) in enumerate(parts):
+                end = parts[part_no + 1][1] if part_no + 1 < len(parts) else None
+                rows = values[offset:end]
+                while rows and not rows[-1]:
+                    rows.pop()
+                value_range = {k: v for k, v in merged.items() if k != 'values'}
+                value_range['range'] = ranges[idx]
+                if rows:
+                    value_range['values'] = rows
+                value_ranges[idx] = value_range
+        logger.debug(f"📚 batchGet: {len(ranges)} диапазонов прочитано как {len(groups)}")
+        return dict(response, valueRanges=value_ranges)
+
+    def values_batch_update(self, id: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        """values.batchUpdate с объединением соседних диапазонов."""
+        if body and body.get('data'):
+            data = coalesce_writes(body['data'])
+            if len(data) < len(body['data']):
+                logger.debug(f"📚 batchUpdate: {len(body['data'])} диапазонов записано как {len(data)}")
+                body = dict(body, data=data)
+        return super().values_batch_update(id, body)
+
+
+def authorize(credentials) -> gspread.Client:
+    """Клиент gspread, все запросы которого идут через QuotaAwareHTTPClient."""
+    return gspread.authorize(credentials, http_client=QuotaAwareHTTPClient)
@@ -93,13 +93,25 @@ def rematch_orders(orders_data: dict, matcher: ProductMatcher) -> dict:
     logger.info(f"📦 Будет обработано уникальных товаров: {len(unique_items)}")
     sync_send_message(f"📦 <b>Уникальных товаров:</b> {len(unique_items)}\n\nНачинаем сопоставление...")
     
+    # Кандидаты из каталога для всех товаров считаем одним пакетом
+    batch_matches = matcher.find_matches_batch([(item['name'], item.get('color', '')) for item in unique_items])
+    
     # Сопоставляем каждый уникальный товар
     for idx, item in enumerate(unique_items, 1):
         logger.info(f"\n[{idx}/{len(unique_items)}] Обрабатываем: {item['name']}")
-        sync_send_message(f"🔄 [{idx}/{len(unique_items)}] {item['name'][:50]}...")
+        matches = batch_matches.get((item['name'], item.get('color', '')), [])
+        
+        # Прогресс шлём только перед вопросом пользователю: сохранённые и точные
+        # совпадения применяются без сетевых вызовов
+        needs_prompt = (
+            not matcher.get_mapping(item['name'], item.get('color', ''))
+            and not (matches and matches[0]['match_score'] == 100)
+        )
+        if needs_prompt:
+            sync_send_message(f"🔄 [{idx}/{len(unique_items)}] {item['name'][:50]}...")
         
         # Интерактивное сопоставление (auto_mode=False для запроса у пользователя)
-        mapped_name, mapped_type = match_product_interactive(item, matcher, auto_mode=False)
+        mapped_name, mapped_type = match_product_interactive(item, matcher, auto_mode=False, matches=matches)
         
         # Сохраняем в кеш
         key = f"{item['name']}|{item.get('color', '')}"
@@ -122,8 +134,11 @@ def rematch_orders(orders_data: dict, matcher: ProductMatcher) -> dict:
                 item['mapped_name'] = mapping_cache[key]['mapped_name']
                 item['mapped_type'] = mapping_cache[key]['mapped_type']
     
+    matcher.match_cache.save()
     logger.info("✅ Пересопоставление завершено!")
-    sync_send_message("✅ <b>Пересопоставление завершено!</b>\n\nВсе товары обновлены.")
+    sync_send_message(
+        f"✅ <b>Пересопоставление завершено!</b>\n\nВсе товары обновлены.\n{matcher.match_cache.stats_message()}"
+    )
     
     return updated_orders_data
 
@@ -0,0 +1,164 @@
+"""
+Построчный diff существующего заказа в листе синхронизации.
+
+Старые строки заказа (значения A-P из снимка) сопоставляются с новыми
+развёрнутыми строками (A-H) по идентичности товара:
+
+1. точное совпадение (mapped_name, статус, цена) - строка остаётся как есть;
+2. то же mapped_name с другим статусом/ценой - правятся только изменившиеся
+   ячейки (смена статуса = одна запись в D);
+3. оставшиеся старые строки удаляются, оставшиеся новые - вставляются
+   рядом со строками того же товара.
+
+Строки, оставшиеся на месте, сохраняют свои данные в I-P: их не нужно
+переносить и восстанавливать.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Индексы столбцов
+COL_DATE, COL_ORDER, COL_SOURCE, COL_STATUS, COL_FORMULA, COL_PRICE, COL_NAME, COL_TYPE = range(8)
+# Столбцы, сравниваемые у сохранённых строк. Дата, номер заказа и источник
+# у строк одного заказа не меняются (а дата в листе отображается в его
+# формате), E - формула суммы, она пишется отдельно
+COMPARED_COLUMNS = (COL_STATUS, COL_PRICE, COL_NAME, COL_TYPE)
+# Столбцы I-P с пользовательскими данными
+USER_COLUMNS = range(8, 16)
+
+
+def _number(value: Any) -> Optional[float]:
+    """Число из значения ячейки ('1 443,97 ₽' → 1443.97) или None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace('₽', '').replace(' ', '').replace('\xa0', '').replace(' ', '').replace(',', '.').strip()
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def same_value(old: Any, new: Any) -> bool:
+    """Совпадает ли отображаемое значение ячейки с записываемым."""
+    old_text = '' if old is None else str(old).strip()
+    new_text = '' if new is None else str(new).strip()
+    if old_text == new_text:
+        return True
+    old_number, new_number = _number(old_text), _number(new)
+    return old_number is not None and new_number is not None and abs(old_number - new_number) < 0.005
+
+
+def _cell(row: List, col: int) -> Any:
+    return row[col] if col < len(row) else ''
+
+
+def has_user_data(row: List) -> bool:
+    """Есть ли в строке данные в I-P (кроме формулы в J)."""
+    return any(str(_cell(row, col)).strip() for col in USER_COLUMNS if col != 9)
+
+
+class RowDiff:
+    """Результат сопоставления старых и новых строк заказа."""
+
+    def __init__(self):
+        # Итоговый порядок строк блока: (индекс старой строки или None для новой, новая строка)
+        self.layout: List[Tuple[Optional[int], List]] = []
+        # Индексы старых строк, которые удаляются
+        self.deleted: List[int] = []
+        # Правки ячеек оставшихся строк: (позиция в итоговом блоке, столбец, значение)
+        self.edits: List[Tuple[int, int, Any]] = []
+
+    @property
+    def inserted(self) -> List[int]:
+        """Позиции новых строк в итоговом блоке."""
+        return [pos for pos, (old_idx, _) in enumerate(self.layout) if old_idx is None]
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.deleted or self.edits or self.inserted)
+
+    def summary(self) -> str:
+        return (
+            f"правок ячеек: {len(self.edits)}, вставок: {len(self.inserted)}, "
+            f"удалений: {len(self.deleted)}"
+        )
+
+
+def diff_order_rows(old_rows: List[List], new_rows: List[List]) -> RowDiff:
+    """
+    Сопоставить строки заказа.
+
+    Args:
+        old_rows: Текущие строки заказа в листе (A-P), по порядку
+        new_rows: Новые строки (A-H), отсортированные group_and_sort_rows
+
+    Returns:
+        RowDiff с итоговым порядком строк, удалениями и правками ячеек
+    """
+    diff = RowDiff()
+
+    def identity(row: List) -> Tuple[str, str, Optional[float]]:
+        price = _number(_cell(row, COL_PRICE))
+        return str(_cell(row, COL_NAME)).strip(), str(_cell(row, COL_STATUS)).strip(), (
+            round(price, 2) if price is not None else None
+        )
+
+    # Свободные новые строки по идентичности и по названию (в порядке сортировки)
+    free_exact: Dict[Tuple, List[int]] = {}
+    free_by_name: Dict[str, List[int]] = {}
+    for idx, row in enumerate(new_rows):
+        free_exact.setdefault(identity(row), []).append(idx)
+        free_by_name.setdefault(identity(row)[0], []).append(idx)
+
+    def take(new_idx: int) -> None:
+        key = identity(new_rows[new_idx])
+        free_exact[key].remove(new_idx)
+        free_by_name[key[0]].remove(new_idx)
+
+    match: Dict[int, int] = {}  # старая строка → новая
+    # 1. Точные совпадения
+    for old_idx, row in enumerate(old_rows):
+        candidates = free_exact.get(identity(row))
+        if candidates:
+            match[old_idx] = candidates[0]
+            take(candidates[0])
+    # 2. То же название: приоритет строкам с данными в I-P, затем по порядку
+    unmatched = sorted(
+        (idx for idx in range(len(old_rows)) if idx not in match),
+        key=lambda idx: (not has_user_data(old_rows[idx]), idx)
+    )
+    for old_idx in unmatched:
+        candidates = free_by_name.get(identity(old_rows[old_idx])[0])
+        if candidates:
+            match[old_idx] = candidates[0]
+            take(candidates[0])
+
+    diff.deleted = [idx for idx in range(len(old_rows)) if idx not in match]
+
+    # Итоговый порядок: оставшиеся старые строки на своих местах,
+    # новые - после последней строки того же товара (или по порядку сортировки)
+    order: List[Tuple[Optional[int], int]] = [
+        (old_idx, match[old_idx]) for old_idx in range(len(old_rows)) if old_idx in match
+    ]
+    inserted = sorted(idx for indices in free_by_name.values() for idx in indices)
+    for new_idx in inserted:
+        name = identity(new_rows[new_idx])[0]
+        same_name = [pos for pos, (_, placed) in enumerate(order) if identity(new_rows[placed])[0] == name]
+        if same_name:
+            position = same_name[-1] + 1
+        else:
+            # Перед первой строкой, которая в новом порядке идёт позже
+            position = next((pos for pos, (_, placed) in enumerate(order) if placed > new_idx), len(order))
+        order.insert(position, (None, new_idx))
+    layout = [(old_idx, new_rows[new_idx]) for old_idx, new_idx in order]
+    diff.layout = layout
+
+    for pos, (old_idx, row) in enumerate(layout):
+        if old_idx is None:
+            continue
+        old_row = old_rows[old_idx]
+        for col in COMPARED_COLUMNS:
+            if not same_value(_cell(old_row, col), _cell(row, col)):
+                diff.edits.append((pos, col, _cell(row, col)))
+    return diff
@@ -0,0 +1,287 @@
+"""
+Встроенный планировщик автозапуска (вместо crontab).
+
+Расписания работают внутри процесса бота и ставят задания в очередь
+(job_queue) с source='schedule' - без вызовов crontab и без холодного
+старта через run_parser.sh.
+
+Расписание: тип задания, шаг в минутах и окно часов в часовом поясе
+(по умолчанию - парсинг каждые 15 минут с 9:00 до 21:45 МСК, как
+'*/15 9-21 * * *' в setup-cron.sh).
+
+- Расписания (включено ли, время следующего и последнего запуска)
+  хранятся в SCHEDULES_FILE и переживают перезапуск бота.
+- Jitter: к каждому слоту добавляется случайная задержка до
+  jitter секунд.
+- Пропущенный запуск (бот был выключен) выполняется один раз после
+  старта, если опоздание не больше Config.SCHEDULE_CATCHUP_MINUTES;
+  несколько пропущенных слотов схлопываются в один запуск.
+- Пока задание того же типа ждёт или работает, очередной слот
+  пропускается - запуски не накладываются.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from loguru import logger
+
+from config import Config
+from job_queue import QUEUED, RUNNING, Job, JobQueue
+
+SCHEDULES_FILE = 'schedules.json'
+# Поля расписания, которые меняются при работе (остальные - настройки)
+STATE_FIELDS = ('enabled', 'next_run', 'last_run', 'last_job_id')
+# Дольше этого планировщик не спит, даже если до запуска далеко, секунд
+MAX_SLEEP = 60.0
+
+
+def parse_hours(value: str) -> Tuple[int, int]:
+    """'9-21' -> (9, 21): окно часов включительно."""
+    start, _, end = value.partition('-')
+    hours = (int(start), int(end or start))
+    if not 0 <= hours[0] <= hours[1] <= 23:
+        raise ValueError(f"Некорректное окно часов: {value}")
+    return hours
+
+
+def next_slot(after: datetime, every_minutes: int, hours: Tuple[int, int]) -> datetime:
+    """
+    Первый слот расписания строго после after (в часовом поясе after).
+
+    Слоты - минуты суток, кратные every_minutes, в часах hours[0]..hours[1].
+    """
+    start, end = hours
+    midnight = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    first_in_window = -(-start * 60 // every_minutes) * every_minutes
+    current = after.hour * 60 + after.minute
+    for day in range(2):
+        minute = current // every_minutes * every_minutes + every_minutes if day == 0 else 0
+        minute = max(minute, first_in_window)
+        if minute < 24 * 60 and minute // 60 <= end:
+            return midnight + timedelta(days=day, minutes=minute)
+    raise ValueError("Пустое расписание")
+
+
+class Schedule:
+    """Расписание одного типа задания."""
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        every_minutes: int,
+        hours: Tuple[int, int] = (0, 23),
+        args: Sequence[str] = (),
+        jitter: float = 0,
+        enabled: bool = False,
+        next_run: Optional[float] = None,
+        last_run: Optional[float] = None,
+        last_job_id: Optional[int] = None
+    ):
+        self.name = name
+        self.kind = kind
+        self.every_minutes = every_minutes
+        self.hours = tuple(hours)
+        self.args = list(args)
+        self.jitter = jitter
+        self.enabled = enabled
+        self.next_run = next_run
+        self.last_run = last_run
+        self.last_job_id = last_job_id
+
+    @property
+    def description(self) -> str:
+        return f"каждые {self.every_minutes} мин, {self.hours[0]}:00-{self.hours[1]}:59"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'every_minutes': self.every_minutes,
+            'hours': list(self.hours),
+            'args': self.args,
+            'jitter': self.jitter,
+            'enabled': self.enabled,
+            'next_run': self.next_run,
+            'last_run': self.last_run,
+            'last_job_id': self.last_job_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Schedule':
+        return cls(**data)
+
+
+def default_schedules() -> List[Schedule]:
+    """Расписания по умолчанию из Config (выключены до /cron_on)."""
+    return [
+        Schedule(
+            'parse', 'parse',
+            every_minutes=Config.SCHEDULE_PARSE_EVERY_MINUTES,
+            hours=parse_hours(Config.SCHEDULE_PARSE_HOURS),
+            jitter=Config.SCHEDULE_JITTER_SECONDS
+        )
+    ]
+
+
+class Scheduler:
+    """Планировщик: по расписаниям ставит задания в очередь."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        path: str = SCHEDULES_FILE,
+        defaults: Optional[List[Schedule]] = None,
+        timezone: str = Config.SCHEDULE_TIMEZONE,
+        catchup_seconds: float = Config.SCHEDULE_CATCHUP_MINUTES * 60,
+        clock: Callable[[], float] = time.time,
+        rand: Callable[[float, float], float] = random.uniform
+    ):
+        """
+        Args:
+            queue: Очередь, в которую ставятся задания
+            path: Файл расписаний
+            defaults: Расписания, которых ещё нет в файле
+            timezone: Часовой пояс окна часов
+            catchup_seconds: Максимальное опоздание, при котором пропущенный запуск выполняется
+            clock: Источник времени (для тестов)
+            rand: Источник случайной задержки (для тестов)
+        """
+        self.queue = queue
+        self.path = Path(path)
+        self.tz = ZoneInfo(timezone)
+        self.catchup_seconds = catchup_seconds
+        self.clock = clock
+        self.rand = rand
+        self.schedules: Dict[str, Schedule] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        for schedule in defaults if defaults is not None else default_schedules():
+            self.schedules[schedule.name] = schedule
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    schedule = self.schedules.get(data.get('name'))
+                    if schedule is None:
+                        schedule = Schedule.from_dict(data)
+                        self.schedules[schedule.name] = schedule
+                        continue
+                    # Для расписаний по умолчанию шаг и окно берутся из Config, из файла - состояние
+                    for field in STATE_FIELDS:
+                        setattr(schedule, field, data.get(field))
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"❌ Ошибка чтения расписаний {self.path}: {e}")
+
+    def save(self) -> None:
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([s.to_dict() for s in self.schedules.values()], f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def plan(self, schedule: Schedule, after: float) -> float:
+        """Время следующего запуска: слот после after плюс случайная задержка."""
+        slot = next_slot(datetime.fromtimestamp(after, self.tz), schedule.every_minutes, schedule.hours)
+        return slot.timestamp() + (self.rand(0, schedule.jitter) if schedule.jitter else 0)
+
+    def set_enabled(self, name: str, enabled: bool) -> bool:
+        """
+        Включить или выключить расписание.
+
+        Returns:
+            True если состояние изменилось
+        """
+        schedule = self.schedules[name]
+        if schedule.enabled == enabled:
+            return False
+        schedule.enabled = enabled
+        schedule.next_run = self.plan(schedule, self.clock()) if enabled else None
+        self.save()
+        logger.info(f"⏰ Расписание {name} {'включено' if enabled else 'выключено'}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def busy(self, schedule: Schedule) -> bool:
+        """Задание этого типа ещё ждёт или работает."""
+        return any(job.kind == schedule.kind for job in self.queue.jobs((QUEUED, RUNNING)))
+
+    def tick(self) -> List[Job]:
+        """Поставить в очередь задания наступивших слотов и перепланировать их."""
+        now = self.clock()
+        submitted = []
+        changed = False
+        for schedule in self.schedules.values():
+            if not schedule.enabled:
+                continue
+            if schedule.next_run is None:
+                schedule.next_run = self.plan(schedule, now)
+                changed = True
+                continue
+            if now < schedule.next_run:
+                continue
+
+            late = now - schedule.next_run
+            if late > self.catchup_seconds:
+                logger.warning(f"⏭️ Расписание {schedule.name}: пропущенный запуск опоздал на {late / 60:.0f} мин, пропускаю")
+            elif self.busy(schedule):
+                logger.info(f"⏭️ Расписание {schedule.name}: предыдущее задание ещё не завершено, пропускаю слот")
+            else:
+                try:
+                    job = self.queue.submit(schedule.kind, schedule.args, source='schedule')
+                    schedule.last_run = now
+                    schedule.last_job_id = job.id
+                    submitted.append(job)
+                    logger.info(f"⏰ Расписание {schedule.name}: задание #{job.id}")
+                except ValueError as e:
+                    logger.error(f"❌ Расписание {schedule.name}: {e}")
+            schedule.next_run = self.plan(schedule, now)
+            changed = True
+        if changed:
+            self.save()
+        return submitted
+
+    def _sleep_seconds(self) -> float:
+        pending = [s.next_run for s in self.schedules.values() if s.enabled and s.next_run is not None]
+        if not pending:
+            return MAX_SLEEP
+        return min(max(min(pending) - self.clock(), 0.0), MAX_SLEEP)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"❌ Ошибка планировщика: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._sleep_seconds())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def start(self) -> None:
+        """Запустить планировщик в текущем цикле событий."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        enabled = [s.name for s in self.schedules.values() if s.enabled]
+        logger.info(f"⏰ Планировщик запущен (включены: {', '.join(enabled) or 'нет'})")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -1,6 +1,9 @@
 #!/bin/bash
 # Настройка cron для автоматического запуска парсера
 # Запуск каждый час с 9:00 до 21:00 по Москве
+#
+# Telegram-бот умеет запускать парсер сам (/cron_on, встроенный планировщик
+# scheduler.py). Если он включён, эта cron-задача не нужна - не включайте оба.
 
 set -e
 
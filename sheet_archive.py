@@ -0,0 +1,239 @@
+"""
+Архив завершённых заказов листа синхронизации.
+
+Заказы, все строки которых в конечном статусе (получен / отменен) и дата
+которых старше Config.ARCHIVE_AFTER_DAYS, переносятся из рабочего листа
+в архивные листы по годам ("Архив 2024") или кварталам ("Архив 2024 Q1").
+Лист-индекс ARCHIVE_INDEX_TITLE хранит order_number → архивный лист, и
+sync_orders не добавляет заархивированные заказы заново.
+
+Строки переносятся с формулами, но на другие номера строк: формула суммы
+заказа (E) заменяется на ORDER_TOTAL_FORMULA без номеров строк, а прочие
+формулы со ссылками на строки - на их вычисленные значения.
+
+Порядок переноса безопасен при сбое посередине: сначала строки
+дописываются в архив (values.append с формулами), затем в индекс, и
+только потом удаляются из рабочего листа одним batchUpdate. При сбое
+заказ окажется в двух местах, но не потеряется.
+
+Запуск: python sheet_archive.py [--dry-run]
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from gspread.utils import ValueRenderOption, DateTimeOption
+from loguru import logger
+
+from config import Config
+from google_client import get_metadata
+from sheet_plan import SheetUpdatePlan, has_row_references
+from sheet_snapshot import SheetSnapshot, split_blocks
+
+ARCHIVE_INDEX_TITLE = 'Архив заказов'
+ARCHIVE_INDEX_HEADER = ['Номер заказа', 'Лист архива', 'Дата заказа', 'Строк', 'Перенесено']
+ARCHIVE_TITLE_PREFIX = 'Архив'
+
+# Конечные статусы (значения столбца D)
+TERMINAL_STATUSES = ('TRUE', 'отменен')
+# Столбец суммы заказа (E, с 0)
+TOTAL_COLUMN = 4
+
+
+def parse_sheet_date(value) -> Optional[date]:
+    """Дата из столбца A: DD.MM.YYYY (как пишет парсер) или YYYY-MM-DD."""
+    text = str(value or '').strip()
+    for fmt in ('%d.%m.%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def archive_title(day: date, period: str = 'year') -> str:
+    """Название архивного листа для даты заказа."""
+    if period == 'quarter':
+        return f"{ARCHIVE_TITLE_PREFIX} {day.year} Q{(day.month - 1) // 3 + 1}"
+    return f"{ARCHIVE_TITLE_PREFIX} {day.year}"
+
+
+def select_orders(snapshot: SheetSnapshot, cutoff: date, period: str = 'year') -> Dict[str, List[str]]:
+    """
+    Заказы для архивации, сгруппированные по архивным листам.
+
+    Args:
+        snapshot: Снимок рабочего листа
+        cutoff: Архивируются заказы с датой раньше этой
+        period: 'year' или 'quarter'
+
+    Returns:
+        {название архивного листа: [order_number, ...]}
+    """
+    selected: Dict[str, List[str]] = {}
+    for order_number, row_numbers in snapshot.index.items():
+        rows = snapshot.get_rows(row_numbers)
+        if not all(str(row[3]).strip() in TERMINAL_STATUSES for row in rows):
+            continue
+        order_date = parse_sheet_date(rows[0][0])
+        if order_date is None or order_date >= cutoff:
+            continue
+        selected.setdefault(archive_title(order_date, period), []).append(order_number)
+    return selected
+
+
+class OrderArchiver:
+    """Перенос старых завершённых заказов в архивные листы."""
+
+    def __init__(self, synchronizer, max_age_days: int = None, period: str = None):
+        """
+        Args:
+            synchronizer: SheetsSynchronizer с открытым рабочим листом
+            max_age_days: Возраст заказа для архивации (по умолчанию из Config)
+            period: 'year' или 'quarter' (по умолчанию из Config)
+        """
+        self.sync = synchronizer
+        self.max_age_days = Config.ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+        self.period = period or Config.ARCHIVE_PERIOD
+
+    def _get_or_create(self, worksheets: Dict[str, object], title: str, header: List[str]):
+        if title in worksheets:
+            return worksheets[title]
+        worksheet = self.sync.spreadsheet.add_worksheet(title=title, rows=1000, cols=max(16, len(header)))
+        worksheet.update(range_name='A1', values=[header])
+        worksheets[title] = worksheet
+        get_metadata().invalidate(self.sync.spreadsheet.id)
+        logger.info(f"📁 Создан лист архива: {title}")
+        return worksheet
+
+    def _portable_rows(self, blocks: List[List[int]], fetched: List[List[List]]) -> Dict[int, List]:
+        """
+        Строки блоков в виде, который можно дописать в архив на другие номера строк.
+
+        Сумма заказа (старая =SUM(F{a}:F{b}) или SUMIF) - ORDER_TOTAL_FORMULA,
+        остальные формулы со ссылками на строки - вычисленные значения
+        (дочитываются одним batchGet только при наличии таких формул).
+        """
+        values_by_row: Dict[int, List] = {}
+        computed_cells = []
+        for block, values in zip(blocks, fetched):
+            for offset, row_number in enumerate(block):
+                row = list(values[offset]) if offset < len(values) else []
+                for col, value in enumerate(row):
+                    if not (isinstance(value, str) and value.startswith('=')):
+                        continue
+                    if col == TOTAL_COLUMN:
+                        row[col] = self.sync.ORDER_TOTAL_FORMULA
+                    elif has_row_references(value):
+                        computed_cells.append((row_number, col))
+                values_by_row[row_number] = row
+
+        if computed_cells:
+            computed_blocks = split_blocks(sorted({row for row, _ in computed_cells}))
+            computed = self.sync.worksheet.batch_get(
+                [f'A{block[0]}:P{block[-1]}' for block in computed_blocks],
+                value_render_option=ValueRenderOption.unformatted,
+                date_time_render_option=DateTimeOption.formatted_string
+            )
+            computed_by_row = {
+                row_number: values[offset] if offset < len(values) else []
+                for block, values in zip(computed_blocks, computed)
+                for offset, row_number in enumerate(block)
+            }
+            for row_number, col in computed_cells:
+                value = computed_by_row[row_number]
+                values_by_row[row_number][col] = value[col] if col < len(value) else ''
+        return values_by_row
+
+    def _append(self, title: str, rows: List[List]) -> None:
+        self.sync.spreadsheet.values_append(
+            f"'{title}'!A1",
+            {'valueInputOption': 'USER_ENTERED', 'insertDataOption': 'INSERT_ROWS'},
+            {'values': rows}
+        )
+
+    def archive(self, dry_run: bool = False, today: Optional[date] = None) -> Dict[str, int]:
+        """
+        Перенести заказы в архив.
+
+        Args:
+            dry_run: Только посчитать, без изменений листов
+            today: Текущая дата (для тестов)
+
+        Returns:
+            {название архивного листа: количество перенесённых заказов}
+        """
+        sync = self.sync
+        if sync.worksheet is None or sync.spreadsheet is None:
+            raise RuntimeError("Worksheet не инициализирован")
+
+        cutoff = (today or date.today()) - timedelta(days=self.max_age_days)
+        snapshot = sync._load_snapshot()
+        selected = select_orders(snapshot, cutoff, self.period)
+        summary = {title: len(orders) for title, orders in selected.items()}
+        if not selected:
+            logger.info(f"🗄️ Нет завершённых заказов старше {cutoff.strftime('%d.%m.%Y')} для архивации")
+            return summary
+        logger.info(f"🗄️ К архивации: {sum(summary.values())} заказов → {summary}")
+        if dry_run:
+            return summary
+
+        # Исходные значения (формулы и даты как текст) всех переносимых строк - одним batchGet
+        row_numbers = sorted(r for orders in selected.values() for o in orders for r in snapshot.row_numbers(o))
+        blocks = split_blocks(row_numbers)
+        fetched = sync.worksheet.batch_get(
+            [f'A{block[0]}:P{block[-1]}' for block in blocks],
+            value_render_option=ValueRenderOption.formula,
+            date_time_render_option=DateTimeOption.formatted_string
+        )
+        values_by_row = self._portable_rows(blocks, fetched)
+
+        header = list(snapshot.row(1))
+        worksheets = {ws.title: ws for ws in get_metadata().worksheets(sync.spreadsheet)}
+        archived_at = datetime.now().strftime('%d.%m.%Y %H:%M')
+        index_rows = []
+        for title, orders in selected.items():
+            sync._track_write(lambda: self._get_or_create(worksheets, title, header))
+            rows = []
+            for order_number in orders:
+                order_rows = [values_by_row[r] for r in snapshot.row_numbers(order_number)]
+                rows.extend(order_rows)
+                index_rows.append([order_number, title, snapshot.row(snapshot.row_numbers(order_number)[0])[0],
+                                   len(order_rows), archived_at])
+            sync._track_write(lambda: self._append(title, rows))
+            logger.info(f"   📦 {title}: {len(orders)} заказов, {len(rows)} строк")
+
+        sync._track_write(lambda: self._get_or_create(worksheets, ARCHIVE_INDEX_TITLE, ARCHIVE_INDEX_HEADER))
+        sync._track_write(lambda: self._append(ARCHIVE_INDEX_TITLE, index_rows))
+
+        # Удаление из рабочего листа: блоки снизу вверх, одним batchUpdate
+        plan = SheetUpdatePlan(sync.worksheet, snapshot)
+        for block in reversed(blocks):
+            plan.delete_rows(block[0], block[-1])
+        sync._execute_plan(plan)
+
+        sync.snapshot = snapshot
+        try:
+            sync._save_mirror()
+        finally:
+            sync.snapshot = None
+        sync.archive_index = worksheets[ARCHIVE_INDEX_TITLE]
+        logger.success(f"✅ В архив перенесено заказов: {sum(summary.values())}, строк: {len(row_numbers)}")
+        return summary
+
+
+def archive_orders(dry_run: bool = False) -> Dict[str, int]:
+    """Архивировать старые заказы рабочего листа синхронизации."""
+    from sheets_sync import SheetsSynchronizer
+
+    sync = SheetsSynchronizer(Config.GOOGLE_CREDENTIALS_FILE)
+    if not sync.connect():
+        return {}
+    if not sync.open_sync_worksheet(Config.GOOGLE_SHEETS_URL, Config.GOOGLE_SHEETS_SYNC_GID):
+        return {}
+    return OrderArchiver(sync).archive(dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    archive_orders(dry_run='--dry-run' in sys.argv)
@@ -0,0 +1,145 @@
+"""
+Границы заказов в листе синхронизации.
+
+Правила оформления (как в прежнем add_group_borders):
+1. линия 1px сверху первой строки и снизу последней строки каждого заказа
+   (вся строка);
+2. линия 1px между группами товаров (mapped_name) внутри заказа (G-I).
+
+Границы считаются по итоговым строкам области, а соседние линии
+сливаются в один updateBorders: серия заказов по одной строке - это один
+запрос с top/bottom/innerHorizontal, а не две линии на каждый заказ.
+SheetUpdatePlan копит области, затронутые за синхронизацию, объединяет
+соседние и пересчитывает границы только в них - один раз, после всех
+вставок и удалений строк.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+SOLID = {"style": "SOLID", "width": 1, "color": {"red": 0, "green": 0, "blue": 0}}
+NONE = {"style": "NONE"}
+
+# Столбцы линий между группами товаров: G-I
+GROUP_COLUMNS = (6, 9)
+
+
+def merge_regions(regions: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Объединить пересекающиеся и соседние области строк (включительно)."""
+    merged: List[Tuple[int, int]] = []
+    for first, last in sorted(regions):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def border_lines(rows: List[List]) -> Tuple[Set[int], Set[int]]:
+    """
+    Линии границ области.
+
+    Линия k - верхняя граница строки k области (k = len(rows) - нижняя
+    граница последней строки).
+
+    Returns:
+        (линии заказов на всю строку, линии групп товаров G-I)
+    """
+    if not rows:
+        return set(), set()
+    order_lines = {0, len(rows)}
+    group_lines = set()
+    for idx in range(1, len(rows)):
+        previous, row = rows[idx - 1], rows[idx]
+        if _cell(row, 1) != _cell(previous, 1):
+            order_lines.add(idx)
+        elif _cell(row, 6) != _cell(previous, 6):
+            group_lines.add(idx)
+    return order_lines, group_lines
+
+
+def _cell(row: List, col: int) -> Any:
+    return row[col] if col < len(row) else ''
+
+
+def _runs(lines: Iterable[int]) -> List[Tuple[int, int]]:
+    runs: List[Tuple[int, int]] = []
+    for line in sorted(lines):
+        if runs and line == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], line)
+        else:
+            runs.append((line, line))
+    return runs
+
+
+def _grid(sheet_id: int, first_row: int, last_row: int, columns: Optional[Tuple[int, int]]) -> Dict[str, int]:
+    grid = {"sheetId": sheet_id, "startRowIndex": first_row - 1, "endRowIndex": last_row}
+    if columns:
+        # Без столбцов - граница на ВСЮ строку
+        grid["startColumnIndex"], grid["endColumnIndex"] = columns
+    return grid
+
+
+def line_requests(
+    sheet_id: int,
+    start_row: int,
+    lines: Iterable[int],
+    columns: Optional[Tuple[int, int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    updateBorders для линий области, соседние линии - одним запросом.
+
+    Серия линий p..q рисуется на строках p..q-1: top, innerHorizontal и bottom.
+    """
+    requests = []
+    for first, last in _runs(lines):
+        if first == last:
+            # Одиночная линия: верх строки или низ предыдущей (для нижней линии области)
+            if first == 0:
+                request = {"range": _grid(sheet_id, start_row, start_row, columns), "top": SOLID}
+            else:
+                row = start_row + first - 1
+                request = {"range": _grid(sheet_id, row, row, columns), "bottom": SOLID}
+        else:
+            request = {
+                "range": _grid(sheet_id, start_row + first, start_row + last - 1, columns),
+                "top": SOLID,
+                "bottom": SOLID
+            }
+            if last - first > 1:
+                request["innerHorizontal"] = SOLID
+        requests.append({"updateBorders": request})
+    return requests
+
+
+def clear_request(sheet_id: int, first_row: int, last_row: int) -> Dict[str, Any]:
+    """Очистить все границы (внешние и внутренние) строк first_row..last_row по всем столбцам."""
+    return {
+        "updateBorders": {
+            "range": _grid(sheet_id, first_row, last_row, None),
+            "top": NONE,
+            "bottom": NONE,
+            "left": NONE,
+            "right": NONE,
+            "innerHorizontal": NONE,
+            "innerVertical": NONE
+        }
+    }
+
+
+def region_requests(sheet_id: int, start_row: int, rows: List[List], clear: bool = True) -> List[Dict[str, Any]]:
+    """
+    Запросы оформления области: очистка и границы заказов и групп товаров.
+
+    Args:
+        sheet_id: ID листа
+        start_row: Первая строка области (начало заказа)
+        rows: Значения строк области (нужны B и G)
+        clear: Очистить прежние границы области перед рисованием
+    """
+    if not rows:
+        return []
+    order_lines, group_lines = border_lines(rows)
+    requests = [clear_request(sheet_id, start_row, start_row + len(rows) - 1)] if clear else []
+    requests.extend(line_requests(sheet_id, start_row, order_lines))
+    requests.extend(line_requests(sheet_id, start_row, group_lines, GROUP_COLUMNS))
+    return requests
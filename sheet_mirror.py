@@ -0,0 +1,220 @@
+"""
+Локальное зеркало листа синхронизации заказов в SQLite.
+
+Хранит значения A-P листа и время последнего изменения таблицы (Drive
+modifiedTime), с которым они совпадают. При следующей синхронизации:
+
+- таблица не менялась - снимок целиком берётся из зеркала, без чтения листа;
+- таблица менялась - читается только хвост листа A-P. Если номера
+  заказов (B) в хвосте совпадают с зеркалом, строки выше не сдвигались и
+  остаются из зеркала. Иначе дочитывается столбец B над хвостом: зеркало
+  расходится с ним только там, где строки вставляли или удаляли, и с
+  первой такой строки A-P читается из листа.
+
+Правки в старых строках не видны: такие строки отмечены в снимке
+(mirrored_rows), и перед сравнением заказов их блоки перечитываются из
+листа (refresh_rows). Если в перечитанных строках сменились номера
+заказов, строки сдвигали незаметно для хвоста (например, перенесли), и
+синхронизация читает лист целиком. После синхронизации зеркало
+сохраняется с временем изменения таблицы, только если её не менял никто,
+кроме самой синхронизации, - иначе оно сбрасывается (clear).
+"""
+
+import json
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import gspread
+from loguru import logger
+
+from sheet_snapshot import SNAPSHOT_COLUMNS, SheetSnapshot, split_blocks
+
+SHEET_MIRROR_FILE = 'sheet_mirror.sqlite3'
+# Сколько последних строк перечитывается при любом изменении таблицы
+TAIL_ROWS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_meta (
+    source TEXT PRIMARY KEY,
+    modified_time TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    row_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mirror_rows (
+    source TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    row_values TEXT NOT NULL,
+    PRIMARY KEY (source, row_number)
+);
+"""
+
+
+def _column_b(rows: Iterable[List]) -> List[str]:
+    return [str(row[1]) if len(row) > 1 and row[1] is not None else '' for row in rows]
+
+
+def first_difference(mirror_b: List[str], sheet_b: List[str]) -> Optional[int]:
+    """Номер первой строки (с 1), где столбец B зеркала и листа расходится."""
+    for row_number in range(1, max(len(mirror_b), len(sheet_b)) + 1):
+        left = mirror_b[row_number - 1] if row_number <= len(mirror_b) else ''
+        right = sheet_b[row_number - 1] if row_number <= len(sheet_b) else ''
+        if left != right:
+            return row_number
+    return None
+
+
+class SheetMirror:
+    """Зеркало значений A-P листа, привязанное к времени изменения таблицы."""
+
+    def __init__(self, db_path: str = SHEET_MIRROR_FILE, tail_rows: int = TAIL_ROWS):
+        """
+        Args:
+            db_path: Путь к файлу SQLite
+            tail_rows: Сколько последних строк перечитывать при изменении таблицы
+        """
+        self.db_path = Path(db_path)
+        self.tail_rows = tail_rows
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def load(self, source: str) -> Optional[Tuple[str, List[List]]]:
+        """
+        Время изменения и строки зеркала.
+
+        Returns:
+            (modified_time, строки A-P) или None, если зеркала нет или оно неполное
+        """
+        try:
+            with closing(self._connect()) as conn:
+                meta = conn.execute(
+                    "SELECT modified_time, row_count FROM mirror_meta WHERE source = ?",
+                    (source,)
+                ).fetchone()
+                if meta is None:
+                    return None
+                rows = [
+                    json.loads(row_values) for (row_values,) in conn.execute(
+                        "SELECT row_values FROM mirror_rows WHERE source = ? ORDER BY row_number",
+                        (source,)
+                    )
+                ]
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать зеркало листа: {e}")
+            return None
+
+        if len(rows) != meta[1]:
+            logger.warning("⚠️ Зеркало листа неполное - лист будет прочитан целиком")
+            return None
+        return meta[0], rows
+
+    def save(self, source: str, modified_time: str, rows: List[List]) -> bool:
+        """
+        Заменить зеркало источника (одной транзакцией).
+
+        Returns:
+            True если зеркало сохранено
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM mirror_rows WHERE source = ?", (source,))
+                conn.executemany(
+                    "INSERT INTO mirror_rows (source, row_number, row_values) VALUES (?, ?, ?)",
+                    (
+                        (source, row_number, json.dumps(row, ensure_ascii=False))
+                        for row_number, row in enumerate(rows, start=1)
+                    )
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO mirror_meta (source, modified_time, saved_at, row_count) "
+                    "VALUES (?, ?, ?, ?)",
+                    (source, modified_time, time.time(), len(rows))
+                )
+            logger.debug(f"💾 Зеркало листа сохранено: {len(rows)} строк ({modified_time})")
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Не удалось сохранить зеркало листа: {e}")
+            return False
+
+    def clear(self, source: str) -> None:
+        """Удалить зеркало источника: следующий снимок будет полным чтением."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM mirror_rows WHERE source = ?", (source,))
+                conn.execute("DELETE FROM mirror_meta WHERE source = ?", (source,))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Не удалось сбросить зеркало листа: {e}")
+
+    def load_snapshot(self, worksheet: gspread.Worksheet, source: str, modified_time: Optional[str]) -> SheetSnapshot:
+        """
+        Снимок листа: из зеркала, с дочитыванием изменившегося хвоста.
+
+        Args:
+            worksheet: Лист синхронизации
+            source: Идентификатор листа (таблица и gid)
+            modified_time: Текущее время изменения таблицы (None - неизвестно)
+        """
+        cached = self.load(source)
+        if cached is None:
+            logger.info("📸 Зеркала листа нет - полное чтение")
+            return SheetSnapshot.load(worksheet)
+
+        mirror_time, rows = cached
+        if modified_time and mirror_time == modified_time:
+            snapshot = SheetSnapshot(rows)
+            logger.info(f"⚡ Таблица не менялась ({modified_time}) - снимок из зеркала: {len(snapshot.rows)} строк")
+            return snapshot
+
+        tail_start = max(1, len(rows) - self.tail_rows + 1)
+        tail = worksheet.get_values(f'A{tail_start}:P')
+        mirror_b = _column_b(rows)
+
+        if tail_start > 1 and first_difference(mirror_b[tail_start - 1:], _column_b(tail)) is not None:
+            # Номера заказов в хвосте разошлись с зеркалом: строки могли вставлять
+            # или удалять выше - ищем первое расхождение в столбце B над хвостом
+            column_b = worksheet.get_values(f'B1:B{tail_start - 1}')
+            changed_from = first_difference(mirror_b[:tail_start - 1], [row[0] if row else '' for row in column_b])
+            if changed_from is not None:
+                logger.info(f"🔄 Зеркало расходится со столбцом B со строки {changed_from} - дочитываем A-P")
+                tail_start = changed_from
+                tail = worksheet.get_values(f'A{tail_start}:P')
+
+        snapshot = SheetSnapshot(rows[:tail_start - 1] + [list(row) for row in tail])
+        snapshot.mirrored_rows = tail_start - 1
+        logger.info(
+            f"📸 Снимок из зеркала: {tail_start - 1} строк из зеркала, "
+            f"{len(snapshot.rows) - tail_start + 1} прочитано из листа"
+        )
+        return snapshot
+
+    @staticmethod
+    def refresh_rows(worksheet: gspread.Worksheet, snapshot: SheetSnapshot, row_numbers: Iterable[int]) -> int:
+        """
+        Перечитать A-P указанных строк одним batchGet и обновить снимок.
+
+        Returns:
+            Количество перечитанных строк, в которых сменился номер заказа (B)
+        """
+        blocks = split_blocks(sorted(set(row_numbers)))
+        if not blocks:
+            return 0
+        ranges = [f'A{block[0]}:P{block[-1]}' for block in blocks]
+        moved = 0
+        for block, values in zip(blocks, worksheet.batch_get(ranges)):
+            values = [list(row) for row in values]
+            values.extend([] for _ in range(len(block) - len(values)))
+            values = [row + [''] * (SNAPSHOT_COLUMNS - len(row)) for row in values]
+            moved += sum(
+                1 for row_number, row in zip(block, values)
+                if str(row[1]) != str(snapshot.row(row_number)[1])
+            )
+            snapshot.update(block[0], 0, values)
+        count = sum(len(block) for block in blocks)
+        logger.debug(f"🔄 Перечитано строк заказов из листа: {count} ({len(blocks)} диапазонов)")
+        return moved
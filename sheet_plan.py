@@ -0,0 +1,434 @@
+"""
+План изменений листа синхронизации.
+
+Вместо отдельного HTTP-запроса на каждое действие (вставка строки,
+удаление, очистка, запись A-H, запись I-P, границы) update_order и
+добавление новых заказов складывают изменения в SheetUpdatePlan, а
+sync_orders выполняет его в конце синхронизации:
+
+1. spreadsheets.batchUpdate - вставки/удаления строк в исходном порядке,
+   затем границы (в итоговых номерах строк);
+2. spreadsheets.values.batchUpdate (USER_ENTERED) - все значения.
+
+Значения пишутся через Values API, а не updateCells: USER_ENTERED
+разбирает даты, числа и формулы так же, как прежние worksheet.update.
+Поэтому запланированные значения и границы хранятся в координатах
+"после всех изменений": каждая следующая вставка/удаление сдвигает уже
+запланированные ячейки, а ссылки на строки в формулах (=SUM(F10:F15))
+сдвигаются вместе с ними, как это сделал бы сам Google Sheets.
+
+Границы заказов не пересчитываются на каждый update_order: план копит
+затронутые области строк (mark_borders) и при выполнении строит границы
+один раз для объединённых областей по итоговому снимку (sheet_borders).
+
+Одинаковые подряд идущие строки (товар с quantity × split_units единиц)
+отправляются один раз: в Values API уходит первая строка серии, а
+остальные заполняются copyPaste в завершающем batchUpdate (вместе с
+границами). Объём запроса зависит от числа разных строк, а не единиц.
+
+batches() собирает те же запросы без отправки, а cost() считает по ним
+стоимость плана - на этом построен пробный прогон синхронизации
+(sync_planner).
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import gspread
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from loguru import logger
+
+from google_client import get_metadata
+from sheet_borders import merge_regions, region_requests
+from sheet_snapshot import SheetSnapshot
+
+# Ссылка на ячейку в формуле: F10, $F$10. Начало открытого диапазона (B2:B) не
+# ссылка на строку данных - такие диапазоны (формула сумм в E1) не сдвигаются
+_CELL_REF = re.compile(r'(\$?[A-Z]{1,3}\$?)(\d+)(?!\d|:\$?[A-Z]{1,3}(?![\w$]))')
+
+# Минимальная длина серии одинаковых строк, которую выгодно копировать на сервере
+MIN_REPLICATED_ROWS = 3
+
+
+def shift_formula_rows(formula: str, position: int, delta: int) -> str:
+    """
+    Сдвинуть ссылки на строки >= position на delta (delta < 0 - удаление).
+
+    При удалении ссылки внутрь удалённого диапазона прижимаются к position.
+    """
+    def replace(match: re.Match) -> str:
+        row = int(match.group(2))
+        if row >= position:
+            row = max(position, row + delta)
+        return f"{match.group(1)}{row}"
+    return _CELL_REF.sub(replace, formula)
+
+
+def has_row_references(formula: str) -> bool:
+    """Есть ли в формуле ссылки на конкретные строки (F10, $F$10:F12)."""
+    return bool(_CELL_REF.search(formula))
+
+
+class SheetUpdatePlan:
+    """Накопитель изменений листа, выполняемый двумя пакетными запросами."""
+
+    def __init__(self, worksheet: gspread.Worksheet, snapshot: Optional[SheetSnapshot] = None):
+        """
+        Args:
+            worksheet: Лист синхронизации
+            snapshot: Снимок листа; все изменения плана повторяются в нём
+        """
+        self.worksheet = worksheet
+        self.sheet_id = worksheet.id
+        self.snapshot = snapshot
+        self.structural: List[Dict[str, Any]] = []
+        self.formatting: List[Dict[str, Any]] = []
+        # (строка, столбец с 0) → значение, в итоговых координатах
+        self.cells: Dict[Tuple[int, int], Any] = {}
+        # Области строк (включительно), границы которых пересчитываются при выполнении
+        self.border_regions: List[Tuple[int, int]] = []
+
+    # ------------------------------------------------------------------
+    # Структура
+
+    def _shift(self, position: int, delta: int) -> None:
+        """Сдвинуть запланированные ячейки и границы после вставки/удаления."""
+        deleted_end = position - delta - 1 if delta < 0 else None
+
+        cells: Dict[Tuple[int, int], Any] = {}
+        for (row, col), value in self.cells.items():
+            if deleted_end is not None and position <= row <= deleted_end:
+                continue
+            # Формулы заголовка (E1) относятся к столбцу целиком, а не к сдвигаемым строкам
+            if isinstance(value, str) and value.startswith('=') and row > 1:
+                value = shift_formula_rows(value, position, delta)
+            cells[(row + delta if row >= position else row, col)] = value
+        self.cells = cells
+
+        formatting = []
+        for request in self.formatting:
+            grid = next(iter(request.values()))['range']
+            # Индексы API: startRowIndex = строка - 1, endRowIndex не включается
+            span = self._shift_span(grid['startRowIndex'] + 1, grid['endRowIndex'], position, delta)
+            if span is None:
+                continue  # Диапазон удалён целиком
+            grid['startRowIndex'], grid['endRowIndex'] = span[0] - 1, span[1]
+            formatting.append(request)
+        self.formatting = formatting
+
+        regions = [self._shift_span(first, last, position, delta) for first, last in self.border_regions]
+        self.border_regions = [region for region in regions if region is not None]
+
+    @staticmethod
+    def _shift_span(start: int, end: int, position: int, delta: int) -> Optional[Tuple[int, int]]:
+        """Сдвинуть строки start..end (включительно); None - если они удалены целиком."""
+        if delta < 0:
+            deleted_end = position - delta - 1
+            if end >= position:
+                end = end + delta if end > deleted_end else position - 1
+            if start >= position:
+                start = start + delta if start > deleted_end else position
+            if end < start:
+                return None
+        else:
+            if start >= position:
+                start += delta
+            if end >= position:
+                end += delta
+        return start, end
+
+    def insert_rows(self, position: int, count: int) -> None:
+        """Вставить count пустых строк перед строкой position."""
+        if count <= 0:
+            return
+        self.structural.append({
+            "insertDimension": {
+                "range": {
+                    "sheetId": self.sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": position - 1,
+                    "endIndex": position - 1 + count
+                },
+                "inheritFromBefore": False
+            }
+        })
+        self._shift(position, count)
+        if self.snapshot:
+            self.snapshot.insert_rows(position, count)
+
+    def delete_rows(self, start_row: int, end_row: int) -> None:
+        """Удалить строки start_row..end_row включительно."""
+        if end_row < start_row:
+            return
+        self.structural.append({
+            "deleteDimension": {
+                "range": {
+                    "sheetId": self.sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": start_row - 1,
+                    "endIndex": end_row
+                }
+            }
+        })
+        self._shift(start_row, -(end_row - start_row + 1))
+        if self.snapshot:
+            self.snapshot.delete_rows(start_row, end_row)
+
+    # ------------------------------------------------------------------
+    # Значения и оформление
+
+    def update(self, start_row: int, start_col: int, values: List[List]) -> None:
+        """
+        Записать прямоугольник значений (USER_ENTERED).
+
+        Args:
+            start_row: Первая строка (1-индексация)
+            start_col: Первый столбец (0 = A)
+            values: Строки значений
+        """
+        for row_offset, row_values in enumerate(values):
+            for col_offset, value in enumerate(row_values):
+                self.cells[(start_row + row_offset, start_col + col_offset)] = value
+        if self.snapshot:
+            self.snapshot.update(start_row, start_col, values)
+
+    def add_requests(self, requests: List[Dict[str, Any]]) -> None:
+        """Добавить запросы оформления с диапазоном строк (updateBorders и т.п.)."""
+        for request in requests:
+            grid = next(iter(request.values()))['range']
+            if 'startRowIndex' not in grid or 'endRowIndex' not in grid:
+                raise ValueError("Запрос оформления должен содержать startRowIndex и endRowIndex")
+            self.formatting.append(request)
+
+    def mark_borders(self, first_row: int, last_row: int) -> None:
+        """
+        Пересчитать границы строк first_row..last_row при выполнении плана.
+
+        Область должна состоять из целых заказов. Границы строятся по
+        итоговым значениям снимка, поэтому план без снимка их не поддерживает.
+        """
+        if self.snapshot is None:
+            raise ValueError("Пересчёт границ по областям требует снимка листа")
+        if last_row >= first_row:
+            self.border_regions.append((first_row, last_row))
+
+    def border_requests(self) -> List[Dict[str, Any]]:
+        """Очистка и границы для объединённых областей (по итоговому снимку)."""
+        requests: List[Dict[str, Any]] = []
+        for first, last in merge_regions(self.border_regions):
+            requests.extend(region_requests(self.sheet_id, first, self.snapshot.get_rows(range(first, last + 1))))
+        return requests
+
+    def is_empty(self) -> bool:
+        return not (self.structural or self.formatting or self.cells or self.border_regions)
+
+    def _grid(self, first_row: int, last_row: int, col_start: int, col_end: int) -> Dict[str, int]:
+        return {
+            "sheetId": self.sheet_id,
+            "startRowIndex": first_row - 1,
+            "endRowIndex": last_row,
+            "startColumnIndex": col_start,
+            "endColumnIndex": col_end + 1
+        }
+
+    def replicated_rows(self) -> Tuple[Dict[Tuple[int, int], Any], List[Dict[str, Any]]]:
+        """
+        Свернуть серии одинаковых строк.
+
+        Строка входит в серию, если её ячейки образуют один отрезок столбцов
+        без формул (относительные ссылки при копировании сдвинулись бы)
+        и совпадают с предыдущей строкой.
+
+        Returns:
+            (ячейки для Values API, запросы copyPaste для остальных строк серий)
+        """
+        rows: Dict[int, Dict[int, Any]] = {}
+        for (row, col), value in self.cells.items():
+            rows.setdefault(row, {})[col] = value
+
+        def signature(row: int) -> Optional[Tuple]:
+            values = rows.get(row)
+            if not values:
+                return None
+            cols = sorted(values)
+            if cols[-1] - cols[0] + 1 != len(cols):
+                return None
+            if any(isinstance(v, str) and v.startswith('=') for v in values.values()):
+                return None
+            return tuple((col, repr(values[col])) for col in cols)
+
+        cells = dict(self.cells)
+        copies: List[Dict[str, Any]] = []
+        ordered = sorted(rows)
+        idx = 0
+        while idx < len(ordered):
+            first = ordered[idx]
+            key = signature(first)
+            last = first
+            while (idx + 1 < len(ordered) and ordered[idx + 1] == last + 1
+                   and key is not None and signature(ordered[idx + 1]) == key):
+                idx += 1
+                last = ordered[idx]
+            idx += 1
+            if key is None or last - first + 1 < MIN_REPLICATED_ROWS:
+                continue
+            col_start, col_end = key[0][0], key[-1][0]
+            for row in range(first + 1, last + 1):
+                for col in range(col_start, col_end + 1):
+                    del cells[(row, col)]
+            copies.append({
+                "copyPaste": {
+                    "source": self._grid(first, first, col_start, col_end),
+                    "destination": self._grid(first + 1, last, col_start, col_end),
+                    "pasteType": "PASTE_NORMAL",
+                    "pasteOrientation": "NORMAL"
+                }
+            })
+        return cells, copies
+
+    def value_ranges(self, cells: Optional[Dict[Tuple[int, int], Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Ячейки, собранные в прямоугольные диапазоны.
+
+        Соседние ячейки строки объединяются в отрезок, одинаковые отрезки
+        соседних строк - в один диапазон.
+
+        Args:
+            cells: Ячейки для записи (по умолчанию - все ячейки плана)
+        """
+        cells = self.cells if cells is None else cells
+        runs: Dict[int, List[Tuple[int, int]]] = {}
+        for row, col in sorted(cells):
+            row_runs = runs.setdefault(row, [])
+            if row_runs and row_runs[-1][1] == col - 1:
+                row_runs[-1] = (row_runs[-1][0], col)
+            else:
+                row_runs.append((col, col))
+
+        blocks: List[Tuple[int, int, int, int]] = []  # (первая строка, последняя, col_start, col_end)
+        open_blocks: Dict[Tuple[int, int], int] = {}
+        for row in sorted(runs):
+            next_open: Dict[Tuple[int, int], int] = {}
+            for span in runs[row]:
+                idx = open_blocks.get(span)
+                if idx is not None and blocks[idx][1] == row - 1:
+                    first, _, col_start, col_end = blocks[idx]
+                    blocks[idx] = (first, row, col_start, col_end)
+                else:
+                    idx = len(blocks)
+                    blocks.append((row, row, span[0], span[1]))
+                next_open[span] = idx
+            open_blocks = next_open
+
+        ranges = []
+        for first, last, col_start, col_end in blocks:
+            a1 = f"{rowcol_to_a1(first, col_start + 1)}:{rowcol_to_a1(last, col_end + 1)}"
+            ranges.append({
+                'range': absolute_range_name(self.worksheet.title, a1),
+                'values': [
+                    [cells[(row, col)] for col in range(col_start, col_end + 1)]
+                    for row in range(first, last + 1)
+                ]
+            })
+        return ranges
+
+    def batches(self) -> Tuple[List[Tuple[str, Dict[str, Any]]], 'PlanCost']:
+        """
+        Запросы, которыми будет выполнен план, без отправки.
+
+        Returns:
+            ([(метод Spreadsheet, тело запроса), ...] в порядке отправки, стоимость плана)
+        """
+        cells, copies = self.replicated_rows()
+        formatting = self.formatting + self.border_requests()
+        batches: List[Tuple[str, Dict[str, Any]]] = []
+        # Копирование возможно только после записи исходных строк - тогда
+        # оформление уходит вместе с ним в завершающий batchUpdate
+        requests = self.structural if copies else self.structural + formatting
+        if requests:
+            batches.append(('batch_update', {"requests": requests}))
+        value_ranges = self.value_ranges(cells)
+        if value_ranges:
+            batches.append(('values_batch_update', {
+                "valueInputOption": "USER_ENTERED",
+                "data": value_ranges
+            }))
+        if copies:
+            batches.append(('batch_update', {"requests": copies + formatting}))
+
+        cost = PlanCost()
+        for request in self.structural:
+            kind, body = next(iter(request.items()))
+            rows = body['range']['endIndex'] - body['range']['startIndex']
+            if kind == 'insertDimension':
+                cost.inserted_rows += rows
+            else:
+                cost.deleted_rows += rows
+        cost.structural = len(self.structural)
+        cost.formatting = len(formatting)
+        cost.border_requests = sum(1 for request in formatting if 'updateBorders' in request)
+        cost.cells = len(self.cells)
+        cost.cells_sent = len(cells)
+        cost.value_ranges = len(value_ranges)
+        cost.copies = len(copies)
+        cost.calls = len(batches)
+        cost.payload_bytes = sum(len(json.dumps(body, ensure_ascii=False).encode('utf-8')) for _, body in batches)
+        return batches, cost
+
+    def cost(self) -> 'PlanCost':
+        """Стоимость выполнения плана: запросы, ячейки, объём (план не меняется)."""
+        return self.batches()[1]
+
+    def execute(self, spreadsheet: gspread.Spreadsheet) -> int:
+        """
+        Выполнить план.
+
+        Returns:
+            Количество HTTP-запросов к API
+        """
+        batches, cost = self.batches()
+        try:
+            for method, body in batches:
+                getattr(spreadsheet, method)(body)
+        finally:
+            if cost.structural:
+                # Размеры листов в кеше метаданных (row_count) устарели после вставки/удаления строк
+                get_metadata().invalidate(spreadsheet.id)
+        logger.info(
+            f"📦 План листа выполнен: {cost.structural} изменений строк, "
+            f"{cost.formatting} запросов оформления, {cost.value_ranges} диапазонов значений "
+            f"({cost.cells_sent} из {cost.cells} ячеек, копирований: {cost.copies}) за {cost.calls} запрос(а)"
+        )
+        self.structural, self.formatting, self.cells, self.border_regions = [], [], {}, []
+        return cost.calls
+
+
+class PlanCost:
+    """Стоимость выполнения SheetUpdatePlan."""
+
+    def __init__(self):
+        self.inserted_rows = 0
+        self.deleted_rows = 0
+        # Запросы insertDimension/deleteDimension
+        self.structural = 0
+        # Запросы оформления (из них updateBorders - border_requests)
+        self.formatting = 0
+        self.border_requests = 0
+        # Ячейки плана и отправленные в Values API (остальные копируются copyPaste)
+        self.cells = 0
+        self.cells_sent = 0
+        self.value_ranges = 0
+        self.copies = 0
+        # HTTP-запросы на запись и объём их тел в байтах
+        self.calls = 0
+        self.payload_bytes = 0
+
+    def summary(self) -> str:
+        return (
+            f"вставок строк: {self.inserted_rows}, удалений строк: {self.deleted_rows}, "
+            f"ячеек: {self.cells_sent} из {self.cells} (диапазонов: {self.value_ranges}, "
+            f"копирований: {self.copies}), оформления: {self.formatting} "
+            f"(границ: {self.border_requests}), запросов: {self.calls}, "
+            f"объём: {self.payload_bytes / 1024:.1f} КБ"
+        )
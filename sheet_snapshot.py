@@ -0,0 +1,147 @@
+"""
+Снимок листа синхронизации заказов в памяти.
+
+SheetsSynchronizer.sync_orders читает столбцы A-P один раз за
+синхронизацию и дальше работает с этим снимком: номера строк заказа,
+непрерывные блоки и значения A-P берутся из индекса, а вставки,
+удаления и записи строк повторяются локально, чтобы следующие заказы
+видели актуальные позиции без повторного чтения листа.
+
+Записанные значения хранятся так, как они отправлены (формулы -
+текстом), поэтому для вычисляемых столбцов (E, J) снимок может
+отличаться от отображаемых значений листа.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import gspread
+from loguru import logger
+
+# Столбцы A-P
+SNAPSHOT_COLUMNS = 16
+SNAPSHOT_RANGE = 'A:P'
+
+# Значения столбца B, которые не являются номерами заказов
+HEADER_ORDER_VALUES = ('order_number', 'Номер заказа', '')
+
+
+def _pad(row: Iterable, width: int = SNAPSHOT_COLUMNS) -> List[str]:
+    values = ['' if value is None else value for value in row][:width]
+    values.extend([''] * (width - len(values)))
+    return values
+
+
+def split_blocks(row_numbers: List[int]) -> List[List[int]]:
+    """Разбить отсортированные номера строк на непрерывные блоки."""
+    blocks: List[List[int]] = []
+    for row_number in row_numbers:
+        if blocks and row_number == blocks[-1][-1] + 1:
+            blocks[-1].append(row_number)
+        else:
+            blocks.append([row_number])
+    return blocks
+
+
+class SheetSnapshot:
+    """Значения A-P листа и индекс order_number → номера строк."""
+
+    def __init__(self, values: List[List[str]]):
+        """
+        Args:
+            values: Строки листа начиная с первой (столбцы A-P)
+        """
+        self.rows: List[List[str]] = [_pad(row) for row in values]
+        self._index: Optional[Dict[str, List[int]]] = None
+        # Первые строки, взятые из зеркала без проверки (могли измениться в листе)
+        self.mirrored_rows = 0
+
+    @classmethod
+    def load(cls, worksheet: gspread.Worksheet) -> 'SheetSnapshot':
+        """Прочитать лист одним запросом."""
+        values = worksheet.get_values(SNAPSHOT_RANGE)
+        snapshot = cls(values)
+        logger.info(f"📸 Снимок листа: {len(snapshot.rows)} строк, заказов: {len(snapshot.order_numbers())}")
+        return snapshot
+
+    # ------------------------------------------------------------------
+    # Индекс заказов
+
+    @property
+    def index(self) -> Dict[str, List[int]]:
+        """order_number → номера строк (1-индексация, по возрастанию)."""
+        if self._index is None:
+            index: Dict[str, List[int]] = {}
+            for row_number, row in enumerate(self.rows, start=1):
+                order_number = str(row[1])
+                if order_number not in HEADER_ORDER_VALUES:
+                    index.setdefault(order_number, []).append(row_number)
+            self._index = index
+        return self._index
+
+    def order_numbers(self) -> set:
+        return set(self.index)
+
+    def __contains__(self, order_number: object) -> bool:
+        return str(order_number) in self.index
+
+    def row_numbers(self, order_number: str) -> List[int]:
+        return list(self.index.get(str(order_number), []))
+
+    def blocks(self, order_number: str) -> List[List[int]]:
+        """Непрерывные блоки строк заказа."""
+        return split_blocks(self.row_numbers(order_number))
+
+    def get_rows(self, row_numbers: Iterable[int]) -> List[List[str]]:
+        """Значения A-P указанных строк (копии)."""
+        return [list(self.row(row_number)) for row_number in row_numbers]
+
+    def row(self, row_number: int) -> List[str]:
+        if 1 <= row_number <= len(self.rows):
+            return self.rows[row_number - 1]
+        return [''] * SNAPSHOT_COLUMNS
+
+    def next_free_row(self) -> int:
+        """
+        Строка для дописывания новых заказов.
+
+        Как и прежнее чтение столбца A: количество непустых ячеек A + 1.
+        """
+        return sum(1 for row in self.rows if isinstance(row[0], str) and row[0].strip()) + 1
+
+    # ------------------------------------------------------------------
+    # Локальное повторение изменений листа
+
+    def update(self, start_row: int, start_col: int, values: List[List]) -> None:
+        """
+        Записать прямоугольник значений.
+
+        Args:
+            start_row: Первая строка (1-индексация)
+            start_col: Первый столбец (0 = A)
+            values: Строки значений
+        """
+        last_row = start_row + len(values) - 1
+        while len(self.rows) < last_row:
+            self.rows.append([''] * SNAPSHOT_COLUMNS)
+        for offset, row_values in enumerate(values):
+            row = self.rows[start_row - 1 + offset]
+            for col, value in enumerate(row_values, start=start_col):
+                if col < SNAPSHOT_COLUMNS:
+                    row[col] = '' if value is None else value
+        if start_col <= 1 < start_col + max((len(v) for v in values), default=0):
+            self._index = None
+
+    def insert_rows(self, position: int, count: int) -> None:
+        """Вставить count пустых строк перед строкой position."""
+        if count <= 0:
+            return
+        at = min(position - 1, len(self.rows))
+        self.rows[at:at] = [[''] * SNAPSHOT_COLUMNS for _ in range(count)]
+        self._index = None
+
+    def delete_rows(self, start_row: int, end_row: int) -> None:
+        """Удалить строки start_row..end_row включительно."""
+        if end_row < start_row:
+            return
+        del self.rows[start_row - 1:end_row]
+        self._index = None
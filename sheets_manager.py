@@ -4,30 +4,31 @@
 """
 
 import gspread
-from google.oauth2.service_account import Credentials
 from loguru import logger
 from typing import List, Dict, Optional
-import re
+
+from catalog_snapshot import CATALOG_SNAPSHOT_FILE, CatalogSnapshot
+from config import Config
+from product_index import ProductIndex
+from google_client import get_client, get_metadata
 
 
 class SheetsManager:
     """Менеджер для работы с Google Sheets."""
     
-    SCOPES = [
-        'https://www.googleapis.com/auth/spreadsheets.readonly',
-        'https://www.googleapis.com/auth/drive.readonly'
-    ]
-    
-    def __init__(self, credentials_file: str):
+    def __init__(self, credentials_file: str, snapshot_file: Optional[str] = CATALOG_SNAPSHOT_FILE):
         """
         Инициализация менеджера.
         
         Args:
             credentials_file: Путь к JSON файлу с credentials от Google
+            snapshot_file: Путь к локальному снимку каталога (None - без снимка)
         """
         self.credentials_file = credentials_file
         self.client: Optional[gspread.Client] = None
         self.products_cache: List[Dict[str, str]] = []
+        self._index: Optional[ProductIndex] = None
+        self.snapshot = CatalogSnapshot(snapshot_file) if snapshot_file else None
         
     def connect(self) -> bool:
         """
@@ -38,11 +39,8 @@ class SheetsManager:
         """
         try:
             logger.info("Подключение к Google Sheets API...")
-            creds = Credentials.from_service_account_file(
-                self.credentials_file,
-                scopes=self.SCOPES
-            )
-            self.client = gspread.authorize(creds)
+            # Общий на процесс клиент с правами только на чтение
+            self.client = get_client(self.credentials_file, readonly=True)
             logger.info("✅ Успешно подключились к Google Sheets API")
             return True
         except Exception as e:
@@ -75,13 +73,27 @@ class SheetsManager:
             if self.client is None:
                 raise RuntimeError("Google Sheets client не инициализирован. Вызовите connect() сначала.")
             
-            # Открываем таблицу
-            spreadsheet = self.client.open_by_url(spreadsheet_url)
+            # Открываем таблицу (из общего кеша метаданных)
+            metadata = get_metadata()
+            spreadsheet = metadata.open(self.client, spreadsheet_url)
             
             # Открываем лист "Настройки"
-            worksheet = spreadsheet.worksheet(sheet_name)
+            worksheet = metadata.worksheet_by_title(spreadsheet, sheet_name)
+            if worksheet is None:
+                raise RuntimeError(f"Лист {sheet_name!r} не найден")
             logger.info(f"📄 Открыт лист: {worksheet.title}")
             
+            # Если каталог не менялся с прошлого запуска - берём его из снимка
+            source = f"{spreadsheet.id}:{sheet_name}!{columns_range}"
+            version = self._get_catalog_version(worksheet) if self.snapshot else None
+            if self.snapshot and version:
+                products = self.snapshot.load(source, version, max_age=Config.CATALOG_SNAPSHOT_MAX_AGE_HOURS * 3600)
+                if products is not None:
+                    logger.info(f"⚡ Каталог не менялся ({version}) - загружен из снимка: {len(products)} товаров")
+                    self.products_cache = products
+                    self._index = None  # индекс строится при первом поиске
+                    return products
+            
             # Получаем все данные из диапазона
             all_values = worksheet.get(columns_range)
             
@@ -89,51 +101,87 @@ class SheetsManager:
                 logger.warning("⚠️ Таблица пустая")
                 return []
             
-            # Парсим данные: каждые 4 столбца = [цена, наименование, тип, номер заказа]
-            products = []
-            unique_products = set()  # Для отслеживания уникальных (name, type)
-            
-            # Проходим по каждой строке
-            for row_idx, row in enumerate(all_values, start=1):
-                # Обрабатываем каждую четвёрку столбцов
-                for col_idx in range(0, len(row), 4):
-                    if col_idx + 2 >= len(row):
-                        break  # Недостаточно столбцов для полной четвёрки (минимум нужны price, name, type)
-                    
-                    price = row[col_idx].strip() if col_idx < len(row) else ""
-                    name = row[col_idx + 1].strip() if col_idx + 1 < len(row) else ""
-                    product_type = row[col_idx + 2].strip() if col_idx + 2 < len(row) else ""
-                    # Четвёртый столбец (номер заказа) игнорируем
-                    # order_number = row[col_idx + 3].strip() if col_idx + 3 < len(row) else ""
-                    
-                    # Пропускаем пустые или заголовочные строки
-                    if not name or name.lower() in ['наименование', 'название', 'товар']:
-                        continue
-                    
-                    # Пропускаем если тип пустой
-                    if not product_type or product_type.lower() in ['тип', 'категория']:
-                        continue
-                    
-                    # Создаём уникальный ключ
-                    unique_key = (name.lower(), product_type.lower())
-                    
-                    if unique_key not in unique_products:
-                        unique_products.add(unique_key)
-                        products.append({
-                            'name': name,
-                            'type': product_type,
-                            'price': price  # Для справки
-                        })
-                        logger.debug(f"Добавлен товар: {name} ({product_type})")
+            products = self._parse_products(all_values)
+            if self.snapshot and version:
+                self.snapshot.save(source, version, products)
             
             logger.info(f"✅ Загружено уникальных товаров: {len(products)}")
             self.products_cache = products
+            self._index = None  # индекс строится при первом поиске
             return products
             
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки данных из Google Sheets: {e}")
             return []
     
+    @staticmethod
+    def _get_catalog_version(worksheet: gspread.Worksheet, cell: Optional[str] = None) -> Optional[str]:
+        """
+        Версия каталога - значение контрольной ячейки (одно чтение) или None.
+        
+        Ячейка с формулой CATALOG_CHECKSUM_FORMULA настраивается вручную (см.
+        catalog_snapshot) и здесь только читается. Время изменения всей таблицы
+        не подходит: её меняет и синхронизация заказов.
+        """
+        cell = Config.CATALOG_CHECKSUM_CELL if cell is None else cell
+        if not cell:
+            return None
+        try:
+            values = worksheet.get(cell)
+            version = str(values[0][0]).strip() if values and values[0] else ''
+            if not version:
+                logger.warning(
+                    f"⚠️ Контрольная ячейка {cell} листа {worksheet.title!r} пуста - "
+                    f"снимок каталога не используется (см. catalog_snapshot)"
+                )
+            return version or None
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось получить версию каталога, снимок не используется: {e}")
+            return None
+    
+    @staticmethod
+    def _parse_products(all_values: List[List[str]]) -> List[Dict[str, str]]:
+        """
+        Разобрать значения листа в список уникальных товаров.
+        
+        Структура: каждые 4 столбца = [цена, наименование, тип, номер заказа]
+        """
+        products = []
+        unique_products = set()  # Для отслеживания уникальных (name, type)
+        
+        # Проходим по каждой строке
+        for row in all_values:
+            # Обрабатываем каждую четвёрку столбцов
+            for col_idx in range(0, len(row), 4):
+                if col_idx + 2 >= len(row):
+                    break  # Недостаточно столбцов для полной четвёрки (минимум нужны price, name, type)
+                
+                price = row[col_idx].strip()
+                name = row[col_idx + 1].strip()
+                product_type = row[col_idx + 2].strip()
+                # Четвёртый столбец (номер заказа) игнорируем
+                
+                # Пропускаем пустые или заголовочные строки
+                if not name or name.lower() in ['наименование', 'название', 'товар']:
+                    continue
+                
+                # Пропускаем если тип пустой
+                if not product_type or product_type.lower() in ['тип', 'категория']:
+                    continue
+                
+                # Создаём уникальный ключ
+                unique_key = (name.lower(), product_type.lower())
+                
+                if unique_key not in unique_products:
+                    unique_products.add(unique_key)
+                    products.append({
+                        'name': name,
+                        'type': product_type,
+                        'price': price  # Для справки
+                    })
+        
+        return products
+    
     def get_products(self) -> List[Dict[str, str]]:
         """Получить кешированный список товаров."""
         return self.products_cache
@@ -151,34 +199,8 @@ class SheetsManager:
         if not self.products_cache:
             return []
         
-        search_lower = search_name.lower()
-        similar = []
-        
-        for product in self.products_cache:
-            product_name_lower = product['name'].lower()
-            
-            # Точное совпадение
-            if product_name_lower == search_lower:
-                similar.insert(0, {**product, 'match_score': 100})
-                continue
-            
-            # Содержит полное название
-            if search_lower in product_name_lower or product_name_lower in search_lower:
-                similar.append({**product, 'match_score': 80})
-                continue
-            
-            # Проверка по ключевым словам
-            search_words = set(re.findall(r'\w+', search_lower))
-            product_words = set(re.findall(r'\w+', product_name_lower))
-            
-            if search_words and product_words:
-                common_words = search_words & product_words
-                if common_words:
-                    score = int((len(common_words) / max(len(search_words), len(product_words))) * 70)
-                    if score >= 30:  # Минимальный порог похожести
-                        similar.append({**product, 'match_score': score})
-        
-        # Сортируем по score
-        similar.sort(key=lambda x: x['match_score'], reverse=True)
+        # Индекс перестраивается только если кеш каталога заменили
+        if self._index is None or self._index.products is not self.products_cache:
+            self._index = ProductIndex(self.products_cache)
         
-        return similar[:5]  # Топ-5 похожих
\ No newline at end of file
+        return self._index.search(search_name)  # Топ-5 похожих
@@ -5,22 +5,25 @@ MVP версия: базовая запись новых заказов.
 
 import gspread
 import json
-from google.oauth2.service_account import Credentials
 from loguru import logger
-from typing import List, Dict, Optional, Any, cast
+from typing import List, Dict, Optional, Any, Callable
 from config import Config
 from notifier import sync_send_message, sync_wait_for_input
-import time
+from google_client import get_client, get_metadata
+from quota_client import get_budget
+from mappings_store import get_store
+from row_diff import RowDiff, diff_order_rows, has_user_data
+from sheet_archive import ARCHIVE_INDEX_TITLE
+from sheet_borders import clear_request, region_requests
+from sheet_mirror import SHEET_MIRROR_FILE, SheetMirror
+from sheet_plan import SheetUpdatePlan
+from sheet_snapshot import SheetSnapshot, split_blocks
+from sync_planner import SyncPlanReport, scattered_orders
 
 
 class SheetsSynchronizer:
     """Класс для синхронизации заказов с Google Sheets."""
     
-    SCOPES = [
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    
     # Маппинг статусов для столбца D
     STATUS_MAPPING = {
         'получен': 'TRUE',      # Галочка
@@ -29,6 +32,22 @@ class SheetsSynchronizer:
         'отменен': 'отменен'    # Текст
     }
     
+    # Сумма заказа в первой строке заказа: SUMIF по номеру заказа этой строки
+    # в окне из ORDER_TOTAL_MAX_ROWS строк, начиная с неё (строки заказа идут
+    # подряд после сортировки). Без номеров строк - устойчива к вставке и
+    # удалению строк; окно вместо столбца целиком - пересчёт не растёт с листом
+    ORDER_TOTAL_MAX_ROWS = 200
+    ORDER_TOTAL_FORMULA = (
+        f'=SUMIF(INDEX(B:B,ROW()):INDEX(B:B,ROW()+{ORDER_TOTAL_MAX_ROWS - 1}),'
+        f'INDEX(B:B,ROW()),'
+        f'INDEX(F:F,ROW()):INDEX(F:F,ROW()+{ORDER_TOTAL_MAX_ROWS - 1}))'
+    )
+    # Режим 'arrayformula': одна формула в E1 - сумма в первой строке каждого заказа
+    ARRAY_TOTAL_FORMULA = (
+        '={"{header}";ARRAYFORMULA(IF(B2:B="","",'
+        'IF(B2:B<>ARRAY_CONSTRAIN(B1:B,ROWS(B2:B),1),SUMIF(B2:B,B2:B,F2:F),"")))}'
+    )
+    
     # Приоритет статусов для сортировки (используем маппированные значения)
     STATUS_PRIORITY = {
         'TRUE': 1,      # получен → TRUE
@@ -37,30 +56,37 @@ class SheetsSynchronizer:
         'отменен': 4
     }
     
-    def __init__(self, credentials_file: str):
+    def __init__(self, credentials_file: str, mirror_file: Optional[str] = SHEET_MIRROR_FILE):
         """
         Инициализация синхронизатора.
         
         Args:
             credentials_file: Путь к JSON файлу с credentials от Google
+            mirror_file: Путь к локальному зеркалу листа (None - без зеркала)
         """
         self.credentials_file = credentials_file
         self.client: Optional[gspread.Client] = None
         self.spreadsheet: Optional[gspread.Spreadsheet] = None
         self.worksheet: Optional[gspread.Worksheet] = None
         self._lost_i_p_values: List[Dict[str, Any]] = []  # Список потерянных значений колонок I-P
-        self.product_mappings: Dict[str, Any] = {}  # Загруженные маппинги товаров
-        self._load_product_mappings()
-    
-    def _load_product_mappings(self) -> None:
-        """Загрузить product_mappings.json для получения split_units."""
-        try:
-            with open('product_mappings.json', 'r', encoding='utf-8') as f:
-                self.product_mappings = json.load(f)
-            logger.debug(f"Загружено {len(self.product_mappings)} товаров из product_mappings.json")
-        except Exception as e:
-            logger.warning(f"Не удалось загрузить product_mappings.json: {e}")
-            self.product_mappings = {}
+        # Общий индекс сопоставлений (split_units предрассчитаны при загрузке)
+        self.mappings_store = get_store(Config.PRODUCT_MAPPINGS_FILE)
+        # Снимок листа на время sync_orders (одно чтение A-P за синхронизацию)
+        self.snapshot: Optional[SheetSnapshot] = None
+        # План изменений листа на время sync_orders (выполняется пакетно в конце)
+        self.plan: Optional[SheetUpdatePlan] = None
+        # Локальное зеркало листа: снимок без полного чтения, если таблица не менялась
+        self.mirror = SheetMirror(mirror_file) if mirror_file else None
+        # Время изменения таблицы, которому соответствует снимок;
+        # None - таблицу менял кто-то ещё, снимок нельзя сохранять в зеркало
+        self._mirror_time: Optional[str] = None
+        # Были ли наши записи после снимка (время проверяется перед первой из них)
+        self._mirror_written = False
+        # Лист-индекс архива заказов (sheet_archive), None - архива нет
+        self.archive_index: Optional[gspread.Worksheet] = None
+        # Пробный прогон sync_orders: план не выполняется, итог - в plan_report
+        self.plan_only = False
+        self.plan_report: Optional[SyncPlanReport] = None
     
     def _get_split_units(self, mapped_name: str, color: str = '') -> int:
         """
@@ -74,22 +100,14 @@ class SheetsSynchronizer:
             Количество единиц в упаковке (по умолчанию 1)
             Например, если split_units=3 и quantity=30, то будет 90 строк (30*3)
         """
-        # Формируем ключ как в product_matcher
-        key = f"{mapped_name.lower()}|{color.lower()}" if color else mapped_name.lower()
-        
-        # Ищем товар в маппингах
-        product_info = self.product_mappings.get(key, {})
-        return product_info.get('split_units', 1)
+        return self.mappings_store.split_units(mapped_name, color)
         
     def connect(self) -> bool:
         """Подключение к Google Sheets API с правами записи."""
         try:
             logger.info("🔄 Подключение к Google Sheets (запись)...")
-            creds = Credentials.from_service_account_file(
-                self.credentials_file,
-                scopes=self.SCOPES
-            )
-            self.client = gspread.authorize(creds)
+            # Общий на процесс клиент: авторизация и HTTP-сессия - один раз
+            self.client = get_client(self.credentials_file)
             logger.info("✅ Подключение успешно (режим записи)")
             return True
         except Exception as e:
@@ -111,15 +129,17 @@ class SheetsSynchronizer:
             if self.client is None:
                 raise RuntimeError("Клиент не инициализирован. Вызовите connect() сначала.")
             
-            # Открываем таблицу
-            self.spreadsheet = self.client.open_by_url(spreadsheet_url)
+            # Открываем таблицу (метаданные таблицы и листов - из общего кеша)
+            metadata = get_metadata()
+            self.spreadsheet = metadata.open(self.client, spreadsheet_url)
             
-            # Ищем лист по GID
-            for ws in self.spreadsheet.worksheets():
-                if str(ws.id) == str(gid):
-                    self.worksheet = ws
-                    logger.info(f"📄 Открыт лист: {ws.title} (gid={gid})")
-                    return True
+            # Ищем лист по GID (и лист-индекс архива, если он есть)
+            self.archive_index = metadata.worksheet_by_title(self.spreadsheet, ARCHIVE_INDEX_TITLE)
+            ws = metadata.worksheet_by_gid(self.spreadsheet, gid)
+            if ws is not None:
+                self.worksheet = ws
+                logger.info(f"📄 Открыт лист: {ws.title} (gid={gid})")
+                return True
             
             logger.error(f"❌ Лист с gid={gid} не найден")
             return False
@@ -128,30 +148,45 @@ class SheetsSynchronizer:
             logger.error(f"❌ Ошибка открытия листа: {e}")
             return False
     
-    def ensure_buffer_rows(self, last_used_row: int, buffer_size: int = 1000) -> None:
+    def ensure_buffer_rows(self, last_used_row: int, buffer_size: int = 1000, dry_run: bool = False) -> int:
         """
         Убедиться, что после последней использованной строки есть буфер пустых строк.
         
         Args:
             last_used_row: Номер последней использованной строки
             buffer_size: Размер буфера пустых строк (по умолчанию 1000)
+            dry_run: Только посчитать недостающие строки, без добавления
+            
+        Returns:
+            Количество добавленных (при dry_run - недостающих) строк
         """
         try:
             if self.worksheet is None:
-                return
+                return 0
             
             current_rows = self.worksheet.row_count
             required_rows = last_used_row + buffer_size
             
             if current_rows < required_rows:
                 rows_to_add = required_rows - current_rows
-                self.worksheet.add_rows(rows_to_add)
+                if dry_run:
+                    return rows_to_add
+                self._track_write(lambda: self.worksheet.add_rows(rows_to_add))
                 logger.info(f"➕ Добавлено {rows_to_add} пустых строк (всего: {current_rows + rows_to_add}, буфер: {buffer_size})")
-            else:
-                logger.debug(f"✓ Буфер пустых строк достаточен ({current_rows - last_used_row} строк после данных)")
+                return rows_to_add
+            logger.debug(f"✓ Буфер пустых строк достаточен ({current_rows - last_used_row} строк после данных)")
+            return 0
             
         except Exception as e:
             logger.warning(f"⚠️ Не удалось добавить пустые строки: {e}")
+            return 0
+    
+    def _notify(self, message: str) -> None:
+        """Сообщение в Telegram; в пробном прогоне - только в лог."""
+        if self.plan_only:
+            logger.debug(f"🧮 Пробный прогон, сообщение не отправлено: {message}")
+            return
+        sync_send_message(message)
     
     def get_existing_orders(self) -> List[str]:
         """
@@ -164,8 +199,8 @@ class SheetsSynchronizer:
             if self.worksheet is None:
                 return []
             
-            # Читаем столбец B (order_number)
-            column_b = self.worksheet.col_values(2)  # 2 = столбец B
+            # Столбец B (order_number) - из снимка/зеркала листа
+            column_b = [row[1] for row in self._current_snapshot().rows]
             
             # Фильтруем пустые и заголовки, приводим к строкам
             existing_orders: List[str] = [
@@ -180,6 +215,111 @@ class SheetsSynchronizer:
             logger.error(f"❌ Ошибка чтения существующих заказов: {e}")
             return []
     
+    def get_archived_orders(self) -> set:
+        """Номера заказов, перенесённых в архивные листы (столбец A индекса архива)."""
+        if self.archive_index is None:
+            return set()
+        try:
+            return {str(value) for value in self.archive_index.col_values(1)[1:] if value}
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать индекс архива: {e}")
+            return set()
+    
+    def _current_snapshot(self) -> SheetSnapshot:
+        """Снимок текущей синхронизации или свежее чтение листа (вне sync_orders)."""
+        if self.snapshot is not None:
+            return self.snapshot
+        return self._load_snapshot()
+    
+    def _mirror_source(self) -> str:
+        return f"{self.spreadsheet.id}:{self.worksheet.id}"
+    
+    def _get_modified_time(self) -> Optional[str]:
+        """Время последнего изменения таблицы (Drive modifiedTime) или None."""
+        try:
+            return self.spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось получить время изменения таблицы: {e}")
+            return None
+    
+    def _load_snapshot(self) -> SheetSnapshot:
+        """Снимок листа: через зеркало (если включено) или полным чтением A-P."""
+        if self.worksheet is None:
+            raise RuntimeError("Worksheet не инициализирован")
+        if self.mirror is None or self.spreadsheet is None:
+            return SheetSnapshot.load(self.worksheet)
+        # Время читается до значений: правка во время чтения даст расхождение при сохранении
+        self._mirror_time = self._get_modified_time()
+        self._mirror_written = False
+        try:
+            return self.mirror.load_snapshot(self.worksheet, self._mirror_source(), self._mirror_time)
+        except Exception as e:
+            logger.warning(f"⚠️ Зеркало листа недоступно, полное чтение: {e}")
+            return SheetSnapshot.load(self.worksheet)
+    
+    def _track_write(self, write: Callable[[], Any]) -> Any:
+        """
+        Выполнить свою запись в таблицу, отслеживая время изменения для зеркала.
+        
+        Время читается один раз на синхронизацию - перед первой записью: если
+        оно уже не то, что у снимка, таблицу менял кто-то ещё и снимок в
+        зеркало не попадёт. Дальнейшие изменения до сохранения зеркала
+        (_save_mirror) считаются нашими записями.
+        """
+        if self.mirror is None or self.spreadsheet is None:
+            return write()
+        if self._mirror_time is not None and not self._mirror_written:
+            if self._get_modified_time() != self._mirror_time:
+                logger.info("👥 Таблица изменена во время синхронизации не нами")
+                self._mirror_time = None
+        self._mirror_written = True
+        return write()
+    
+    def _execute_plan(self, plan: SheetUpdatePlan) -> int:
+        """Выполнить план листа как свою запись (см. _track_write)."""
+        return self._track_write(lambda: plan.execute(self.spreadsheet))
+    
+    def _refresh_mirrored_rows(self, orders_list: List[Dict]) -> set:
+        """
+        Перечитать строки заказов, взятые из зеркала без проверки (выше хвоста).
+        
+        Их могли править вручную - перед сравнением они читаются одним запросом.
+        Если в них сменились номера заказов, строки сдвигали незаметно для
+        хвоста зеркала, и снимок читается из листа целиком.
+        
+        Returns:
+            Номера перечитанных строк
+        """
+        refreshed_rows = {
+            row_number
+            for order in orders_list
+            for row_number in self.snapshot.row_numbers(order.get('order_number'))
+            if row_number <= self.snapshot.mirrored_rows
+        }
+        if refreshed_rows and SheetMirror.refresh_rows(self.worksheet, self.snapshot, refreshed_rows):
+            logger.info("🔄 Строки из зеркала сдвинуты в листе - полное чтение")
+            self.snapshot = SheetSnapshot.load(self.worksheet)
+            return set()
+        return refreshed_rows
+    
+    def _save_mirror(self) -> None:
+        """
+        Сохранить снимок в зеркало, если кроме наших записей таблица не менялась.
+        
+        Иначе зеркало сбрасывается, и следующая синхронизация читает лист целиком:
+        чужая правка могла попасть в строки, которые снимок не перечитывал.
+        """
+        if self.mirror is None or self.snapshot is None or self.spreadsheet is None:
+            return
+        if self.plan is not None and not self.plan.is_empty():
+            return  # Снимок содержит невыполненные изменения
+        modified_time = self._get_modified_time()
+        if modified_time and self._mirror_time and (self._mirror_written or modified_time == self._mirror_time):
+            self.mirror.save(self._mirror_source(), modified_time, self.snapshot.rows)
+        else:
+            logger.info("🔄 Таблицу меняли во время синхронизации - зеркало сброшено, следующий снимок будет полным")
+            self.mirror.clear(self._mirror_source())
+    
     def get_order_data(self, order_number: str) -> Dict[str, Any]:
         """
         Получить полные данные существующего заказа из Google Sheets.
@@ -201,34 +341,25 @@ class SheetsSynchronizer:
             if self.worksheet is None:
                 return {}
             
-            # Читаем все данные (столбцы A-I)
-            all_data = self.worksheet.get_all_values()
+            # Номера строк заказа - из индекса снимка (без чтения всего листа)
+            snapshot = self._current_snapshot()
+            row_numbers = snapshot.row_numbers(order_number)
             
             order_rows = []
-            row_numbers = []  # НОВОЕ: список всех номеров строк с этим заказом
-            
-            for idx, row in enumerate(all_data, start=1):
-                # Пропускаем пустые строки
-                if len(row) < 2:
-                    continue
-                
-                # Проверяем столбец B (order_number)
-                if len(row) > 1 and str(row[1]) == str(order_number):
-                    row_numbers.append(idx)
-                    
-                    # Сохраняем данные строки
-                    order_rows.append({
-                        'row_number': idx,
-                        'date': row[0] if len(row) > 0 else '',
-                        'order_number': row[1] if len(row) > 1 else '',
-                        'source': row[2] if len(row) > 2 else '',
-                        'status': row[3] if len(row) > 3 else '',
-                        'formula': row[4] if len(row) > 4 else '',
-                        'price': row[5] if len(row) > 5 else '',
-                        'mapped_name': row[6] if len(row) > 6 else '',
-                        'mapped_type': row[7] if len(row) > 7 else '',
-                        'reserved': row[8] if len(row) > 8 else ''
-                    })
+            for idx, row in zip(row_numbers, snapshot.get_rows(row_numbers)):
+                # Сохраняем данные строки
+                order_rows.append({
+                    'row_number': idx,
+                    'date': row[0],
+                    'order_number': row[1],
+                    'source': row[2],
+                    'status': row[3],
+                    'formula': row[4],
+                    'price': row[5],
+                    'mapped_name': row[6],
+                    'mapped_type': row[7],
+                    'reserved': row[8]
+                })
             
             if not order_rows:
                 logger.debug(f"Заказ {order_number} не найден в таблице")
@@ -390,21 +521,12 @@ class SheetsSynchronizer:
                 return False
             
             start_row = row_numbers[0]
+            snapshot = self._current_snapshot()
+            # Внутри sync_orders изменения копятся в общем плане, иначе выполняются в конце метода
+            plan = self.plan if self.plan is not None else SheetUpdatePlan(self.worksheet, snapshot)
             
             # Находим ВСЕ непрерывные блоки
-            blocks = []
-            current_block = [row_numbers[0]]
-            
-            for i in range(1, len(row_numbers)):
-                if row_numbers[i] == current_block[-1] + 1:
-                    current_block.append(row_numbers[i])
-                else:
-                    # Блок закончился, сохраняем его
-                    blocks.append(current_block)
-                    # Начинаем новый блок
-                    current_block = [row_numbers[i]]
-            # Добавляем последний блок
-            blocks.append(current_block)
+            blocks = split_blocks(row_numbers)
             
             # Выбираем САМЫЙ БОЛЬШОЙ непрерывный блок как основной
             continuous_block = max(blocks, key=len)
@@ -427,21 +549,28 @@ class SheetsSynchronizer:
             
             logger.info(f"   Старых строк: {old_row_count} (непрерывных: {len(continuous_block)}, разбросанных: {len(scattered_rows)}), новых строк: {new_row_count}")
             
+            # Заказ в одном блоке - построчный diff: правим только изменившиеся ячейки,
+            # строки на своих местах сохраняют I-P без переноса
+            if not scattered_rows:
+                old_rows = snapshot.get_rows(continuous_block)
+                row_diff = diff_order_rows(old_rows, new_rows)
+                if not any(has_user_data(old_rows[idx]) for idx in row_diff.deleted):
+                    self._lost_i_p_values = []
+                    writes = self._apply_row_diff(continuous_block[0], old_rows, row_diff, plan)
+                    if plan is not self.plan and self.spreadsheet:
+                        plan.execute(self.spreadsheet)
+                    logger.info(f"✅ Заказ {order_number} обновлён построчно ({row_diff.summary()}, записей: {writes})")
+                    return True
+                logger.info("   ↩️ Удаляемые строки содержат данные I-P - полная перезапись блока")
+                if self.plan_report is not None:
+                    self.plan_report.warnings.append(f"заказ {order_number}: полная перезапись блока (данные I-P в удаляемых строках)")
+            
             # КРИТИЧНО: Сохраняем данные из колонок I-P (8 колонок) ПЕРЕД любыми изменениями
             columns_i_p_mapping = {}  # {"name|status": [[i,j,k,l,m,n,o,p], ...]}
             if old_row_count > 0:
                 try:
-                    # Читаем непрерывный блок диапазоном (A-P, колонки 0-15)
-                    old_range = f"A{continuous_block[0]}:P{continuous_block[-1]}"
-                    old_data = self.worksheet.get(old_range)
-                    
-                    # Если есть разбросанные - читаем их отдельно
-                    if scattered_rows:
-                        for row_num in scattered_rows:
-                            row_range = f"A{row_num}:P{row_num}"
-                            row_data = self.worksheet.get(row_range)
-                            if row_data:
-                                old_data.extend(row_data)
+                    # Значения A-P непрерывного блока и разбросанных строк - из снимка
+                    old_data = snapshot.get_rows(continuous_block + scattered_rows)
                     
                     for row in old_data:
                         # Проверяем есть ли хоть одно значение в колонках I-P (индексы 8-15)
@@ -499,23 +628,10 @@ class SheetsSynchronizer:
                 # Добавляем последний блок
                 delete_blocks.append((current_block_end, current_block_start))
                 
-                # Создаём запросы на удаление блоков (от больших индексов к меньшим)
-                delete_requests = []
+                # Удаляем блоки от больших индексов к меньшим - номера оставшихся не сдвигаются
+                logger.info(f"   📦 Удаление {len(delete_blocks)} блоков строк: {delete_blocks}")
                 for block_start, block_end in delete_blocks:
-                    delete_requests.append({
-                        "deleteDimension": {
-                            "range": {
-                                "sheetId": self.worksheet.id,
-                                "dimension": "ROWS",
-                                "startIndex": block_start - 1,  # 0-индексация
-                                "endIndex": block_end  # endIndex не включается
-                            }
-                        }
-                    })
-                
-                if delete_requests and self.spreadsheet:
-                    logger.info(f"   📦 Удаление {len(delete_blocks)} блоков строк: {delete_blocks}")
-                    self.spreadsheet.batch_update({"requests": delete_requests})
+                    plan.delete_rows(block_start, block_end)
                 
                 # ВАЖНО: После удаления строк номера continuous_block сдвигаются!
                 # Считаем сколько удалённых строк было ПЕРЕД основным блоком
@@ -527,9 +643,8 @@ class SheetsSynchronizer:
             # ВАЖНО: Очищаем столбцы I-P во ВСЁМ непрерывном блоке ПЕРЕД любыми изменениями
             # Это предотвращает "призрачные" данные от предыдущих записей
             logger.info(f"   🧹 Очистка столбцов I-P во всём блоке ({continuous_block[0]}-{continuous_block[-1]})...")
-            clear_range = f"I{continuous_block[0]}:P{continuous_block[-1]}"
             empty_rows = [[''] * 8] * len(continuous_block)
-            self.worksheet.update(range_name=clear_range, values=empty_rows, value_input_option='RAW')  # type: ignore[arg-type]
+            plan.update(continuous_block[0], 8, empty_rows)
             
             # Обновляем/добавляем строки в непрерывном блоке
             continuous_count = len(continuous_block)
@@ -539,8 +654,7 @@ class SheetsSynchronizer:
                 rows_to_add = new_row_count - continuous_count
                 insert_position = continuous_block[-1] + 1
                 logger.info(f"   ➕ Вставка {rows_to_add} новых строк после строки {continuous_block[-1]}...")
-                for _ in range(rows_to_add):
-                    self.worksheet.insert_row([], index=insert_position)
+                plan.insert_rows(insert_position, rows_to_add)
             elif new_row_count < continuous_count:
                 # Нужно удалить лишние строки - батч-удалением одним запросом
                 rows_to_delete = continuous_count - new_row_count
@@ -549,22 +663,10 @@ class SheetsSynchronizer:
                 
                 logger.info(f"   🗑️ Удаление {rows_to_delete} лишних строк из блока (строки {delete_start}-{delete_end}) одним запросом...")
                 
-                # Батч-удаление всего блока лишних строк за один запрос
-                if self.spreadsheet:
-                    delete_request = {
-                        "deleteDimension": {
-                            "range": {
-                                "sheetId": self.worksheet.id,
-                                "dimension": "ROWS",
-                                "startIndex": delete_start - 1,  # 0-индексация
-                                "endIndex": delete_end  # endIndex не включается, поэтому delete_end (а не delete_end + 1)
-                            }
-                        }
-                    }
-                    self.spreadsheet.batch_update({"requests": [delete_request]})
-                    
-                    # Обновляем continuous_block
-                    continuous_block = continuous_block[:new_row_count]
+                plan.delete_rows(delete_start, delete_end)
+                
+                # Обновляем continuous_block
+                continuous_block = continuous_block[:new_row_count]
             
             # Позиция для записи данных - начало непрерывного блока
             insert_position = continuous_block[0]
@@ -663,6 +765,11 @@ class SheetsSynchronizer:
                         msg += f"{i}. {name}\n"
                     msg += "\n0 - пропустить (данные будут потеряны)"
                     
+                    if self.plan_only:
+                        self.plan_report.warnings.append(f"заказ {order_number}: вопрос о переносе I-P товара '{old_name}'")
+                        logger.info(f"      ⏭️ Пробный прогон - вопрос пропущен: '{old_name}'")
+                        continue
+                    
                     try:
                         response = sync_wait_for_input(msg, timeout=0, options=options)
                         
@@ -672,7 +779,7 @@ class SheetsSynchronizer:
                                 new_name = new_names_list[choice - 1]
                                 name_mapping[old_name] = new_name
                                 logger.info(f"      ✅ '{old_name}' → '{new_name}'")
-                                sync_send_message(f"✅ <code>{old_name}</code> → <code>{new_name}</code>")
+                                self._notify(f"✅ <code>{old_name}</code> → <code>{new_name}</code>")
                             else:
                                 logger.info(f"      ❌ Пропущено: '{old_name}'")
                         else:
@@ -728,8 +835,7 @@ class SheetsSynchronizer:
             rows_without_i_p = [row[:8] for row in new_rows]  # Только A-H
             
             # Обновляем A-H
-            range_a_h = f"A{insert_position}:H{insert_position + new_row_count - 1}"
-            self.worksheet.update(range_name=range_a_h, values=rows_without_i_p, value_input_option='USER_ENTERED')  # type: ignore[arg-type]
+            plan.update(insert_position, 0, rows_without_i_p)
             logger.info(f"   ✅ Записано {new_row_count} строк (A-H)")
             
             # Восстанавливаем колонки I-P (8 колонок)
@@ -754,8 +860,7 @@ class SheetsSynchronizer:
                         row_i_p.append('')
                 i_p_values.append(row_i_p)
             
-            i_p_range = f"I{insert_position}:P{insert_position + new_row_count - 1}"
-            self.worksheet.update(range_name=i_p_range, values=i_p_values, value_input_option='USER_ENTERED')  # type: ignore[arg-type]
+            plan.update(insert_position, 8, i_p_values)
             logger.info(f"   ✅ Восстановлены колонки I-P (сопоставлено по названию товара)")
             
             # Собираем потерянные значения колонок I-P (которые не были восстановлены)
@@ -818,7 +923,7 @@ class SheetsSynchronizer:
                 msg += "💡 <i>Эти данные были в удаленных строках и не могут быть автоматически восстановлены</i>"
                 
                 try:
-                    sync_send_message(msg)
+                    self._notify(msg)
                     logger.success(f"✅ Уведомление о потерянных данных отправлено")
                 except Exception as send_err:
                     logger.error(f"❌ Ошибка отправки уведомления: {send_err}")
@@ -827,10 +932,13 @@ class SheetsSynchronizer:
             
             # КРИТИЧНО: Очищаем границы ПОСЛЕ записи данных, но ПЕРЕД добавлением новых границ
             # Используем insert_position (скорректированный после удаления строк), НЕ start_row!
-            self._clear_borders_for_range(insert_position, new_row_count)
+            self._clear_borders_for_range(insert_position, new_row_count, plan=plan)
             
             # Применяем границы ПОСЛЕ всех манипуляций со строками
-            self.add_group_borders(insert_position, new_row_count, new_rows)
+            self.add_group_borders(insert_position, new_row_count, new_rows, plan=plan)
+            
+            if plan is not self.plan and self.spreadsheet:
+                plan.execute(self.spreadsheet)
             
             logger.info(f"✅ Заказ {order_number} успешно обновлён")
             return True
@@ -839,6 +947,59 @@ class SheetsSynchronizer:
             logger.error(f"❌ Ошибка обновления заказа: {e}")
             return False
     
+    def _apply_row_diff(self, start_row: int, old_rows: List[List], row_diff: RowDiff, plan: SheetUpdatePlan) -> int:
+        """
+        Применить построчный diff к непрерывному блоку заказа.
+        
+        Порядок: удаления (снизу вверх), вставки (по возрастанию итоговых позиций),
+        затем значения в итоговых номерах строк. Сохранённые строки получают
+        только изменившиеся ячейки, столбцы I-P не трогаются.
+        
+        Args:
+            start_row: Первая строка блока
+            old_rows: Текущие значения A-P строк блока
+            row_diff: Результат diff_order_rows
+            plan: План изменений листа
+            
+        Returns:
+            Количество записанных ячеек
+        """
+        for block in reversed(split_blocks(row_diff.deleted)):
+            plan.delete_rows(start_row + block[0], start_row + block[-1])
+        for block in split_blocks(row_diff.inserted):
+            plan.insert_rows(start_row + block[0], len(block))
+        
+        structural = bool(row_diff.deleted or row_diff.inserted)
+        final_rows = self.add_sum_formulas([list(row[:8]) for _, row in row_diff.layout], start_row)
+        
+        writes = 0
+        for pos, (old_idx, _) in enumerate(row_diff.layout):
+            if old_idx is None:
+                # Новая строка: A-H целиком (I-P у вставленной строки пустые)
+                plan.update(start_row + pos, 0, [final_rows[pos]])
+                writes += len(final_rows[pos])
+                continue
+            if Config.ORDER_TOTAL_MODE == 'arrayformula':
+                continue  # Суммы считает формула в E1
+            old_formula = str(old_rows[old_idx][4]).strip() if len(old_rows[old_idx]) > 4 else ''
+            if pos == 0 and (structural or not old_formula):
+                # Формула без номеров строк сдвиги переживает; переписываем её только
+                # при изменении строк блока - это заодно заменяет старые =SUM(F..:F..)
+                plan.update(start_row, 4, [[final_rows[0][4]]])
+                writes += 1
+            elif pos > 0 and old_formula:
+                # Строка перестала быть первой в заказе - убираем старую сумму
+                plan.update(start_row + pos, 4, [['']])
+                writes += 1
+        for pos, col, value in row_diff.edits:
+            plan.update(start_row + pos, col, [[value]])
+            writes += 1
+        
+        if structural:
+            self._clear_borders_for_range(start_row, len(final_rows), plan=plan)
+            self.add_group_borders(start_row, len(final_rows), final_rows, plan=plan)
+        return writes
+    
     def _format_lost_i_p_message(self, lost_items: list) -> str:
         """
         Форматировать сообщение о потерянных данных I-P.
@@ -998,9 +1159,14 @@ class SheetsSynchronizer:
     
     def add_sum_formulas(self, sorted_rows: List[List], start_row: int) -> List[List]:
         """
-        Добавить формулы SUM в столбец E для каждой группы заказа.
+        Добавить формулы суммы в столбец E для каждой группы заказа.
         ОЧИЩАЕТ столбец E для всех строк кроме первой в группе.
         
+        Формула не содержит номеров строк (ORDER_TOTAL_FORMULA), поэтому
+        не ломается при вставке и удалении строк и её не нужно переписывать.
+        В режиме ORDER_TOTAL_MODE='arrayformula' суммы считает одна формула
+        в E1, и столбец E остаётся пустым.
+        
         Args:
             sorted_rows: Отсортированные строки
             start_row: Номер строки начала записи
@@ -1011,244 +1177,180 @@ class SheetsSynchronizer:
         if not sorted_rows:
             return sorted_rows
         
-        # Сначала очищаем столбец E во всех строках
+        array_mode = Config.ORDER_TOTAL_MODE == 'arrayformula'
+        previous_order = None
         for row in sorted_rows:
             while len(row) < 5:
                 row.append('')
-            row[4] = ''  # E: очищаем
+            order_num = row[1] if len(row) > 1 else ''  # B: order_number
+            # Формула - только в первой строке заказа
+            row[4] = self.ORDER_TOTAL_FORMULA if order_num != previous_order and not array_mode else ''
+            previous_order = order_num
         
-        # Группируем по order_number (колонка B, индекс 1)
-        current_order = None
-        group_start_idx = 0
+        if not array_mode:
+            logger.info(f"➕ Добавлены формулы суммы для групп заказов")
         
-        for idx, row in enumerate(sorted_rows):
-            order_num = row[1] if len(row) > 1 else ''  # B: order_number
-            
-            # Если начинается новая группа заказа
-            if order_num != current_order:
-                # Добавляем формулу для предыдущей группы
-                if current_order is not None and group_start_idx < idx:
-                    formula_row = start_row + group_start_idx
-                    end_formula_row = start_row + idx - 1
-                    formula = f"=SUM(F{formula_row}:F{end_formula_row})"
-                    sorted_rows[group_start_idx][4] = formula  # E: формула
-                
-                # Начинаем новую группу
-                current_order = order_num
-                group_start_idx = idx
+        return sorted_rows
+    
+    def ensure_array_total_formula(self, plan: Optional[SheetUpdatePlan] = None) -> bool:
+        """
+        Режим ORDER_TOTAL_MODE='arrayformula': поставить в E1 формулу сумм на весь столбец.
         
-        # Добавляем формулу для последней группы
-        if current_order is not None and group_start_idx < len(sorted_rows):
-            formula_row = start_row + group_start_idx
-            end_formula_row = start_row + len(sorted_rows) - 1
-            formula = f"=SUM(F{formula_row}:F{end_formula_row})"
-            sorted_rows[group_start_idx][4] = formula  # E: формула
+        Формула проверяется чтением одной ячейки E1 (FORMULA). При установке
+        столбец E ниже заголовка очищается - иначе формула не сможет заполнить его.
         
-        logger.info(f"➕ Добавлены формулы SUM для групп заказов")
+        Returns:
+            True если формула была установлена
+        """
+        if Config.ORDER_TOTAL_MODE != 'arrayformula' or self.worksheet is None:
+            return False
+        current = self.worksheet.get('E1', value_render_option=gspread.utils.ValueRenderOption.formula)
+        current_value = current[0][0] if current and current[0] else ''
+        if str(current_value).startswith('={') and 'ARRAYFORMULA' in str(current_value):
+            return False
         
-        return sorted_rows
+        header = current_value if current_value and not str(current_value).startswith('=') else 'Сумма'
+        formula = self.ARRAY_TOTAL_FORMULA.replace('{header}', str(header).replace('"', '""'))
+        
+        local_plan = plan if plan is not None else SheetUpdatePlan(self.worksheet, self.snapshot)
+        local_plan.add_requests([{
+            "repeatCell": {
+                "range": {
+                    "sheetId": self.worksheet.id,
+                    "startRowIndex": 1,
+                    "endRowIndex": self.worksheet.row_count,
+                    "startColumnIndex": 4,
+                    "endColumnIndex": 5
+                },
+                "cell": {},
+                "fields": "userEnteredValue"
+            }
+        }])
+        local_plan.update(1, 4, [[formula]])
+        if plan is None and self.spreadsheet:
+            local_plan.execute(self.spreadsheet)
+        logger.info("➕ Установлена формула сумм заказов для всего столбца E (E1)")
+        return True
     
-    def _clear_borders_for_range(self, start_row: int, num_rows: int) -> None:
+    def _clear_borders_for_range(self, start_row: int, num_rows: int, plan: Optional[SheetUpdatePlan] = None) -> None:
         """
         Очистить ВСЕ границы (внешние + внутренние) для указанного диапазона строк по ВСЕМ столбцам.
         
+        С планом, у которого есть снимок, диапазон только отмечается: очистка и
+        новые границы строятся один раз при выполнении плана.
+        
         Args:
             start_row: Номер строки начала диапазона
             num_rows: Количество строк в диапазоне
+            plan: План изменений листа (если задан - запрос добавляется в план)
         """
         try:
             if self.worksheet is None or num_rows == 0:
                 return
             
-            clear_borders_request = {
-                "updateBorders": {
-                    "range": {
-                        "sheetId": self.worksheet.id,
-                        "startRowIndex": start_row - 1,  # -1 для 0-индексации
-                        "endRowIndex": start_row + num_rows - 1
-                        # НЕ указываем startColumnIndex и endColumnIndex = очистка по ВСЕМ столбцам
-                    },
-                    # Очистка ВСЕХ границ: внешних и внутренних
-                    "top": {"style": "NONE"},
-                    "bottom": {"style": "NONE"},
-                    "left": {"style": "NONE"},
-                    "right": {"style": "NONE"},
-                    "innerHorizontal": {"style": "NONE"},  # Горизонтальные границы между строками
-                    "innerVertical": {"style": "NONE"}      # Вертикальные границы между столбцами
-                }
-            }
+            if plan is not None and plan.snapshot is not None:
+                plan.mark_borders(start_row, start_row + num_rows - 1)
+                return
             
-            # Отправляем очистку ОТДЕЛЬНЫМ запросом
-            if self.spreadsheet:
+            clear_borders_request = clear_request(self.worksheet.id, start_row, start_row + num_rows - 1)
+            
+            if plan is not None:
+                plan.add_requests([clear_borders_request])
+                logger.info(f"🧹 Запланирована очистка границ для диапазона: строки {start_row}-{start_row + num_rows - 1}")
+            elif self.spreadsheet:
+                # Отправляем очистку ОТДЕЛЬНЫМ запросом
                 self.spreadsheet.batch_update({"requests": [clear_borders_request]})
                 logger.info(f"🧹 Очищены границы (ВСЕ столбцы) для диапазона: строки {start_row}-{start_row + num_rows - 1}")
         
         except Exception as e:
             logger.warning(f"⚠️ Не удалось очистить границы: {e}")
     
-    def add_group_borders(self, start_row: int, num_rows: int, sorted_rows: List[List]) -> None:
+    def add_group_borders(
+        self,
+        start_row: int,
+        num_rows: int,
+        sorted_rows: List[List],
+        plan: Optional[SheetUpdatePlan] = None
+    ) -> None:
         """
-        Добавить границы:
+        Добавить границы (правила - в sheet_borders):
         1. Верхняя граница 1px для первой строки каждого заказа (A-I, вся строка)
         2. Нижняя граница 1px на последнюю строку каждого заказа (A-I, вся строка)
         3. Нижняя граница 1px между группами товаров внутри заказа (G-I)
         
-        ВАЖНО: Границы должны быть очищены ДО вызова этого метода через _clear_borders_for_range()
+        С планом, у которого есть снимок, область только отмечается: границы всех
+        затронутых за синхронизацию областей строятся при выполнении плана.
+        Без снимка границы считаются по sorted_rows сразу, и их нужно
+        предварительно очистить через _clear_borders_for_range().
         
         Args:
             start_row: Номер строки начала данных
             num_rows: Количество строк (ВЕСЬ заказ после вставки/удаления)
             sorted_rows: Отсортированные строки для определения границ
+            plan: План изменений листа (если задан - запросы добавляются в план)
         """
         try:
             if self.worksheet is None or not sorted_rows:
                 return
             
-            # Создаем запросы для добавления границ
-            requests = []
-            
-            # 1. Находим границы заказов (для верхней линии 1px)
-            order_borders = []
-            current_order = None
-            
-            for idx, row in enumerate(sorted_rows):
-                order_num = row[1] if len(row) > 1 else ''  # B: order_number
-                
-                # Если начинается новый заказ
-                if order_num != current_order:
-                    order_borders.append(start_row + idx)
-                    current_order = order_num
-            
-            # Добавляем верхние границы для заказов (ВСЯ СТРОКА, 1px)
-            for border_row in order_borders:
-                request = {
-                    "updateBorders": {
-                        "range": {
-                            "sheetId": self.worksheet.id,
-                            "startRowIndex": border_row - 1,  # -1 для 0-индексации
-                            "endRowIndex": border_row
-                            # НЕ указываем startColumnIndex и endColumnIndex = граница на ВСЮ строку
-                        },
-                        "top": {
-                            "style": "SOLID",
-                            "width": 1,
-                            "color": {"red": 0, "green": 0, "blue": 0}
-                        }
-                    }
-                }
-                requests.append(request)
-            
-            logger.info(f"📐 Добавлены верхние границы для {len(order_borders)} заказов")
-            
-            # 1б. Находим последние строки каждого заказа (для нижней линии 1px на всю строку)
-            order_last_rows = []
-            current_order = None
-            last_row_idx = None
-            
-            for idx, row in enumerate(sorted_rows):
-                order_num = row[1] if len(row) > 1 else ''  # B: order_number
-                
-                if order_num != current_order:
-                    # Если был предыдущий заказ, сохраняем его последнюю строку
-                    if current_order is not None and last_row_idx is not None:
-                        order_last_rows.append(last_row_idx)
-                    current_order = order_num
-                
-                last_row_idx = start_row + idx
-            
-            # Добавляем последнюю строку самого последнего заказа
-            if last_row_idx is not None:
-                order_last_rows.append(last_row_idx)
-            
-            # Добавляем нижние границы для последних строк заказов (ВСЯ СТРОКА, 1px)
-            for border_row in order_last_rows:
-                request = {
-                    "updateBorders": {
-                        "range": {
-                            "sheetId": self.worksheet.id,
-                            "startRowIndex": border_row - 1,  # -1 для 0-индексации
-                            "endRowIndex": border_row
-                            # НЕ указываем startColumnIndex и endColumnIndex = граница на ВСЮ строку
-                        },
-                        "bottom": {
-                            "style": "SOLID",
-                            "width": 1,
-                            "color": {"red": 0, "green": 0, "blue": 0}
-                        }
-                    }
-                }
-                requests.append(request)
-            
-            logger.info(f"📐 Добавлены нижние границы для {len(order_last_rows)} заказов (последние строки)")
-            
-            # 2. Находим границы групп товаров по mapped_name (для нижней линии 1px)
-            group_borders = []
-            current_name = None
-            current_order = None
-            
-            for idx, row in enumerate(sorted_rows):
-                order_num = row[1] if len(row) > 1 else ''  # B: order_number
-                mapped_name = row[6] if len(row) > 6 else ''  # G: mapped_name
-                
-                # Если начинается новая группа товаров (но не новый заказ)
-                if mapped_name != current_name and current_name is not None and order_num == current_order:
-                    # Граница после предыдущей группы
-                    group_borders.append(start_row + idx - 1)
-                
-                current_name = mapped_name
-                current_order = order_num
-            
-            # Добавляем нижние границы между группами товаров (G-I, 1px)
-            for border_row in group_borders:
-                request = {
-                    "updateBorders": {
-                        "range": {
-                            "sheetId": self.worksheet.id,
-                            "startRowIndex": border_row - 1,  # -1 для 0-индексации
-                            "endRowIndex": border_row,
-                            "startColumnIndex": 6,  # G
-                            "endColumnIndex": 9      # I (не включительно = до конца столбца I)
-                        },
-                        "bottom": {
-                            "style": "SOLID",
-                            "width": 1,
-                            "color": {"red": 0, "green": 0, "blue": 0}
-                        }
-                    }
-                }
-                requests.append(request)
+            if plan is not None and plan.snapshot is not None:
+                plan.mark_borders(start_row, start_row + num_rows - 1)
+                logger.info(f"📐 Границы строк {start_row}-{start_row + num_rows - 1} будут пересчитаны при выполнении плана")
+                return
             
-            logger.info(f"🔲 Добавлены нижние границы между {len(group_borders)} группами товаров")
+            requests = region_requests(self.worksheet.id, start_row, sorted_rows[:num_rows], clear=False)
+            logger.info(f"📐 Границы строк {start_row}-{start_row + num_rows - 1}: {len(requests)} запросов")
             
-            # Отправляем batch запрос
-            if requests and self.spreadsheet:
+            if requests and plan is not None:
+                plan.add_requests(requests)
+            elif requests and self.spreadsheet:
+                # Отправляем batch запрос
                 self.spreadsheet.batch_update({"requests": requests})
-                logger.info(f"✅ Применены границы: {len(order_borders)} заказов (верх) + {len(order_last_rows)} заказов (низ) + {len(group_borders)} групп товаров")
+                logger.info(f"✅ Применены границы: {len(requests)} запросов")
             
         except Exception as e:
             logger.warning(f"⚠️ Не удалось добавить границы: {e}")
             # Не критично, продолжаем работу
     
-    def sync_orders(self, orders_data: Dict[str, Any]) -> bool:
+    def sync_orders(self, orders_data: Dict[str, Any], plan_only: bool = False) -> bool:
         """
         Синхронизировать заказы с Google Sheets (MVP версия).
         
         Args:
             orders_data: Словарь с данными заказов из ozon_orders.json
+            plan_only: Пробный прогон - посчитать изменения и стоимость (plan_report)
+                без записи в лист и вопросов в Telegram
             
         Returns:
             True если успешно
         """
+        self.plan_only = plan_only
+        self.plan_report = SyncPlanReport() if plan_only else None
+        reads_before = get_budget('read').acquired
         try:
             logger.info("🔄 Начинаем синхронизацию заказов с Google Sheets...")
-            sync_send_message("🔄 <b>Синхронизация с Google Sheets...</b>")
+            self._notify("🔄 <b>Синхронизация с Google Sheets...</b>")
             
-            # Получаем существующие заказы
-            existing_orders = self.get_existing_orders()
+            if self.worksheet is None or self.spreadsheet is None:
+                raise RuntimeError("Worksheet не инициализирован")
             
-            # Проверяем существующие заказы на изменения
+            # Один снимок листа на всю синхронизацию: индекс заказов, строки и значения A-P
+            self.snapshot = self._load_snapshot()
             orders_list = orders_data.get('orders', [])
+            refreshed_rows = self._refresh_mirrored_rows(orders_list)
+            self.plan = SheetUpdatePlan(self.worksheet, self.snapshot)
+            self.ensure_array_total_formula(plan=self.plan)
+            existing_orders = self.snapshot.order_numbers()
+            logger.info(f"📋 Найдено существующих заказов в таблице: {len(existing_orders)}")
+            
+            # Проверяем существующие заказы на изменения
             updated_orders = []
+            changed_orders = []
+            if plan_only:
+                # До изменений плана: обновление заказа сливает его разбросанные блоки
+                self.plan_report.scattered = scattered_orders(
+                    self.snapshot, [order.get('order_number') for order in orders_list]
+                )
             
             for order in orders_list:
                 order_number = order.get('order_number')
@@ -1266,52 +1368,75 @@ class SheetsSynchronizer:
                         
                         if comparison['has_changes']:
                             logger.warning(f"⚠️ Обнаружены изменения в заказе {order_number}")
-                            
-                            # Формируем сообщение для Telegram - показываем ВСЕ изменения
-                            changes_text = "\n".join([f"  • {change}" for change in comparison['changes']])
-                            
-                            # Ссылка на заказ отдельной строкой
-                            order_link = f"https://www.ozon.ru/my/orderdetails/?order={order_number}"
-                            
-                            sync_send_message(
-                                f"⚠️ <b>Изменения в заказе {order_number}:</b>\n{order_link}\n\n{changes_text}\n\n"
-                                f"🔄 Обновляем данные..."
-                            )
-                            
-                            # Обновляем заказ
-                            if self.update_order(order, sheets_data):
-                                updated_orders.append(order_number)
-                                sync_send_message(f"✅ Заказ {order_number} обновлён")
-                                
-                                # Проверяем, есть ли потерянные значения I-P
-                                if self._lost_i_p_values:
-                                    lost_msg = self._format_lost_i_p_message(self._lost_i_p_values)
-                                    if lost_msg:
-                                        sync_send_message(lost_msg)
-                                    # Очищаем список после отправки
-                                    self._lost_i_p_values = []
-                            else:
-                                sync_send_message(f"❌ Не удалось обновить заказ {order_number}")
+                            changed_orders.append((order, comparison))
+            
+            # Строки изменившихся заказов перечитываем из листа одним запросом:
+            # зеркало могло не видеть правок в I-P старых строк
+            if changed_orders and self.mirror is not None:
+                SheetMirror.refresh_rows(self.worksheet, self.snapshot, [
+                    row_number
+                    for order, _ in changed_orders
+                    for row_number in self.snapshot.row_numbers(order.get('order_number'))
+                    if row_number not in refreshed_rows
+                ])
+            
+            for order, comparison in changed_orders:
+                order_number = order.get('order_number')
+                
+                # Формируем сообщение для Telegram - показываем ВСЕ изменения
+                changes_text = "\n".join([f"  • {change}" for change in comparison['changes']])
+                
+                # Ссылка на заказ отдельной строкой
+                order_link = f"https://www.ozon.ru/my/orderdetails/?order={order_number}"
+                
+                self._notify(
+                    f"⚠️ <b>Изменения в заказе {order_number}:</b>\n{order_link}\n\n{changes_text}\n\n"
+                    f"🔄 Обновляем данные..."
+                )
+                
+                # Обновляем заказ (номера строк - по снимку с учётом предыдущих обновлений)
+                if self.update_order(order, self.get_order_data(order_number)):
+                    updated_orders.append(order_number)
+                    self._notify(f"✅ Заказ {order_number} обновлён")
+                    
+                    # Проверяем, есть ли потерянные значения I-P
+                    if self._lost_i_p_values:
+                        lost_msg = self._format_lost_i_p_message(self._lost_i_p_values)
+                        if lost_msg:
+                            self._notify(lost_msg)
+                        # Очищаем список после отправки
+                        self._lost_i_p_values = []
+                else:
+                    self._notify(f"❌ Не удалось обновить заказ {order_number}")
             
             if updated_orders:
                 logger.info(f"🔄 Обновлено заказов: {len(updated_orders)}")
             
-            # Фильтруем новые заказы
+            # Фильтруем новые заказы (заархивированные не добавляем заново)
+            archived_orders = self.get_archived_orders()
             new_orders = [
                 order for order in orders_list
                 if order.get('order_number') not in existing_orders
+                and str(order.get('order_number')) not in archived_orders
             ]
             
             # Если нет ни обновлений, ни новых заказов
             if not new_orders and not updated_orders:
                 logger.info("✅ Нет изменений для синхронизации")
-                sync_send_message("✅ Нет изменений для синхронизации")
+                self._notify("✅ Нет изменений для синхронизации")
+                if plan_only:
+                    self._finish_plan_report(updated_orders, new_orders, 0, 0, reads_before)
+                    return True
+                # В плане могут быть запросы без заказов (установка формулы сумм в E1)
+                if not self.plan.is_empty():
+                    self._execute_plan(self.plan)
+                self._save_mirror()
                 return True
             
             # Если есть новые заказы - добавляем их
             if new_orders:
                 logger.info(f"📦 Найдено новых заказов: {len(new_orders)}")
-                sync_send_message(f"📦 <b>Новых заказов:</b> {len(new_orders)}")
+                self._notify(f"📦 <b>Новых заказов:</b> {len(new_orders)}")
                 
                 # Подготавливаем все строки
                 all_rows = []
@@ -1325,9 +1450,8 @@ class SheetsSynchronizer:
                 if self.worksheet is None:
                     raise RuntimeError("Worksheet не инициализирован")
                 
-                # Находим последнюю непустую строку в столбце A
-                column_a = self.worksheet.col_values(1)
-                last_row = len([cell for cell in column_a if isinstance(cell, str) and cell.strip()]) + 1
+                # Находим последнюю непустую строку в столбце A (по снимку, с учётом обновлений выше)
+                last_row = self.snapshot.next_free_row()
                 
                 logger.info(f"📍 Начало записи с строки: {last_row}")
                 
@@ -1339,17 +1463,22 @@ class SheetsSynchronizer:
                 
                 # Записываем данные
                 if all_rows:
-                    start_cell = f"A{last_row}"
-                    # type: ignore для gspread API
-                    self.worksheet.update(range_name=start_cell, values=all_rows, value_input_option='USER_ENTERED')  # type: ignore[arg-type]
-                    
-                    logger.info(f"✅ Записано {len(all_rows)} строк в таблицу")
+                    self.plan.update(last_row, 0, all_rows)
                     
                     # Добавляем границы между группами
-                    self.add_group_borders(last_row, len(all_rows), all_rows)
+                    self.add_group_borders(last_row, len(all_rows), all_rows, plan=self.plan)
                     
                     # Убеждаемся, что есть буфер пустых строк после данных
                     last_used_row = last_row + len(all_rows) - 1
+                    if plan_only:
+                        buffer_rows = self.ensure_buffer_rows(last_used_row, buffer_size=1000, dry_run=True)
+                        self._finish_plan_report(updated_orders, new_orders, len(all_rows),
+                                                 1 if buffer_rows else 0, reads_before)
+                        return True
+                    
+                    # Все обновления и новые строки - двумя пакетными запросами
+                    self._execute_plan(self.plan)
+                    logger.info(f"✅ Записано {len(all_rows)} строк в таблицу")
                     self.ensure_buffer_rows(last_used_row, buffer_size=1000)
                     
                     # Формируем итоговое сообщение
@@ -1359,27 +1488,63 @@ class SheetsSynchronizer:
                     summary_parts.append(f"➕ <b>Добавлено:</b> {len(new_orders)}")
                     summary_parts.append(f"📝 <b>Записано строк:</b> {len(all_rows)}")
                     
-                    sync_send_message("✅ " + "\n".join(summary_parts))
-            elif updated_orders:
+                    self._notify("✅ " + "\n".join(summary_parts))
+            elif updated_orders and not plan_only:
                 # Были только обновления, без добавления новых
+                self._execute_plan(self.plan)
                 summary_msg = f"✅ <b>Обновлено заказов:</b> {len(updated_orders)}"
                 
-                sync_send_message(summary_msg)
+                self._notify(summary_msg)
+            
+            if plan_only:
+                self._finish_plan_report(updated_orders, new_orders, 0, 0, reads_before)
+                return True
+            
+            # Обновления без новых строк (например, новые заказы без товаров)
+            if not self.plan.is_empty():
+                self._execute_plan(self.plan)
             
+            self._save_mirror()
             return True
             
         except Exception as e:
             logger.error(f"❌ Ошибка синхронизации: {e}")
-            sync_send_message(f"❌ Ошибка синхронизации: {e}")
+            self._notify(f"❌ Ошибка синхронизации: {e}")
             return False
+        finally:
+            self.snapshot = None
+            self.plan = None
+            self.plan_only = False
+    
+    def _finish_plan_report(
+        self,
+        updated_orders: List[str],
+        new_orders: List[Dict],
+        new_rows: int,
+        extra_writes: int,
+        reads_before: int
+    ) -> None:
+        """Заполнить plan_report пробного прогона по невыполненному плану и отправить отчёт."""
+        report = self.plan_report
+        report.updated_orders = list(updated_orders)
+        report.new_orders = [str(order.get('order_number')) for order in new_orders]
+        report.new_rows = new_rows
+        report.cost = self.plan.cost()
+        report.extra_writes = extra_writes
+        report.reads = get_budget('read').acquired - reads_before
+        logger.info(f"🧮 План синхронизации: {report.summary()}")
+        for flag in report.flags():
+            logger.warning(f"⚠️ {flag}")
+        sync_send_message(report.format_message())
 
 
-def sync_to_sheets(orders_json_path: str = "ozon_orders.json") -> bool:
+def sync_to_sheets(orders_json_path: str = "ozon_orders.json", plan_only: bool = False) -> bool:
     """
     Главная функция для синхронизации заказов с Google Sheets.
     
     Args:
         orders_json_path: Путь к JSON файлу с заказами
+        plan_only: Только план синхронизации: изменения, запросы к API и оценка времени, без записи
         
     Returns:
         True если успешно
@@ -1406,8 +1571,15 @@ def sync_to_sheets(orders_json_path: str = "ozon_orders.json") -> bool:
             return False
         
         # Синхронизируем
-        return sync.sync_orders(orders_data)
+        return sync.sync_orders(orders_data, plan_only=plan_only)
         
     except Exception as e:
         logger.error(f"❌ Ошибка синхронизации: {e}")
         return False
+
+
+if __name__ == "__main__":
+    import sys
+    
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    sync_to_sheets(args[0] if args else "ozon_orders.json", plan_only='--plan-only' in sys.argv)
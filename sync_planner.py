@@ -0,0 +1,132 @@
+"""
+Пробный прогон синхронизации заказов: что изменится и во что обойдётся.
+
+sync_orders(plan_only=True) проходит синхронизацию целиком - сравнение
+заказов, построчный diff, новые строки, границы - на снимке листа, но
+план не выполняет и вопросов в Telegram не задаёт. Итог - SyncPlanReport:
+
+- вставки и удаления строк, правки ячеек, запросы границ;
+- точное число запросов на запись и отправляемых ячеек - по тем же
+  batches(), которыми SheetUpdatePlan.execute отправил бы план;
+- число чтений листа (настоящая синхронизация сделает те же чтения);
+- оценка длительности при текущем остатке квот (quota_client).
+
+Отдельно отмечаются опасные случаи: заказы, разбросанные по нескольким
+блокам строк, полная перезапись блока из-за данных I-P, вопросы, которые
+задала бы синхронизация, и планы больше минутной квоты.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional
+
+from quota_client import QuotaBudget, get_budget
+from sheet_plan import PlanCost
+from sheet_snapshot import SheetSnapshot, split_blocks
+
+# Средняя длительность одного запроса к API без ожидания квоты, секунд
+REQUEST_SECONDS = 1.0
+# Рекомендуемый Google предел тела запроса
+MAX_PAYLOAD_BYTES = 2 * 1024 * 1024
+
+
+def estimate_seconds(calls: int, budget: QuotaBudget, request_seconds: float = REQUEST_SECONDS) -> float:
+    """
+    Оценка времени на calls запросов при текущем остатке бюджета.
+
+    Запросы сверх свободных мест окна ждут: каждые limit запросов - ещё одно окно.
+    """
+    if calls <= 0:
+        return 0.0
+    waiting = 0.0
+    overflow = calls - budget.available()
+    if overflow > 0:
+        waiting = math.ceil(overflow / budget.limit) * budget.window
+    return waiting + calls * request_seconds
+
+
+def scattered_orders(snapshot: SheetSnapshot, order_numbers: Iterable[str]) -> Dict[str, int]:
+    """Заказы, строки которых лежат в нескольких блоках: {номер заказа: количество блоков}."""
+    scattered = {}
+    for order_number in order_numbers:
+        blocks = split_blocks(snapshot.row_numbers(order_number))
+        if len(blocks) > 1:
+            scattered[order_number] = len(blocks)
+    return scattered
+
+
+class SyncPlanReport:
+    """Результат пробного прогона синхронизации."""
+
+    def __init__(self):
+        self.updated_orders: List[str] = []
+        self.new_orders: List[str] = []
+        self.new_rows = 0
+        self.cost = PlanCost()
+        # Запросы на запись вне плана (добавление буфера пустых строк)
+        self.extra_writes = 0
+        # Запросы на чтение за пробный прогон
+        self.reads = 0
+        # {номер заказа: количество блоков строк}
+        self.scattered: Dict[str, int] = {}
+        # Замечания синхронизации (перезапись блоков, пропущенные вопросы)
+        self.warnings: List[str] = []
+
+    @property
+    def writes(self) -> int:
+        return self.cost.calls + self.extra_writes
+
+    def estimated_seconds(
+        self,
+        read_budget: Optional[QuotaBudget] = None,
+        write_budget: Optional[QuotaBudget] = None
+    ) -> float:
+        """Оценка длительности настоящей синхронизации, секунд."""
+        return (
+            estimate_seconds(self.reads, read_budget or get_budget('read'))
+            + estimate_seconds(self.writes, write_budget or get_budget('write'))
+        )
+
+    def flags(self, write_budget: Optional[QuotaBudget] = None) -> List[str]:
+        """Опасные случаи плана."""
+        write_budget = write_budget or get_budget('write')
+        flags = [
+            f"заказ {order_number}: строки в {blocks} блоках (дубликаты)"
+            for order_number, blocks in sorted(self.scattered.items())
+        ]
+        flags.extend(self.warnings)
+        if self.writes > write_budget.limit:
+            flags.append(f"запросов на запись {self.writes} - больше минутной квоты ({write_budget.limit})")
+        if self.cost.payload_bytes > MAX_PAYLOAD_BYTES:
+            flags.append(
+                f"объём запросов {self.cost.payload_bytes / 1024 / 1024:.1f} МБ - "
+                f"больше рекомендуемых {MAX_PAYLOAD_BYTES // 1024 // 1024} МБ"
+            )
+        return flags
+
+    def summary(self) -> str:
+        return (
+            f"обновлено заказов: {len(self.updated_orders)}, новых: {len(self.new_orders)} "
+            f"({self.new_rows} строк); {self.cost.summary()}; "
+            f"запросов на запись: {self.writes}, чтений: {self.reads}, "
+            f"оценка: {self.estimated_seconds():.0f} с"
+        )
+
+    def format_message(self) -> str:
+        """Отчёт для Telegram (HTML)."""
+        cost = self.cost
+        lines = [
+            "🧮 <b>План синхронизации (без записи)</b>",
+            f"🔄 <b>Обновится заказов:</b> {len(self.updated_orders)}",
+            f"➕ <b>Новых заказов:</b> {len(self.new_orders)} ({self.new_rows} строк)",
+            f"↕️ <b>Строк:</b> +{cost.inserted_rows} / -{cost.deleted_rows}",
+            f"✏️ <b>Ячеек:</b> {cost.cells_sent} из {cost.cells} (копирований: {cost.copies})",
+            f"🖼 <b>Границ:</b> {cost.border_requests}",
+            f"📡 <b>Запросов:</b> запись {self.writes}, чтение {self.reads}",
+            f"⏱ <b>Оценка:</b> ~{math.ceil(self.estimated_seconds())} с",
+        ]
+        flags = self.flags()
+        if flags:
+            lines.append("")
+            lines.append("⚠️ <b>Внимание:</b>")
+            lines.extend(f"  • {flag}" for flag in flags)
+        return "\n".join(lines)
@@ -1,13 +1,11 @@
 """Telegram бот для управления парсером Ozon."""
 
-import asyncio
 import atexit
-import io
+import html
 import os
 import sys
 import shutil
 import re
-import signal
 import subprocess
 from datetime import datetime
 from typing import Optional, List
@@ -17,15 +15,23 @@ from telegram import BotCommand, Update
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 
 from config import Config
+from job_queue import CANCELLED, DONE, FAILED, RUNNING, Job, JobQueue
 from prompt_manager import PromptManager
+from scheduler import Scheduler
 
 # PID-файл для предотвращения запуска нескольких инстансов
 PID_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telegram_bot.pid")
 
-# Глобальные переменные для отслеживания статуса парсинга
-parsing_in_progress = False
+# Время последнего запуска парсинга
 last_parse_time = None
-current_parser_process = None  # Текущий процесс парсера для остановки
+# Найдены зависшие процессы парсера вне очереди - следующий /stop их убивает
+stray_parsers_found = False
+
+# Очередь заданий (общая с api_server): парсинг, синхронизации, пересопоставление
+JOB_QUEUE = JobQueue()
+PARSE_KINDS = ('parse', 'parse_range')
+# Встроенный планировщик автозапуска (вместо crontab)
+SCHEDULER = Scheduler(JOB_QUEUE)
 
 # Состояния для ConversationHandler (parse_range)
 WAITING_LAST_ORDER, WAITING_COUNT = range(2)
@@ -155,6 +161,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/parse_wb - 🟣 Парсинг Wildberries (CSV)\n"
         "/stop - Остановить парсинг\n"
         "/status - Показать статус парсера\n"
+        "/jobs - 📋 Очередь заданий\n"
+        "/cancel_job - 🚫 Отменить задание\n"
         "/test_antidetect - 🧪 Тест обхода блокировок\n"
         "/cron_on - ⏰ Включить автозапуск\n"
         "/cron_off - ⏸️ Отключить автозапуск\n"
@@ -194,25 +202,30 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "<b>/stop</b> - Остановить текущий парсинг\n"
         "  • Принудительно завершает работающий процесс\n"
         "  • Закрывает браузер и освобождает ресурсы\n\n"
+        "<b>/jobs</b> - 📋 Очередь заданий\n"
+        "  • Запросы во время работы парсера не отклоняются, а ждут в очереди\n"
+        "  • Показывает работающие, ожидающие и последние задания\n\n"
+        "<b>/cancel_job N</b> - 🚫 Отменить задание N из очереди\n"
+        "  • Работающее задание останавливается\n\n"
         "<b>/test_antidetect</b> - 🧪 Тестирование обхода блокировок\n"
         "  • Проверяет 7 различных методов обхода защиты\n"
         "  • Отправляет результаты с рекомендациями\n"
         "  • Помогает найти рабочую стратегию\n\n"
         "<b>/cron_on</b> - ⏰ Включить автоматический запуск\n"
-        "  • Активирует cron-задачу\n"
+        "  • Включает встроенный планировщик бота\n"
         "  • Парсер будет запускаться каждые 15 мин (9:00-21:00)\n\n"
         "<b>/cron_off</b> - ⏸️ Отключить автоматический запуск\n"
-        "  • Деактивирует cron-задачу\n"
+        "  • Выключает встроенный планировщик\n"
         "  • Парсер больше не будет запускаться автоматически\n\n"
         "<b>/cron_status</b> - 📋 Проверить статус автозапуска\n"
-        "  • Показывает, включен ли cron\n"
-        "  • Последние записи из лога автозапуска\n\n"
+        "  • Показывает, включен ли автозапуск, и время следующего запуска\n"
+        "  • Последние запуски по расписанию\n\n"
         "<b>/status</b> - Проверить статус парсера\n"
         "  • Показывает, запущен ли парсер сейчас\n"
         "  • Время последнего запуска\n\n"
         "<b>/help</b> - Показать эту справку\n\n"
         "⚠️ <b>Важно:</b>\n"
-        "• Парсер нельзя запустить, если он уже работает\n"
+        "• Повторный запуск во время работы парсера встаёт в очередь (/jobs)\n"
         "• Cookies нужно обновлять каждые 3-7 дней\n"
         "• При блокировках используйте /test_antidetect"
     )
@@ -253,13 +266,17 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update):
         return
     
-    global parsing_in_progress, last_parse_time
-    
-    if parsing_in_progress:
-        status_message = (
-            "⏳ <b>Парсер РАБОТАЕТ</b>\n\n"
-            "Дождитесь завершения текущего парсинга."
-        )
+    running = JOB_QUEUE.jobs((RUNNING,))
+    queued = [job for job in JOB_QUEUE.jobs() if job.status != RUNNING]
+    
+    if running:
+        status_message = "⏳ <b>Парсер РАБОТАЕТ</b>\n"
+        for job in running:
+            status_message += f"\n▶️ #{job.id} {job.title}"
+            if job.progress:
+                status_message += f"\n   {format_progress(job.progress)}"
+        if queued:
+            status_message += f"\n\n📥 В очереди: {len(queued)} (/jobs)"
     else:
         if last_parse_time:
             time_ago = datetime.now() - last_parse_time
@@ -283,39 +300,127 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(status_message, parse_mode='HTML')
 
 
-async def monitor_parser_process(update: Update, process: subprocess.Popen):
-    """
-    Мониторинг процесса парсера в фоновом режиме.
-    Позволяет боту обрабатывать другие команды (например /stop).
-    """
-    global parsing_in_progress, current_parser_process
-    
+def format_progress(event: dict) -> str:
+    """Событие прогресса парсера (parser_supervisor.emit_progress) для сообщения."""
+    stage = event.get('stage')
+    if stage == 'order':
+        return f"📦 Заказ {event.get('index')}/{event.get('total')}: <code>{event.get('order_number', '')}</code>"
+    if stage == 'orders':
+        return f"🔎 Найдено заказов: {event.get('total')}"
+    if stage == 'matching':
+        return "🔄 Сопоставление с каталогом"
+    if stage == 'sync':
+        return "📤 Синхронизация с Google Sheets"
+    if stage == 'done':
+        return "✅ Завершение"
+    return f"ℹ️ {stage}"
+
+
+async def send_to_chat(chat_id: Optional[int], message: str) -> None:
+    """Сообщение в чат задания; без чата - всем админам."""
+    if chat_id is None or _bot_application is None:
+        await notify_all_admins(message)
+        return
+    await _bot_application.bot.send_message(chat_id=chat_id, text=message, parse_mode='HTML')
+
+
+async def submit_job(update: Update, kind: str, args: List[str] = ()) -> Optional[Job]:
+    """Поставить задание в очередь и сообщить пользователю его место."""
+    assert update.message is not None
     try:
-        # Ждем завершения процесса с проверкой каждые 5 секунд
-        # Таймаут отключен - парсинг может работать неограниченно долго
-        
-        while True:
-            # Проверяем завершился ли процесс
-            returncode = process.poll()
-            
-            if returncode is not None:
-                # Процесс завершен
-                if returncode == 0:
-                    logger.info("✅ Парсинг завершен успешно")
-                    # Уведомление уже отправлено из main.py
-                else:
-                    logger.error(f"❌ Парсинг завершился с ошибкой: {returncode}")
-                break
-            
-            # Ждем 5 секунд перед следующей проверкой
-            await asyncio.sleep(5)
+        job = JOB_QUEUE.submit(kind, args, source='bot', chat_id=update.effective_chat.id if update.effective_chat else None)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ <b>Ошибка</b>\n\n{e}", parse_mode='HTML')
+        return None
     
-    except Exception as e:
-        logger.error(f"❌ Ошибка мониторинга процесса: {e}")
+    position = JOB_QUEUE.position(job.id)
+    if position <= 1 and not JOB_QUEUE.jobs((RUNNING,)):
+        state = "🚀 Запускается..."
+    else:
+        state = f"⏳ В очереди: {position}-е, запустится после освобождения ресурсов"
+    await update.message.reply_text(
+        f"📥 <b>{job.title}</b> - задание #{job.id}\n\n{state}\n\n"
+        "Очередь: /jobs, отмена: /cancel_job номер",
+        parse_mode='HTML'
+    )
+    return job
+
+
+async def on_job_event(job: Job) -> None:
+    """Уведомления о запуске и завершении заданий очереди."""
+    global last_parse_time
+    
+    if job.status == RUNNING:
+        if job.kind in PARSE_KINDS:
+            last_parse_time = datetime.now()
+        # Задание ждало в очереди - сообщаем о запуске
+        if job.started_at and job.started_at - job.created_at > 5:
+            await send_to_chat(job.chat_id, f"▶️ Задание #{job.id} запущено: <b>{job.title}</b>")
+        return
+    
+    if job.status == DONE:
+        logger.info(f"✅ Задание #{job.id} завершено успешно")
+        # Парсер сам сообщает о результатах в Telegram
+        if job.kind not in PARSE_KINDS:
+            await send_to_chat(job.chat_id, f"✅ <b>{job.title}</b> - задание #{job.id} завершено")
+    elif job.status == CANCELLED:
+        await send_to_chat(job.chat_id, f"🚫 Задание #{job.id} отменено: <b>{job.title}</b>")
+    elif job.status == FAILED:
+        logger.error(f"❌ Задание #{job.id} завершилось с ошибкой: {job.returncode}")
+        tail = (job.error or '')[-3000:]
+        await send_to_chat(
+            job.chat_id,
+            f"❌ <b>{job.title}</b> - задание #{job.id} завершилось с ошибкой (код {job.returncode})\n\n"
+            f"<pre>{html.escape(tail)}</pre>"
+        )
+
+
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /jobs - очередь заданий."""
+    if not update.message:
+        return
     
-    finally:
-        parsing_in_progress = False
-        current_parser_process = None
+    if not await check_access(update):
+        return
+    
+    active = JOB_QUEUE.jobs()
+    recent = JOB_QUEUE.jobs((DONE, FAILED, CANCELLED), limit=5)
+    icons = {RUNNING: '▶️', DONE: '✅', FAILED: '❌', CANCELLED: '🚫'}
+    
+    lines = ["📋 <b>Очередь заданий</b>\n"]
+    if not active:
+        lines.append("Нет активных заданий.")
+    for job in active:
+        lines.append(f"{icons.get(job.status, '⏳')} #{job.id} {job.title}")
+        if job.progress:
+            lines.append(f"   {format_progress(job.progress)}")
+    if recent:
+        lines.append("\n<b>Последние:</b>")
+        for job in recent:
+            finished = datetime.fromtimestamp(job.finished_at).strftime('%d.%m %H:%M') if job.finished_at else ''
+            lines.append(f"{icons.get(job.status, '')} #{job.id} {job.title} {finished}")
+    
+    await update.message.reply_text("\n".join(lines), parse_mode='HTML')
+
+
+async def cancel_job_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /cancel_job N - отменить задание очереди."""
+    if not update.message:
+        return
+    
+    if not await check_access(update):
+        return
+    
+    args = context.args or []
+    if len(args) != 1 or not args[0].lstrip('#').isdigit():
+        await update.message.reply_text("Использование: /cancel_job номер (см. /jobs)")
+        return
+    
+    job_id = int(args[0].lstrip('#'))
+    if JOB_QUEUE.cancel(job_id):
+        await update.message.reply_text(f"🚫 Задание #{job_id} отменяется")
+    else:
+        await update.message.reply_text(f"ℹ️ Задание #{job_id} не найдено или уже завершено")
 
 
 async def handle_prompt_response(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -415,89 +520,17 @@ async def parse_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update):
         return
     
-    global parsing_in_progress, last_parse_time, current_parser_process
-    
-    if parsing_in_progress:
-        await update.message.reply_text(
-            "⚠️ <b>Парсер уже запущен!</b>\n\n"
-            "Дождитесь завершения текущего парсинга или используйте /stop для остановки.",
-            parse_mode='HTML'
-        )
-        return
-    
-    parsing_in_progress = True
-    last_parse_time = datetime.now()
-    
     # Уведомляем других админов о запуске
     user_label = _format_user_label(update)
     await notify_all_admins(
-        f"🚀 <b>Парсинг запущен</b>\n\nПользователь: {user_label}",
+        f"🚀 <b>Парсинг запрошен</b>\n\nПользователь: {user_label}",
         exclude_user_id=update.effective_user.id
     )
     
-    await update.message.reply_text(
-        "🚀 <b>Запускаю парсер...</b>\n\n"
-        "Следите за обновлениями в этом чате.",
-        parse_mode='HTML'
-    )
-    
-    logger.info(f"Парсинг запущен вручную пользователем {update.effective_user.id}")
+    logger.info(f"Парсинг запрошен вручную пользователем {update.effective_user.id}")
     
-    try:
-        # Запускаем парсер как subprocess в фоновом режиме
-        # ИСПОЛЬЗУЕМ main.py с Strategy #3 (Desktop Linux UA) и защитой от concurrent runs
-        current_parser_process = subprocess.Popen(
-            ['python', 'main.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        logger.info(f"✅ Процесс парсера запущен (PID: {current_parser_process.pid})")
-        
-        # НЕ ждем завершения здесь - позволяем боту обрабатывать другие команды
-        # Запускаем фоновую задачу для мониторинга процесса
-        asyncio.create_task(monitor_parser_process(update, current_parser_process))
-    
-    except Exception as e:
-        logger.error(f"❌ Ошибка при запуске парсера: {e}")
-        await update.message.reply_text(
-            f"❌ <b>Ошибка</b>\n\n{str(e)}",
-            parse_mode='HTML'
-        )
-        parsing_in_progress = False
-        current_parser_process = None
-
-
-async def run_wb_sync_background(update: Update):
-    """Запуск синхронизации WB в фоновом режиме."""
-    if not update.message:
-        return
-        
-    try:
-        loop = asyncio.get_running_loop()
-        from wb_sheets_sync import sync_wb_to_sheets
-        
-        # Запускаем синхронизацию в отдельном потоке
-        result = await loop.run_in_executor(None, sync_wb_to_sheets)
-        
-        if result:
-            await update.message.reply_text(
-                "✅ <b>WB Синхронизация завершена успешно!</b>",
-                parse_mode='HTML'
-            )
-        else:
-            await update.message.reply_text(
-                "❌ <b>Ошибка при синхронизации WB</b>\n"
-                "Проверьте логи.",
-                parse_mode='HTML'
-            )
-    except Exception as e:
-        logger.error(f"❌ Ошибка при запуске WB Sync: {e}")
-        await update.message.reply_text(
-            f"❌ <b>Ошибка</b>\n\n{str(e)}",
-            parse_mode='HTML'
-        )
+    # Если парсер уже работает, задание встаёт в очередь (повторный запрос - то же задание)
+    await submit_job(update, 'parse')
 
 
 async def parse_wb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -509,16 +542,10 @@ async def parse_wb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update):
         return
     
-    await update.message.reply_text(
-        "🚀 <b>Запускаю синхронизацию WB...</b>\n\n"
-        "Чтение wb_products.csv и обновление Google Sheets.",
-        parse_mode='HTML'
-    )
-    
-    logger.info(f"WB Sync запущен пользователем {update.effective_user.id}")
+    logger.info(f"WB Sync запрошен пользователем {update.effective_user.id}")
     
-    # Запускаем задачу в фоне, чтобы не блокировать обработку сообщений (кнопок)
-    asyncio.create_task(run_wb_sync_background(update))
+    # Синхронизация идёт отдельным процессом через очередь заданий
+    await submit_job(update, 'wb_sync')
 
 
 async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -533,10 +560,24 @@ async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assert update.message is not None
     assert update.effective_user is not None
     
-    global parsing_in_progress, current_parser_process
+    global stray_parsers_found
+    
+    running = [job for job in JOB_QUEUE.jobs((RUNNING,)) if job.kind in PARSE_KINDS]
+    
+    if running:
+        logger.info(f"Остановка парсера запрошена пользователем {update.effective_user.id}")
+        for job in running:
+            # Процесс останавливает воркер очереди: terminate, через 5 секунд - kill
+            JOB_QUEUE.cancel(job.id)
+        await update.message.reply_text(
+            "⏹️ <b>Останавливаю парсер...</b>\n\n"
+            f"Задания: {', '.join(f'#{job.id}' for job in running)}",
+            parse_mode='HTML'
+        )
+        return
     
-    if not parsing_in_progress and current_parser_process is None:
-        # Дополнительная проверка: может быть зависший процесс
+    if not stray_parsers_found:
+        # Дополнительная проверка: может быть зависший процесс вне очереди
         try:
             pgrep_cmd = get_system_command("pgrep")
             result = subprocess.run(
@@ -554,7 +595,7 @@ async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     parse_mode='HTML'
                 )
                 # Устанавливаем флаг для следующего вызова
-                parsing_in_progress = True
+                stray_parsers_found = True
                 return
         except Exception as e:
             logger.error(f"Ошибка при проверке процессов: {e}")
@@ -566,78 +607,29 @@ async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    # Если current_parser_process None, но parsing_in_progress = True
-    # (это значит был вызван /stop после обнаружения зависшего процесса)
-    if current_parser_process is None:
-        try:
-            pkill_cmd = get_system_command("pkill")
-            result = subprocess.run(
-                [pkill_cmd, "-9", "-f", "python.*main.py"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            parsing_in_progress = False
-            
-            await update.message.reply_text(
-                "✅ <b>Зависшие процессы парсера убиты</b>\n\n"
-                "Использована команда: pkill -9 -f 'python.*main.py'",
-                parse_mode='HTML'
-            )
-            logger.info("✅ Зависшие процессы парсера убиты через pkill")
-            return
-        except Exception as e:
-            logger.error(f"Ошибка при убийстве процессов: {e}")
-            await update.message.reply_text(
-                f"❌ <b>Ошибка при остановке процессов</b>\n\n{str(e)}",
-                parse_mode='HTML'
-            )
-            return
-    
+    # Повторный /stop после обнаружения зависшего процесса
+    stray_parsers_found = False
     try:
-        logger.info(f"Остановка парсера запрошена пользователем {update.effective_user.id}")
+        pkill_cmd = get_system_command("pkill")
+        subprocess.run(
+            [pkill_cmd, "-9", "-f", "python.*main.py"],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
         
         await update.message.reply_text(
-            "⏹️ <b>Останавливаю парсер...</b>",
+            "✅ <b>Зависшие процессы парсера убиты</b>\n\n"
+            "Использована команда: pkill -9 -f 'python.*main.py'",
             parse_mode='HTML'
         )
-        
-        # Пытаемся корректно завершить процесс
-        current_parser_process.terminate()
-        
-        # Даем 5 секунд на завершение
-        try:
-            current_parser_process.wait(timeout=5)
-            logger.info("✅ Парсер остановлен корректно")
-            
-            await update.message.reply_text(
-                "✅ <b>Парсер остановлен</b>\n\n"
-                "Процесс завершен корректно.",
-                parse_mode='HTML'
-            )
-        
-        except subprocess.TimeoutExpired:
-            # Если не завершился - убиваем принудительно
-            logger.warning("⚠️ Процесс не завершился за 5 секунд, принудительное завершение")
-            current_parser_process.kill()
-            current_parser_process.wait()
-            
-            await update.message.reply_text(
-                "✅ <b>Парсер остановлен принудительно</b>\n\n"
-                "Процесс был завершен жестко (kill signal).",
-                parse_mode='HTML'
-            )
-    
+        logger.info("✅ Зависшие процессы парсера убиты через pkill")
     except Exception as e:
-        logger.error(f"❌ Ошибка при остановке парсера: {e}")
+        logger.error(f"Ошибка при убийстве процессов: {e}")
         await update.message.reply_text(
-            f"❌ <b>Ошибка при остановке</b>\n\n{str(e)}",
+            f"❌ <b>Ошибка при остановке процессов</b>\n\n{str(e)}",
             parse_mode='HTML'
         )
-    
-    finally:
-        parsing_in_progress = False
-        current_parser_process = None
 
 
 async def parse_range_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -652,16 +644,6 @@ async def parse_range_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
     assert update.message is not None
     assert update.effective_user is not None
     
-    global parsing_in_progress
-    
-    if parsing_in_progress:
-        await update.message.reply_text(
-            "⚠️ <b>Парсер уже работает</b>\n\n"
-            "Дождитесь завершения текущего парсинга.",
-            parse_mode='HTML'
-        )
-        return ConversationHandler.END
-    
     await update.message.reply_text(
         "⏳ 📋 <b>Парсинг диапазона заказов</b>\n\n"
         "Введите номер <b>последнего</b> заказа после дефиса.\n"
@@ -773,44 +755,12 @@ async def parse_range_count(update: Update, context: ContextTypes.DEFAULT_TYPE)
         f"• Первый заказ: <code>{first_order}</code>\n"
         f"• Последний заказ: <code>{last_order}</code>\n"
         f"• Всего заказов: <b>{count}</b>\n\n"
-        f"🚀 Запускаю парсинг...",
+        f"🚀 Ставлю парсинг в очередь...",
         parse_mode='HTML'
     )
     
-    # Запускаем парсинг
-    global parsing_in_progress, last_parse_time, current_parser_process
-    parsing_in_progress = True
-    last_parse_time = datetime.now()
-    
-    logger.info(f"Запуск парсинга диапазона {first_order} - {last_order}")
-    
-    # Запускаем main.py с параметрами диапазона
-    import sys
-    python_executable = sys.executable
-    script_path = os.path.join(os.path.dirname(__file__), "main.py")
-    
-    try:
-        process = subprocess.Popen(
-            [python_executable, script_path, "--range", first_order, last_order],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        current_parser_process = process
-        
-        # Запускаем мониторинг в фоновом режиме
-        asyncio.create_task(monitor_parser_process(update, process))
-        
-        logger.info(f"Парсер запущен с PID: {process.pid}")
-    
-    except Exception as e:
-        logger.error(f"❌ Ошибка при запуске парсинга диапазона: {e}")
-        await update.message.reply_text(
-            f"❌ <b>Ошибка запуска</b>\n\n{str(e)}",
-            parse_mode='HTML'
-        )
-        parsing_in_progress = False
+    logger.info(f"Запрошен парсинг диапазона {first_order} - {last_order}")
+    await submit_job(update, 'parse_range', [first_order, last_order])
     
     # Очищаем контекст
     if context.user_data is not None:
@@ -917,6 +867,13 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
             logger.error(f"Не удалось отправить сообщение об ошибке: {e}")
 
 
+def format_timestamp(timestamp: Optional[float]) -> str:
+    """Время в часовом поясе планировщика."""
+    if not timestamp:
+        return "—"
+    return datetime.fromtimestamp(timestamp, SCHEDULER.tz).strftime('%d.%m.%Y %H:%M:%S')
+
+
 async def cron_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /cron_status - проверить статус автозапуска."""
     if not check_update(update):
@@ -929,85 +886,32 @@ async def cron_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     assert update.message is not None
     assert update.effective_user is not None
     
-    try:
-        logger.info(f"Проверка статуса cron запрошена пользователем {update.effective_user.id}")
-        
-        # Проверяем есть ли активная задача в crontab
-        result = subprocess.run(
-            ['crontab', '-l'],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode != 0:
-            await update.message.reply_text(
-                "⚠️ <b>Ошибка проверки cron</b>\n\n"
-                "Не удалось получить список задач crontab.",
-                parse_mode='HTML'
-            )
-            return
-        
-        # Ищем строку с парсером
-        cron_lines = result.stdout.strip().split('\n')
-        parser_cron = None
-        is_active = False
-        
-        for line in cron_lines:
-            # Ищем по run_parser.sh или main.py в ozon_parser
-            if ('run_parser.sh' in line or 'main.py' in line) and 'ozon_parser' in line:
-                parser_cron = line
-                # Проверяем, закомментирована ли строка
-                is_active = not line.strip().startswith('#')
-                break
-        
-        if parser_cron is None:
-            status_message = (
-                "❌ <b>Автозапуск НЕ настроен</b>\n\n"
-                "Задача cron для парсера не найдена.\n"
-                "Используйте setup-cron.sh для настройки."
-            )
-        elif is_active:
-            status_message = (
-                "✅ <b>Автозапуск ВКЛЮЧЕН</b>\n\n"
-                "📋 Расписание:\n"
-                "<code>*/15 9-21 * * *</code>\n\n"
-                "⏰ Каждые 15 минут с 9:00 до 21:00 МСК\n"
-                "(48 запусков в день)\n\n"
-                "Используйте /cron_off для отключения."
-            )
-        else:
-            status_message = (
-                "⏸️ <b>Автозапуск ОТКЛЮЧЕН</b>\n\n"
-                "Задача cron существует, но закомментирована.\n\n"
-                "Используйте /cron_on для включения."
-            )
-        
-        # Добавляем информацию о последних запусках из лога
-        try:
-            log_result = subprocess.run(
-                ['tail', '-5', os.path.expanduser('~/ozon_parser/logs/cron.log')],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            if log_result.returncode == 0 and log_result.stdout.strip():
-                status_message += "\n\n📝 <b>Последние запуски:</b>\n"
-                log_lines = log_result.stdout.strip().split('\n')
-                for line in log_lines[-3:]:  # Последние 3 строки
-                    if line.strip():
-                        status_message += f"<code>{line[:80]}</code>\n"
-        except:
-            pass  # Игнорируем ошибки чтения лога
-        
-        await update.message.reply_text(status_message, parse_mode='HTML')
+    logger.info(f"Проверка статуса автозапуска запрошена пользователем {update.effective_user.id}")
     
-    except Exception as e:
-        logger.error(f"❌ Ошибка при проверке статуса cron: {e}")
-        await update.message.reply_text(
-            f"❌ <b>Ошибка</b>\n\n{str(e)}",
-            parse_mode='HTML'
+    schedule = SCHEDULER.schedules['parse']
+    if schedule.enabled:
+        status_message = (
+            "✅ <b>Автозапуск ВКЛЮЧЕН</b>\n\n"
+            f"⏰ {schedule.description} (МСК)\n"
+            f"Следующий запуск: {format_timestamp(schedule.next_run)}\n\n"
+            "Используйте /cron_off для отключения."
+        )
+    else:
+        status_message = (
+            "⏸️ <b>Автозапуск ОТКЛЮЧЕН</b>\n\n"
+            f"⏰ Расписание: {schedule.description} (МСК)\n\n"
+            "Используйте /cron_on для включения."
         )
+    
+    # Последние запуски по расписанию
+    finished = [job for job in JOB_QUEUE.jobs((DONE, FAILED, CANCELLED), limit=50) if job.source == 'schedule']
+    if finished:
+        icons = {DONE: '✅', FAILED: '❌', CANCELLED: '🚫'}
+        status_message += "\n\n📝 <b>Последние запуски:</b>\n"
+        for job in finished[-3:]:
+            status_message += f"{icons[job.status]} #{job.id} {format_timestamp(job.started_at or job.finished_at)}\n"
+    
+    await update.message.reply_text(status_message, parse_mode='HTML')
 
 
 async def cron_on_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1022,98 +926,29 @@ async def cron_on_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assert update.message is not None
     assert update.effective_user is not None
     
+    logger.info(f"Включение автозапуска запрошено пользователем {update.effective_user.id}")
+    
     try:
-        logger.info(f"Включение cron запрошено пользователем {update.effective_user.id}")
-        
-        await update.message.reply_text(
-            "⏰ <b>Включаю автозапуск...</b>",
-            parse_mode='HTML'
-        )
-        
-        # Получаем текущий crontab
-        result = subprocess.run(
-            ['crontab', '-l'],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode != 0:
+        if not SCHEDULER.set_enabled('parse', True):
             await update.message.reply_text(
-                "⚠️ <b>Ошибка</b>\n\n"
-                "Не удалось получить crontab. Возможно, cron не настроен.\n"
-                "Используйте setup-cron.sh для первоначальной настройки.",
+                "ℹ️ <b>Автозапуск уже включен</b>\n\n"
+                f"Следующий запуск: {format_timestamp(SCHEDULER.schedules['parse'].next_run)}",
                 parse_mode='HTML'
             )
             return
-        
-        cron_lines = result.stdout.strip().split('\n') if result.stdout.strip() else []
-        modified = False
-        new_cron_lines = []
-        
-        for line in cron_lines:
-            # Ищем по run_parser.sh или main.py в ozon_parser
-            if ('run_parser.sh' in line or 'main.py' in line) and 'ozon_parser' in line:
-                # Раскомментируем строку
-                if line.strip().startswith('#'):
-                    new_line = line.lstrip('#').lstrip()
-                    new_cron_lines.append(new_line)
-                    modified = True
-                    logger.info(f"Раскомментирована строка: {new_line}")
-                else:
-                    new_cron_lines.append(line)
-                    # Уже включено
-                    await update.message.reply_text(
-                        "ℹ️ <b>Автозапуск уже включен</b>\n\n"
-                        "Задача cron уже активна.",
-                        parse_mode='HTML'
-                    )
-                    return
-            else:
-                new_cron_lines.append(line)
-        
-        if not modified:
-            await update.message.reply_text(
-                "⚠️ <b>Задача не найдена</b>\n\n"
-                "Не найдена задача cron для парсера.\n"
-                "Используйте setup-cron.sh для настройки.",
-                parse_mode='HTML'
-            )
-            return
-        
-        # Записываем обновленный crontab
-        new_crontab = '\n'.join(new_cron_lines) + '\n'
-        
-        write_result = subprocess.run(
-            ['crontab', '-'],
-            input=new_crontab,
-            text=True,
-            capture_output=True
-        )
-        
-        if write_result.returncode != 0:
-            await update.message.reply_text(
-                f"❌ <b>Ошибка записи crontab</b>\n\n{write_result.stderr}",
-                parse_mode='HTML'
-            )
-            return
-        
-        logger.info("✅ Cron включен успешно")
-        await update.message.reply_text(
-            "✅ <b>Автозапуск ВКЛЮЧЕН</b>\n\n"
-            "⏰ Парсер будет запускаться:\n"
-            "• Каждые 15 минут\n"
-            "• С 9:00 до 21:00 МСК\n"
-            "• 48 раз в день\n\n"
-            "Используйте /cron_status для проверки.",
-            parse_mode='HTML'
-        )
+    except OSError as e:
+        logger.error(f"❌ Ошибка при включении автозапуска: {e}")
+        await update.message.reply_text(f"❌ <b>Ошибка</b>\n\n{str(e)}", parse_mode='HTML')
+        return
     
-    except Exception as e:
-        logger.error(f"❌ Ошибка при включении cron: {e}")
-        await update.message.reply_text(
-            f"❌ <b>Ошибка</b>\n\n{str(e)}",
-            parse_mode='HTML'
-        )
+    schedule = SCHEDULER.schedules['parse']
+    await update.message.reply_text(
+        "✅ <b>Автозапуск ВКЛЮЧЕН</b>\n\n"
+        f"⏰ Парсер будет запускаться {schedule.description} (МСК)\n"
+        f"Следующий запуск: {format_timestamp(schedule.next_run)}\n\n"
+        "Используйте /cron_status для проверки.",
+        parse_mode='HTML'
+    )
 
 
 async def cron_off_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1128,123 +963,37 @@ async def cron_off_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     assert update.message is not None
     assert update.effective_user is not None
     
+    logger.info(f"Отключение автозапуска запрошено пользователем {update.effective_user.id}")
+    
     try:
-        logger.info(f"Отключение cron запрошено пользователем {update.effective_user.id}")
-        
-        await update.message.reply_text(
-            "⏸️ <b>Отключаю автозапуск...</b>",
-            parse_mode='HTML'
-        )
-        
-        # Получаем текущий crontab
-        result = subprocess.run(
-            ['crontab', '-l'],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode != 0:
-            await update.message.reply_text(
-                "⚠️ <b>Ошибка</b>\n\n"
-                "Не удалось получить crontab.",
-                parse_mode='HTML'
-            )
-            return
-        
-        cron_lines = result.stdout.strip().split('\n') if result.stdout.strip() else []
-        modified = False
-        new_cron_lines = []
-        
-        for line in cron_lines:
-            # Ищем по run_parser.sh или main.py в ozon_parser
-            if ('run_parser.sh' in line or 'main.py' in line) and 'ozon_parser' in line:
-                # Комментируем строку
-                if not line.strip().startswith('#'):
-                    new_line = f"# {line}"
-                    new_cron_lines.append(new_line)
-                    modified = True
-                    logger.info(f"Закомментирована строка: {new_line}")
-                else:
-                    new_cron_lines.append(line)
-                    # Уже отключено
-                    await update.message.reply_text(
-                        "ℹ️ <b>Автозапуск уже отключен</b>\n\n"
-                        "Задача cron уже неактивна.",
-                        parse_mode='HTML'
-                    )
-                    return
-            else:
-                new_cron_lines.append(line)
-        
-        if not modified:
-            await update.message.reply_text(
-                "⚠️ <b>Задача не найдена</b>\n\n"
-                "Не найдена задача cron для парсера.",
-                parse_mode='HTML'
-            )
-            return
-        
-        # Записываем обновленный crontab
-        new_crontab = '\n'.join(new_cron_lines) + '\n'
-        
-        write_result = subprocess.run(
-            ['crontab', '-'],
-            input=new_crontab,
-            text=True,
-            capture_output=True
-        )
-        
-        if write_result.returncode != 0:
+        if not SCHEDULER.set_enabled('parse', False):
             await update.message.reply_text(
-                f"❌ <b>Ошибка записи crontab</b>\n\n{write_result.stderr}",
+                "ℹ️ <b>Автозапуск уже отключен</b>",
                 parse_mode='HTML'
             )
             return
-        
-        logger.info("✅ Cron отключен успешно")
-        await update.message.reply_text(
-            "✅ <b>Автозапуск ОТКЛЮЧЕН</b>\n\n"
-            "⏸️ Парсер больше не будет запускаться автоматически.\n\n"
-            "Используйте:\n"
-            "• /parse - для ручного запуска\n"
-            "• /cron_on - для повторного включения автозапуска",
-            parse_mode='HTML'
-        )
+    except OSError as e:
+        logger.error(f"❌ Ошибка при отключении автозапуска: {e}")
+        await update.message.reply_text(f"❌ <b>Ошибка</b>\n\n{str(e)}", parse_mode='HTML')
+        return
     
-    except Exception as e:
-        logger.error(f"❌ Ошибка при отключении cron: {e}")
-        await update.message.reply_text(
-            f"❌ <b>Ошибка</b>\n\n{str(e)}",
-            parse_mode='HTML'
-        )
+    await update.message.reply_text(
+        "✅ <b>Автозапуск ОТКЛЮЧЕН</b>\n\n"
+        "⏸️ Парсер больше не будет запускаться автоматически.\n\n"
+        "Используйте:\n"
+        "• /parse - для ручного запуска\n"
+        "• /cron_on - для повторного включения автозапуска",
+        parse_mode='HTML'
+    )
 
 
 async def post_init(application: Application):
-    """Настройка бота после инициализации - установка меню команд и проверка процессов."""
-    global parsing_in_progress, current_parser_process
-    
-    # Проверяем, есть ли реально запущенный парсер
-    try:
-        pgrep_cmd = get_system_command("pgrep")
-        result = subprocess.run(
-            [pgrep_cmd, "-f", "python.*main.py"],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
-            # Нет запущенных процессов парсера - сбрасываем флаги
-            if parsing_in_progress or current_parser_process is not None:
-                logger.warning("⚠️ Обнаружены некорректные флаги при старте (нет процессов парсера)")
-                parsing_in_progress = False
-                current_parser_process = None
-                logger.info("✅ Флаги parsing_in_progress и current_parser_process сброшены")
-        else:
-            # Есть запущенные процессы парсера
-            pids = result.stdout.strip().split('\n')
-            logger.warning(f"⚠️ Обнаружены запущенные процессы парсера: {', '.join(pids)}")
-            parsing_in_progress = True
-    except Exception as e:
-        logger.error(f"❌ Ошибка проверки процессов парсера: {e}")
+    """Настройка бота после инициализации - установка меню команд, запуск очереди и планировщика."""
+    # Задания, осиротевшие после перезапуска, возвращаются в очередь
+    JOB_QUEUE.listeners.append(on_job_event)
+    await JOB_QUEUE.start()
+    # Пропущенный за время простоя запуск по расписанию выполняется сразу
+    await SCHEDULER.start()
     
     commands = [
         BotCommand("start", "🏠 Главное меню"),
@@ -1257,12 +1006,20 @@ async def post_init(application: Application):
         BotCommand("cron_off", "⏸️ Отключить автозапуск"),
         BotCommand("cron_status", "📋 Статус автозапуска"),
         BotCommand("status", "📊 Статус парсера"),
+        BotCommand("jobs", "📋 Очередь заданий"),
+        BotCommand("cancel_job", "🚫 Отменить задание"),
         BotCommand("help", "❓ Справка"),
     ]
     await application.bot.set_my_commands(commands)
     logger.info("✅ Меню команд установлено")
 
 
+async def post_shutdown(application: Application):
+    """Остановка планировщика и очереди заданий при завершении бота."""
+    await SCHEDULER.stop()
+    await JOB_QUEUE.stop()
+
+
 def check_pid_file() -> bool:
     """
     Проверить, не запущен ли уже другой инстанс бота.
@@ -1325,7 +1082,7 @@ def main():
     logger.info("🤖 Запуск Telegram бота для управления парсером...")
     
     # Создаем приложение
-    application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).post_init(post_init).build()
+    application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     
     # Сохраняем ссылку для уведомлений всем админам
     _bot_application = application
@@ -1351,6 +1108,8 @@ def main():
     application.add_handler(parse_range_handler)
     
     application.add_handler(CommandHandler("stop", stop_command))
+    application.add_handler(CommandHandler("jobs", jobs_command))
+    application.add_handler(CommandHandler("cancel_job", cancel_job_command))
     application.add_handler(CommandHandler("test_antidetect", test_antidetect_command))
     application.add_handler(CommandHandler("cron_status", cron_status_command))
     application.add_handler(CommandHandler("cron_on", cron_on_command))
@@ -1366,7 +1125,7 @@ def main():
     application.add_error_handler(error_handler)
     
     logger.info("✅ Бот запущен и готов к работе")
-    logger.info("Доступные команды: /start, /help, /status, /parse, /stop, /test_antidetect, /cron_on, /cron_off, /cron_status")
+    logger.info("Доступные команды: /start, /help, /status, /parse, /stop, /jobs, /cancel_job, /test_antidetect, /cron_on, /cron_off, /cron_status")
     
     # Запускаем бота
     application.run_polling(allowed_updates=Update.ALL_TYPES)
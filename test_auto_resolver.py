@@ -0,0 +1,91 @@
+"""
+Тест автоматического сопоставления по истории решений (AutoResolver).
+"""
+
+from loguru import logger
+from auto_resolver import AutoResolver
+
+CATALOG = [
+    {'name': 'Термопаста Arctic MX-4', 'type': 'расходники', 'price': '500'},
+    {'name': 'Видеокарта RTX 4070 Super', 'type': 'Видеокарты', 'price': '60000'},
+    {'name': 'Видеокарта RTX 4060', 'type': 'Видеокарты', 'price': '30000'},
+    {'name': 'Винты для корпуса', 'type': 'расходники', 'price': '100'},
+]
+
+MAPPINGS = {
+    'термопаста arctic mx-4 4г 2 шт|': {
+        'original_name': 'Термопаста Arctic MX-4 4г 2 шт',
+        'mapped_name': 'Термопаста Arctic MX-4', 'mapped_type': 'расходники', 'color': ''
+    },
+    'видеокарта palit geforce rtx 4070 super jetstream oc|': {
+        'original_name': 'Видеокарта Palit GeForce RTX 4070 Super JetStream OC',
+        'mapped_name': 'Видеокарта RTX 4070 Super', 'mapped_type': 'Видеокарты', 'color': ''
+    },
+    'кабельные стяжки нейлон 100 шт|': {
+        'original_name': 'Кабельные стяжки нейлон 100 шт',
+        'mapped_name': 'Кабельные стяжки нейлон 100 шт', 'mapped_type': 'расходники', 'color': ''
+    },
+    'винты для корпуса набор x4|': {
+        'original_name': 'Винты для корпуса набор x4',
+        'mapped_name': 'Винты для корпуса', 'mapped_type': 'расходники', 'color': '', 'split_units': 4
+    },
+    'пакет подарочный|': {
+        'original_name': 'Пакет подарочный', 'mapped_name': 'SKIP', 'mapped_type': 'SKIP', 'color': ''
+    },
+}
+
+
+def test_resolves_pack_size_and_wording():
+    """Другое количество в упаковке и порядок слов - то же решение."""
+    logger.info("=== Тест: автосопоставление похожих товаров ===")
+    resolver = AutoResolver(MAPPINGS, CATALOG, threshold=0.6)
+
+    decision = resolver.resolve('Термопаста Arctic MX-4 4г 5 шт')
+    assert decision and decision['mapped_name'] == 'Термопаста Arctic MX-4'
+
+    decision = resolver.resolve('Palit Видеокарта GeForce RTX 4070 Super JetStream OC')
+    assert decision and decision['mapped_type'] == 'Видеокарты'
+
+    # "Оставить своё название" переносится на новый товар с его собственным названием
+    decision = resolver.resolve('Кабельные стяжки нейлон 50 шт')
+    assert decision and decision['mapped_name'] == 'Кабельные стяжки нейлон 50 шт'
+    assert decision['mapped_type'] == 'расходники'
+    logger.success("✅ Тест пройден")
+
+
+def test_guards():
+    """Другая модель, другое количество при разбивке, SKIP и низкая уверенность - без решения."""
+    logger.info("=== Тест: защита от ложных автосопоставлений ===")
+    resolver = AutoResolver(MAPPINGS, CATALOG, threshold=0.6)
+
+    assert resolver.resolve('Видеокарта Palit GeForce RTX 4060 Super JetStream OC') is None
+    assert resolver.resolve('Винты для корпуса набор x8') is None
+    assert resolver.resolve('Винты для корпуса набор x4')['split_units'] == 4
+    assert resolver.resolve('Пакет подарочный') is None
+    assert resolver.resolve('Термопаста') is None
+
+    # Товар из истории, которого больше нет в каталоге, не предлагается
+    assert AutoResolver(MAPPINGS, CATALOG[1:], threshold=0.6).resolve('Термопаста Arctic MX-4 4г 5 шт') is None
+
+    # Автоматические решения не используются для обучения
+    auto = {'x|': {**MAPPINGS['термопаста arctic mx-4 4г 2 шт|'], 'auto_resolved': 0.9}}
+    assert AutoResolver(auto, CATALOG).resolve('Термопаста Arctic MX-4 4г 2 шт') is None
+    logger.success("✅ Тест пройден")
+
+
+def test_learn_updates_decision():
+    """Новое решение пользователя по тому же названию заменяет прежнее."""
+    logger.info("=== Тест: обучение на новых решениях ===")
+    resolver = AutoResolver({}, CATALOG)
+    assert resolver.resolve('Видеокарта RTX 4060 Dual') is None
+
+    resolver.learn('Видеокарта RTX 4060 Dual', 'Видеокарта RTX 4070 Super', 'Видеокарты')
+    resolver.learn('Видеокарта RTX 4060 Dual', 'Видеокарта RTX 4060', 'Видеокарты')
+    assert resolver.resolve('видеокарта rtx 4060 dual')['mapped_name'] == 'Видеокарта RTX 4060'
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_resolves_pack_size_and_wording()
+    test_guards()
+    test_learn_updates_decision()
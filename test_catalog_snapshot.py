@@ -0,0 +1,113 @@
+"""
+Тест локального снимка каталога (CatalogSnapshot) и разбора листа "Настройки".
+"""
+
+import os
+
+from loguru import logger
+from catalog_snapshot import CatalogSnapshot
+from config import Config
+from fake_sheets import FakeClient
+from google_client import get_metadata
+from sheets_manager import SheetsManager
+
+SNAPSHOT_FILE = 'catalog_snapshot_test.sqlite3'
+
+
+def test_parse_products():
+    """Четвёрки столбцов разбираются в уникальные товары, заголовки пропускаются."""
+    logger.info("=== Тест: разбор листа каталога ===")
+    values = [
+        ['Цена', 'Наименование', 'Тип', 'Заказ', 'Цена', 'Наименование', 'Тип'],
+        ['100', ' Кабель USB-C ', 'Кабели', '1', '200', 'Мышь', 'Периферия'],
+        ['150', 'кабель usb-c', 'кабели', '2', '300', 'Без типа', ''],
+        ['50', 'Неполная'],
+    ]
+    products = SheetsManager._parse_products(values)
+    assert products == [
+        {'name': 'Кабель USB-C', 'type': 'Кабели', 'price': '100'},
+        {'name': 'Мышь', 'type': 'Периферия', 'price': '200'},
+    ]
+    logger.success("✅ Тест пройден")
+
+
+def test_snapshot_roundtrip():
+    """Снимок отдаётся только для той же версии таблицы."""
+    logger.info("=== Тест: снимок каталога ===")
+    if os.path.exists(SNAPSHOT_FILE):
+        os.remove(SNAPSHOT_FILE)
+    try:
+        snapshot = CatalogSnapshot(SNAPSHOT_FILE)
+        products = [{'name': f'Товар {i}', 'type': 'Тип', 'price': str(i)} for i in range(1000)]
+        assert snapshot.load('sheet:Настройки!A:AU', '2026-01-01T00:00:00.000Z') is None
+
+        assert snapshot.save('sheet:Настройки!A:AU', '2026-01-01T00:00:00.000Z', products)
+        assert snapshot.load('sheet:Настройки!A:AU', '2026-01-01T00:00:00.000Z') == products
+        assert snapshot.load('sheet:Настройки!A:AU', '2026-01-02T00:00:00.000Z') is None
+        assert snapshot.load('sheet:Настройки!A:Z', '2026-01-01T00:00:00.000Z') is None
+
+        # Повторное сохранение заменяет снимок целиком
+        assert snapshot.save('sheet:Настройки!A:AU', '2026-01-02T00:00:00.000Z', products[:10])
+        assert snapshot.load('sheet:Настройки!A:AU', '2026-01-02T00:00:00.000Z') == products[:10]
+    finally:
+        if os.path.exists(SNAPSHOT_FILE):
+            os.remove(SNAPSHOT_FILE)
+    logger.success("✅ Тест пройден")
+
+
+def test_snapshot_keyed_on_catalog_checksum():
+    """Запись синхронизации в ту же таблицу не сбрасывает снимок, изменение контрольной ячейки - сбрасывает."""
+    logger.info("=== Тест: версия каталога по контрольной ячейке ===")
+    if os.path.exists(SNAPSHOT_FILE):
+        os.remove(SNAPSHOT_FILE)
+    checksum_cell = Config.CATALOG_CHECKSUM_CELL
+    Config.CATALOG_CHECKSUM_CELL = ''
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        sync_sheet = spreadsheet.sheet1
+        catalog = spreadsheet.add_worksheet('Настройки', rows=100, cols=48)
+        catalog.update(range_name='A1', values=[['Цена', 'Наименование', 'Тип', 'Заказ'], ['100', 'Кабель', 'Кабели', '']])
+        get_metadata().invalidate()
+
+        manager = SheetsManager('unused.json', snapshot_file=SNAPSHOT_FILE)
+        manager.client = client
+
+        # Контрольная ячейка не настроена - каталог читается целиком, лист не меняется
+        products = manager.load_products_from_sheet(spreadsheet.url)
+        assert products == [{'name': 'Кабель', 'type': 'Кабели', 'price': '100'}]
+        catalog.stats.reset()
+        Config.CATALOG_CHECKSUM_CELL = 'AV1'
+        assert manager.load_products_from_sheet(spreadsheet.url) == products
+        assert catalog.stats.calls['values.get'] == 2  # пустая ячейка и весь каталог
+        assert catalog.stats.calls['values.update'] == 0 and catalog.stats.calls['batchUpdate'] == 0
+        assert catalog.cell_value(1, 48) == ''
+
+        # Ячейку с формулой настроили вручную (в подмене - её значение)
+        catalog.update(range_name='AV1', values=[['2-4170-8']])
+        assert manager.load_products_from_sheet(spreadsheet.url) == products
+
+        # Синхронизация пишет в другой лист той же таблицы - снимок остаётся в силе
+        sync_sheet.update(range_name='A2', values=[['01.01.2026', '0001-1']])
+        catalog.stats.reset()
+        assert manager.load_products_from_sheet(spreadsheet.url) == products
+        assert catalog.stats.calls['values.get'] == 1  # только контрольная ячейка
+
+        # Каталог изменился - контрольная ячейка даёт новое значение, полное чтение
+        catalog.update(range_name='B2', values=[['Кабель USB']])
+        catalog.update(range_name='AV1', values=[['2-4170-9']])
+        catalog.stats.reset()
+        assert manager.load_products_from_sheet(spreadsheet.url)[0]['name'] == 'Кабель USB'
+        assert catalog.stats.calls['values.get'] == 2
+        assert catalog.stats.calls['values.update'] == 0
+    finally:
+        Config.CATALOG_CHECKSUM_CELL = checksum_cell
+        get_metadata().invalidate()
+        if os.path.exists(SNAPSHOT_FILE):
+            os.remove(SNAPSHOT_FILE)
+    logger.success("✅ Тест пройден")
+
+if __name__ == "__main__":
+    test_parse_products()
+    test_snapshot_roundtrip()
+    test_snapshot_keyed_on_catalog_checksum()
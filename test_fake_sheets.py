@@ -0,0 +1,358 @@
+"""
+Тест синхронизации заказов на локальной подмене Google Sheets (fake_sheets).
+
+Проверяет итоговое содержимое листа и количество обращений к API.
+"""
+
+from loguru import logger
+
+import tempfile
+from pathlib import Path
+
+import sheets_sync
+from config import Config
+from fake_sheets import FakeClient
+from sheet_mirror import SheetMirror
+from sheets_sync import SheetsSynchronizer
+
+
+def make_order(order_number, items, date='01.01.2026', status='получен'):
+    return {
+        'order_number': order_number,
+        'date': date,
+        'items': [
+            {'name': name, 'mapped_name': name, 'mapped_type': 'Тип', 'quantity': quantity,
+             'price': 100, 'status': status, 'split_units': 1}
+            for name, quantity in items
+        ]
+    }
+
+
+def open_fake_sync(client, spreadsheet, mirror_file=None):
+    sync = SheetsSynchronizer('google_credentials.json', mirror_file=mirror_file)
+    sync.client = client
+    assert sync.open_sync_worksheet(spreadsheet.url, str(spreadsheet.sheet1.id))
+    return sync
+
+
+def test_sync_orders_on_fake_sheet():
+    """Обновление + новые заказы: один снимок, два пакетных запроса на запись."""
+    logger.info("=== Тест: синхронизация на подмене Google Sheets ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+
+        # Первая синхронизация: два заказа
+        sync = open_fake_sync(client, spreadsheet)
+        assert sync.sync_orders({'orders': [
+            make_order('100-1', [('Мышь', 2)]),
+            make_order('200-1', [('Кабель', 1)]),
+        ]})
+        assert [worksheet.cell_value(r, 2) for r in range(2, 5)] == ['100-1', '100-1', '200-1']
+
+        # Вторая: в первом заказе стало 3 мыши + новый заказ
+        spreadsheet.stats.reset()
+        assert sync.sync_orders({'orders': [
+            make_order('100-1', [('Мышь', 3)]),
+            make_order('200-1', [('Кабель', 1)]),
+            make_order('300-1', [('Клавиатура', 1)]),
+        ]})
+
+        column_b = [worksheet.cell_value(r, 2) for r in range(2, 7)]
+        assert column_b == ['100-1', '100-1', '100-1', '200-1', '300-1']
+        total = SheetsSynchronizer.ORDER_TOTAL_FORMULA
+        assert [worksheet.cell_value(r, 5) for r in range(2, 7)] == [total, '', '', total, total]
+
+        calls = spreadsheet.stats.calls
+        assert calls['values.get'] == 1, spreadsheet.stats
+        # План изменений + добавление буфера пустых строк (ensure_buffer_rows)
+        assert calls['batchUpdate'] == 2, spreadsheet.stats
+        assert spreadsheet.stats.requests['insertDimension'] == 1, spreadsheet.stats
+        assert calls['values.batchUpdate'] == 1, spreadsheet.stats
+        assert calls['values.update'] == 0, spreadsheet.stats
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_status_flip_writes_single_cell():
+    """Смена статуса - одна запись в D, данные I-P остаются на месте."""
+    logger.info("=== Тест: смена статуса на подмене Google Sheets ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+
+        sync = open_fake_sync(client, spreadsheet)
+        assert sync.sync_orders({'orders': [make_order('100-1', [('Кабель', 1), ('Мышь', 1)], status='забрать')]})
+        worksheet.update(range_name='I3', values=[['ART-1']])
+
+        spreadsheet.stats.reset()
+        order = make_order('100-1', [('Кабель', 1), ('Мышь', 1)], status='забрать')
+        order['items'][1]['status'] = 'получен'
+        assert sync.sync_orders({'orders': [order]})
+
+        assert worksheet.cell_value(3, 4) == 'TRUE'
+        assert worksheet.cell_value(3, 9) == 'ART-1'
+        assert spreadsheet.stats.calls['values.batchUpdate'] == 1, spreadsheet.stats
+        assert spreadsheet.stats.requests.get('insertDimension', 0) == 0, spreadsheet.stats
+        assert spreadsheet.stats.cells_written == 1, spreadsheet.stats
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_mirror_skips_unchanged_sheet():
+    """Зеркало: без изменений таблицы лист не читается, после правок - только хвост."""
+    logger.info("=== Тест: зеркало листа ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = FakeClient()
+            spreadsheet = client.create('Заказы')
+            worksheet = spreadsheet.sheet1
+            worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+
+            sync = open_fake_sync(client, spreadsheet, mirror_file=str(Path(tmp) / 'mirror.sqlite3'))
+            sync.mirror.tail_rows = 2
+            orders = {'orders': [make_order('100-1', [('Мышь', 2)]), make_order('200-1', [('Кабель', 1)])]}
+            assert sync.sync_orders(orders)
+
+            # Таблица не менялась: ни одного чтения значений
+            spreadsheet.stats.reset()
+            assert sync.sync_orders(orders)
+            assert spreadsheet.stats.calls['values.get'] == 0, spreadsheet.stats
+            assert spreadsheet.stats.calls['values.batchGet'] == 0, spreadsheet.stats
+            assert sorted(set(sync.get_existing_orders())) == ['100-1', '200-1']
+
+            # Пользователь вписал артикул в старую строку: читается только хвост
+            # (номера заказов в нём не сдвинулись), а строки заказов выше хвоста -
+            # одним batchGet перед сравнением
+            worksheet.update(range_name='I2', values=[['ART-1']])
+            spreadsheet.stats.reset()
+            assert sync.sync_orders(orders)
+            assert spreadsheet.stats.calls['values.get'] == 1, spreadsheet.stats
+            assert spreadsheet.stats.calls['values.batchGet'] == 1, spreadsheet.stats
+
+            # Ручная правка статуса выше хвоста видна при сравнении и исправляется;
+            # время изменения таблицы - при снимке, перед первой записью и при сохранении
+            worksheet.update(range_name='D2', values=[['FALSE']])
+            spreadsheet.stats.reset()
+            assert sync.sync_orders(orders)
+            assert worksheet.cell_value(2, 4) == 'TRUE'
+            assert spreadsheet.stats.calls['drive.files.get'] == 3, spreadsheet.stats
+            assert worksheet.cell_value(2, 9) == 'ART-1'
+
+            # Чужая правка во время синхронизации: зеркало сбрасывается, следующий снимок - полный
+            compare_orders = sync.compare_orders
+
+            def compare_and_edit(order, sheets_data):
+                worksheet.update(range_name='J2', values=[['правка']])
+                return compare_orders(order, sheets_data)
+
+            sync.compare_orders = compare_and_edit
+            assert sync.sync_orders(orders)
+            sync.compare_orders = compare_orders
+            spreadsheet.stats.reset()
+            assert sync.sync_orders(orders)
+            assert spreadsheet.stats.calls['values.get'] == 1, spreadsheet.stats
+            assert sync.mirror.load(sync._mirror_source())[1][1][9] == 'правка'
+
+            # Пользователь удалил строку выше хвоста: A-P дочитывается с места расхождения
+            worksheet._delete(1, 2)
+            spreadsheet.touch()
+            state = SheetMirror(str(Path(tmp) / 'mirror.sqlite3'), tail_rows=1)
+            snapshot = state.load_snapshot(worksheet, sync._mirror_source(), spreadsheet.get_lastUpdateTime())
+            assert [row[1] for row in snapshot.rows] == [row[1] for row in worksheet.get_values('A:P')]
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_mirror_detects_rows_moved_above_tail():
+    """Строки переставили выше хвоста: хвост совпадает, но перечитанные строки выдают сдвиг."""
+    logger.info("=== Тест: зеркало и перенос строк выше хвоста ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = FakeClient()
+            spreadsheet = client.create('Заказы')
+            worksheet = spreadsheet.sheet1
+            worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+
+            sync = open_fake_sync(client, spreadsheet, mirror_file=str(Path(tmp) / 'mirror.sqlite3'))
+            sync.mirror.tail_rows = 2
+            orders = [make_order(f'{n}00-1', [(f'Товар {n}', 1)]) for n in range(1, 5)]
+            assert sync.sync_orders({'orders': orders})
+            assert [worksheet.cell_value(r, 2) for r in range(2, 6)] == ['100-1', '200-1', '300-1', '400-1']
+
+            # Строки 2 и 3 поменяли местами: хвост (строки 4-5) не изменился
+            worksheet.grid[1], worksheet.grid[2] = worksheet.grid[2], worksheet.grid[1]
+            spreadsheet.touch()
+            spreadsheet.stats.reset()
+            assert sync.sync_orders({'orders': orders[:2]})
+            # Хвост, перечитанные строки и полное чтение после обнаруженного сдвига
+            assert spreadsheet.stats.calls['values.get'] == 2, spreadsheet.stats
+            assert spreadsheet.stats.calls['values.batchGet'] == 1, spreadsheet.stats
+            assert spreadsheet.stats.calls['values.batchUpdate'] == 0, spreadsheet.stats
+            # Зеркало сохранено по полному чтению - с переставленными строками
+            mirrored = sync.mirror.load(sync._mirror_source())[1]
+            assert [row[1] for row in mirrored] == [row[1] for row in worksheet.get_values('A:P')]
+            assert mirrored[1][1] == '200-1'
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_bulk_units_are_copied_on_server():
+    """100 единиц товара: в запросе одна строка, остальные копируются copyPaste."""
+    logger.info("=== Тест: копирование строк единиц товара ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+        spreadsheet.stats.reset()
+
+        sync = open_fake_sync(client, spreadsheet)
+        assert sync.sync_orders({'orders': [make_order('100-1', [('Мышь', 100)])]})
+
+        assert [worksheet.cell_value(r, 7) for r in (2, 50, 101)] == ['Мышь'] * 3
+        assert worksheet.cell_value(101, 2) == '100-1'
+        assert worksheet.cell_value(102, 2) == ''
+        assert spreadsheet.stats.requests['copyPaste'] == 1, spreadsheet.stats
+        assert spreadsheet.stats.cells_written < 50, spreadsheet.stats
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_array_total_formula_mode():
+    """Режим arrayformula: одна формула в E1, столбец E данных пустой."""
+    logger.info("=== Тест: формула сумм в E1 ===")
+    send_message = sheets_sync.sync_send_message
+    mode = Config.ORDER_TOTAL_MODE
+    sheets_sync.sync_send_message = lambda message: True
+    Config.ORDER_TOTAL_MODE = 'arrayformula'
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус', 'Итого']])
+
+        sync = open_fake_sync(client, spreadsheet)
+        assert sync.sync_orders({'orders': [make_order('100-1', [('Мышь', 2)])]})
+        formula = worksheet.cell_value(1, 5)
+        assert formula.startswith('={"Итого";ARRAYFORMULA(')
+        assert [worksheet.cell_value(r, 5) for r in (2, 3)] == ['', '']
+
+        # Формула уже стоит - повторно не устанавливается
+        assert not sync.ensure_array_total_formula()
+    finally:
+        sheets_sync.sync_send_message = send_message
+        Config.ORDER_TOTAL_MODE = mode
+    logger.success("✅ Тест пройден")
+
+
+def test_array_total_formula_installed_without_changes():
+    """Переход на arrayformula на листе со старыми SUM: формула ставится и при синхронизации без изменений."""
+    logger.info("=== Тест: формула сумм без изменений заказов ===")
+    send_message = sheets_sync.sync_send_message
+    mode = Config.ORDER_TOTAL_MODE
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус', 'Итого']])
+        orders = {'orders': [make_order('100-1', [('Мышь', 2)])]}
+
+        Config.ORDER_TOTAL_MODE = 'sumif'
+        sync = open_fake_sync(client, spreadsheet)
+        assert sync.sync_orders(orders)
+        worksheet.update(range_name='E2', values=[['=SUM(F2:F3)']])
+
+        Config.ORDER_TOTAL_MODE = 'arrayformula'
+        spreadsheet.stats.reset()
+        assert sync.sync_orders(orders)
+        assert spreadsheet.stats.calls['batchUpdate'] == 1, spreadsheet.stats
+        assert worksheet.cell_value(1, 5).startswith('={"Итого";ARRAYFORMULA(')
+        assert worksheet.cell_value(2, 5) == ''
+    finally:
+        sheets_sync.sync_send_message = send_message
+        Config.ORDER_TOTAL_MODE = mode
+    logger.success("✅ Тест пройден")
+
+
+def test_plan_only_predicts_real_sync():
+    """Пробный прогон ничего не пишет, а его запросы совпадают с настоящей синхронизацией."""
+    logger.info("=== Тест: пробный прогон синхронизации ===")
+    send_message = sheets_sync.sync_send_message
+    messages = []
+    sheets_sync.sync_send_message = lambda message: messages.append(message) or True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+
+        sync = open_fake_sync(client, spreadsheet)
+        assert sync.sync_orders({'orders': [
+            make_order('100-1', [('Мышь', 2)]),
+            make_order('200-1', [('Кабель', 1)]),
+        ]})
+        # Дубликат строки заказа 100-1 ниже заказа 200-1
+        worksheet.update(range_name='A5', values=[['01.01.2026', '100-1', 'Ozon', 'TRUE', '', 100, 'Мышь', 'Тип']])
+        orders = {'orders': [
+            make_order('100-1', [('Мышь', 2)]),
+            make_order('200-1', [('Кабель', 2)]),
+            make_order('300-1', [('Клавиатура', 1)]),
+        ]}
+        before = [worksheet.get_values(f'A{r}:P{r}') for r in range(1, 8)]
+
+        spreadsheet.stats.reset()
+        messages.clear()
+        assert sync.sync_orders(orders, plan_only=True)
+        report = sync.plan_report
+        assert spreadsheet.stats.calls['batchUpdate'] == 0, spreadsheet.stats
+        assert spreadsheet.stats.calls['values.batchUpdate'] == 0, spreadsheet.stats
+        assert spreadsheet.stats.cells_written == 0, spreadsheet.stats
+        assert [worksheet.get_values(f'A{r}:P{r}') for r in range(1, 8)] == before
+        assert len(messages) == 1 and 'План синхронизации' in messages[0]
+        assert report.updated_orders == ['100-1', '200-1']
+        assert report.new_orders == ['300-1'] and report.new_rows == 1
+        assert report.scattered == {'100-1': 2}
+        assert any('100-1' in flag for flag in report.flags())
+        assert report.cost.inserted_rows == 1 and report.cost.border_requests > 0
+
+        # Настоящая синхронизация отправляет ровно предсказанные запросы и ячейки
+        spreadsheet.stats.reset()
+        assert sync.sync_orders(orders)
+        calls = spreadsheet.stats.calls
+        assert calls['batchUpdate'] + calls['values.batchUpdate'] == report.writes, spreadsheet.stats
+        assert spreadsheet.stats.cells_written == report.cost.cells_sent, spreadsheet.stats
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_sync_orders_on_fake_sheet()
+    test_status_flip_writes_single_cell()
+    test_mirror_skips_unchanged_sheet()
+    test_mirror_detects_rows_moved_above_tail()
+    test_bulk_units_are_copied_on_server()
+    test_array_total_formula_mode()
+    test_array_total_formula_installed_without_changes()
+    test_plan_only_predicts_real_sync()
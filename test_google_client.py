@@ -0,0 +1,84 @@
+"""
+Тест кеша метаданных таблиц (google_client) на подмене Google Sheets.
+"""
+
+from loguru import logger
+
+from fake_sheets import FakeClient
+from google_client import MetadataCache, get_metadata, spreadsheet_key
+from sheet_plan import SheetUpdatePlan
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_spreadsheet_key():
+    assert spreadsheet_key('https://docs.google.com/spreadsheets/d/abc123/edit#gid=0') == 'abc123'
+    assert spreadsheet_key('abc123') == 'abc123'
+
+
+def test_metadata_fetched_once_per_ttl():
+    """Повторное открытие таблицы и поиск листов - без запросов до истечения TTL."""
+    logger.info("=== Тест: кеш метаданных таблиц ===")
+    client = FakeClient()
+    spreadsheet = client.create('Заказы')
+    orders = spreadsheet.add_worksheet('Заказы WB')
+    spreadsheet.stats.reset()
+
+    clock = FakeClock()
+    cache = MetadataCache(ttl=300, clock=clock)
+    assert cache.open(client, spreadsheet.url) is spreadsheet
+    assert cache.worksheet_by_gid(spreadsheet, str(orders.id)) is orders
+    assert cache.open(client, spreadsheet.url + '/edit') is spreadsheet
+    assert cache.worksheet_by_title(spreadsheet, 'Лист1') is spreadsheet.sheet1
+    assert cache.worksheet_by_gid(spreadsheet, '999') is None
+    assert spreadsheet.stats.calls['spreadsheets.get'] == 2, spreadsheet.stats
+
+    # Истёк TTL - метаданные запрашиваются заново
+    clock.now = 301
+    cache.open(client, spreadsheet.url)
+    cache.worksheets(spreadsheet)
+    assert spreadsheet.stats.calls['spreadsheets.get'] == 4, spreadsheet.stats
+
+    # Добавили лист - после сброса он виден сразу
+    archive = spreadsheet.add_worksheet('Архив 2024')
+    cache.invalidate(spreadsheet.id)
+    assert cache.worksheet_by_title(spreadsheet, 'Архив 2024') is archive
+    logger.success("✅ Тест пройден")
+
+
+def test_structural_plan_invalidates_metadata():
+    """После вставки строк планом метаданные таблицы (размеры листов) перечитываются."""
+    client = FakeClient()
+    spreadsheet = client.create('Заказы')
+    metadata = get_metadata()
+    metadata.invalidate()
+    try:
+        assert metadata.open(client, spreadsheet.url) is spreadsheet
+        metadata.worksheets(spreadsheet)
+
+        # Только значения - кеш остаётся
+        plan = SheetUpdatePlan(spreadsheet.sheet1)
+        plan.update(2, 0, [['01.01.2026', '100-1']])
+        plan.execute(spreadsheet)
+        spreadsheet.stats.reset()
+        metadata.worksheets(spreadsheet)
+        assert spreadsheet.stats.calls['spreadsheets.get'] == 0, spreadsheet.stats
+
+        plan.insert_rows(2, 3)
+        plan.execute(spreadsheet)
+        metadata.open(client, spreadsheet.url)
+        assert spreadsheet.stats.calls['spreadsheets.get'] == 1, spreadsheet.stats
+    finally:
+        metadata.invalidate()
+
+
+if __name__ == "__main__":
+    test_spreadsheet_key()
+    test_metadata_fetched_once_per_ttl()
+    test_structural_plan_invalidates_metadata()
@@ -0,0 +1,191 @@
+"""
+Тест очереди заданий (job_queue): допуск по ресурсам, исполнение, отмена.
+"""
+
+import asyncio
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue, job_command
+
+SCRIPTS = {
+    'parse': 'print("ok")',
+    'sheets_sync': 'import sys; print("нет листа"); sys.exit(2)',
+    'rematch': 'import time; time.sleep(30)',
+}
+
+
+def fake_command(kind, args):
+    return [sys.executable, '-c', SCRIPTS.get(kind, 'pass')]
+
+
+def test_job_command_validates_args():
+    assert job_command('parse_range', ['46206571-0680', '46206571-0710'])[-3:] == [
+        '--range', '46206571-0680', '46206571-0710'
+    ]
+    for kind, args in (('parse_range', ['1-1']), ('parse_range', ['1-1', '; rm']), ('wb_sync', ['x']),
+                       ('sheets_sync', ['../secret.json']), ('unknown', [])):
+        try:
+            job_command(kind, args)
+        except ValueError:
+            continue
+        raise AssertionError(f"{kind} {args} должен быть отклонён")
+
+
+def test_admission_respects_resources():
+    """Задания с общим ресурсом не запускаются вместе, ожидающее не обгоняют."""
+    logger.info("=== Тест: допуск заданий по ресурсам ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(str(Path(tmp) / 'jobs.sqlite3'), workers=3, min_free_mb=0, log_dir=None)
+        parse = queue.submit('parse')
+        assert queue.submit('parse').id == parse.id  # Повторный запрос - то же задание
+        sync = queue.submit('sheets_sync')
+        wb = queue.submit('wb_sync')
+        rematch = queue.submit('rematch')
+        assert queue.position(sync.id) == 2
+
+        # parse занимает sheets и catalog (сопоставляет товары); sheets_sync,
+        # wb_sync и rematch ждут - их ресурсы заняты или зарезервированы
+        assert [job.id for job in queue._claim()] == [parse.id]
+        assert queue.get(parse.id).status == RUNNING
+        assert queue._claim() == []
+
+        assert queue.cancel(wb.id)
+        assert queue.get(wb.id).status == CANCELLED
+        with sqlite3.connect(queue.db_path) as conn:
+            conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (DONE, parse.id))
+        assert [job.id for job in queue._claim()] == [sync.id, rematch.id]
+    logger.success("✅ Тест пройден")
+
+
+def test_jobs_run_and_cancel():
+    logger.info("=== Тест: исполнение и отмена заданий ===")
+    events = []
+
+    async def listener(job):
+        events.append((job.id, job.status))
+
+    async def run(db_path):
+        queue = JobQueue(db_path, workers=3, command=fake_command, min_free_mb=0, log_dir=None)
+        queue.listeners.append(listener)
+        await queue.start()
+        ok = queue.submit('parse')
+        failed = queue.submit('sheets_sync')
+        slow = queue.submit('rematch')
+        deadline = time.time() + 30
+        while queue.get(slow.id).status != RUNNING and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        assert queue.cancel(slow.id)
+        while queue.jobs() and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        await queue.stop()
+        return queue, ok, failed, slow
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue, ok, failed, slow = asyncio.run(run(str(Path(tmp) / 'jobs.sqlite3')))
+        assert queue.get(ok.id).status == DONE
+        assert queue.get(ok.id).child_pid  # PID процесса задания сохранён для recover
+        failed = queue.get(failed.id)
+        assert failed.status == FAILED and failed.returncode == 2 and 'нет листа' in failed.error
+        assert queue.get(slow.id).status == CANCELLED
+        assert (ok.id, RUNNING) in events and (ok.id, DONE) in events
+        assert queue.jobs() == []
+    logger.success("✅ Тест пройден")
+
+
+def test_listeners_see_jobs_of_other_process():
+    """Бот сообщает о запуске и завершении задания, которое забрал api_server."""
+    logger.info("=== Тест: события заданий другого процесса ===")
+    events = []
+
+    async def listener(job):
+        events.append((job.id, job.status))
+
+    async def run(db_path):
+        bot = JobQueue(db_path, min_free_mb=0, log_dir=None)
+        bot.owner = 'bot-host:1'
+        bot.listeners.append(listener)
+        bot._watch_since = time.time()
+        api = JobQueue(db_path, command=fake_command, min_free_mb=0, log_dir=None)
+        await api.start()
+        job = bot.submit('rematch')
+        deadline = time.time() + 30
+        while api.get(job.id).status != RUNNING and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        await bot._watch_others()
+        await bot._watch_others()
+        assert bot.cancel(job.id)
+        while api.get(job.id).status == RUNNING and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        await bot._watch_others()
+        await bot._watch_others()
+        await api.stop()
+        return job
+
+    with tempfile.TemporaryDirectory() as tmp:
+        job = asyncio.run(run(str(Path(tmp) / 'jobs.sqlite3')))
+        assert events == [(job.id, RUNNING), (job.id, CANCELLED)]
+    logger.success("✅ Тест пройден")
+
+
+def test_recover_requeues_orphaned_jobs():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'jobs.sqlite3')
+        queue = JobQueue(db_path, min_free_mb=0, log_dir=None)
+        job = queue.submit('parse')
+        with sqlite3.connect(db_path) as conn:
+            # PID 2**22 + 1 больше pid_max Linux - такого процесса нет
+            conn.execute("UPDATE jobs SET status = ?, owner = ? WHERE id = ?",
+                         (RUNNING, f"{socket.gethostname()}:{2 ** 22 + 1}", job.id))
+        assert queue.recover() == 1
+        assert queue.get(job.id).status == QUEUED
+
+
+def test_recover_waits_for_orphaned_child():
+    """Исполнитель завершился, а его main.py ещё работает - задание не перезапускается."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'jobs.sqlite3')
+        queue = JobQueue(db_path, min_free_mb=0, log_dir=None)
+        job = queue.submit('parse')
+        child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("UPDATE jobs SET status = ?, owner = ?, child_pid = ? WHERE id = ?",
+                             (RUNNING, f"{socket.gethostname()}:{2 ** 22 + 1}", child.pid, job.id))
+            assert queue.recover() == 0
+            assert queue.get(job.id).status == RUNNING
+        finally:
+            child.kill()
+            child.wait()
+        assert queue.recover() == 1
+        assert queue.get(job.id).status == QUEUED
+        assert queue.get(job.id).child_pid is None
+
+
+def test_child_pid_column_added_to_old_queue():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'jobs.sqlite3')
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                         "args TEXT NOT NULL, status TEXT NOT NULL, source TEXT NOT NULL, chat_id INTEGER, "
+                         "owner TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+                         "started_at REAL, finished_at REAL, returncode INTEGER, error TEXT, progress TEXT)")
+        job = JobQueue(db_path, min_free_mb=0, log_dir=None).submit('parse')
+        assert job.child_pid is None
+
+
+if __name__ == "__main__":
+    test_job_command_validates_args()
+    test_admission_respects_resources()
+    test_jobs_run_and_cancel()
+    test_listeners_see_jobs_of_other_process()
+    test_recover_requeues_orphaned_jobs()
+    test_recover_waits_for_orphaned_child()
+    test_child_pid_column_added_to_old_queue()
@@ -0,0 +1,112 @@
+"""
+Тест хранилища сопоставлений с журналом (MappingsStore).
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+from loguru import logger
+from mappings_store import MappingsStore
+
+
+def _snapshot_path() -> Path:
+    return Path(tempfile.mkdtemp()) / "product_mappings.json"
+
+
+def test_put_appends_to_journal():
+    """Запись дописывает одну строку в журнал и не трогает снимок."""
+    logger.info("=== Тест: запись в журнал ===")
+    path = _snapshot_path()
+    path.write_text(json.dumps({"товар|black": {"mapped_name": "А", "mapped_type": "т"}}), encoding="utf-8")
+    snapshot_before = path.read_text(encoding="utf-8")
+
+    store = MappingsStore(str(path))
+    assert store.put("новый|white", {"mapped_name": "Б", "mapped_type": "т"})
+
+    assert path.read_text(encoding="utf-8") == snapshot_before
+    lines = store.journal_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["key"] == "новый|white"
+
+    # Новый экземпляр (другой процесс) видит снимок + журнал
+    reopened = MappingsStore(str(path))
+    assert reopened.get("товар|black")["mapped_name"] == "А"
+    assert reopened.get("новый|white")["mapped_name"] == "Б"
+
+    logger.success("✅ Тест пройден")
+
+
+def test_refresh_and_compact():
+    """Чужие записи подхватываются, сворачивание даёт прежний формат файла."""
+    logger.info("=== Тест: обновление и сворачивание ===")
+    path = _snapshot_path()
+    writer = MappingsStore(str(path))
+    reader = MappingsStore(str(path))
+
+    writer.put("ключ", {"mapped_name": "В", "mapped_type": "т"})
+    reader.refresh(force=True)
+    assert reader.get("ключ")["mapped_name"] == "В"
+
+    writer.delete("ключ")
+    writer.put("другой", {"mapped_name": "Г", "mapped_type": "т"})
+    assert writer.compact()
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"другой": {"mapped_name": "Г", "mapped_type": "т"}}
+    assert store_journal_is_empty(writer)
+
+    # Снимок заменён - читатель перезагружается полностью
+    reader.refresh(force=True)
+    assert reader.get("ключ") is None
+    assert reader.get("другой")["mapped_name"] == "Г"
+
+    logger.success("✅ Тест пройден")
+
+
+def test_legacy_keys_are_normalized():
+    """Ключи старого формата (ё, лишние пробелы) приводятся к mapping_key."""
+    logger.info("=== Тест: нормализация старых ключей ===")
+    path = _snapshot_path()
+    path.write_text(json.dumps({"Чёрный  Кабель|Black": {"mapped_name": "Д"}}, ensure_ascii=False), encoding="utf-8")
+
+    store = MappingsStore(str(path))
+    assert store.get("черный кабель|black")["mapped_name"] == "Д"
+
+    logger.success("✅ Тест пройден")
+
+
+def test_color_variants_and_split_units():
+    """Цветовой вариант и split_units находятся одним обращением к индексу."""
+    logger.info("=== Тест: цветовые варианты и split_units ===")
+    path = _snapshot_path()
+    store = MappingsStore(str(path))
+    store.put("кабель|white", {"mapped_name": "Кабель", "mapped_type": "т"})
+    store.put("кабель", {"mapped_name": "Кабель (без цвета)", "mapped_type": "т"})
+    store.put("набор|black", {"mapped_name": "Набор", "mapped_type": "т", "split_units": 3})
+
+    # Точный цвет
+    assert store.lookup("Кабель", "White")["mapped_name"] == "Кабель"
+    # Нет black - берём white (порядок black → white → без цвета)
+    assert store.lookup("Кабель", "Black")["mapped_name"] == "Кабель"
+    assert store.lookup("Неизвестный", "Black") is None
+    assert set(store.color_variants("кабель")) == {"white", ""}
+
+    # После удаления white остаётся вариант без цвета
+    store.delete("кабель|white")
+    assert store.lookup("Кабель", "Black")["mapped_name"] == "Кабель (без цвета)"
+
+    assert store.split_units("Набор", "Black") == 3
+    assert store.split_units("Кабель", "White") == 1
+
+    logger.success("✅ Тест пройден")
+
+
+def store_journal_is_empty(store: MappingsStore) -> bool:
+    return not store.journal_path.exists() or store.journal_path.stat().st_size == 0
+
+
+if __name__ == "__main__":
+    test_put_appends_to_journal()
+    test_refresh_and_compact()
+    test_legacy_keys_are_normalized()
+    test_color_variants_and_split_units()
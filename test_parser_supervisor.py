@@ -0,0 +1,77 @@
+"""
+Тест запуска дочернего процесса под супервизором (parser_supervisor).
+"""
+
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+from loguru import logger
+
+from parser_supervisor import ParserSupervisor, parse_progress
+
+# Дочерний процесс: много строк в stderr (больше буфера трубы), события прогресса в stdout
+CHILD = """
+import sys
+from parser_supervisor import emit_progress
+emit_progress('orders', total=2)
+for i in range(20000):
+    sys.stderr.write(f"строка лога {i}\\n")
+emit_progress('order', index=1, total=2, order_number='100-1')
+print('готово')
+sys.exit(3)
+"""
+
+
+def test_parse_progress():
+    assert parse_progress('@@progress {"stage": "sync"}') == {'stage': 'sync'}
+    assert parse_progress('@@progress не json') is None
+    assert parse_progress('обычная строка') is None
+
+
+def test_streams_output_and_events():
+    """Вывод больше буфера трубы не блокирует процесс, события доходят по порядку."""
+    logger.info("=== Тест: супервизор процесса парсера ===")
+    events = []
+
+    async def on_progress(event):
+        events.append(event)
+
+    async def run(log_file):
+        supervisor = ParserSupervisor([sys.executable, '-c', CHILD], log_file=log_file, on_progress=on_progress)
+        await supervisor.start()
+        returncode = await asyncio.wait_for(supervisor.wait(), timeout=30)
+        return supervisor, returncode
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / 'logs' / 'parser_run.log'
+        supervisor, returncode = asyncio.run(run(str(log_file)))
+        log_text = log_file.read_text(encoding='utf-8')
+
+    assert returncode == 3 and not supervisor.running
+    assert [event['stage'] for event in events] == ['orders', 'order']
+    assert supervisor.progress == {'stage': 'order', 'index': 1, 'total': 2, 'order_number': '100-1'}
+    assert 'готово' in supervisor.tail(200)
+    assert len(supervisor.lines) == 200
+    assert '[stderr] строка лога 19999' in log_text
+    assert '@@progress' not in log_text
+    assert 'код завершения: 3' in log_text
+    logger.success("✅ Тест пройден")
+
+
+def test_stop_terminates_process():
+    async def run():
+        supervisor = ParserSupervisor([sys.executable, '-c', 'import time; time.sleep(60)'])
+        await supervisor.start()
+        stopped = await supervisor.stop(timeout=5)
+        return supervisor, stopped, await supervisor.wait()
+
+    supervisor, stopped, returncode = asyncio.run(run())
+    assert stopped and returncode != 0 and not supervisor.running
+
+
+if __name__ == "__main__":
+    test_parse_progress()
+    test_streams_output_and_events()
+    test_stop_terminates_process()
@@ -0,0 +1,196 @@
+"""
+Тест индекса каталога товаров (ProductIndex).
+
+Сравнивает результаты индекса с прежним линейным поиском по каталогу.
+"""
+
+import random
+import re
+
+from loguru import logger
+from product_index import ProductIndex, mapping_key, normalize_name
+
+
+def linear_search(products, search_name):
+    """Прежний поиск полным перебором каталога (эталон)."""
+    search_lower = search_name.lower()
+    similar = []
+    for idx, product in enumerate(products):
+        product_name_lower = product['name'].lower()
+        if product_name_lower == search_lower:
+            similar.append((100, idx))
+            continue
+        if search_lower in product_name_lower or product_name_lower in search_lower:
+            similar.append((80, idx))
+            continue
+        search_words = set(re.findall(r'\w+', search_lower))
+        product_words = set(re.findall(r'\w+', product_name_lower))
+        if search_words and product_words:
+            common_words = search_words & product_words
+            if common_words:
+                score = int((len(common_words) / max(len(search_words), len(product_words))) * 70)
+                if score >= 30:
+                    similar.append((score, idx))
+    similar.sort(key=lambda x: (-x[0], x[1]))
+    return [(products[idx]['name'], score) for score, idx in similar[:5]]
+
+
+CATALOG = [
+    {'name': 'Видеокарта RTX 4070 Super', 'type': 'видеокарты'},
+    {'name': 'Видеокарта RTX 4070', 'type': 'видеокарты'},
+    {'name': 'Кабель USB-C', 'type': 'расходники'},
+    {'name': 'Кабель USB-C 2м', 'type': 'расходники'},
+    {'name': 'Блок питания 750W', 'type': 'блоки питания'},
+    {'name': 'Термопаста', 'type': 'расходники'},
+    {'name': 'SSD Samsung 980 1TB', 'type': 'накопители'},
+]
+
+
+def test_exact_and_contains():
+    """Точное совпадение - 100, вхождение названия - 80."""
+    logger.info("=== Тест: точное совпадение и вхождение ===")
+    index = ProductIndex(CATALOG)
+
+    results = index.search('Кабель USB-C')
+    assert results[0]['name'] == 'Кабель USB-C'
+    assert results[0]['match_score'] == 100
+    assert results[1]['name'] == 'Кабель USB-C 2м'
+    assert results[1]['match_score'] == 80
+
+    # Название каталога внутри более длинного названия из заказа
+    results = index.search('Термопаста Arctic MX-4 4г')
+    assert results[0]['name'] == 'Термопаста'
+    assert results[0]['match_score'] == 80
+
+    # Часть слова тоже считается вхождением (как раньше)
+    results = index.search('пита')
+    assert [r['name'] for r in results] == ['Блок питания 750W']
+
+    logger.success("✅ Тест пройден")
+
+
+def test_matches_linear_search():
+    """Результаты индекса совпадают с линейным перебором."""
+    logger.info("=== Тест: сравнение с линейным поиском ===")
+    rnd = random.Random(42)
+    words = ['кабель', 'usb', 'c', 'видеокарта', 'rtx', '4070', 'super', 'блок', 'питания',
+             'ssd', '1tb', 'черный', 'белый', 'для', 'ноутбука', 'мышь', 'клавиатура']
+    catalog = []
+    seen = set()
+    for _ in range(400):
+        name = " ".join(rnd.sample(words, rnd.randint(1, 5)))
+        if name not in seen:
+            seen.add(name)
+            catalog.append({'name': name.capitalize(), 'type': 'тип'})
+
+    index = ProductIndex(catalog, fuzzy=False)
+    for _ in range(200):
+        query = " ".join(rnd.sample(words, rnd.randint(1, 4)))
+        expected = linear_search(catalog, query)
+        actual = [(r['name'], r['match_score']) for r in index.search(query)]
+        assert actual == expected, f"{query}: {actual} != {expected}"
+
+    logger.success("✅ Тест пройден")
+
+
+
+
+def test_typos_and_normalization():
+    """Опечатки, ё/е и латинские двойники не роняют товар ниже порога."""
+    logger.info("=== Тест: опечатки и нормализация ===")
+    catalog = CATALOG + [
+        {'name': 'Корпус Zalman чёрный', 'type': 'корпуса'},
+        {'name': 'Вентилятор Arctic P12', 'type': 'охлаждение'},
+    ]
+    index = ProductIndex(catalog)
+
+    # ё → е: точное совпадение после нормализации
+    results = index.search('Корпус Zalman черный')
+    assert results[0]['name'] == 'Корпус Zalman чёрный'
+    assert results[0]['match_score'] == 100
+
+    # Латинские "о" и "р" внутри кириллического слова
+    results = index.search('Kopпус Zalman чёрный')
+    assert results[0]['name'] == 'Корпус Zalman чёрный'
+    assert results[0]['match_score'] == 100
+
+    # Одна опечатка в названии - почти совпадение, но не 100 (нужен вопрос)
+    results = index.search('Вентилятор Arctik P12')
+    assert results[0]['name'] == 'Вентилятор Arctic P12'
+    assert results[0]['match_score'] == 90
+
+    # Опечатка в слове учитывается как общее слово
+    results = index.search('Блок питанея')
+    assert results[0]['name'] == 'Блок питания 750W'
+    assert results[0]['match_score'] >= 30
+    assert ProductIndex(catalog, fuzzy=False).search('Блок питанея') == []
+
+    assert mapping_key('  Корпус ZALMAN Чёрный ', 'Black') == 'корпус zalman черный|black'
+    assert normalize_name('Kopпус') == 'корпус'
+
+    logger.success("✅ Тест пройден")
+
+
+def test_batch_scores_match_single_search():
+    """Пакетный (матричный) поиск даёт те же оценки, что и find_matches: вхождение - 80, опечатка - 90."""
+    logger.info("=== Тест: пакетное сопоставление ===")
+    import tempfile
+    from pathlib import Path
+    from product_matcher import ProductMatcher
+
+    matcher = ProductMatcher(CATALOG, mappings_file=str(Path(tempfile.mkdtemp()) / 'product_mappings.json'))
+    items = [('Термопаста Arctic MX-4 4г', ''), ('Кабель USB-C', 'Black'),
+             ('Блок питанея 750W', ''), ('Кабель USB-C', 'Black')]
+    batch = matcher.find_matches_batch(items)
+
+    assert list(batch) == items[:3]
+    assert batch[items[0]][0]['match_score'] == 80
+    assert batch[items[2]][0]['match_score'] == 90
+    index = ProductIndex(CATALOG)
+    for (name, color), matches in zip(items, index.search_batch([name for name, _ in items])):
+        assert batch[(name, color)] == matches == index.search(name)
+        # Кеш общий с find_matches: тот же ключ название+цвет
+        assert matcher.match_cache.get('index', name, color) == batch[(name, color)]
+        assert matcher.find_matches(name, color) == batch[(name, color)]
+
+    logger.success("✅ Тест пройден")
+
+
+def test_match_cache_invalidation():
+    """Кеш кандидатов: попадания, LRU-вытеснение и сброс при изменении каталога."""
+    logger.info("=== Тест: кеш кандидатов сопоставления ===")
+    import os
+    from match_cache import MatchCache, catalog_hash
+
+    cache_file = 'match_cache_test.json'
+    if os.path.exists(cache_file):
+        os.remove(cache_file)
+    try:
+        digest = catalog_hash(CATALOG)
+        cache = MatchCache(digest, cache_file=cache_file, max_entries=2)
+        assert cache.get('index', 'Кабель USB-C') is None
+        cache.put('index', 'Кабель USB-C', '', [{'name': 'Кабель USB-C', 'match_score': 100}])
+        cache.put('index', 'Второй', '', [])
+        cache.put('index', 'Третий', '', [])
+        assert cache.get('index', 'Кабель USB-C') is None  # вытеснен
+        assert cache.save()
+
+        reloaded = MatchCache(digest, cache_file=cache_file, max_entries=2)
+        assert reloaded.get('index', 'ТРЕТИЙ') == []
+        assert reloaded.hits == 1
+
+        changed = MatchCache(catalog_hash(CATALOG[1:]), cache_file=cache_file)
+        assert changed.get('index', 'Третий') is None
+    finally:
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_exact_and_contains()
+    test_matches_linear_search()
+    test_typos_and_normalization()
+    test_batch_scores_match_single_search()
+    test_match_cache_invalidation()
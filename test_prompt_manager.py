@@ -0,0 +1,194 @@
+"""
+Тест промптов между парсером и ботом (prompt_manager): пробуждение через сокет,
+страховочный опрос, ответ без reply, обрезка истории.
+"""
+
+import asyncio
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from loguru import logger
+
+import notifier
+import telegram_bot
+from notifier import PromptBatch, TelegramNotifier
+from prompt_manager import PromptManager
+
+
+def _manager() -> PromptManager:
+    return PromptManager(Path(tempfile.mkdtemp()) / "prompt_state.json")
+
+
+def _notifier(manager: PromptManager) -> TelegramNotifier:
+    """Notifier без бота: промпты только в файле, без рассылки."""
+    instance = TelegramNotifier.__new__(TelegramNotifier)
+    instance.prompt_manager = manager
+    instance.chat_ids = []
+
+    async def send_message(message):
+        return True
+
+    async def send_prompt(prompt, timeout=0, options=None, notify_path=None):
+        return manager.create_prompt(prompt, timeout or None, notify_path=notify_path)
+
+    instance.send_message = send_message
+    instance.send_prompt = send_prompt
+    return instance
+
+
+def _typed_reply(manager: PromptManager, text: str) -> None:
+    """Сообщение в бот без reply и без кода промпта."""
+    async def reply_text(text, **kwargs):
+        pass
+
+    update = SimpleNamespace(
+        message=SimpleNamespace(text=text, reply_to_message=None, reply_text=reply_text),
+        effective_user=SimpleNamespace(username="admin", full_name="", id=1)
+    )
+    original = telegram_bot.PROMPT_MANAGER
+    telegram_bot.PROMPT_MANAGER = manager
+    try:
+        asyncio.run(telegram_bot.handle_prompt_response(update, None))
+    finally:
+        telegram_bot.PROMPT_MANAGER = original
+
+
+def test_channel_wakes_waiter():
+    """Ответ будит ожидающий процесс сразу, без ожидания интервала опроса."""
+    logger.info("=== Тест: пробуждение через сокет ===")
+    manager = _manager()
+    channel = manager.open_channel()
+    assert channel is not None
+    try:
+        prompt_id = manager.create_prompt("Что это?", timeout=None, notify_path=str(channel.path))
+        threading.Timer(0.1, manager.set_response, (prompt_id, "ответ")).start()
+
+        async def wait():
+            started = time.monotonic()
+            woke = await channel.wait(10)
+            return woke, time.monotonic() - started
+
+        woke, elapsed = asyncio.run(wait())
+        assert woke and elapsed < 5
+        assert manager.get_response_text(prompt_id) == "ответ"
+    finally:
+        channel.close()
+    assert not channel.path.exists()
+    logger.success("✅ Тест пройден")
+
+
+def test_socket_wakes_notifier_before_fallback_poll():
+    """С каналом ответ приходит через сокет, а не по страховочному опросу файла."""
+    logger.info("=== Тест: ожидание ответа через сокет ===")
+    manager = _manager()
+    channel = manager.open_channel()
+    assert channel is not None
+    interval = notifier.PROMPT_FALLBACK_POLL_INTERVAL
+    notifier.PROMPT_FALLBACK_POLL_INTERVAL = 30
+    try:
+        # Без сигнала ожидание заканчивается по таймауту
+        assert asyncio.run(channel.wait(0.05)) is False
+
+        first = manager.create_prompt("Первый?", timeout=None, notify_path=str(channel.path))
+        second = manager.create_prompt("Второй?", timeout=None, notify_path=str(channel.path))
+        threading.Timer(0.1, manager.set_response, (second, "да")).start()
+        started = time.monotonic()
+        answer = asyncio.run(_notifier(manager).wait_for_any_response([first, second], timeout=60, channel=channel))
+        assert answer == (second, "да")
+        assert time.monotonic() - started < 5
+    finally:
+        notifier.PROMPT_FALLBACK_POLL_INTERVAL = interval
+        channel.close()
+    logger.success("✅ Тест пройден")
+
+
+def test_fallback_poll_without_channel():
+    """Без канала ответ находится опросом файла промптов."""
+    manager = _manager()
+    first = manager.create_prompt("Первый?", timeout=None)
+    second = manager.create_prompt("Второй?", timeout=None)
+    interval = notifier.PROMPT_POLL_INTERVAL
+    notifier.PROMPT_POLL_INTERVAL = 0.05
+    try:
+        threading.Timer(0.2, manager.set_response, (second, "да")).start()
+        answer = asyncio.run(_notifier(manager).wait_for_any_response([first, second], timeout=10))
+    finally:
+        notifier.PROMPT_POLL_INTERVAL = interval
+    assert answer == (second, "да")
+
+
+def test_typed_reply_without_reply_to():
+    """Текст без reply и без кода промпта записывается в самый новый ожидающий промпт."""
+    manager = _manager()
+    older = manager.create_prompt("Первый?", timeout=None)
+    newest = manager.create_prompt("Второй?", timeout=None)
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(
+        message=SimpleNamespace(text="Кабель USB", reply_to_message=None, reply_text=reply_text),
+        effective_user=SimpleNamespace(username="admin", full_name="", id=1)
+    )
+    original = telegram_bot.PROMPT_MANAGER
+    telegram_bot.PROMPT_MANAGER = manager
+    try:
+        asyncio.run(telegram_bot.handle_prompt_response(update, None))
+    finally:
+        telegram_bot.PROMPT_MANAGER = original
+
+    assert manager.get_response_text(newest) == "Кабель USB"
+    assert manager.get_prompt(newest)["response"]["user"] == "@admin"
+    assert manager.get_prompt(older)["status"] == "waiting"
+    assert newest in replies[0]
+
+
+def test_typed_follow_up_answer_during_batch():
+    """Уточняющий вопрос при открытом пакете: текст без кода не попадает в вопросы пакета."""
+    manager = _manager()
+    batch = PromptBatch.__new__(PromptBatch)
+    batch.notifier = _notifier(manager)
+    batch.timeout = 0
+    batch.channel = None
+    batch.pending = {}
+    first = batch.send('мышь', "Что это: мышь?")
+    second = batch.send('кабель', "Что это: кабель?")
+
+    with batch.paused():
+        follow_up = manager.create_prompt("Сколько единиц?", timeout=None)
+        _typed_reply(manager, "3")
+        assert manager.get_response_text(follow_up) == "3"
+        assert [manager.get_prompt(p)["status"] for p in (first, second)] == ["waiting"] * 2
+        # Пока других целей нет, текст без кода игнорируется
+        _typed_reply(manager, "Кабель USB")
+        assert manager.get_oldest_waiting_prompt() is None
+
+    # После уточнения вопросы пакета снова принимают текст без кода
+    _typed_reply(manager, "Мышь")
+    assert manager.get_response_text(second) == "Мышь"
+    assert manager.get_response_text(first) is None
+
+
+def test_trim_keeps_waiting_prompts():
+    """Обрезка истории удаляет только закрытые промпты, ожидающие сохраняются."""
+    manager = PromptManager(Path(tempfile.mkdtemp()) / "prompt_state.json", max_prompts=3)
+    answered = manager.create_prompt("Старый", timeout=None)
+    manager.set_response(answered, "ok")
+    waiting = [manager.create_prompt(f"Вопрос {i}", timeout=None) for i in range(5)]
+
+    assert manager.get_prompt(answered) is None
+    for prompt_id in waiting:
+        assert manager.set_response(prompt_id, "ответ")
+
+
+if __name__ == "__main__":
+    test_channel_wakes_waiter()
+    test_socket_wakes_notifier_before_fallback_poll()
+    test_fallback_poll_without_channel()
+    test_typed_reply_without_reply_to()
+    test_typed_follow_up_answer_during_batch()
+    test_trim_keeps_waiting_prompts()
@@ -0,0 +1,183 @@
+"""
+Тест HTTP-слоя с квотами Sheets API (quota_client).
+"""
+
+import json
+
+import requests
+from loguru import logger
+
+import quota_client
+from quota_client import QuotaAwareHTTPClient, QuotaBudget, coalesce_reads, coalesce_writes
+from sync_planner import estimate_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_response(status, payload, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(payload).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+class ScriptedSession:
+    """Сессия, отвечающая заранее заданными ответами."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_budget_waits_for_window():
+    """Сверх лимита запрос ждёт освобождения минутного окна."""
+    logger.info("=== Тест: бюджет запросов ===")
+    clock = FakeClock()
+    budget = QuotaBudget(2, window=60, clock=clock, sleep=clock.sleep)
+    assert budget.acquire() == 0
+    clock.now = 10
+    assert budget.acquire() == 0
+    assert budget.acquire() == 50  # первый запрос выходит из окна на 60-й секунде
+    assert clock.now == 60
+    logger.success("✅ Тест пройден")
+
+
+def test_retry_on_429_then_success():
+    """429 повторяется с задержкой, 400 - нет."""
+    logger.info("=== Тест: повтор при 429 ===")
+    base = quota_client.BACKOFF_BASE
+    quota_client.BACKOFF_BASE = 0.001
+    try:
+        error = {'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}
+        session = ScriptedSession([make_response(429, error), make_response(503, error), make_response(200, {'ok': 1})])
+        client = QuotaAwareHTTPClient(auth=None, session=session)
+        assert client.request('get', 'https://sheets.example/values').json() == {'ok': 1}
+        assert len(session.calls) == 3
+
+        bad = {'error': {'code': 400, 'message': 'Bad range', 'status': 'INVALID_ARGUMENT'}}
+        session = ScriptedSession([make_response(400, bad)])
+        client = QuotaAwareHTTPClient(auth=None, session=session)
+        try:
+            client.request('post', 'https://sheets.example/values')
+            assert False, "400 не должен повторяться"
+        except quota_client.APIError:
+            pass
+        assert len(session.calls) == 1
+    finally:
+        quota_client.BACKOFF_BASE = base
+    logger.success("✅ Тест пройден")
+
+
+def test_non_idempotent_writes_not_resent():
+    """batchUpdate и append после таймаута или 5xx не повторяются, values.batchUpdate - повторяется."""
+    logger.info("=== Тест: повтор только идемпотентных запросов ===")
+    base = quota_client.BACKOFF_BASE
+    quota_client.BACKOFF_BASE = 0.001
+    try:
+        batch_update = 'https://sheets.googleapis.com/v4/spreadsheets/id:batchUpdate'
+        session = ScriptedSession([requests.ReadTimeout('timed out'), make_response(200, {'ok': 1})])
+        client = QuotaAwareHTTPClient(auth=None, session=session)
+        try:
+            client.request('post', batch_update, json={'requests': [{'insertDimension': {}}]})
+            assert False, "таймаут batchUpdate не должен повторяться"
+        except requests.ReadTimeout:
+            pass
+        assert len(session.calls) == 1
+
+        error = {'error': {'code': 503, 'message': 'Unavailable', 'status': 'UNAVAILABLE'}}
+        append = 'https://sheets.googleapis.com/v4/spreadsheets/id/values/A1:append'
+        session = ScriptedSession([make_response(503, error)])
+        client = QuotaAwareHTTPClient(auth=None, session=session)
+        try:
+            client.request('post', append)
+            assert False, "503 append не должен повторяться"
+        except quota_client.APIError:
+            pass
+        assert len(session.calls) == 1
+
+        # 429 и ошибка соединения до отправки - запрос не выполнен, повтор безопасен
+        quota = {'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}
+        session = ScriptedSession([
+            make_response(429, quota), requests.ConnectTimeout('connect'), make_response(200, {'ok': 1})
+        ])
+        client = QuotaAwareHTTPClient(auth=None, session=session)
+        assert client.request('post', batch_update).json() == {'ok': 1}
+        assert len(session.calls) == 3
+
+        values_update = 'https://sheets.googleapis.com/v4/spreadsheets/id/values:batchUpdate'
+        session = ScriptedSession([requests.ReadTimeout('timed out'), make_response(200, {'ok': 1})])
+        client = QuotaAwareHTTPClient(auth=None, session=session)
+        assert client.request('post', values_update).json() == {'ok': 1}
+        assert len(session.calls) == 2
+    finally:
+        quota_client.BACKOFF_BASE = base
+    logger.success("✅ Тест пройден")
+
+
+def test_coalesce_ranges():
+    """Соседние диапазоны с теми же столбцами объединяются."""
+    reads = coalesce_reads(["'Лист'!A2:H3", "'Лист'!A4:H4", "'Лист'!I4:P4", 'A:P'])
+    assert reads == [("'Лист'!A2:H4", [(0, 0), (1, 2)]), ("'Лист'!I4:P4", [(2, 0)]), ('A:P', [(3, 0)])]
+
+    writes = coalesce_writes([
+        {'range': "'Лист'!D5:D5", 'values': [['TRUE']]},
+        {'range': "'Лист'!D6:D6", 'values': [['FALSE']]},
+        {'range': "'Лист'!F6:F6", 'values': [[100]]},
+    ])
+    assert writes == [
+        {'range': "'Лист'!D5:D6", 'values': [['TRUE'], ['FALSE']]},
+        {'range': "'Лист'!F6:F6", 'values': [[100]]},
+    ]
+
+
+def test_batch_get_splits_merged_ranges():
+    """Объединённый batchGet раскладывается обратно по исходным диапазонам."""
+    session = ScriptedSession([make_response(200, {
+        'spreadsheetId': 'id',
+        'valueRanges': [{'range': "'Лист'!A2:B5", 'majorDimension': 'ROWS', 'values': [['a', '1'], [], ['c', '3']]}]
+    })])
+    client = QuotaAwareHTTPClient(auth=None, session=session)
+    response = client.values_batch_get('id', ["'Лист'!A2:B3", "'Лист'!A4:B5"])
+    assert len(session.calls) == 1
+    first, second = response['valueRanges']
+    assert first == {'range': "'Лист'!A2:B3", 'majorDimension': 'ROWS', 'values': [['a', '1']]}
+    assert second == {'range': "'Лист'!A4:B5", 'majorDimension': 'ROWS', 'values': [['c', '3']]}
+
+
+def test_estimate_seconds_uses_free_budget():
+    clock = FakeClock()
+    budget = QuotaBudget(10, window=60, clock=clock, sleep=clock.sleep)
+    for _ in range(8):
+        budget.acquire()
+    assert budget.available() == 2 and budget.acquired == 8
+    # 2 запроса - без ожидания, 12 - ещё одно окно квоты
+    assert estimate_seconds(2, budget, request_seconds=0.5) == 1.0
+    assert estimate_seconds(12, budget, request_seconds=0.5) == 60 + 6.0
+    clock.now = 60
+    assert budget.available() == 10
+
+
+if __name__ == "__main__":
+    test_budget_waits_for_window()
+    test_retry_on_429_then_success()
+    test_non_idempotent_writes_not_resent()
+    test_coalesce_ranges()
+    test_batch_get_splits_merged_ranges()
+    test_estimate_seconds_uses_free_budget()
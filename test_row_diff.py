@@ -0,0 +1,69 @@
+"""
+Тест построчного diff строк заказа (row_diff).
+"""
+
+from loguru import logger
+
+from row_diff import COL_STATUS, diff_order_rows, same_value
+
+
+def sheet_row(name, status='TRUE', price='100,00 ₽', i_p=None):
+    """Строка листа A-P в том виде, в котором её читает снимок."""
+    row = ['01.01.2026', '100-1', 'Озон', status, '', price, name, 'Тип']
+    return row + (i_p or [''] * 8)
+
+
+def new_row(name, status='TRUE', price=100):
+    return ['01.01.2026', '100-1', 'Озон', status, '', price, name, 'Тип']
+
+
+def test_status_flip_is_single_edit():
+    """Смена статуса одной строки - одна правка столбца D, без вставок и удалений."""
+    logger.info("=== Тест: смена статуса ===")
+    old = [sheet_row('Кабель', 'FALSE'), sheet_row('Мышь', 'FALSE', i_p=['ART-1'] + [''] * 7)]
+    new = [new_row('Кабель', 'FALSE'), new_row('Мышь', 'TRUE')]
+    diff = diff_order_rows(old, new)
+    assert diff.deleted == [] and diff.inserted == []
+    assert diff.edits == [(1, COL_STATUS, 'TRUE')]
+    # Строка с данными I-P осталась на своей позиции
+    assert [old_idx for old_idx, _ in diff.layout] == [0, 1]
+    logger.success("✅ Тест пройден")
+
+
+def test_insert_and_delete_keep_existing_rows():
+    """Новые строки встают рядом с тем же товаром, лишние удаляются."""
+    logger.info("=== Тест: вставка и удаление ===")
+    old = [sheet_row('Кабель'), sheet_row('Мышь'), sheet_row('Чехол')]
+    new = [new_row('Кабель'), new_row('Кабель'), new_row('Мышь')]
+    diff = diff_order_rows(old, new)
+    assert diff.deleted == [2]
+    assert [old_idx for old_idx, _ in diff.layout] == [0, None, 1]
+    assert diff.inserted == [1]
+    assert diff.edits == []
+    logger.success("✅ Тест пройден")
+
+
+def test_prefers_rows_with_user_data():
+    """При уменьшении количества удаляется строка без данных в I-P."""
+    logger.info("=== Тест: приоритет строк с I-P ===")
+    old = [sheet_row('Мышь', 'FALSE'), sheet_row('Мышь', 'FALSE', i_p=['ART-1'] + [''] * 7)]
+    new = [new_row('Мышь', 'TRUE')]
+    diff = diff_order_rows(old, new)
+    assert diff.deleted == [0]
+    assert [old_idx for old_idx, _ in diff.layout] == [1]
+    assert diff.edits == [(0, COL_STATUS, 'TRUE')]
+    logger.success("✅ Тест пройден")
+
+
+def test_same_value_normalizes_prices():
+    assert same_value('1 443,97 ₽', 1443.97)
+    assert same_value('100,00 ₽', 100)
+    assert not same_value('100,00 ₽', 101)
+    assert not same_value('в пути', 'TRUE')
+
+
+if __name__ == "__main__":
+    test_status_flip_is_single_edit()
+    test_insert_and_delete_keep_existing_rows()
+    test_prefers_rows_with_user_data()
+    test_same_value_normalizes_prices()
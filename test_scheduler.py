@@ -0,0 +1,95 @@
+"""
+Тест встроенного планировщика (scheduler): слоты, догон пропущенного запуска, наложение.
+"""
+
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from loguru import logger
+
+from job_queue import DONE, RUNNING, JobQueue
+from scheduler import Schedule, Scheduler, next_slot, parse_hours
+
+MSK = ZoneInfo('Europe/Moscow')
+
+
+def msk(day, hour, minute=0, second=0):
+    return datetime(2026, 3, day, hour, minute, second, tzinfo=MSK)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now.timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+def finish(queue, job_id):
+    with sqlite3.connect(str(queue.db_path)) as conn:
+        conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (DONE, job_id))
+
+
+def test_next_slot():
+    assert parse_hours('9-21') == (9, 21)
+    assert next_slot(msk(2, 9, 7, 30), 15, (9, 21)) == msk(2, 9, 15)
+    assert next_slot(msk(2, 9, 15), 15, (9, 21)) == msk(2, 9, 30)
+    assert next_slot(msk(2, 21, 50), 15, (9, 21)) == msk(3, 9, 0)
+    assert next_slot(msk(2, 3, 0), 15, (9, 21)) == msk(2, 9, 0)
+    assert next_slot(msk(2, 23, 59), 60, (0, 23)) == msk(3, 0, 0)
+
+
+def test_schedule_dispatches_and_persists():
+    """Слот ставит задание, пока оно работает - слоты пропускаются, после перезапуска - догон."""
+    logger.info("=== Тест: планировщик автозапуска ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(str(Path(tmp) / 'jobs.sqlite3'), min_free_mb=0, log_dir=None)
+        path = str(Path(tmp) / 'schedules.json')
+        clock = FakeClock(msk(2, 9, 7))
+
+        def make():
+            return Scheduler(
+                queue, path=path, defaults=[Schedule('parse', 'parse', 15, (9, 21), jitter=30)],
+                catchup_seconds=1800, clock=clock, rand=lambda a, b: b
+            )
+
+        scheduler = make()
+        assert scheduler.tick() == []  # выключено
+        assert scheduler.set_enabled('parse', True)
+        assert scheduler.schedules['parse'].next_run == msk(2, 9, 15, 30).timestamp()
+
+        clock.now = msk(2, 9, 15, 40).timestamp()
+        [job] = scheduler.tick()
+        assert job.source == 'schedule' and job.kind == 'parse'
+
+        # Задание работает - следующий слот пропускается
+        queue._claim()
+        assert queue.get(job.id).status == RUNNING
+        clock.now = msk(2, 9, 31).timestamp()
+        assert scheduler.tick() == []
+        assert scheduler.schedules['parse'].next_run == msk(2, 9, 45, 30).timestamp()
+
+        finish(queue, job.id)
+
+        # Бот был выключен 20 минут: пропущенный слот выполняется один раз после старта
+        clock.now = msk(2, 10, 5).timestamp()
+        scheduler = make()
+        assert scheduler.schedules['parse'].enabled
+        [caught_up] = scheduler.tick()
+        assert caught_up.id != job.id
+        assert scheduler.schedules['parse'].next_run == msk(2, 10, 15, 30).timestamp()
+        finish(queue, caught_up.id)
+
+        # Простой дольше окна догона - запуск пропускается
+        clock.now = msk(2, 23, 0).timestamp()
+        assert scheduler.tick() == []
+        assert scheduler.schedules['parse'].next_run == msk(3, 9, 0, 30).timestamp()
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_next_slot()
+    test_schedule_dispatches_and_persists()
@@ -0,0 +1,111 @@
+"""
+Тест архивации старых заказов (sheet_archive) на подмене Google Sheets.
+"""
+
+from datetime import date
+
+from loguru import logger
+
+import sheets_sync
+from fake_sheets import FakeClient
+from sheet_archive import ARCHIVE_INDEX_TITLE, OrderArchiver, archive_title, parse_sheet_date
+from sheets_sync import SheetsSynchronizer
+
+
+def make_order(order_number, order_date, status):
+    return {
+        'order_number': order_number,
+        'date': order_date,
+        'items': [{'name': 'Мышь', 'mapped_name': 'Мышь', 'mapped_type': 'Тип', 'quantity': 2,
+                   'price': 100, 'status': status, 'split_units': 1}]
+    }
+
+
+def test_archive_old_terminal_orders():
+    """Старые завершённые заказы уходят в архив по годам и не возвращаются при синхронизации."""
+    logger.info("=== Тест: архивация заказов ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус']])
+
+        sync = SheetsSynchronizer('google_credentials.json', mirror_file=None)
+        sync.client = client
+        assert sync.open_sync_worksheet(spreadsheet.url, str(worksheet.id))
+        orders = {'orders': [
+            make_order('100-1', '05.03.2023', 'получен'),
+            make_order('200-1', '10.06.2023', 'в пути'),
+            make_order('300-1', '01.12.2024', 'отменен'),
+            make_order('400-1', '01.10.2026', 'получен'),
+        ]}
+        assert sync.sync_orders(orders)
+        worksheet.update(range_name='I2', values=[['ART-1']])
+
+        summary = OrderArchiver(sync, max_age_days=180).archive(today=date(2026, 10, 19))
+        assert summary == {'Архив 2023': 1, 'Архив 2024': 1}
+
+        archive = spreadsheet.worksheet('Архив 2023')
+        assert [archive.cell_value(r, 2) for r in (2, 3)] == ['100-1', '100-1']
+        assert archive.cell_value(2, 9) == 'ART-1'
+        index = spreadsheet.worksheet(ARCHIVE_INDEX_TITLE)
+        assert [index.cell_value(r, 1) for r in (2, 3)] == ['100-1', '300-1']
+        assert [worksheet.cell_value(r, 2) for r in range(2, 6)] == ['200-1', '200-1', '400-1', '400-1']
+
+        # Повторная синхронизация не добавляет заархивированные заказы
+        assert sync.sync_orders(orders)
+        assert worksheet.cell_value(6, 2) == ''
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_archive_rewrites_row_formulas():
+    """Старая сумма =SUM(F{a}:F{b}) в архиве заменяется формулой без номеров строк."""
+    logger.info("=== Тест: формулы при архивации ===")
+    send_message = sheets_sync.sync_send_message
+    sheets_sync.sync_send_message = lambda message: True
+    try:
+        client = FakeClient()
+        spreadsheet = client.create('Заказы')
+        worksheet = spreadsheet.sheet1
+        worksheet.update(range_name='A1', values=[['Дата', 'Номер заказа', 'Источник', 'Статус', 'Сумма']])
+
+        sync = SheetsSynchronizer('google_credentials.json', mirror_file=None)
+        sync.client = client
+        assert sync.open_sync_worksheet(spreadsheet.url, str(worksheet.id))
+        assert sync.sync_orders({'orders': [
+            make_order('100-1', '05.03.2024', 'в пути'),
+            make_order('200-1', '10.06.2023', 'получен'),
+        ]})
+        # Заказ, записанный до перехода на SUMIF: сумма с номерами строк
+        assert worksheet.cell_value(4, 2) == '200-1'
+        worksheet.update(range_name='E4', values=[['=SUM(F4:F5)']])
+
+        spreadsheet.stats.reset()
+        assert OrderArchiver(sync, max_age_days=180).archive(today=date(2026, 10, 19)) == {'Архив 2023': 1}
+        assert spreadsheet.stats.calls['values.batchGet'] == 1, spreadsheet.stats
+
+        archive = spreadsheet.worksheet('Архив 2023')
+        assert [archive.cell_value(r, 2) for r in (2, 3)] == ['200-1', '200-1']
+        assert archive.cell_value(2, 5) == sync.ORDER_TOTAL_FORMULA
+        assert archive.cell_value(3, 5) == ''
+    finally:
+        sheets_sync.sync_send_message = send_message
+    logger.success("✅ Тест пройден")
+
+
+def test_archive_titles():
+    day = parse_sheet_date('17.09.2025')
+    assert day == date(2025, 9, 17)
+    assert archive_title(day) == 'Архив 2025'
+    assert archive_title(day, 'quarter') == 'Архив 2025 Q3'
+    assert parse_sheet_date('вчера') is None
+
+
+if __name__ == "__main__":
+    test_archive_old_terminal_orders()
+    test_archive_rewrites_row_formulas()
+    test_archive_titles()
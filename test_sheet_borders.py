@@ -0,0 +1,62 @@
+"""
+Тест границ заказов (sheet_borders) и их пересчёта по областям плана.
+"""
+
+from types import SimpleNamespace
+
+from loguru import logger
+
+from sheet_borders import GROUP_COLUMNS, border_lines, merge_regions, region_requests
+from sheet_plan import SheetUpdatePlan
+from sheet_snapshot import SheetSnapshot
+
+
+def row(order_number, name):
+    return ['01.01', order_number, 'Озон', 'TRUE', '', 100, name, 'Тип']
+
+
+def test_lines_are_merged():
+    """Серия заказов по одной строке - один запрос с innerHorizontal."""
+    logger.info("=== Тест: слияние линий границ ===")
+    rows = [row('1', 'Мышь'), row('2', 'Мышь'), row('3', 'Мышь'), row('4', 'Кабель'), row('4', 'Мышь')]
+    order_lines, group_lines = border_lines(rows)
+    assert order_lines == {0, 1, 2, 3, 5}
+    assert group_lines == {4}
+
+    requests = [r['updateBorders'] for r in region_requests(7, 10, rows)]
+    clear, orders, last, group = requests
+    assert clear['innerHorizontal'] == {'style': 'NONE'}
+    # Линии 0-3: строки 10-12 с top, innerHorizontal и bottom
+    assert (orders['range']['startRowIndex'], orders['range']['endRowIndex']) == (9, 12)
+    assert 'innerHorizontal' in orders
+    # Линия 5: низ последней строки
+    assert (last['range']['startRowIndex'], last['range']['endRowIndex']) == (13, 14) and 'bottom' in last
+    # Линия между группами - низ строки 13 в G-I
+    assert (group['range']['startRowIndex'], group['range']['startColumnIndex']) == (12, GROUP_COLUMNS[0])
+    logger.success("✅ Тест пройден")
+
+
+def test_plan_recomputes_merged_regions():
+    """Соседние области объединяются и сдвигаются вместе со строками."""
+    logger.info("=== Тест: области границ в плане ===")
+    assert merge_regions([(5, 6), (2, 4), (10, 12)]) == [(2, 6), (10, 12)]
+
+    snapshot = SheetSnapshot([['Дата', 'Номер заказа'], row('1', 'Мышь'), row('2', 'Мышь')])
+    plan = SheetUpdatePlan(SimpleNamespace(id=7, title='Заказы'), snapshot)
+    plan.mark_borders(2, 2)
+    plan.mark_borders(3, 3)
+    plan.insert_rows(3, 1)
+    plan.update(3, 0, [row('1', 'Кабель')])
+    plan.mark_borders(2, 3)
+
+    assert plan.border_regions == [(2, 2), (4, 4), (2, 3)]
+    requests = [r['updateBorders'] for r in plan.border_requests()]
+    # Одна очистка на объединённую область 2-4
+    clears = [r for r in requests if r.get('innerVertical')]
+    assert [(r['range']['startRowIndex'], r['range']['endRowIndex']) for r in clears] == [(1, 4)]
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_lines_are_merged()
+    test_plan_recomputes_merged_regions()
@@ -0,0 +1,138 @@
+"""
+Тест плана изменений листа (SheetUpdatePlan).
+
+Проверяет, что пакетное выполнение (сначала все вставки/удаления,
+потом значения в итоговых координатах) даёт тот же лист, что и
+последовательное применение изменений.
+"""
+
+from types import SimpleNamespace
+
+from gspread.utils import a1_range_to_grid_range
+from loguru import logger
+from sheet_plan import SheetUpdatePlan, has_row_references, shift_formula_rows
+from sheet_snapshot import SheetSnapshot
+from sheets_sync import SheetsSynchronizer
+
+
+def make_sheet():
+    rows = [['Дата', 'Номер заказа']]
+    for order, count in (('100-1', 3), ('200-1', 2), ('300-1', 4)):
+        for _ in range(count):
+            rows.append(['01.01', order, 'Озон', 'TRUE', '', '100', f'Товар {order}', 'Тип'])
+    return rows
+
+
+def apply_batch(rows, plan):
+    """Применить структурные запросы и значения так, как это сделает API."""
+    rows = [list(row) + [''] * (16 - len(row)) for row in rows]
+    for request in plan.structural:
+        if 'insertDimension' in request:
+            grid = request['insertDimension']['range']
+            rows[grid['startIndex']:grid['startIndex']] = [
+                [''] * 16 for _ in range(grid['endIndex'] - grid['startIndex'])
+            ]
+        else:
+            grid = request['deleteDimension']['range']
+            del rows[grid['startIndex']:grid['endIndex']]
+    for value_range in plan.value_ranges():
+        grid = a1_range_to_grid_range(value_range['range'].split('!')[1])
+        for r, row_values in enumerate(value_range['values']):
+            while len(rows) <= grid['startRowIndex'] + r:
+                rows.append([''] * 16)
+            for c, value in enumerate(row_values):
+                rows[grid['startRowIndex'] + r][grid['startColumnIndex'] + c] = value
+    return rows
+
+
+def test_batch_matches_sequential_changes():
+    """Изменения нескольких заказов в одном плане сдвигают ранее запланированные."""
+    logger.info("=== Тест: план изменений листа ===")
+    sheet = make_sheet()
+    snapshot = SheetSnapshot(sheet)
+    plan = SheetUpdatePlan(SimpleNamespace(id=7, title='Заказы'), snapshot)
+
+    # Заказ 300-1 (строки 7-10): остаётся 2 строки, пишем формулу
+    plan.delete_rows(9, 10)
+    plan.update(7, 0, [['02.01', '300-1', 'Озон', 'FALSE', '=SUM(F7:F8)'], ['02.01', '300-1']])
+    plan.add_requests([{"updateBorders": {"range": {"sheetId": 7, "startRowIndex": 6, "endRowIndex": 8}}}])
+
+    # Заказ 100-1 (строки 2-4): становится 5 строк - сдвигает уже запланированный 300-1
+    plan.insert_rows(5, 2)
+    plan.update(2, 0, [['03.01', '100-1', 'Озон', 'TRUE', '=SUM(F2:F6)']] + [['03.01', '100-1']] * 4)
+
+    # Заказ 200-1 теперь в строках 7-8 по снимку
+    assert snapshot.row_numbers('200-1') == [7, 8]
+    assert snapshot.row_numbers('300-1') == [9, 10]
+
+    result = apply_batch(sheet, plan)
+    assert [row[:4] for row in result] == [row[:4] for row in snapshot.rows]
+    assert result[8][4] == '=SUM(F9:F10)'
+    assert result[1][4] == '=SUM(F2:F6)'
+
+    border = plan.formatting[0]['updateBorders']['range']
+    assert (border['startRowIndex'], border['endRowIndex']) == (8, 10)
+    logger.success("✅ Тест пройден")
+
+
+def test_value_ranges_are_coalesced():
+    """Соседние ячейки собираются в прямоугольные диапазоны."""
+    logger.info("=== Тест: объединение диапазонов значений ===")
+    plan = SheetUpdatePlan(SimpleNamespace(id=7, title='Заказы'))
+    plan.update(2, 0, [['a', 'b'], ['c', 'd']])
+    plan.update(2, 8, [['i'], ['j']])
+    plan.update(4, 0, [['e', 'f']])
+
+    ranges = {r['range']: r['values'] for r in plan.value_ranges()}
+    assert ranges == {
+        "'Заказы'!A2:B4": [['a', 'b'], ['c', 'd'], ['e', 'f']],
+        "'Заказы'!I2:I3": [['i'], ['j']],
+    }
+    assert shift_formula_rows('=SUM(F10:F15)', 12, -2) == '=SUM(F10:F13)'
+    logger.success("✅ Тест пройден")
+
+
+def test_identical_rows_are_replicated():
+    """Серия одинаковых строк пишется один раз и копируется copyPaste."""
+    logger.info("=== Тест: копирование одинаковых строк ===")
+    plan = SheetUpdatePlan(SimpleNamespace(id=7, title='Заказы'))
+    plan.update(2, 0, [['01.01', '100-1', 'TRUE', '=SUM(F2:F6)']] + [['01.01', '100-1', 'TRUE', '']] * 4)
+    plan.update(7, 0, [['01.01', '200-1', 'TRUE', '=SUM(F7:F8)'], ['01.01', '200-1', 'TRUE', '']])
+
+    cells, copies = plan.replicated_rows()
+    assert len(copies) == 1
+    copy = copies[0]['copyPaste']
+    assert (copy['source']['startRowIndex'], copy['source']['endRowIndex']) == (2, 3)
+    assert (copy['destination']['startRowIndex'], copy['destination']['endRowIndex']) == (3, 6)
+    ranges = {r['range']: r['values'] for r in plan.value_ranges(cells)}
+    assert ranges == {
+        "'Заказы'!A2:D3": [['01.01', '100-1', 'TRUE', '=SUM(F2:F6)'], ['01.01', '100-1', 'TRUE', '']],
+        "'Заказы'!A7:D8": [['01.01', '200-1', 'TRUE', '=SUM(F7:F8)'], ['01.01', '200-1', 'TRUE', '']],
+    }
+    logger.success("✅ Тест пройден")
+
+
+def test_header_formula_is_not_shifted():
+    """Формула сумм в E1 с открытыми диапазонами не меняется при вставке и удалении строк."""
+    logger.info("=== Тест: формула заголовка при сдвиге строк ===")
+    formula = '={"Сумма";ARRAYFORMULA(IF(B2:B="","",IF(B2:B<>ARRAY_CONSTRAIN(B1:B,ROWS(B2:B),1),SUMIF(B2:B,B2:B,F2:F),"")))}'
+    plan = SheetUpdatePlan(SimpleNamespace(id=7, title='Заказы'))
+    plan.update(1, 4, [[formula]])
+    plan.update(5, 4, [['=SUM(F5:F6)']])
+    plan.insert_rows(2, 3)
+    plan.delete_rows(2, 2)
+
+    assert plan.cells[(1, 4)] == formula
+    assert plan.cells[(7, 4)] == '=SUM(F7:F8)'
+    assert shift_formula_rows('=SUMIF(B2:B,B12,F$2:F)', 2, 1) == '=SUMIF(B2:B,B13,F$2:F)'
+    # Сумма заказа по окну INDEX/ROW номеров строк не содержит
+    total = SheetsSynchronizer.ORDER_TOTAL_FORMULA
+    assert not has_row_references(total) and shift_formula_rows(total, 2, 5) == total
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_batch_matches_sequential_changes()
+    test_value_ranges_are_coalesced()
+    test_identical_rows_are_replicated()
+    test_header_formula_is_not_shifted()
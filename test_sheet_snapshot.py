@@ -0,0 +1,62 @@
+"""
+Тест снимка листа синхронизации (SheetSnapshot).
+"""
+
+from loguru import logger
+from sheet_snapshot import SheetSnapshot, split_blocks
+
+
+def make_rows():
+    return [
+        ['Дата', 'Номер заказа', 'Источник', 'Статус'],
+        ['01.01', '100-1', 'ozon', 'TRUE', '', '500', 'Мышь', 'Периферия', 'A1'],
+        ['01.01', '100-1', 'ozon', 'TRUE', '', '500', 'Мышь', 'Периферия'],
+        ['02.01', '200-1', 'ozon', 'в пути', '', '900', 'Кабель', 'Кабели'],
+        ['01.01', '100-1', 'ozon', 'FALSE', '', '700', 'Клавиатура', 'Периферия'],
+    ]
+
+
+def test_index_and_blocks():
+    """Индекс заказов, непрерывные блоки и значения A-P."""
+    logger.info("=== Тест: индекс снимка листа ===")
+    snapshot = SheetSnapshot(make_rows())
+
+    assert snapshot.order_numbers() == {'100-1', '200-1'}
+    assert '100-1' in snapshot and '300-1' not in snapshot
+    assert snapshot.row_numbers('100-1') == [2, 3, 5]
+    assert snapshot.blocks('100-1') == [[2, 3], [5]]
+    assert split_blocks([]) == []
+
+    rows = snapshot.get_rows([2])
+    assert len(rows[0]) == 16 and rows[0][8] == 'A1'
+    assert snapshot.next_free_row() == 6
+    logger.success("✅ Тест пройден")
+
+
+def test_local_mutations_shift_positions():
+    """Вставки, удаления и записи сдвигают позиции следующих заказов."""
+    logger.info("=== Тест: изменения снимка листа ===")
+    snapshot = SheetSnapshot(make_rows())
+
+    # Удаляем разбросанную строку заказа 100-1 и добавляем строку в основной блок
+    snapshot.delete_rows(5, 5)
+    snapshot.insert_rows(4, 1)
+    snapshot.update(2, 0, [['03.01', '100-1'], ['03.01', '100-1'], ['03.01', '100-1']])
+    assert snapshot.row_numbers('100-1') == [2, 3, 4]
+    assert snapshot.row_numbers('200-1') == [5]
+
+    # Дописывание новых заказов после последней строки
+    start = snapshot.next_free_row()
+    snapshot.update(start, 0, [['04.01', '300-1']])
+    assert snapshot.row_numbers('300-1') == [6]
+
+    # Запись только I-P не трогает индекс
+    snapshot.update(6, 8, [['артикул']])
+    assert snapshot.row(6)[8] == 'артикул'
+    assert snapshot.row_numbers('300-1') == [6]
+    logger.success("✅ Тест пройден")
+
+
+if __name__ == "__main__":
+    test_index_and_blocks()
+    test_local_mutations_shift_positions()